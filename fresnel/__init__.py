@@ -8,7 +8,13 @@ Attributes:
     __version__ (str): Fresnel version
 """
 
+import json
 import os
+import struct
+import time
+import threading
+import concurrent.futures
+import contextlib
 import numpy
 
 from . import geometry  # noqa
@@ -16,6 +22,11 @@ from . import tracer
 from . import camera
 from . import color  # noqa
 from . import light
+from . import material
+from . import tuning
+from . import util
+from . import animate  # noqa
+from . import distributed  # noqa
 
 from . import _common
 if _common.cpu_built():
@@ -58,6 +69,11 @@ class Device(object):
     Tip:
         Use only a single `Device` to reduce memory consumption.
 
+    Renders on a `Device` run one at a time. Tracers sharing a `Device` may
+    render from different threads (or with `Tracer.render_async
+    <fresnel.tracer.Tracer.render_async>`), and the device serializes the
+    renders in the order they start.
+
     The static member `available_modes` lists which modes are available. For a
     mode to be available, the corresponding module must be enabled at compile
     time. Additionally, there must be at least one GPU present for the ``gpu``
@@ -123,6 +139,11 @@ class Device(object):
         else:
             raise ValueError("Invalid mode")
 
+        # serialize renders on this device, see _submit
+        self._render_lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='fresnel')
+
     @property
     def mode(self):
         """str: The active mode."""
@@ -132,6 +153,14 @@ class Device(object):
         """Human readable `Device` summary."""
         return '<fresnel.Device: ' + self._device.describe() + '>'
 
+    def _submit(self, fn, *args, **kwargs):
+        """Call fn in the background render thread of this device.
+
+        Returns:
+            concurrent.futures.Future: The future result of *fn*.
+        """
+        return self._executor.submit(fn, *args, **kwargs)
+
 
 # determine available Device modes
 if _common.gpu_built():
@@ -152,6 +181,20 @@ if _common.gpu_built():
         Device.available_gpus = gpus_list[:-1]
 
 
+# Scene file format: a fixed size preamble (magic, version, header size), a
+# JSON header, and the array data. Each array starts on an _SCENE_ALIGNMENT
+# byte boundary so that it can be memory mapped.
+_SCENE_MAGIC = b'FRESNEL\x00'
+_SCENE_VERSION = 1
+_SCENE_PREAMBLE = struct.Struct('<8sIIQ')
+_SCENE_ALIGNMENT = 64
+
+
+def _align(offset):
+    """Round offset up to the next multiple of _SCENE_ALIGNMENT."""
+    return -(-offset // _SCENE_ALIGNMENT) * _SCENE_ALIGNMENT
+
+
 class Scene(object):
     """Content of the scene to ray trace.
 
@@ -192,6 +235,20 @@ class Scene(object):
         self.lights = lights
         self._tracer = None
 
+    @contextlib.contextmanager
+    def batch_update(self):
+        """Defer acceleration structure updates of all geometry in the scene.
+
+        Enter `Geometry.batch_update <fresnel.geometry.Geometry.batch_update>`
+        for each geometry in the scene, so that each geometry updates at most
+        once when the block exits. Geometry added to the scene inside the
+        block is not batched.
+        """
+        with contextlib.ExitStack() as stack:
+            for geom in self.geometry:
+                stack.enter_context(geom.batch_update())
+            yield self
+
     def get_extents(self):
         """Get the extents of the scene.
 
@@ -212,6 +269,143 @@ class Scene(object):
 
         return scene_extents
 
+    def save(self, path):
+        """Save the scene to a file.
+
+        Args:
+            path (str): Name of the file to write.
+
+        `save` writes the geometry (including disabled geometry), materials,
+        outline settings, camera, lights, and background to a versioned binary
+        file. Use `load` to read it. The file stores the geometry arrays
+        uncompressed and aligned so that `load` can memory map them.
+        """
+        header = dict(camera=camera._to_dict(self.camera),
+                      lights=[
+                          dict(direction=list(v.direction),
+                               color=list(v.color),
+                               theta=v.theta) for v in self.lights
+                      ],
+                      background_color=[
+                          float(c) for c in self.background_color
+                      ],
+                      background_alpha=self.background_alpha,
+                      geometry=[])
+
+        blobs = []
+        offset = 0
+        for geom in self.geometry:
+            params, arrays = geom._get_state()
+            entry = dict(type=type(geom).__name__,
+                         params=params,
+                         material=material._to_dict(geom.material),
+                         outline_material=material._to_dict(
+                             geom.outline_material),
+                         outline_width=geom.outline_width,
+                         enabled=geom._enabled,
+                         arrays={})
+
+            for name, array in arrays.items():
+                if not isinstance(array, util.Array):
+                    array = numpy.ascontiguousarray(array)
+                dtype = numpy.dtype(array.dtype)
+                entry['arrays'][name] = dict(offset=offset,
+                                             dtype=dtype.str,
+                                             shape=list(array.shape))
+                blobs.append((offset, array))
+                nbytes = int(numpy.prod(array.shape)) * dtype.itemsize
+                offset = _align(offset + nbytes)
+
+            header['geometry'].append(entry)
+
+        header_bytes = json.dumps(header).encode('utf-8')
+        data_start = _align(_SCENE_PREAMBLE.size + len(header_bytes))
+
+        with open(path, 'wb') as f:
+            f.write(
+                _SCENE_PREAMBLE.pack(_SCENE_MAGIC, _SCENE_VERSION, 0,
+                                     len(header_bytes)))
+            f.write(header_bytes)
+            # write the arrays from the geometry buffers without copying them
+            for blob_offset, array in blobs:
+                f.seek(data_start + blob_offset)
+                if isinstance(array, util.Array):
+                    array.buf.map()
+                    try:
+                        f.write(memoryview(numpy.array(array.buf, copy=False)))
+                    finally:
+                        array.buf.unmap()
+                else:
+                    f.write(memoryview(array))
+
+    @classmethod
+    def load(cls, path, device=None):
+        """Load a scene from a file.
+
+        Args:
+            path (str): Name of a file written by `save`.
+            device (`Device`): Device to create the scene on. ``None`` creates
+                a default `Device`.
+
+        Returns:
+            Scene: The scene.
+
+        `load` memory maps the file and, on the CPU, the geometry adopts the
+        mapped arrays as its buffers (see `Geometry
+        <fresnel.geometry.Geometry>`), so the arrays are read from the file
+        as the tracer needs them and never copied. Changes to the loaded
+        geometry do not modify the file.
+
+        Raises:
+            ValueError: When *path* is not a scene file or was written by a
+                newer version of fresnel.
+        """
+        with open(path, 'rb') as f:
+            preamble = f.read(_SCENE_PREAMBLE.size)
+            if len(preamble) != _SCENE_PREAMBLE.size:
+                raise ValueError("Not a fresnel scene file: " + str(path))
+            magic, version, _, header_size = _SCENE_PREAMBLE.unpack(preamble)
+            if magic != _SCENE_MAGIC:
+                raise ValueError("Not a fresnel scene file: " + str(path))
+            if version > _SCENE_VERSION:
+                raise ValueError("Unsupported scene file version: "
+                                 + str(version))
+            header = json.loads(f.read(header_size).decode('utf-8'))
+
+        data_start = _align(_SCENE_PREAMBLE.size + header_size)
+        # map copy-on-write so that the loaded geometry remains writable
+        data = numpy.memmap(path, dtype=numpy.uint8, mode='c')
+
+        scene = cls(device,
+                    camera=camera._from_dict(header['camera']),
+                    lights=[light.Light(**v) for v in header['lights']])
+        scene.background_color = header['background_color']
+        scene.background_alpha = header['background_alpha']
+
+        for entry in header['geometry']:
+            geometry_class = getattr(geometry, entry['type'], None)
+            if not (isinstance(geometry_class, type)
+                    and issubclass(geometry_class, geometry.Geometry)):
+                raise ValueError("Unknown geometry type: " + entry['type'])
+
+            arrays = {}
+            for name, a in entry['arrays'].items():
+                dtype = numpy.dtype(a['dtype'])
+                start = data_start + a['offset']
+                size = int(numpy.prod(a['shape'])) * dtype.itemsize
+                arrays[name] = data[start:start + size].view(dtype).reshape(
+                    a['shape'])
+
+            geom = geometry_class._from_state(scene, entry['params'], arrays)
+            geom.material = material.Material(**entry['material'])
+            geom.outline_material = material.Material(
+                **entry['outline_material'])
+            geom.outline_width = entry['outline_width']
+            if not entry['enabled']:
+                geom.disable()
+
+        return scene
+
     @property
     def device(self):
         """Device: Device this `Scene` is attached to."""
@@ -327,3 +521,148 @@ def pathtrace(scene, w=600, h=370, samples=64, light_samples=1):
     t = tracer.Path(scene.device, w=w, h=h)
     t.sample(scene, samples=samples, light_samples=light_samples)
     return t.output
+
+
+def denoise(image,
+            albedo=None,
+            normal=None,
+            depth=None,
+            iterations=5,
+            sigma_color=0.5,
+            sigma_normal=0.3,
+            sigma_depth=0.05,
+            device=None):
+    """Denoise a path traced image.
+
+    Args:
+        image ((H, W, 4) `numpy.ndarray` of ``float32``): Image to denoise in
+            linear color space, such as `tracer.Path.linear_output
+            <fresnel.tracer.Tracer.linear_output>`.
+        albedo ((H, W, 3) `numpy.ndarray` of ``float32``): Surface color at
+            each pixel, such as `tracer.Tracer.albedo
+            <fresnel.tracer.Tracer.albedo>`.
+        normal ((H, W, 3) `numpy.ndarray` of ``float32``): Surface normal at
+            each pixel, such as `tracer.Tracer.normal
+            <fresnel.tracer.Tracer.normal>`.
+        depth ((H, W) `numpy.ndarray` of ``float32``): Distance from the
+            camera to the surface at each pixel, ``inf`` where the camera ray
+            misses, such as `tracer.Tracer.depth
+            <fresnel.tracer.Tracer.depth>`.
+        iterations (int): Number of filter iterations.
+        sigma_color (float): Scale of the color differences that the filter
+            smooths over (in linear color units).
+        sigma_normal (float): Scale of the normal differences that the filter
+            smooths over.
+        sigma_depth (float): Scale of the depth differences that the filter
+            smooths over, relative to the depth.
+        device (`Device`): Device whose threads run the filter, such as
+            ``scene.device``. ``None`` uses all CPU cores.
+
+    Returns:
+        (H, W, 4) `numpy.ndarray` of ``float32``: The denoised image in linear
+        color space. Use `util.linear_to_srgb
+        <fresnel.util.linear_to_srgb>` to convert it for display.
+
+    `denoise` applies an edge-avoiding à-trous wavelet filter to the image.
+    Each iteration blends every pixel with its neighbors 1, 2, 4, ... pixels
+    away, weighting each neighbor by how similar its color, normal, and depth
+    are to the pixel. The optional *albedo*, *normal*, and *depth* guide images
+    keep the filter from blurring across object edges and surface detail.
+    With all three guides, the filter targets clean images from 8-16 samples
+    per pixel. The filter runs in parallel native code on the CPU and does
+    not modify *image*. With a CPU *device*, the filter runs on the device's
+    threads (see the *n* argument of `Device`). With a GPU *device*, it uses
+    all CPU cores.
+
+    .. code-block:: python
+
+        tracer = fresnel.tracer.Path(device, w=600, h=370)
+        tracer.aovs = True
+        tracer.sample(scene, samples=16)
+        image = fresnel.denoise(tracer.linear_output[:],
+                                albedo=tracer.albedo[:],
+                                normal=tracer.normal[:],
+                                depth=tracer.depth[:],
+                                device=device)
+
+    Note:
+        `denoise` requires the CPU implementation.
+    """
+    if not _common.cpu_built():
+        raise RuntimeError("denoise requires the CPU implementation")
+
+    cpu_device = None
+    if device is not None and device.mode == 'cpu':
+        cpu_device = device._device
+
+    return _cpu.denoise(numpy.asarray(image[:], dtype=numpy.float32),
+                        albedo, normal, depth, iterations, sigma_color,
+                        sigma_normal, sigma_depth, cpu_device)
+
+
+def tune(scene,
+         w=600,
+         h=370,
+         samples=16,
+         tile_sizes=(4, 8, 16, 32),
+         grain_sizes=(1, 4, 16),
+         tile_orders=('row_major', 'morton', 'hilbert'),
+         packet_sizes=(1, 4, 8, 16),
+         wavefronts=(False, True),
+         save=True):
+    """Find the fastest tracer settings for a scene on this machine.
+
+    Args:
+        scene (`Scene`): Scene to render.
+        w (int): Output image width (in pixels).
+        h (int): Output image height (in pixels).
+        samples (int): Number of samples per pixel in each calibration render.
+        tile_sizes (list[int]): Values of `tracer.Tracer.tile_size` to try.
+        grain_sizes (list[int]): Values of `tracer.Tracer.grain_size` to try.
+        tile_orders (list[str]): Values of `tracer.Tracer.tile_order` to try.
+        packet_sizes (list[int]): Values of `tracer.Tracer.packet_size` to
+            try.
+        wavefronts (list[bool]): Values of `tracer.Path.wavefront` to try.
+        save (bool): When True, save the settings to the profile.
+
+    :py:func:`tune` renders *scene* with `tracer.Path` several times and
+    measures the time of each render. It tunes one setting at a time, keeping
+    the fastest value of each before moving on to the next. These settings
+    change only the speed of the render, not the image. The GPU ignores them,
+    so on the GPU :py:func:`tune` returns an empty dict and saves nothing.
+
+    New `Preview` and `Path` tracers on this machine load the settings from
+    the profile automatically. See `fresnel.tuning` for details on the
+    profile.
+
+    Returns:
+        dict: The fastest settings.
+    """
+    settings = {}
+    if scene.device.mode != 'cpu':
+        return settings
+
+    path_tracer = tracer.Path(scene.device, w=w, h=h)
+
+    # build the acceleration structures before timing
+    path_tracer.sample(scene, samples=1)
+
+    for name, values in (('tile_size', tile_sizes),
+                         ('grain_size', grain_sizes),
+                         ('tile_order', tile_orders),
+                         ('packet_size', packet_sizes),
+                         ('wavefront', wavefronts)):
+        times = {}
+        for value in values:
+            setattr(path_tracer, name, value)
+            start = time.perf_counter()
+            path_tracer.sample(scene, samples=samples)
+            times[value] = time.perf_counter() - start
+
+        settings[name] = min(times, key=times.get)
+        setattr(path_tracer, name, settings[name])
+
+    if save:
+        tuning.save(scene.device, scene, settings)
+
+    return settings
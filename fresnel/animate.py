@@ -0,0 +1,307 @@
+# Copyright (c) 2016-2020 The Regents of the University of Michigan
+# This file is part of the Fresnel project, released under the BSD 3-Clause
+# License.
+
+"""Render animations.
+
+`render` renders one image for each frame of a trajectory and passes the
+images to a sink in frame order. Provide a function that builds the scene and a
+function that updates it to a given frame:
+
+.. code-block:: python
+
+    def make_scene(device):
+        scene = fresnel.Scene(device)
+        fresnel.geometry.Sphere(scene, N=N, radius=0.5)
+        scene.camera = fresnel.camera.Orthographic(position=(0, 0, 20),
+                                                   look_at=(0, 0, 0),
+                                                   up=(0, 1, 0),
+                                                   height=12)
+        return scene
+
+    def update(scene, frame):
+        scene.geometry[0].position[:] = frame
+
+    fresnel.animate.render(trajectory, make_scene, update,
+                           fresnel.animate.ImageFiles('frame{:05d}.png'))
+
+`render` overlaps the stages of the pipeline. A background thread iterates over
+*frames*, so reading and decoding the next frames (for example, from a
+trajectory file) proceeds while the current frame renders. The scene is built
+once and updated in place for every frame, which reuses the geometry buffers.
+The sink also runs in a background thread, so encoding and writing an image
+overlaps with rendering the next.
+
+With *processes*, `render` renders frames in a pool of worker processes. Each
+worker creates its own `Device <fresnel.Device>`, scene, and tracer, and the
+main process passes the images to the sink in frame order as they complete.
+Use worker processes when the per-frame Python overhead limits the frame rate,
+or to render on several GPUs at once.
+"""
+
+import collections
+import concurrent.futures
+import multiprocessing
+import os
+import queue
+import threading
+
+import numpy
+
+from . import tracer
+from . import util
+
+
+class ImageFiles(object):
+    """Save images to numbered PNG files.
+
+    Args:
+        pattern (str): File name pattern. ``pattern.format(index)`` gives the
+            file name of each image.
+        start (int): Index of the first image.
+
+    Pass `ImageFiles` as the sink of `render`. It saves the images in the
+    order it receives them, numbering them consecutively from *start*.
+    """
+
+    def __init__(self, pattern='frame{:05d}.png', start=0):
+        if util.PIL_Image is None:
+            raise RuntimeError("No PIL.Image module to save png files")
+
+        self.pattern = pattern
+        self.index = start
+
+    def __call__(self, image):
+        """Save the next image.
+
+        Args:
+            image (``(H, W, 4)`` `numpy.ndarray` of ``numpy.uint8``): sRGB
+                image to save.
+        """
+        util.PIL_Image.fromarray(image, mode='RGBA').save(
+            self.pattern.format(self.index), 'png')
+        self.index += 1
+
+
+class _Prefetcher(object):
+    """Iterate over frames in a background thread.
+
+    Args:
+        frames (iterable): Frames to iterate over.
+        size (int): Maximum number of frames to read ahead.
+    """
+
+    _end = object()
+
+    def __init__(self, frames, size):
+        self._queue = queue.Queue(maxsize=max(size, 1))
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run,
+                                        args=(iter(frames),),
+                                        daemon=True)
+        self._thread.start()
+
+    def _run(self, frames):
+        try:
+            for frame in frames:
+                if not self._put((frame, None)):
+                    return
+            self._put((self._end, None))
+        except BaseException as error:
+            self._put((self._end, error))
+
+    def _put(self, item):
+        """Put an item in the queue, returning False when stopped."""
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def __iter__(self):
+        while True:
+            frame, error = self._queue.get()
+            if error is not None:
+                raise error
+            if frame is self._end:
+                return
+            yield frame
+
+    def close(self):
+        """Stop reading frames."""
+        self._stop.set()
+        self._thread.join()
+
+
+class _FrameRenderer(object):
+    """Render frames of an animation with one scene and tracer."""
+
+    def __init__(self, device, make_scene, update, w, h, method, samples,
+                 light_samples):
+        self.scene = make_scene(device)
+        self.update = update
+        self.method = method
+        self.samples = samples
+        self.light_samples = light_samples
+
+        if method == 'preview':
+            self.tracer = tracer.Preview(device, w=w, h=h)
+        else:
+            self.tracer = tracer.Path(device, w=w, h=h)
+
+    def __call__(self, frame):
+        """Render one frame and return a copy of the image."""
+        self.update(self.scene, frame)
+        if self.method == 'preview':
+            self.tracer.render(self.scene)
+        else:
+            self.tracer.sample(self.scene,
+                               samples=self.samples,
+                               light_samples=self.light_samples)
+        return numpy.array(self.tracer.output[:])
+
+
+# the renderer in a worker process
+_worker_renderer = None
+
+
+def _worker_threads(mode, processes):
+    """Share the CPU cores among worker processes.
+
+    Args:
+        mode (str): Mode of the workers' devices.
+        processes (int): Number of worker processes.
+
+    Returns:
+        int: The number of threads for each worker's device, or ``None`` when
+        the workers render on the GPU.
+    """
+    from . import Device
+    if mode == 'auto' and 'gpu' not in Device.available_modes:
+        mode = 'cpu'
+
+    if mode != 'cpu':
+        return None
+
+    return max(1, (os.cpu_count() or 1) // processes)
+
+
+def _init_worker(mode, n, renderer_args):
+    """Create the device, scene, and tracer in a worker process."""
+    global _worker_renderer
+    from . import Device
+    _worker_renderer = _FrameRenderer(Device(mode=mode, n=n), *renderer_args)
+
+
+def _render_frame(frame):
+    """Render one frame in a worker process."""
+    return _worker_renderer(frame)
+
+
+def render(frames,
+           make_scene,
+           update,
+           sink,
+           w=600,
+           h=370,
+           method='preview',
+           samples=64,
+           light_samples=1,
+           prefetch=4,
+           device=None,
+           processes=None,
+           mode='auto'):
+    """Render an animation.
+
+    Args:
+        frames (iterable): The frames to render. Each element is passed to
+            *update*.
+        make_scene (callable): Function that builds the scene as
+            ``make_scene(device)`` and returns the `Scene <fresnel.Scene>`.
+        update (callable): Function that updates the scene to a frame as
+            ``update(scene, frame)``.
+        sink (callable): Function to call with each rendered image as
+            ``sink(image)``, in frame order. *image* is a ``(h, w, 4)``
+            `numpy.ndarray` of ``numpy.uint8`` in sRGB space.
+        w (int): Output image width (in pixels).
+        h (int): Output image height (in pixels).
+        method (str): ``'preview'`` to render with `tracer.Preview
+            <fresnel.tracer.Preview>` or ``'path'`` to render with `tracer.Path
+            <fresnel.tracer.Path>`.
+        samples (int): Number of samples per pixel with ``method='path'``.
+        light_samples (int): Number of light samples with ``method='path'``.
+        prefetch (int): Maximum number of frames to read ahead and images
+            to hold for the sink.
+        device (`Device <fresnel.Device>`): Device to render on. ``None``
+            creates a new device with *mode*. Not allowed with *processes*.
+        processes (int): Number of worker processes. ``None`` renders in this
+            process.
+        mode (str): Mode of the devices that `render` creates (see `Device
+            <fresnel.Device>`).
+
+    Returns:
+        int: The number of frames rendered.
+
+    With *processes*, *make_scene*, *update*, and every frame must be
+    picklable (for example, module level functions and `numpy.ndarray`
+    frames). The workers start with the ``spawn`` method. On the CPU, each
+    worker uses an equal share of the CPU cores.
+    """
+    if method not in ('preview', 'path'):
+        raise ValueError("Invalid method: " + str(method))
+    if processes is not None and device is not None:
+        raise ValueError("device cannot be used with processes")
+
+    renderer_args = (make_scene, update, w, h, method, samples, light_samples)
+    n_frames = 0
+    prefetcher = _Prefetcher(frames, prefetch)
+
+    try:
+        if processes is None:
+            if device is None:
+                from . import Device
+                device = Device(mode=mode)
+            renderer = _FrameRenderer(device, *renderer_args)
+
+            # write the images in order in a background thread
+            with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
+                pending = collections.deque()
+                for frame in prefetcher:
+                    pending.append(pool.submit(sink, renderer(frame)))
+                    n_frames += 1
+                    while len(pending) > prefetch:
+                        pending.popleft().result()
+
+                while pending:
+                    pending.popleft().result()
+        else:
+            processes = int(processes)
+            if processes < 1:
+                raise ValueError("processes must be at least 1")
+
+            n = _worker_threads(mode, processes)
+
+            context = multiprocessing.get_context('spawn')
+            with concurrent.futures.ProcessPoolExecutor(
+                    max_workers=processes,
+                    mp_context=context,
+                    initializer=_init_worker,
+                    initargs=(mode, n, renderer_args)) as pool:
+                # keep every worker busy while bounding the images in memory
+                max_pending = processes + prefetch
+                pending = collections.deque()
+                for frame in prefetcher:
+                    pending.append(pool.submit(_render_frame, frame))
+                    while len(pending) >= max_pending:
+                        sink(pending.popleft().result())
+                        n_frames += 1
+
+                while pending:
+                    sink(pending.popleft().result())
+                    n_frames += 1
+    finally:
+        prefetcher.close()
+
+    return n_frames
@@ -570,3 +570,30 @@ def _from_cpp(cam):
         raise RuntimeError("Invalid camera model")
 
     return result
+
+
+def _to_dict(cam):
+    """Get the parameters of a camera as a JSON serializable dict."""
+    c = cam._camera
+    return dict(model=c.model.name,
+                position=[c.position.x, c.position.y, c.position.z],
+                look_at=[c.look_at.x, c.look_at.y, c.look_at.z],
+                up=[c.up.x, c.up.y, c.up.z],
+                h=c.h,
+                f=c.f,
+                f_stop=c.f_stop,
+                focus_distance=c.focus_distance)
+
+
+def _from_dict(d):
+    """Make a Python camera object from parameters given by `_to_dict`."""
+    cam = _common.UserCamera()
+    cam.model = _common.CameraModel.__members__[d['model']]
+    cam.position = _common.vec3f(*d['position'])
+    cam.look_at = _common.vec3f(*d['look_at'])
+    cam.up = _common.vec3f(*d['up'])
+    cam.h = d['h']
+    cam.f = d['f']
+    cam.f_stop = d['f_stop']
+    cam.focus_distance = d['focus_distance']
+    return _from_cpp(cam)
@@ -1,6 +1,7 @@
 // Copyright (c) 2016-2020 The Regents of the University of Michigan
 // This file is part of the Fresnel project, released under the BSD 3-Clause License.
 
+#include "Sampler.h"
 #include "VectorMath.h"
 
 #include "Random123/philox.h"
@@ -125,6 +126,11 @@ struct CameraBasis
 
     Some camera models (such as perspective) utilize random sampling. The generate() method takes a
     pixel location, a user random number seed value, and a sample index.
+
+    By default, the image is the tracer's output buffer. setFrame() places the output buffer at an
+    offset in a larger frame, so that a small buffer renders a tile of a large image. Pixel
+    locations passed to generateRay() are relative to the output buffer, and getFrameX() and
+    getFrameY() convert them to locations in the frame.
 */
 class Camera
     {
@@ -137,15 +143,18 @@ class Camera
         @param width Width of the image in pixels.
         @param height Height of the image in pixels.
         @param seed Random number seed.
+        @param sample_aa Set to true to jitter samples within the pixel.
+        @param sampler Sequence to draw anti-aliasing and aperture samples from.
     */
     explicit Camera(const UserCamera& user,
                     unsigned int width,
                     unsigned int height,
                     unsigned int seed,
-                    bool sample_aa = true)
+                    bool sample_aa = true,
+                    Sampler sampler = Sampler::random)
         : m_p(user.position), m_basis(user), m_focal_d(user.focus_distance),
           m_a(user.f / user.f_stop), m_model(user.model), m_width(width), m_height(height),
-          m_seed(seed), m_sample_aa(sample_aa)
+          m_seed(seed), m_sample_aa(sample_aa), m_sampler(sampler)
         {
         // precompute focal plane height
         if (m_model == CameraModel::orthographic)
@@ -158,6 +167,45 @@ class Camera
             }
         }
 
+    /** Place the output buffer in a larger frame.
+
+        @param width Width of the frame in pixels.
+        @param height Height of the frame in pixels.
+        @param x Location of the first pixel of the output buffer in the frame (x direction).
+        @param y Location of the first pixel of the output buffer in the frame (y direction).
+    */
+    void setFrame(unsigned int width, unsigned int height, unsigned int x, unsigned int y)
+        {
+        m_width = width;
+        m_height = height;
+        m_frame_x = x;
+        m_frame_y = y;
+        }
+
+    /// Get the location in the frame of output buffer pixel i (x direction)
+    DEVICE unsigned int getFrameX(unsigned int i) const
+        {
+        return i + m_frame_x;
+        }
+
+    /// Get the location in the frame of output buffer pixel j (y direction)
+    DEVICE unsigned int getFrameY(unsigned int j) const
+        {
+        return j + m_frame_y;
+        }
+
+    /// Get the width of the frame (in pixels)
+    DEVICE unsigned int getFrameWidth() const
+        {
+        return m_width;
+        }
+
+    /// Get the height of the frame (in pixels)
+    DEVICE unsigned int getFrameHeight() const
+        {
+        return m_height;
+        }
+
     /** Generate a ray into the scene.
 
         @param origin [out] Origin of the generated ray.
@@ -172,6 +220,8 @@ class Camera
                             unsigned int j,
                             unsigned int sample) const
         {
+        i = getFrameX(i);
+        j = getFrameY(j);
         vec2<float> s = importanceSampleAA(i, j, sample);
 
         if (m_model == CameraModel::orthographic)
@@ -194,11 +244,20 @@ class Camera
             r123::Philox4x32::ukey_type rng_key = {{pixel, m_seed}};
 
             // generate a random point in a circle
-            r123::Philox4x32 rng;
-            r123::Philox4x32::ctr_type rng_counter = {{0, 0, sample, rng_val_aperture}};
-            r123::Philox4x32::ctr_type rng_u = rng(rng_counter, rng_key);
-            float theta = r123::u01<float>(rng_u[0]) * 2.0f * float(M_PI);
-            float r = r123::u01<float>(rng_u[1]) * m_a * 0.5f;
+            vec2<float> u;
+            if (m_sampler == Sampler::sobol)
+                {
+                u = sobol_sample(rng_key, sobol_dim_aperture, sample);
+                }
+            else
+                {
+                r123::Philox4x32 rng;
+                r123::Philox4x32::ctr_type rng_counter = {{0, 0, sample, rng_val_aperture}};
+                r123::Philox4x32::ctr_type rng_u = rng(rng_counter, rng_key);
+                u = vec2<float>(r123::u01<float>(rng_u[0]), r123::u01<float>(rng_u[1]));
+                }
+            float theta = u.x * 2.0f * float(M_PI);
+            float r = u.y * m_a * 0.5f;
 
             vec3<float> offset = r * cosf(theta) * m_basis.u + r * sinf(theta) * m_basis.v;
             origin = m_p + offset;
@@ -235,11 +294,21 @@ class Camera
             r123::Philox4x32::ukey_type rng_uk = {{pixel, m_seed}};
 
             // generate 2 random numbers from 0 to 2
-            r123::Philox4x32 rng;
-            r123::Philox4x32::ctr_type rng_counter = {{0, 0, sample, rng_val_aa}};
-            r123::Philox4x32::ctr_type rng_u = rng(rng_counter, rng_uk);
-            float r1 = r123::u01<float>(rng_u[0]) * 2.0f;
-            float r2 = r123::u01<float>(rng_u[1]) * 2.0f;
+            float r1, r2;
+            if (m_sampler == Sampler::sobol)
+                {
+                vec2<float> u = sobol_sample(rng_uk, sobol_dim_aa, sample);
+                r1 = u.x * 2.0f;
+                r2 = u.y * 2.0f;
+                }
+            else
+                {
+                r123::Philox4x32 rng;
+                r123::Philox4x32::ctr_type rng_counter = {{0, 0, sample, rng_val_aa}};
+                r123::Philox4x32::ctr_type rng_u = rng(rng_counter, rng_uk);
+                r1 = r123::u01<float>(rng_u[0]) * 2.0f;
+                r2 = r123::u01<float>(rng_u[1]) * 2.0f;
+                }
 
             // use important sampling to sample the tent filter
             float dx, dy;
@@ -286,18 +355,27 @@ class Camera
     /// Camera model
     CameraModel m_model;
 
-    /// Width of the output image (in pixels)
+    /// Width of the frame (in pixels)
     unsigned int m_width;
 
-    /// Height of the output image (in pixels)
+    /// Height of the frame (in pixels)
     unsigned int m_height;
 
+    /// Location of the output buffer in the frame (x direction)
+    unsigned int m_frame_x = 0;
+
+    /// Location of the output buffer in the frame (y direction)
+    unsigned int m_frame_y = 0;
+
     /// Random number seed
     unsigned int m_seed;
 
     /// Flag to enable antialiasing samples
     bool m_sample_aa;
 
+    /// Sequence to draw samples from
+    Sampler m_sampler;
+
     /// Counter for aperture sample placement
     static constexpr unsigned int rng_val_aperture = 0x983abc12;
 
@@ -0,0 +1,36 @@
+// Copyright (c) 2016-2020 The Regents of the University of Michigan
+// This file is part of the Fresnel project, released under the BSD 3-Clause License.
+
+#ifndef __CANCEL_TOKEN_H__
+#define __CANCEL_TOKEN_H__
+
+#include <atomic>
+
+namespace fresnel
+    {
+//! Request that a render in progress stop
+/*! Tracers check the token between tiles and samples and return early once cancel() is called.
+    Any thread may call cancel() while a render is in progress.
+*/
+class CancelToken
+    {
+    public:
+    //! Request that renders using this token stop
+    void cancel()
+        {
+        m_cancelled = true;
+        }
+
+    //! Test if cancel() has been called
+    bool isCancelled() const
+        {
+        return m_cancelled;
+        }
+
+    private:
+    std::atomic<bool> m_cancelled {false}; //!< Set to true when cancelled
+    };
+
+    } // namespace fresnel
+
+#endif
@@ -0,0 +1,24 @@
+// Copyright (c) 2016-2020 The Regents of the University of Michigan
+// This file is part of the Fresnel project, released under the BSD 3-Clause License.
+
+#ifndef __PATH_STATISTICS_H__
+#define __PATH_STATISTICS_H__
+
+namespace fresnel
+    {
+//! Counters that describe the paths a path tracer follows
+/*! Path lengths count the rays in a path from the camera ray to the ray that ends it, not including
+    shadow rays.
+*/
+struct PathStatistics
+    {
+    unsigned long long samples;         //!< Number of camera samples taken
+    unsigned long long paths;           //!< Number of paths followed
+    unsigned long long path_length;     //!< Sum of the lengths of all paths
+    unsigned long long max_path_length; //!< Length of the longest path
+    unsigned long long rays;            //!< Number of rays traced, including shadow rays
+    };
+
+    } // namespace fresnel
+
+#endif
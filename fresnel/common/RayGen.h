@@ -7,6 +7,7 @@
 
 #include "ColorMath.h"
 #include "Material.h"
+#include "Sampler.h"
 #include "VectorMath.h"
 
 #ifndef __RAYGEN_H__
@@ -36,6 +37,9 @@ const unsigned int rng_val_mis = 0x8754abcd;
 //! Counter for ray termination (Russian roulette)
 const unsigned int rng_val_rr = 0x54abf853;
 
+//! Counter for light samples (next event estimation)
+const unsigned int rng_val_light = 0x3c1d97e5;
+
 //! Ray generation methods
 /*! Common code to generate rays on the host and device.
  */
@@ -50,8 +54,9 @@ class RayGen
                            unsigned int j,
                            unsigned int width,
                            unsigned int height,
-                           unsigned int seed)
-        : m_width(width), m_height(height), m_i(i), m_j(j)
+                           unsigned int seed,
+                           Sampler sampler = Sampler::random)
+        : m_width(width), m_height(height), m_i(i), m_j(j), m_sampler(sampler)
         {
         unsigned int pixel = j * width + i;
 
@@ -106,6 +111,9 @@ class RayGen
         \param depth Depth of the ray in the trace
         \param sample Sample index
         \param m Material
+
+        With the Sobol sampler, the direction and the choices between transmission and reflection
+        and between the diffuse and specular lobes come from two stratified 2D samples.
     */
     DEVICE vec3<float> MISReflectionTransmission(float& factor,
                                                  bool& transmit,
@@ -115,14 +123,27 @@ class RayGen
                                                  unsigned int sample,
                                                  const Material& m) const
         {
-        r123::Philox4x32 rng;
-        r123::Philox4x32::ctr_type rng_counter = {{0, depth, sample, rng_val_mis}};
-        r123::Philox4x32::ctr_type rng_u = rng(rng_counter, m_rng_key);
+        vec2<float> xi;
+        float choice_mis, choice_trans;
+        if (m_sampler == Sampler::sobol)
+            {
+            xi = sobol_sample(m_rng_key, sobol_dim_bounce + 2 * depth, sample);
+            vec2<float> choice = sobol_sample(m_rng_key, sobol_dim_bounce + 2 * depth + 1, sample);
+            choice_mis = choice.x;
+            choice_trans = choice.y;
+            }
+        else
+            {
+            r123::Philox4x32 rng;
+            r123::Philox4x32::ctr_type rng_counter = {{0, depth, sample, rng_val_mis}};
+            r123::Philox4x32::ctr_type rng_u = rng(rng_counter, m_rng_key);
+
+            xi = vec2<float>(r123::u01<float>(rng_u[0]), r123::u01<float>(rng_u[1]));
+            choice_mis = r123::u01<float>(rng_u[2]);
+            choice_trans = r123::u01<float>(rng_u[3]);
+            }
 
         // multiple importance sampling
-        vec2<float> xi(r123::u01<float>(rng_u[0]), r123::u01<float>(rng_u[1]));
-        float choice_mis = r123::u01<float>(rng_u[2]);
-        float choice_trans = r123::u01<float>(rng_u[3]);
 
         vec3<float> l;
         transmit = (choice_trans <= m.spec_trans);
@@ -156,6 +177,24 @@ class RayGen
         return l;
         }
 
+    //! Sample a point on a light
+    /*! \returns A uniform sample in [0, 1)^2
+        \param light_id Index of the light
+        \param depth Depth of the ray in the trace
+        \param sample Sample index
+    */
+    DEVICE vec2<float>
+    sampleLight(unsigned int light_id, unsigned int depth, unsigned int sample) const
+        {
+        if (m_sampler == Sampler::sobol)
+            return sobol_sample(m_rng_key, sobol_dim_light + 4 * depth + light_id, sample);
+
+        r123::Philox4x32 rng;
+        r123::Philox4x32::ctr_type rng_counter = {{light_id, depth, sample, rng_val_light}};
+        r123::Philox4x32::ctr_type rng_u = rng(rng_counter, m_rng_key);
+        return vec2<float>(r123::u01<float>(rng_u[0]), r123::u01<float>(rng_u[1]));
+        }
+
     //! Test for Russian roulette ray termination
     /*! \returns True when the path should terminate
         \param attenuation [input/output] Current attenuation
@@ -191,6 +230,7 @@ class RayGen
     r123::Philox4x32::key_type m_rng_key; //!< Key for the random number generator
     unsigned int m_i;                     //!< i coordinate of the pixel
     unsigned int m_j;                     //!< j coordinate of the pixel
+    Sampler m_sampler;                    //!< Sequence to draw samples from
     };
 
     } // namespace fresnel
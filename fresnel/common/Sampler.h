@@ -0,0 +1,160 @@
+// Copyright (c) 2016-2020 The Regents of the University of Michigan
+// This file is part of the Fresnel project, released under the BSD 3-Clause License.
+
+#include "Random123/philox.h"
+
+#include "VectorMath.h"
+
+#ifndef __SAMPLER_H__
+#define __SAMPLER_H__
+
+// need to declare these class methods with __device__ qualifiers when building in nvcc
+// DEVICE is __host__ __device__ when included in nvcc and blank when included into the host
+// compiler
+#undef DEVICE
+#ifdef __CUDACC__
+#define DEVICE __host__ __device__
+#else
+#define DEVICE
+#endif
+
+namespace fresnel
+    {
+//! Sequence that the path tracer draws sample locations from
+enum class Sampler
+    {
+    random, //!< Independent Philox random numbers
+    sobol   //!< Owen scrambled Sobol points
+    };
+
+//! Counter for the per pixel Sobol scrambling seeds
+const unsigned int rng_val_sobol = 0x5eb0c7a1;
+
+//! Sobol dimension pair for anti-aliasing samples
+const unsigned int sobol_dim_aa = 0;
+
+//! Sobol dimension pair for aperture samples
+const unsigned int sobol_dim_aperture = 1;
+
+//! First Sobol dimension pair for bounces along a path
+/*! Bounce *depth* uses pairs sobol_dim_bounce + 2 * depth and sobol_dim_bounce + 2 * depth + 1.
+ */
+const unsigned int sobol_dim_bounce = 2;
+
+//! First Sobol dimension pair for light samples
+/*! Light *light_id* at bounce *depth* uses pair sobol_dim_light + 4 * depth + light_id.
+ */
+const unsigned int sobol_dim_light = 0x10000;
+
+namespace detail
+    {
+//! Reverse the bits of a 32-bit integer
+DEVICE inline unsigned int reverse_bits(unsigned int x)
+    {
+#ifdef __CUDA_ARCH__
+    return __brev(x);
+#else
+    x = ((x >> 1) & 0x55555555u) | ((x & 0x55555555u) << 1);
+    x = ((x >> 2) & 0x33333333u) | ((x & 0x33333333u) << 2);
+    x = ((x >> 4) & 0x0f0f0f0fu) | ((x & 0x0f0f0f0fu) << 4);
+    x = ((x >> 8) & 0x00ff00ffu) | ((x & 0x00ff00ffu) << 8);
+    return (x >> 16) | (x << 16);
+#endif
+    }
+
+//! Hash based permutation that flips each bit depending only on the bits below it
+/*! See Burley 2020, Practical Hash-based Owen Scrambling.
+ */
+DEVICE inline unsigned int laine_karras_permutation(unsigned int x, unsigned int seed)
+    {
+    x += seed;
+    x ^= x * 0x6c50b47cu;
+    x ^= x * 0xb82f1e52u;
+    x ^= x * 0xc7afe638u;
+    x ^= x * 0x8d22f6e6u;
+    return x;
+    }
+
+//! Owen scramble a 32-bit fixed point value
+/*! Each bit is flipped depending only on the more significant bits, so the scramble maps aligned
+    intervals to aligned intervals of the same size.
+*/
+DEVICE inline unsigned int nested_uniform_scramble(unsigned int x, unsigned int seed)
+    {
+    return reverse_bits(laine_karras_permutation(reverse_bits(x), seed));
+    }
+
+//! First dimension of the Sobol sequence (van der Corput)
+DEVICE inline unsigned int sobol_0(unsigned int index)
+    {
+    return reverse_bits(index);
+    }
+
+//! Second dimension of the Sobol sequence
+DEVICE inline unsigned int sobol_1(unsigned int index)
+    {
+    unsigned int x = 0;
+    for (unsigned int v = 0x80000000u; index != 0; index >>= 1, v ^= v >> 1)
+        {
+        if (index & 1)
+            x ^= v;
+        }
+    return x;
+    }
+
+//! Convert a 32-bit fixed point value to a float in [0, 1)
+DEVICE inline float fixed_to_float(unsigned int x)
+    {
+    return float(x >> 8) * (1.0f / 16777216.0f);
+    }
+    } // namespace detail
+
+//! Generate a 2D sample from a shuffled, Owen scrambled Sobol sequence
+/*! \param key Philox key unique to the pixel and random number seed
+    \param dimension Index of the dimension pair
+    \param index Sample index
+
+    \returns A point in [0, 1)^2
+
+    The first two dimensions of the Sobol sequence form a (0,2)-sequence: every aligned block of
+    2^k consecutive points stratifies the unit square into 2^k elementary intervals of every shape.
+    Each pixel and dimension pair scrambles the points and shuffles their order with independent
+    seeds (Burley 2020), which decorrelates the dimension pairs and neighboring pixels while
+    keeping the stratification of the first 2^k samples. The output is a deterministic function of
+    the inputs.
+*/
+DEVICE inline vec2<float>
+sobol_sample(const r123::Philox4x32::key_type& key, unsigned int dimension, unsigned int index)
+    {
+    r123::Philox4x32 rng;
+    r123::Philox4x32::ctr_type rng_counter = {{dimension, 0, 0, rng_val_sobol}};
+    r123::Philox4x32::ctr_type seeds = rng(rng_counter, key);
+
+    index = detail::nested_uniform_scramble(index, seeds[0]);
+    unsigned int x = detail::nested_uniform_scramble(detail::sobol_0(index), seeds[1]);
+    unsigned int y = detail::nested_uniform_scramble(detail::sobol_1(index), seeds[2]);
+    return vec2<float>(detail::fixed_to_float(x), detail::fixed_to_float(y));
+    }
+
+//! Get the index of a camera sample in the sampler's sequence
+/*! \param sampler Sequence that the camera draws samples from
+    \param n_samples Number of samples taken in the pixel, including this one (the first is 1)
+
+    \returns The sample index to pass to Camera::generateRay()
+
+    Sobol points are stratified in aligned blocks of 2^k indices that start at 0, so the first 2^k
+    samples of a pixel use indices 0 to 2^k - 1, the same indices that the bounces use. Random
+    samples keep the 1-based count so that their images do not change.
+*/
+DEVICE inline unsigned int camera_sample_index(Sampler sampler, unsigned int n_samples)
+    {
+    if (sampler == Sampler::sobol)
+        return n_samples - 1;
+    return n_samples;
+    }
+
+    } // namespace fresnel
+
+#undef DEVICE
+
+#endif
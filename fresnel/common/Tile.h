@@ -0,0 +1,140 @@
+// Copyright (c) 2016-2020 The Regents of the University of Michigan
+// This file is part of the Fresnel project, released under the BSD 3-Clause License.
+
+#ifndef __TILE_H__
+#define __TILE_H__
+
+#include <algorithm>
+#include <stdint.h>
+#include <vector>
+
+namespace fresnel
+    {
+//! Order in which CPU threads take tiles of the image
+enum class TileOrder
+    {
+    row_major,
+    morton,
+    hilbert
+    };
+
+//! Rectangular region of the output image
+/*! Pixels x0 <= i < x1, y0 <= j < y1 belong to the tile.
+ */
+struct Tile
+    {
+    unsigned int x0; //!< First pixel in the x direction
+    unsigned int x1; //!< One past the last pixel in the x direction
+    unsigned int y0; //!< First pixel in the y direction
+    unsigned int y1; //!< One past the last pixel in the y direction
+    };
+
+//! Compute the position of a point along the Morton (Z-order) curve
+/*! \param x x coordinate
+    \param y y coordinate
+
+    \returns The bits of x and y interleaved.
+*/
+inline uint64_t morton_index(uint32_t x, uint32_t y)
+    {
+    uint64_t d = 0;
+    for (unsigned int b = 0; b < 32; b++)
+        {
+        d |= uint64_t((x >> b) & 1) << (2 * b);
+        d |= uint64_t((y >> b) & 1) << (2 * b + 1);
+        }
+    return d;
+    }
+
+//! Compute the position of a point along the Hilbert curve
+/*! \param n Size of the grid the curve fills (a power of 2)
+    \param x x coordinate
+    \param y y coordinate
+
+    \returns The distance along the Hilbert curve that fills the n by n grid.
+
+    Adapted from https://en.wikipedia.org/wiki/Hilbert_curve
+*/
+inline uint64_t hilbert_index(uint32_t n, uint32_t x, uint32_t y)
+    {
+    uint64_t d = 0;
+    for (uint32_t s = n / 2; s > 0; s /= 2)
+        {
+        uint32_t rx = (x & s) > 0;
+        uint32_t ry = (y & s) > 0;
+        d += uint64_t(s) * uint64_t(s) * ((3 * rx) ^ ry);
+
+        // rotate the quadrant
+        if (ry == 0)
+            {
+            if (rx == 1)
+                {
+                x = n - 1 - x;
+                y = n - 1 - y;
+                }
+            std::swap(x, y);
+            }
+        }
+    return d;
+    }
+
+//! Split a region of an image into tiles
+/*! \param region Region of the image to cover
+    \param tile_size Width and height of each tile
+    \param order Order of the tiles in the output
+
+    \returns Tiles that cover the region, in the given order.
+
+    Tiles on the right and bottom edges of the region are smaller when the tile size does not divide
+   the region size. Morton and Hilbert order keep neighboring tiles close together in the list. The
+   CPU tracers split the list into contiguous ranges for each thread, so space filling curve orders
+   give each thread a compact region of the image.
+*/
+inline std::vector<Tile> make_tiles(const Tile& region, unsigned int tile_size, TileOrder order)
+    {
+    const unsigned int width = region.x1 - region.x0;
+    const unsigned int height = region.y1 - region.y0;
+    const unsigned int n_tiles_x = (width + tile_size - 1) / tile_size;
+    const unsigned int n_tiles_y = (height + tile_size - 1) / tile_size;
+
+    // the Hilbert curve fills a square grid with a power of 2 size
+    uint32_t n = 1;
+    while (n < n_tiles_x || n < n_tiles_y)
+        n *= 2;
+
+    std::vector<std::pair<uint64_t, Tile>> keyed_tiles;
+    keyed_tiles.reserve(n_tiles_x * n_tiles_y);
+    for (unsigned int tile_y = 0; tile_y < n_tiles_y; tile_y++)
+        for (unsigned int tile_x = 0; tile_x < n_tiles_x; tile_x++)
+            {
+            Tile tile;
+            tile.x0 = region.x0 + tile_x * tile_size;
+            tile.x1 = std::min(tile.x0 + tile_size, region.x1);
+            tile.y0 = region.y0 + tile_y * tile_size;
+            tile.y1 = std::min(tile.y0 + tile_size, region.y1);
+
+            uint64_t key = tile_y * n_tiles_x + tile_x;
+            if (order == TileOrder::morton)
+                key = morton_index(tile_x, tile_y);
+            else if (order == TileOrder::hilbert)
+                key = hilbert_index(n, tile_x, tile_y);
+
+            keyed_tiles.push_back(std::make_pair(key, tile));
+            }
+
+    std::sort(keyed_tiles.begin(),
+              keyed_tiles.end(),
+              [](const std::pair<uint64_t, Tile>& a, const std::pair<uint64_t, Tile>& b) {
+                  return a.first < b.first;
+              });
+
+    std::vector<Tile> tiles;
+    tiles.reserve(keyed_tiles.size());
+    for (const auto& keyed_tile : keyed_tiles)
+        tiles.push_back(keyed_tile.second);
+    return tiles;
+    }
+
+    } // namespace fresnel
+
+#endif
@@ -1,5 +1,6 @@
 #include "ColorMath.h"
 #include "Light.h"
+#include "PathStatistics.h"
 #include "VectorMath.h"
 
 #ifndef __TRACER_PATH_METHODS_H__
@@ -28,8 +29,135 @@ struct PRDpath
     unsigned int light_sample;
     unsigned int depth;
     bool done;
+
+    //! Solid angle pdf of the reflection sample that chose the direction (0 if not sampled)
+    float bsdf_pdf;
+
+    //! Number of shadow rays requested along the path
+    unsigned int n_shadow_rays;
     };
 
+//! Record a completed path in the statistics
+/*! \param stats [input/output] Statistics to update
+    \param prd Per ray data of the completed path
+
+    Counts the rays that the path traced after the camera ray. Callers count camera rays separately
+    as they may share one camera ray among several paths.
+*/
+DEVICE inline void path_tracer_count_path(PathStatistics& stats, const PRDpath& prd)
+    {
+    const unsigned long long length = prd.depth + 1;
+    stats.paths++;
+    stats.path_length += length;
+    if (length > stats.max_path_length)
+        stats.max_path_length = length;
+    stats.rays += prd.depth + prd.n_shadow_rays;
+    }
+
+//! Shadow rays that a path tracer hit requests
+/*! path_tracer_hit fills out one shadow ray per light it samples. The caller traces each ray and
+    adds its contribution to the result when nothing occludes the light.
+*/
+struct PathShadowRays
+    {
+    vec3<float> origin;         //!< Origin of the shadow rays
+    vec3<float> direction[4];   //!< Direction of each shadow ray
+    RGB<float> contribution[4]; //!< Contribution of each shadow ray when the light is visible
+    unsigned int N;             //!< Number of shadow rays
+    };
+
+//! Smallest value of 1 - cos(half angle) that next event estimation samples
+/*! Lights with smaller solid angles are effectively never hit by BRDF samples and would make the
+    light sampling pdf overflow.
+*/
+const float path_tracer_min_light_solid_angle = 1e-6f;
+
+//! Compute the solid angle pdf of sampling a light uniformly
+/*! \param half_angle Half angle of the light
+    \returns The pdf, or 0 when the light is too small to sample
+*/
+DEVICE inline float path_tracer_light_pdf(float half_angle)
+    {
+    float one_minus_cos = 1.0f - cosf(half_angle);
+    if (one_minus_cos < path_tracer_min_light_solid_angle)
+        return 0.0f;
+    return 1.0f / (2.0f * float(M_PI) * one_minus_cos);
+    }
+
+//! Minimum number of samples a pixel must take before it may be considered converged
+/*! Variance estimates from only a few samples are unreliable. Adaptive sampling does not test a
+   pixel for convergence until it has at least this many samples.
+*/
+const unsigned int path_tracer_min_adaptive_samples = 16;
+
+//! Accumulate a sample into the running mean and variance of a pixel
+/*! \param mean [input/output] Running mean of the samples
+    \param m2 [input/output] Running sum of squared differences from the mean (per channel)
+    \param sample The new sample
+    \param n Number of samples including this one (the first sample is 1)
+
+    Update the running mean and variance using Welford's method.
+    (http://jonisalonen.com/2013/deriving-welfords-method-for-computing-variance/)
+*/
+DEVICE void
+path_tracer_accumulate(RGBA<float>& mean, RGB<float>& m2, const RGBA<float>& sample, unsigned int n)
+    {
+    RGBA<float> old_mean = mean;
+    mean = old_mean + (sample - old_mean) / float(n);
+    m2.r += (sample.r - old_mean.r) * (sample.r - mean.r);
+    m2.g += (sample.g - old_mean.g) * (sample.g - mean.g);
+    m2.b += (sample.b - old_mean.b) * (sample.b - mean.b);
+    }
+
+//! Merge the running mean and variance of two sets of samples of a pixel
+/*! \param mean [input/output] Running mean of the samples
+    \param m2 [input/output] Running sum of squared differences from the mean (per channel)
+    \param n [input/output] Number of samples
+    \param other_mean Running mean of the other samples
+    \param other_m2 Running sum of squared differences from the mean of the other samples
+    \param other_n Number of other samples
+
+    Combine the two sets with the parallel variant of Welford's method (Chan, Golub, and LeVeque
+    1979). The result is the mean and variance of all the samples in both sets.
+*/
+DEVICE void path_tracer_merge(RGBA<float>& mean,
+                              RGB<float>& m2,
+                              unsigned int& n,
+                              const RGBA<float>& other_mean,
+                              const RGB<float>& other_m2,
+                              unsigned int other_n)
+    {
+    if (other_n == 0)
+        return;
+
+    const unsigned int total = n + other_n;
+    const RGBA<float> delta = other_mean - mean;
+    const float weight = float(n) * float(other_n) / float(total);
+
+    mean = mean + delta * (float(other_n) / float(total));
+    m2.r += other_m2.r + delta.r * delta.r * weight;
+    m2.g += other_m2.g + delta.g * delta.g * weight;
+    m2.b += other_m2.b + delta.b * delta.b * weight;
+    n = total;
+    }
+
+//! Test if a pixel has converged
+/*! \param m2 Running sum of squared differences from the mean (per channel)
+    \param n Number of samples taken in the pixel
+    \param target_noise Target standard error of the mean (in linear color units)
+
+    \returns True when the standard error of the mean is at most *target_noise* in every color
+    channel.
+*/
+DEVICE bool path_tracer_converged(const RGB<float>& m2, unsigned int n, float target_noise)
+    {
+    if (n < path_tracer_min_adaptive_samples)
+        return false;
+
+    float max_m2 = fmaxf(m2.r, fmaxf(m2.g, m2.b));
+    return max_m2 <= target_noise * target_noise * float(n) * float(n - 1);
+    }
+
 DEVICE void path_tracer_miss(PRDpath& prd,
                              const RGB<float>& _background_color,
                              const float _background_alpha,
@@ -65,7 +193,16 @@ DEVICE void path_tracer_miss(PRDpath& prd,
                 // the division bin sin(light half angle) normalizes the lights so that
                 // a light of color 1 of any non-zero size results in an output of 1
                 // when that light is straight over the surface
-                prd.result += prd.attenuation * _lights.color[light_id] / sinf(half_angle);
+                float weight = 1.0f;
+                if (prd.bsdf_pdf > 0.0f)
+                    {
+                    // the previous hit also sampled this light directly, combine the two
+                    // estimates with the balance heuristic
+                    float pdf_light = path_tracer_light_pdf(_lights.theta[light_id]);
+                    weight = prd.bsdf_pdf / (prd.bsdf_pdf + pdf_light);
+                    }
+                prd.result
+                    += prd.attenuation * _lights.color[light_id] * (weight / sinf(half_angle));
                 }
             } // end loop over lights
         }
@@ -73,6 +210,41 @@ DEVICE void path_tracer_miss(PRDpath& prd,
     prd.done = true;
     }
 
+//! Sample a direction uniformly within the cone of a light
+/*! \param axis Direction of the light (normalized)
+    \param one_minus_cos 1 - cos(half angle) of the light
+    \param xi Uniform random sample in [0, 1)^2
+*/
+DEVICE inline vec3<float>
+path_tracer_sample_cone(const vec3<float>& axis, float one_minus_cos, const vec2<float>& xi)
+    {
+    float cos_t = 1.0f - xi.x * one_minus_cos;
+    float sin_t = sqrtf(fmaxf(0.0f, 1.0f - cos_t * cos_t));
+    float phi = 2.0f * float(M_PI) * xi.y;
+
+    vec3<float> up(0, 0, 1.0f);
+    if (fabs(axis.z) > 0.999)
+        up = vec3<float>(1.0f, 0, 0);
+    vec3<float> t_x = cross(up, axis);
+    t_x = t_x / sqrtf(dot(t_x, t_x));
+    vec3<float> t_y = cross(axis, t_x);
+
+    return t_x * (sin_t * cosf(phi)) + t_y * (sin_t * sinf(phi)) + axis * cos_t;
+    }
+
+//! Process a path tracer ray hit
+/*! Update the attenuation and choose the direction of the next ray in the path.
+
+    When *_light_sampling* is true, path_tracer_hit estimates the direct lighting at each
+    reflective hit with one shadow ray per light (next event estimation). The light sample and the
+    BRDF sample that continues the path are combined with multiple importance sampling (balance
+    heuristic), so the image converges to the same result with less noise from small lights. The
+    caller traces the rays in *shadow* and adds the contribution of each unoccluded one to
+    prd.result.
+
+    Paths end after hitting *_max_depth* surfaces (0 allows any number of hits). Russian roulette
+    terminates paths with a small attenuation from depth *_roulette_depth* on.
+*/
 DEVICE void path_tracer_hit(PRDpath& prd,
                             const Material& _material,
                             const Material& _outline_material,
@@ -85,9 +257,15 @@ DEVICE void path_tracer_hit(PRDpath& prd,
                             const float _t_hit,
                             const RayGen& ray_gen,
                             const unsigned int _n_samples,
-                            const unsigned int _light_samples)
+                            const unsigned int _light_samples,
+                            const Lights& _lights,
+                            const bool _light_sampling,
+                            const unsigned int _max_depth,
+                            const unsigned int _roulette_depth,
+                            PathShadowRays& shadow)
     {
     Material m;
+    shadow.N = 0;
 
     // apply the material color or outline color depending on the distance to the edge
     if (_shading_distance >= _outline_width)
@@ -115,15 +293,50 @@ DEVICE void path_tracer_hit(PRDpath& prd,
         // choose a random direction l to continue the path.
         float factor = 1.0;
         bool transmit = false;
+        const unsigned int sample = (_n_samples - 1) * _light_samples + prd.light_sample;
+
+        // the probability that the reflection lobes (and not transmission) continue the path
+        const float p_reflect = 1.0f - m.spec_trans;
+        vec3<float> hit_point = ray_origin + ray_direction * _t_hit;
 
-        vec3<float> l = ray_gen.MISReflectionTransmission(factor,
-                                                          transmit,
-                                                          v,
-                                                          n,
-                                                          prd.depth,
-                                                          (_n_samples - 1) * _light_samples
-                                                              + prd.light_sample,
-                                                          m);
+        // next event estimation: sample each light directly
+        if (_light_sampling && p_reflect > 0.0f && dot(n, v) > 0.0f)
+            {
+            shadow.origin = hit_point;
+            for (unsigned int light_id = 0; light_id < _lights.N; light_id++)
+                {
+                float pdf_light = path_tracer_light_pdf(_lights.theta[light_id]);
+                if (pdf_light == 0.0f)
+                    continue;
+
+                float one_minus_cos = 1.0f - cosf(_lights.theta[light_id]);
+                vec3<float> l_light
+                    = path_tracer_sample_cone(_lights.direction[light_id],
+                                              one_minus_cos,
+                                              ray_gen.sampleLight(light_id, prd.depth, sample));
+
+                float ndotl = dot(n, l_light);
+                if (ndotl <= 0.0f)
+                    continue;
+
+                float pdf_bsdf
+                    = p_reflect
+                      * (0.5f * m.pdfDiffuse(l_light, v, n) + 0.5f * m.pdfGGX(l_light, v, n));
+                float weight = pdf_light / (pdf_light + pdf_bsdf);
+                float half_angle = fminf(_lights.theta[light_id], float(M_PI) / 2.0f);
+
+                shadow.direction[shadow.N] = l_light;
+                shadow.contribution[shadow.N]
+                    = prd.attenuation * m.brdf(l_light, v, n, _shading_color)
+                      * _lights.color[light_id]
+                      * (ndotl * p_reflect * weight / (sinf(half_angle) * pdf_light));
+                shadow.N++;
+                }
+            }
+
+        vec3<float> l
+            = ray_gen.MISReflectionTransmission(factor, transmit, v, n, prd.depth, sample, m);
+        prd.bsdf_pdf = 0.0f;
         if (transmit)
             {
             // perfect transmission
@@ -142,6 +355,8 @@ DEVICE void path_tracer_hit(PRDpath& prd,
             if (dot(n, v) > 0.0f && ndotl > 0.0f)
                 {
                 prd.attenuation *= m.brdf(l, v, n, _shading_color) * ndotl * factor;
+                if (_light_sampling)
+                    prd.bsdf_pdf = p_reflect / factor;
                 }
             else
                 {
@@ -151,17 +366,23 @@ DEVICE void path_tracer_hit(PRDpath& prd,
             }
 
         // set the origin and direction for the next ray in the path
-        prd.origin = ray_origin + ray_direction * _t_hit;
+        prd.origin = hit_point;
         prd.direction = l;
 
-        // break out of the loop when attenuation is small (Russian roulette termination )
-        if (ray_gen.shouldTerminatePath(prd.attenuation,
-                                        prd.depth,
-                                        (_n_samples - 1) * _light_samples + prd.light_sample))
+        // end the path at the maximum depth, otherwise break out of the loop when attenuation is
+        // small (Russian roulette termination)
+        if (_max_depth != 0 && prd.depth + 1 >= _max_depth)
+            {
+            prd.done = true;
+            }
+        else if (prd.depth >= _roulette_depth
+                 && ray_gen.shouldTerminatePath(prd.attenuation, prd.depth, sample))
             {
             prd.done = true;
             }
         }
+
+    prd.n_shadow_rays += shadow.N;
     }
     } // namespace fresnel
 #undef DEVICE
@@ -5,10 +5,14 @@
 #include <pybind11/pybind11.h>
 
 #include "common/Camera.h"
+#include "common/CancelToken.h"
 #include "common/ColorMath.h"
 #include "common/ConvexPolyhedronBuilder.h"
 #include "common/Light.h"
 #include "common/Material.h"
+#include "common/PathStatistics.h"
+#include "common/Sampler.h"
+#include "common/Tile.h"
 #include "common/VectorMath.h"
 
 #include <sstream>
@@ -34,11 +38,35 @@ bool cpu_built()
 #endif
     }
 
+//! Get the Sobol anti-aliasing points of a pixel's first samples
+/*! \param seed Random number seed
+    \param pixel Index of the pixel in the frame
+    \param n Number of samples
+
+    \returns The (n, 2) points that Camera::generateRay() draws the anti-aliasing offsets of
+    samples 1 to n from, for testing.
+*/
+pybind11::array_t<float> sobol_aa_points(unsigned int seed, unsigned int pixel, unsigned int n)
+    {
+    r123::Philox4x32::ukey_type rng_key = {{pixel, seed}};
+    pybind11::array_t<float> result(std::vector<pybind11::ssize_t> {n, 2});
+    float* points = result.mutable_data();
+    for (unsigned int n_samples = 1; n_samples <= n; n_samples++)
+        {
+        vec2<float> u
+            = sobol_sample(rng_key, sobol_dim_aa, camera_sample_index(Sampler::sobol, n_samples));
+        points[2 * (n_samples - 1)] = u.x;
+        points[2 * (n_samples - 1) + 1] = u.y;
+        }
+    return result;
+    }
+
 PYBIND11_MODULE(_common, m)
     {
     m.def("gpu_built", &gpu_built);
     m.def("cpu_built", &cpu_built);
     m.def("find_polyhedron_faces", &find_polyhedron_faces);
+    m.def("sobol_aa_points", &sobol_aa_points);
 
     pybind11::class_<RGB<float>>(m, "RGBf")
         .def(pybind11::init<float, float, float>())
@@ -93,6 +121,28 @@ PYBIND11_MODULE(_common, m)
         .value("orthographic", CameraModel::orthographic)
         .value("perspective", CameraModel::perspective);
 
+    pybind11::enum_<TileOrder>(m, "TileOrder")
+        .value("row_major", TileOrder::row_major)
+        .value("morton", TileOrder::morton)
+        .value("hilbert", TileOrder::hilbert);
+
+    pybind11::enum_<Sampler>(m, "Sampler")
+        .value("random", Sampler::random)
+        .value("sobol", Sampler::sobol);
+
+    pybind11::class_<CancelToken, std::shared_ptr<CancelToken>>(m, "CancelToken")
+        .def(pybind11::init<>())
+        .def("cancel", &CancelToken::cancel)
+        .def("isCancelled", &CancelToken::isCancelled);
+
+    pybind11::class_<PathStatistics>(m, "PathStatistics")
+        .def(pybind11::init<>())
+        .def_readonly("samples", &PathStatistics::samples)
+        .def_readonly("paths", &PathStatistics::paths)
+        .def_readonly("path_length", &PathStatistics::path_length)
+        .def_readonly("max_path_length", &PathStatistics::max_path_length)
+        .def_readonly("rays", &PathStatistics::rays);
+
     pybind11::class_<CameraBasis>(m, "CameraBasis")
         .def(pybind11::init<const UserCamera&>())
         .def_readwrite("u", &CameraBasis::u)
@@ -15,7 +15,9 @@ void export_Array(pybind11::module& m)
         pybind11::buffer_protocol())
         .def_buffer([](Array<RGBA<float>>& t) -> pybind11::buffer_info { return t.getBuffer(); })
         .def("map", &Array<RGBA<float>>::map_py)
-        .def("unmap", &Array<RGBA<float>>::unmap);
+        .def("unmap", &Array<RGBA<float>>::unmap)
+        .def("adopt", &Array<RGBA<float>>::adopt)
+        .def("isAdopted", &Array<RGBA<float>>::isAdopted);
 
     pybind11::class_<Array<RGBA<unsigned char>>, std::shared_ptr<Array<RGBA<unsigned char>>>>(
         m,
@@ -24,7 +26,9 @@ void export_Array(pybind11::module& m)
         .def_buffer(
             [](Array<RGBA<unsigned char>>& t) -> pybind11::buffer_info { return t.getBuffer(); })
         .def("map", &Array<RGBA<unsigned char>>::map_py)
-        .def("unmap", &Array<RGBA<unsigned char>>::unmap);
+        .def("unmap", &Array<RGBA<unsigned char>>::unmap)
+        .def("adopt", &Array<RGBA<unsigned char>>::adopt)
+        .def("isAdopted", &Array<RGBA<unsigned char>>::isAdopted);
 
     pybind11::class_<Array<RGB<float>>, std::shared_ptr<Array<RGB<float>>>>(
         m,
@@ -32,7 +36,9 @@ void export_Array(pybind11::module& m)
         pybind11::buffer_protocol())
         .def_buffer([](Array<RGB<float>>& t) -> pybind11::buffer_info { return t.getBuffer(); })
         .def("map", &Array<RGB<float>>::map_py)
-        .def("unmap", &Array<RGB<float>>::unmap);
+        .def("unmap", &Array<RGB<float>>::unmap)
+        .def("adopt", &Array<RGB<float>>::adopt)
+        .def("isAdopted", &Array<RGB<float>>::isAdopted);
 
     pybind11::class_<Array<RGB<unsigned char>>, std::shared_ptr<Array<RGB<unsigned char>>>>(
         m,
@@ -41,7 +47,9 @@ void export_Array(pybind11::module& m)
         .def_buffer(
             [](Array<RGB<unsigned char>>& t) -> pybind11::buffer_info { return t.getBuffer(); })
         .def("map", &Array<RGB<unsigned char>>::map_py)
-        .def("unmap", &Array<RGB<unsigned char>>::unmap);
+        .def("unmap", &Array<RGB<unsigned char>>::unmap)
+        .def("adopt", &Array<RGB<unsigned char>>::adopt)
+        .def("isAdopted", &Array<RGB<unsigned char>>::isAdopted);
 
     pybind11::class_<Array<vec3<float>>, std::shared_ptr<Array<vec3<float>>>>(
         m,
@@ -49,7 +57,9 @@ void export_Array(pybind11::module& m)
         pybind11::buffer_protocol())
         .def_buffer([](Array<vec3<float>>& t) -> pybind11::buffer_info { return t.getBuffer(); })
         .def("map", &Array<vec3<float>>::map_py)
-        .def("unmap", &Array<vec3<float>>::unmap);
+        .def("unmap", &Array<vec3<float>>::unmap)
+        .def("adopt", &Array<vec3<float>>::adopt)
+        .def("isAdopted", &Array<vec3<float>>::isAdopted);
 
     pybind11::class_<Array<vec2<float>>, std::shared_ptr<Array<vec2<float>>>>(
         m,
@@ -57,7 +67,9 @@ void export_Array(pybind11::module& m)
         pybind11::buffer_protocol())
         .def_buffer([](Array<vec2<float>>& t) -> pybind11::buffer_info { return t.getBuffer(); })
         .def("map", &Array<vec2<float>>::map_py)
-        .def("unmap", &Array<vec2<float>>::unmap);
+        .def("unmap", &Array<vec2<float>>::unmap)
+        .def("adopt", &Array<vec2<float>>::adopt)
+        .def("isAdopted", &Array<vec2<float>>::isAdopted);
 
     pybind11::class_<Array<quat<float>>, std::shared_ptr<Array<quat<float>>>>(
         m,
@@ -65,14 +77,28 @@ void export_Array(pybind11::module& m)
         pybind11::buffer_protocol())
         .def_buffer([](Array<quat<float>>& t) -> pybind11::buffer_info { return t.getBuffer(); })
         .def("map", &Array<quat<float>>::map_py)
-        .def("unmap", &Array<quat<float>>::unmap);
+        .def("unmap", &Array<quat<float>>::unmap)
+        .def("adopt", &Array<quat<float>>::adopt)
+        .def("isAdopted", &Array<quat<float>>::isAdopted);
 
     pybind11::class_<Array<float>, std::shared_ptr<Array<float>>>(m,
                                                                   "Array_f",
                                                                   pybind11::buffer_protocol())
         .def_buffer([](Array<float>& t) -> pybind11::buffer_info { return t.getBuffer(); })
         .def("map", &Array<float>::map_py)
-        .def("unmap", &Array<float>::unmap);
+        .def("unmap", &Array<float>::unmap)
+        .def("adopt", &Array<float>::adopt)
+        .def("isAdopted", &Array<float>::isAdopted);
+
+    pybind11::class_<Array<unsigned int>, std::shared_ptr<Array<unsigned int>>>(
+        m,
+        "Array_ui",
+        pybind11::buffer_protocol())
+        .def_buffer([](Array<unsigned int>& t) -> pybind11::buffer_info { return t.getBuffer(); })
+        .def("map", &Array<unsigned int>::map_py)
+        .def("unmap", &Array<unsigned int>::unmap)
+        .def("adopt", &Array<unsigned int>::adopt)
+        .def("isAdopted", &Array<unsigned int>::isAdopted);
     }
 
     } // namespace cpu
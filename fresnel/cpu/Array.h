@@ -7,7 +7,10 @@
 #include "common/ColorMath.h"
 #include "common/VectorMath.h"
 
+#include <cstdlib>
+#include <memory>
 #include <pybind11/pybind11.h>
+#include <stdexcept>
 
 #if (PYBIND11_VERSION_MAJOR) != 2 || (PYBIND11_VERSION_MINOR) < 2
 #error Fresnel requires pybind11 >= 2.2
@@ -19,6 +22,15 @@ namespace cpu
     {
 namespace detail
     {
+//! Deleter for memory allocated with calloc
+struct FreeDeleter
+    {
+    void operator()(void* ptr) const
+        {
+        free(ptr);
+        }
+    };
+
 template<class T> unsigned int array_width(const T& a)
     {
     return 1;
@@ -94,6 +106,10 @@ template<class T> std::string array_dtype(const RGB<T>& a)
 
     Arrays of vector types (vec3, RGBA, etc...) automatically map to WxHx3 (or 4) numpy arrays to
    allow users natural access to the individual data elements from within python.
+
+    The array allocates its storage with calloc, so the operating system provides zeroed pages as
+   they are first written. adopt() replaces the storage with the memory of a python buffer (such as
+   a numpy array) and keeps a reference to the buffer for the lifetime of the Array.
 */
 template<class T> class Array
     {
@@ -106,30 +122,61 @@ template<class T> class Array
         }
 
     //! Construct a 1D array
-    Array(size_t n) : m_data(n)
+    Array(size_t n)
         {
         m_w = n;
         m_h = 1;
         m_ndim = 1;
-
-        // reset to zero for primitive data types
-        memset((void*)&m_data[0], 0, sizeof(T) * n);
-
-        // this looks weird, because the underlying std::vector has already constructed
-        // the objects, but we just reset the array to zero to account for non-primitive data-types
-        for (std::size_t i = 0; i < n; ++i)
-            ::new ((void**)&m_data[i]) T;
+        allocate();
         }
 
     //! Construct a 2D array
-    Array(size_t w, size_t h) : m_data(w * h)
+    Array(size_t w, size_t h)
         {
         m_w = w;
         m_h = h;
         m_ndim = 2;
-        memset((void*)&m_data[0], 0, sizeof(T) * w * h);
-        for (std::size_t i = 0; i < w * h; ++i)
-            ::new ((void**)&m_data[i]) T;
+        allocate();
+        }
+
+    //! Destructor
+    ~Array()
+        {
+        // release the adopted buffer with the GIL held
+        if (m_owner)
+            {
+            pybind11::gil_scoped_acquire gil;
+            m_owner = pybind11::object();
+            }
+        }
+
+    //! Use the memory of a python buffer as the array storage
+    /*! \param b Buffer to adopt. It must have the same shape, type, and C-contiguous strides as the
+            buffer returned by getBuffer().
+
+        Read-only buffers may be adopted. The caller must not write to the array after adopting a
+        read-only buffer.
+    */
+    void adopt(pybind11::buffer b)
+        {
+        pybind11::buffer_info info = b.request();
+        pybind11::buffer_info current = getBuffer();
+        if (info.format != current.format || info.itemsize != current.itemsize
+            || info.shape != current.shape || info.strides != current.strides)
+            {
+            throw std::runtime_error("Buffer must be a C-contiguous array of the same shape and "
+                                     "type as the array");
+            }
+
+        m_storage.reset();
+        m_data = (T*)info.ptr;
+        m_owner = b;
+        }
+
+    //! Test if the array storage is an adopted python buffer
+    bool isAdopted() const
+        {
+        return bool(m_owner);
         }
 
     //! Get a python buffer pointing to the data
@@ -173,7 +220,7 @@ template<class T> class Array
         if (array_width > 1)
             dim += 1;
 
-        return pybind11::buffer_info(&m_data[0],
+        return pybind11::buffer_info(m_data,
                                      item_size,
                                      detail::array_dtype(T()),
                                      dim,
@@ -208,7 +255,7 @@ template<class T> class Array
     //! Bind the array
     T* map()
         {
-        return &m_data[0];
+        return m_data;
         }
 
     //! Map from python
@@ -222,10 +269,30 @@ template<class T> class Array
     void unmap() { }
 
     protected:
-    std::vector<T> m_data; //!< Stored data
-    size_t m_w;            //!< Width of data array
-    size_t m_h;            //!< Height of data array
-    unsigned int m_ndim;   //!< Number of dimensions in the data array
+    std::unique_ptr<T, detail::FreeDeleter> m_storage; //!< Storage allocated by the array
+    T* m_data = nullptr;      //!< Stored data (in m_storage or an adopted buffer)
+    pybind11::object m_owner; //!< Adopted python buffer
+    size_t m_w;               //!< Width of data array
+    size_t m_h;               //!< Height of data array
+    unsigned int m_ndim;      //!< Number of dimensions in the data array
+
+    //! Allocate zeroed storage for m_w * m_h elements
+    void allocate()
+        {
+        size_t n = m_w * m_h;
+        if (n == 0)
+            return;
+
+        m_storage.reset((T*)calloc(n, sizeof(T)));
+        if (!m_storage)
+            throw std::bad_alloc();
+        m_data = m_storage.get();
+
+        // construct non-primitive data types in the zeroed memory. Types with empty constructors
+        // leave the pages untouched until they are first written.
+        for (std::size_t i = 0; i < n; ++i)
+            ::new ((void*)&m_data[i]) T;
+        }
     };
 
 //! Export Array instantiations to python
@@ -0,0 +1,292 @@
+// Copyright (c) 2016-2020 The Regents of the University of Michigan
+// This file is part of the Fresnel project, released under the BSD 3-Clause License.
+
+#include "Denoise.h"
+#include "Device.h"
+
+#include <algorithm>
+#include <cmath>
+#include <pybind11/numpy.h>
+#include <stdexcept>
+#include <vector>
+
+#include "tbb/parallel_for.h"
+
+using namespace tbb;
+
+namespace fresnel
+    {
+namespace cpu
+    {
+namespace
+    {
+//! B3 spline filter taps
+const float atrous_kernel[5] = {1.0f / 16.0f, 1.0f / 4.0f, 3.0f / 8.0f, 1.0f / 4.0f, 1.0f / 16.0f};
+
+//! Smallest albedo to divide by when demodulating
+const float min_albedo = 1e-3f;
+
+//! Compute the factor that removes the albedo from a pixel's color
+/*! \param albedo Surface albedo
+
+    Channels with a (near) zero albedo, such as the background, are left unchanged.
+*/
+inline RGB<float> albedo_factor(const RGB<float>& albedo)
+    {
+    return RGB<float>(albedo.r > min_albedo ? albedo.r : 1.0f,
+                      albedo.g > min_albedo ? albedo.g : 1.0f,
+                      albedo.b > min_albedo ? albedo.b : 1.0f);
+    }
+
+//! Edge stopping weight for depth
+/*! \param dp Depth at the center pixel
+    \param dq Depth at the neighboring pixel
+    \param sigma Relative depth difference scale
+
+    Pixels where the camera ray missed have an infinite depth. They only blend with each other.
+*/
+inline float depth_weight(float dp, float dq, float sigma)
+    {
+    if (!std::isfinite(dp) || !std::isfinite(dq))
+        return (std::isfinite(dp) == std::isfinite(dq)) ? 1.0f : 0.0f;
+
+    float d = (dp - dq) / (sigma * std::max(std::fabs(dp), 1e-6f));
+    return expf(-d * d);
+    }
+
+    } // end anonymous namespace
+
+/*! \param output Output image (width * height pixels)
+    \param color Input image (width * height pixels)
+    \param albedo Per pixel surface albedo (may be nullptr)
+    \param normal Per pixel surface normal (may be nullptr)
+    \param depth Per pixel camera ray hit distance (may be nullptr)
+    \param width Width of the image
+    \param height Height of the image
+    \param params Filter parameters
+
+    Apply the edge-avoiding a-trous wavelet filter of Dammertz et al. 2010 (High-Performance
+    Edge-Avoiding Wavelet Filtering). Each iteration blurs the image with a 5x5 B3 spline kernel
+    whose taps are spaced 2^i pixels apart and weights each tap by how similar its color, normal,
+    and depth are to the center pixel. The color scale halves in every iteration.
+
+    When *albedo* is given, the filter divides the albedo out of the color before filtering and
+    multiplies it back in afterwards so that texture and per particle color detail is preserved.
+*/
+void denoise(RGBA<float>* output,
+             const RGBA<float>* color,
+             const RGB<float>* albedo,
+             const vec3<float>* normal,
+             const float* depth,
+             unsigned int width,
+             unsigned int height,
+             const DenoiseParameters& params)
+    {
+    const size_t n_pixels = size_t(width) * size_t(height);
+    std::vector<RGBA<float>> input(n_pixels);
+    RGBA<float>* in = input.data();
+
+    // remove the albedo
+    parallel_for(blocked_range<size_t>(0, n_pixels), [=](const blocked_range<size_t>& r) {
+        for (size_t p = r.begin(); p != r.end(); ++p)
+            {
+            in[p] = color[p];
+            if (albedo)
+                {
+                RGB<float> c
+                    = RGB<float>(color[p].r, color[p].g, color[p].b) / albedo_factor(albedo[p]);
+                in[p] = RGBA<float>(c, color[p].a);
+                }
+            }
+    });
+
+    std::vector<RGBA<float>> filtered(n_pixels);
+    RGBA<float>* out = filtered.data();
+
+    float sigma_color = params.sigma_color;
+    for (unsigned int iteration = 0; iteration < params.iterations; iteration++)
+        {
+        const int step = 1 << iteration;
+        const float inv_sigma_color2 = 1.0f / (sigma_color * sigma_color);
+        const float inv_sigma_normal2 = 1.0f / (params.sigma_normal * params.sigma_normal);
+        const float sigma_depth = params.sigma_depth;
+
+        parallel_for(blocked_range<unsigned int>(0, height),
+                     [=](const blocked_range<unsigned int>& r) {
+                         for (unsigned int j = r.begin(); j != r.end(); ++j)
+                             for (unsigned int i = 0; i < width; i++)
+                                 {
+                                 const size_t p = size_t(j) * width + i;
+                                 RGBA<float> sum(0, 0, 0, 0);
+                                 float weight_sum = 0.0f;
+
+                                 for (int dy = -2; dy <= 2; dy++)
+                                     {
+                                     const int y = int(j) + dy * step;
+                                     if (y < 0 || y >= int(height))
+                                         continue;
+
+                                     for (int dx = -2; dx <= 2; dx++)
+                                         {
+                                         const int x = int(i) + dx * step;
+                                         if (x < 0 || x >= int(width))
+                                             continue;
+
+                                         const size_t q = size_t(y) * width + x;
+                                         float w = atrous_kernel[dx + 2] * atrous_kernel[dy + 2];
+
+                                         const RGBA<float> dc = in[q] - in[p];
+                                         w *= expf(-(dc.r * dc.r + dc.g * dc.g + dc.b * dc.b)
+                                                   * inv_sigma_color2);
+
+                                         if (normal)
+                                             {
+                                             const vec3<float> dn = normal[q] - normal[p];
+                                             w *= expf(-dot(dn, dn) * inv_sigma_normal2);
+                                             }
+
+                                         if (depth)
+                                             w *= depth_weight(depth[p], depth[q], sigma_depth);
+
+                                         sum += in[q] * w;
+                                         weight_sum += w;
+                                         }
+                                     }
+
+                                 // the center pixel always has a non-zero weight
+                                 out[p] = sum / weight_sum;
+                                 }
+                     });
+
+        std::swap(in, out);
+        sigma_color *= 0.5f;
+        }
+
+    // restore the albedo
+    parallel_for(blocked_range<size_t>(0, n_pixels), [=](const blocked_range<size_t>& r) {
+        for (size_t p = r.begin(); p != r.end(); ++p)
+            {
+            output[p] = in[p];
+            if (albedo)
+                {
+                RGB<float> c = RGB<float>(in[p].r, in[p].g, in[p].b) * albedo_factor(albedo[p]);
+                output[p] = RGBA<float>(c, in[p].a);
+                }
+            }
+    });
+    }
+
+/*! \param color Input image (height, width, 4)
+    \param albedo Per pixel surface albedo (height, width, 3) or None
+    \param normal Per pixel surface normal (height, width, 3) or None
+    \param depth Per pixel camera ray hit distance (height, width) or None
+    \param iterations Number of a-trous iterations
+    \param sigma_color Color difference scale of the edge stopping function
+    \param sigma_normal Normal difference scale of the edge stopping function
+    \param sigma_depth Relative depth difference scale of the edge stopping function
+    \param device Device whose task arena runs the filter (may be nullptr)
+
+    \returns The denoised image (height, width, 4)
+
+    Validate the array shapes and call denoise() without holding the GIL. When *device* is given,
+    the filter runs in its task arena and uses only the device's threads.
+*/
+pybind11::array_t<float>
+denoise_py(pybind11::array_t<float, pybind11::array::c_style | pybind11::array::forcecast> color,
+           pybind11::object albedo,
+           pybind11::object normal,
+           pybind11::object depth,
+           unsigned int iterations,
+           float sigma_color,
+           float sigma_normal,
+           float sigma_depth,
+           std::shared_ptr<Device> device)
+    {
+    typedef pybind11::array_t<float, pybind11::array::c_style | pybind11::array::forcecast>
+        float_array;
+
+    pybind11::buffer_info info_color = color.request();
+    if (info_color.ndim != 3 || info_color.shape[2] != 4)
+        throw std::runtime_error("color must be a (height, width, 4) array");
+    const pybind11::ssize_t height = info_color.shape[0];
+    const pybind11::ssize_t width = info_color.shape[1];
+
+    if (sigma_color <= 0 || sigma_normal <= 0 || sigma_depth <= 0)
+        throw std::runtime_error("Invalid filter scale");
+
+    // keep references to the converted guide arrays until the filter completes
+    float_array albedo_array, normal_array, depth_array;
+    const RGB<float>* albedo_ptr = nullptr;
+    const vec3<float>* normal_ptr = nullptr;
+    const float* depth_ptr = nullptr;
+
+    if (!albedo.is_none())
+        {
+        albedo_array = albedo.cast<float_array>();
+        pybind11::buffer_info info = albedo_array.request();
+        if (info.ndim != 3 || info.shape[0] != height || info.shape[1] != width
+            || info.shape[2] != 3)
+            throw std::runtime_error("albedo must be a (height, width, 3) array");
+        albedo_ptr = (const RGB<float>*)info.ptr;
+        }
+
+    if (!normal.is_none())
+        {
+        normal_array = normal.cast<float_array>();
+        pybind11::buffer_info info = normal_array.request();
+        if (info.ndim != 3 || info.shape[0] != height || info.shape[1] != width
+            || info.shape[2] != 3)
+            throw std::runtime_error("normal must be a (height, width, 3) array");
+        normal_ptr = (const vec3<float>*)info.ptr;
+        }
+
+    if (!depth.is_none())
+        {
+        depth_array = depth.cast<float_array>();
+        pybind11::buffer_info info = depth_array.request();
+        if (info.ndim != 2 || info.shape[0] != height || info.shape[1] != width)
+            throw std::runtime_error("depth must be a (height, width) array");
+        depth_ptr = (const float*)info.ptr;
+        }
+
+    DenoiseParameters params;
+    params.iterations = iterations;
+    params.sigma_color = sigma_color;
+    params.sigma_normal = sigma_normal;
+    params.sigma_depth = sigma_depth;
+
+    pybind11::array_t<float> result(std::vector<pybind11::ssize_t> {height, width, 4});
+    RGBA<float>* output = (RGBA<float>*)result.mutable_data();
+    const RGBA<float>* input = (const RGBA<float>*)info_color.ptr;
+
+        {
+        pybind11::gil_scoped_release release;
+        auto run = [&] {
+            denoise(output,
+                    input,
+                    albedo_ptr,
+                    normal_ptr,
+                    depth_ptr,
+                    (unsigned int)width,
+                    (unsigned int)height,
+                    params);
+        };
+
+        if (device)
+            device->getTBBArena()->execute(run);
+        else
+            run();
+        }
+
+    return result;
+    }
+
+/*! \param m Python module to export in
+ */
+void export_Denoise(pybind11::module& m)
+    {
+    m.def("denoise", &denoise_py);
+    }
+
+    } // namespace cpu
+    } // namespace fresnel
@@ -0,0 +1,41 @@
+// Copyright (c) 2016-2020 The Regents of the University of Michigan
+// This file is part of the Fresnel project, released under the BSD 3-Clause License.
+
+#ifndef DENOISE_H_
+#define DENOISE_H_
+
+#include <pybind11/pybind11.h>
+
+#include "common/ColorMath.h"
+#include "common/VectorMath.h"
+
+namespace fresnel
+    {
+namespace cpu
+    {
+//! Parameters of the denoising filter
+struct DenoiseParameters
+    {
+    unsigned int iterations = 5; //!< Number of a-trous iterations
+    float sigma_color = 0.5f;    //!< Color difference scale of the edge stopping function
+    float sigma_normal = 0.3f;   //!< Normal difference scale of the edge stopping function
+    float sigma_depth = 0.05f;   //!< Relative depth difference scale of the edge stopping function
+    };
+
+//! Denoise a linear RGBA image
+void denoise(RGBA<float>* output,
+             const RGBA<float>* color,
+             const RGB<float>* albedo,
+             const vec3<float>* normal,
+             const float* depth,
+             unsigned int width,
+             unsigned int height,
+             const DenoiseParameters& params);
+
+//! Export denoise to python
+void export_Denoise(pybind11::module& m);
+
+    } // namespace cpu
+    } // namespace fresnel
+
+#endif
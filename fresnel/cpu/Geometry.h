@@ -51,6 +51,12 @@ class Geometry
     //! Remove the Geometry from the Scene
     void remove();
 
+    //! Get the id reported for this geometry in the geometry id output buffer
+    unsigned int getGeometryID() const
+        {
+        return m_geom_id;
+        }
+
     //! Get the material
     const Material& getMaterial()
         {
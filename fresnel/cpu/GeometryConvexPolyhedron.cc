@@ -101,6 +101,8 @@ GeometryConvexPolyhedron::GeometryConvexPolyhedron(
     m_device->checkError();
     rtcSetGeometryIntersectFunction(m_geometry, &GeometryConvexPolyhedron::intersect);
     m_device->checkError();
+    rtcSetGeometryOccludedFunction(m_geometry, &GeometryConvexPolyhedron::occluded);
+    m_device->checkError();
 
     rtcCommitGeometry(m_geometry);
     m_device->checkError();
@@ -131,14 +133,31 @@ void GeometryConvexPolyhedron::bounds(const struct RTCBoundsFunctionArguments* a
     bounds_o.upper_z = p.z + geom->m_radius;
     }
 
-/*! Compute the intersection of a ray with the given primitive
-
-    \param ptr Pointer to a GeometryConvexPolyhedron instance
-    \param ray The ray to intersect
-    \param item Index of the primitive to compute the bounding box of
+/*! Compute the intersection of each active ray in a packet with the given primitive
+   \param args Arguments to the intersect check
 */
 void GeometryConvexPolyhedron::intersect(const struct RTCIntersectFunctionNArguments* args)
     {
+    fresnel_intersect_n(args, &GeometryConvexPolyhedron::intersectRay);
+    }
+
+/*! Test if each active ray in a packet is occluded by the given primitive
+   \param args Arguments to the occlusion check
+*/
+void GeometryConvexPolyhedron::occluded(const struct RTCOccludedFunctionNArguments* args)
+    {
+    fresnel_occluded_n(args, &GeometryConvexPolyhedron::intersectRay);
+    }
+
+/*! Compute the intersection of a single ray with the given primitive
+   \param args Arguments to the intersect check
+   \param rayhit The ray to intersect, updated when the ray hits the primitive
+   \param hit_data Shading data set when the ray hits the primitive
+*/
+void GeometryConvexPolyhedron::intersectRay(const struct RTCIntersectFunctionNArguments* args,
+                                            RTCRayHit& rayhit,
+                                            FresnelHitData& hit_data)
+    {
     GeometryConvexPolyhedron* geom = (GeometryConvexPolyhedron*)args->geometryUserPtr;
 
     // adapted from OptiX quick start tutorial and Embree user_geometry tutorial files
@@ -149,7 +168,6 @@ void GeometryConvexPolyhedron::intersect(const struct RTCIntersectFunctionNArgum
     const vec3<float> pos_world = geom->m_position->get(args->primID);
     const quat<float> q_world = geom->m_orientation->get(args->primID);
 
-    RTCRayHit& rayhit = *(RTCRayHit*)args->rayhit;
     RTCRay& ray = rayhit.ray;
     vec3<float> dir = vec3<float>(ray.dir_x, ray.dir_y, ray.dir_z);
 
@@ -211,7 +229,6 @@ void GeometryConvexPolyhedron::intersect(const struct RTCIntersectFunctionNArgum
     vec3<float> n_hit, p_hit;
 
     // if the t0 is in (tnear,tfar), we hit the entry plane
-    FresnelRTCIntersectContext& context = *(FresnelRTCIntersectContext*)args->context;
     if ((ray.tnear < t0) & (t0 < ray.tfar))
         {
         t_hit = ray.tfar = t0;
@@ -223,9 +240,9 @@ void GeometryConvexPolyhedron::intersect(const struct RTCIntersectFunctionNArgum
         rayhit.hit.Ng_z = Ng.z;
         n_hit = t0_n_local;
         p_hit = t0_p_local;
-        context.shading_color = lerp(geom->m_color_by_face,
-                                     geom->m_color->get(args->primID),
-                                     geom->m_plane_color[t0_plane_hit]);
+        hit_data.shading_color = lerp(geom->m_color_by_face,
+                                      geom->m_color->get(args->primID),
+                                      geom->m_plane_color[t0_plane_hit]);
         hit = true;
         }
     // if t1 is in (tnear,tfar), we hit the exit plane
@@ -240,9 +257,9 @@ void GeometryConvexPolyhedron::intersect(const struct RTCIntersectFunctionNArgum
         rayhit.hit.Ng_z = Ng.z;
         n_hit = t1_n_local;
         p_hit = t1_p_local;
-        context.shading_color = lerp(geom->m_color_by_face,
-                                     geom->m_color->get(args->primID),
-                                     geom->m_plane_color[t1_plane_hit]);
+        hit_data.shading_color = lerp(geom->m_color_by_face,
+                                      geom->m_color->get(args->primID),
+                                      geom->m_plane_color[t1_plane_hit]);
         hit = true;
         }
 
@@ -327,7 +344,7 @@ void GeometryConvexPolyhedron::intersect(const struct RTCIntersectFunctionNArgum
                     min_d = d;
                 }
             }
-        context.d = min_d;
+        hit_data.d = min_d;
         }
     }
 
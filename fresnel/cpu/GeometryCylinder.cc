@@ -42,6 +42,8 @@ GeometryCylinder::GeometryCylinder(std::shared_ptr<Scene> scene, unsigned int N)
     m_device->checkError();
     rtcSetGeometryIntersectFunction(m_geometry, &GeometryCylinder::intersect);
     m_device->checkError();
+    rtcSetGeometryOccludedFunction(m_geometry, &GeometryCylinder::occluded);
+    m_device->checkError();
 
     m_valid = true;
     }
@@ -69,18 +71,36 @@ void GeometryCylinder::bounds(const struct RTCBoundsFunctionArguments* args)
     bounds_o.upper_z = std::max(A.z + radius, B.z + radius);
     }
 
-/*! Compute the intersection of a ray with the given primitive
-
-    \param args Arguments to the bounds check
+/*! Compute the intersection of each active ray in a packet with the given primitive
+   \param args Arguments to the intersect check
 */
 void GeometryCylinder::intersect(const struct RTCIntersectFunctionNArguments* args)
     {
+    fresnel_intersect_n(args, &GeometryCylinder::intersectRay);
+    }
+
+/*! Test if each active ray in a packet is occluded by the given primitive
+   \param args Arguments to the occlusion check
+*/
+void GeometryCylinder::occluded(const struct RTCOccludedFunctionNArguments* args)
+    {
+    fresnel_occluded_n(args, &GeometryCylinder::intersectRay);
+    }
+
+/*! Compute the intersection of a single ray with the given primitive
+   \param args Arguments to the intersect check
+   \param rayhit The ray to intersect, updated when the ray hits the primitive
+   \param hit_data Shading data set when the ray hits the primitive
+*/
+void GeometryCylinder::intersectRay(const struct RTCIntersectFunctionNArguments* args,
+                                    RTCRayHit& rayhit,
+                                    FresnelHitData& hit_data)
+    {
     GeometryCylinder* geom = (GeometryCylinder*)args->geometryUserPtr;
     const vec3<float> A = geom->m_points->get(args->primID * 2 + 0);
     const vec3<float> B = geom->m_points->get(args->primID * 2 + 1);
     const float radius = geom->m_radius->get(args->primID);
 
-    RTCRayHit& rayhit = *(RTCRayHit*)args->rayhit;
     RTCRay& ray = rayhit.ray;
 
     float t = HUGE_VALF, d = HUGE_VALF;
@@ -107,10 +127,8 @@ void GeometryCylinder::intersect(const struct RTCIntersectFunctionNArguments* ar
         rayhit.hit.Ng_y = N.y;
         rayhit.hit.Ng_z = N.z;
 
-        FresnelRTCIntersectContext& context = *(FresnelRTCIntersectContext*)args->context;
-        rayhit.hit.instID[0] = context.context.instID[0];
-        context.shading_color = geom->m_color->get(args->primID * 2 + color_index);
-        context.d = d;
+        hit_data.shading_color = geom->m_color->get(args->primID * 2 + color_index);
+        hit_data.d = d;
         }
     }
 
@@ -65,6 +65,14 @@ class GeometryCylinder : public Geometry
 
     //! Embree ray intersection function
     static void intersect(const struct RTCIntersectFunctionNArguments* args);
+
+    //! Embree ray occlusion function
+    static void occluded(const struct RTCOccludedFunctionNArguments* args);
+
+    //! Intersect a single ray with a primitive
+    static void intersectRay(const struct RTCIntersectFunctionNArguments* args,
+                             RTCRayHit& rayhit,
+                             FresnelHitData& hit_data);
     };
 
 //! Export Cylinder to python
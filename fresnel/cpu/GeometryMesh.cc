@@ -65,6 +65,8 @@ GeometryMesh::GeometryMesh(
     m_device->checkError();
     rtcSetGeometryIntersectFunction(m_geometry, &GeometryMesh::intersect);
     m_device->checkError();
+    rtcSetGeometryOccludedFunction(m_geometry, &GeometryMesh::occluded);
+    m_device->checkError();
 
     rtcCommitGeometry(m_geometry);
     m_device->checkError();
@@ -109,11 +111,31 @@ void GeometryMesh::bounds(const struct RTCBoundsFunctionArguments* args)
     bounds_o.upper_z = std::max(v0_world.z, std::max(v1_world.z, v2_world.z));
     }
 
-/*! Compute the intersection of a ray with the given primitive
+/*! Compute the intersection of each active ray in a packet with the given primitive
    \param args Arguments to the intersect check
 */
 void GeometryMesh::intersect(const struct RTCIntersectFunctionNArguments* args)
     {
+    fresnel_intersect_n(args, &GeometryMesh::intersectRay);
+    }
+
+/*! Test if each active ray in a packet is occluded by the given primitive
+   \param args Arguments to the occlusion check
+*/
+void GeometryMesh::occluded(const struct RTCOccludedFunctionNArguments* args)
+    {
+    fresnel_occluded_n(args, &GeometryMesh::intersectRay);
+    }
+
+/*! Compute the intersection of a single ray with the given primitive
+   \param args Arguments to the intersect check
+   \param rayhit The ray to intersect, updated when the ray hits the primitive
+   \param hit_data Shading data set when the ray hits the primitive
+*/
+void GeometryMesh::intersectRay(const struct RTCIntersectFunctionNArguments* args,
+                                RTCRayHit& rayhit,
+                                FresnelHitData& hit_data)
+    {
     GeometryMesh* geom = (GeometryMesh*)args->geometryUserPtr;
 
     unsigned int item = args->primID;
@@ -121,7 +143,6 @@ void GeometryMesh::intersect(const struct RTCIntersectFunctionNArguments* args)
     unsigned int i_poly = item / n_faces;
     unsigned int i_face = item % n_faces;
 
-    RTCRayHit& rayhit = *(RTCRayHit*)args->rayhit;
     RTCRay& ray = rayhit.ray;
 
     const vec3<float> p3 = geom->m_position->get(i_poly);
@@ -177,14 +198,11 @@ void GeometryMesh::intersect(const struct RTCIntersectFunctionNArguments* args)
         rayhit.hit.Ng_y = n_world.y;
         rayhit.hit.Ng_z = n_world.z;
 
-        FresnelRTCIntersectContext& context = *(FresnelRTCIntersectContext*)args->context;
-        rayhit.hit.instID[0] = context.context.instID[0];
-
-        context.shading_color = geom->m_color->get(i_face * 3 + 0) * u
-                                + geom->m_color->get(i_face * 3 + 1) * v
-                                + geom->m_color->get(i_face * 3 + 2) * w;
+        hit_data.shading_color = geom->m_color->get(i_face * 3 + 0) * u
+                                 + geom->m_color->get(i_face * 3 + 1) * v
+                                 + geom->m_color->get(i_face * 3 + 2) * w;
 
-        context.d = d;
+        hit_data.d = d;
         }
     }
 
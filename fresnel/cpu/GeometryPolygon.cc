@@ -71,6 +71,8 @@ GeometryPolygon::GeometryPolygon(
     m_device->checkError();
     rtcSetGeometryIntersectFunction(m_geometry, &GeometryPolygon::intersect);
     m_device->checkError();
+    rtcSetGeometryOccludedFunction(m_geometry, &GeometryPolygon::occluded);
+    m_device->checkError();
 
     rtcCommitGeometry(m_geometry);
     m_device->checkError();
@@ -141,14 +143,31 @@ inline bool is_inside(float& min_d, const vec2<float>& p, const std::vector<vec2
     return oddNodes;
     }
 
-/*! Compute the intersection of a ray with the given primitive
-
-    \param ptr Pointer to a GeometryPolygon instance
-    \param ray The ray to intersect
-    \param item Index of the primitive to compute the bounding box of
+/*! Compute the intersection of each active ray in a packet with the given primitive
+   \param args Arguments to the intersect check
 */
 void GeometryPolygon::intersect(const struct RTCIntersectFunctionNArguments* args)
     {
+    fresnel_intersect_n(args, &GeometryPolygon::intersectRay);
+    }
+
+/*! Test if each active ray in a packet is occluded by the given primitive
+   \param args Arguments to the occlusion check
+*/
+void GeometryPolygon::occluded(const struct RTCOccludedFunctionNArguments* args)
+    {
+    fresnel_occluded_n(args, &GeometryPolygon::intersectRay);
+    }
+
+/*! Compute the intersection of a single ray with the given primitive
+   \param args Arguments to the intersect check
+   \param rayhit The ray to intersect, updated when the ray hits the primitive
+   \param hit_data Shading data set when the ray hits the primitive
+*/
+void GeometryPolygon::intersectRay(const struct RTCIntersectFunctionNArguments* args,
+                                   RTCRayHit& rayhit,
+                                   FresnelHitData& hit_data)
+    {
     GeometryPolygon* geom = (GeometryPolygon*)args->geometryUserPtr;
 
     const vec2<float> p2 = geom->m_position->get(args->primID);
@@ -157,7 +176,7 @@ void GeometryPolygon::intersect(const struct RTCIntersectFunctionNArguments* arg
     const quat<float> q_world = quat<float>::fromAxisAngle(vec3<float>(0, 0, 1), angle);
 
     // transform the ray into the primitive coordinate system
-    RTCRay& ray = ((RTCRayHit*)args->rayhit)->ray;
+    RTCRay& ray = rayhit.ray;
     vec3<float> ray_dir_local = rotate(conj(q_world), vec3<float>(ray.dir_x, ray.dir_y, ray.dir_z));
     vec3<float> ray_org_local
         = rotate(conj(q_world), vec3<float>(ray.org_x, ray.org_y, ray.org_z) - pos_world);
@@ -199,13 +218,11 @@ void GeometryPolygon::intersect(const struct RTCIntersectFunctionNArguments* arg
 
     // if we get here, we hit the inside of the polygon
     // if the t_hit is in (tnear,tfar), we hit the polygon
-    RTCRayHit& rh = *(RTCRayHit*)args->rayhit;
-    FresnelRTCIntersectContext& context = *(FresnelRTCIntersectContext*)args->context;
     if ((ray.tnear < t_hit) & (t_hit < ray.tfar))
         {
         ray.tfar = t_hit;
-        rh.hit.geomID = geom->m_geom_id;
-        rh.hit.primID = args->primID;
+        rayhit.hit.geomID = geom->m_geom_id;
+        rayhit.hit.primID = args->primID;
 
         // make polygons double sided
         vec3<float> n_flip;
@@ -220,11 +237,11 @@ void GeometryPolygon::intersect(const struct RTCIntersectFunctionNArguments* arg
 
         vec3<float> Ng = rotate(q_world, n_flip);
 
-        rh.hit.Ng_x = Ng.x;
-        rh.hit.Ng_y = Ng.y;
-        rh.hit.Ng_z = Ng.z;
-        context.shading_color = geom->m_color->get(args->primID);
-        context.d = min_d;
+        rayhit.hit.Ng_x = Ng.x;
+        rayhit.hit.Ng_y = Ng.y;
+        rayhit.hit.Ng_z = Ng.z;
+        hit_data.shading_color = geom->m_color->get(args->primID);
+        hit_data.d = min_d;
         }
     }
 
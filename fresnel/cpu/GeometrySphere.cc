@@ -42,6 +42,8 @@ GeometrySphere::GeometrySphere(std::shared_ptr<Scene> scene, unsigned int N) : G
     m_device->checkError();
     rtcSetGeometryIntersectFunction(m_geometry, &GeometrySphere::intersect);
     m_device->checkError();
+    rtcSetGeometryOccludedFunction(m_geometry, &GeometrySphere::occluded);
+    m_device->checkError();
 
     rtcCommitGeometry(m_geometry);
     m_device->checkError();
@@ -72,18 +74,34 @@ void GeometrySphere::bounds(const struct RTCBoundsFunctionArguments* args)
     bounds_o.upper_z = p.z + radius;
     }
 
-/*! Compute the intersection of a ray with the given primitive
-
-    \param ptr Pointer to a GeometrySphere instance
-    \param ray The ray to intersect
-    \param item Index of the primitive to compute the bounding box of
+/*! Compute the intersection of each active ray in a packet with the given primitive
+   \param args Arguments to the intersect check
 */
 void GeometrySphere::intersect(const struct RTCIntersectFunctionNArguments* args)
     {
+    fresnel_intersect_n(args, &GeometrySphere::intersectRay);
+    }
+
+/*! Test if each active ray in a packet is occluded by the given primitive
+   \param args Arguments to the occlusion check
+*/
+void GeometrySphere::occluded(const struct RTCOccludedFunctionNArguments* args)
+    {
+    fresnel_occluded_n(args, &GeometrySphere::intersectRay);
+    }
+
+/*! Compute the intersection of a single ray with the given primitive
+   \param args Arguments to the intersect check
+   \param rayhit The ray to intersect, updated when the ray hits the primitive
+   \param hit_data Shading data set when the ray hits the primitive
+*/
+void GeometrySphere::intersectRay(const struct RTCIntersectFunctionNArguments* args,
+                                  RTCRayHit& rayhit,
+                                  FresnelHitData& hit_data)
+    {
     GeometrySphere* geom = (GeometrySphere*)args->geometryUserPtr;
     const vec3<float> position = geom->m_position->get(args->primID);
     const float radius = geom->m_radius->get(args->primID);
-    RTCRayHit& rayhit = *(RTCRayHit*)args->rayhit;
     RTCRay& ray = rayhit.ray;
 
     float t = 0, d = 0;
@@ -106,10 +124,8 @@ void GeometrySphere::intersect(const struct RTCIntersectFunctionNArguments* args
         rayhit.hit.Ng_x = ray.org_x + t * ray.dir_x - position.x;
         rayhit.hit.Ng_y = ray.org_y + t * ray.dir_y - position.y;
         rayhit.hit.Ng_z = ray.org_z + t * ray.dir_z - position.z;
-        FresnelRTCIntersectContext& context = *(FresnelRTCIntersectContext*)args->context;
-        rayhit.hit.instID[0] = context.context.instID[0];
-        context.shading_color = geom->m_color->get(args->primID);
-        context.d = d;
+        hit_data.shading_color = geom->m_color->get(args->primID);
+        hit_data.d = d;
         }
     }
 
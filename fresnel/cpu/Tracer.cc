@@ -3,10 +3,152 @@
 
 #include "Tracer.h"
 
+#include <algorithm>
+#include <cmath>
+#include <limits>
+
+#include "tbb/parallel_for.h"
+
 namespace fresnel
     {
 namespace cpu
     {
+namespace detail
+    {
+//! Lookup table to convert linear color values to 8-bit sRGB
+/*! threshold[k] is the smallest linear value that sRGB() converts to the 8-bit value k. Converting
+   a channel is a binary search over the thresholds, which is much faster than evaluating powf.
+*/
+class SRGBTable
+    {
+    public:
+    //! Constructor
+    SRGBTable()
+        {
+        threshold[0] = -std::numeric_limits<float>::infinity();
+        for (unsigned int k = 1; k < 256; k++)
+            {
+            // invert the sRGB transfer function at the rounding boundary below k
+            float s = (float(k) - 0.5f) / 255.0f;
+            if (s < 12.92f * 0.0031308f)
+                threshold[k] = s / 12.92f;
+            else
+                threshold[k] = powf((s + 0.055f) / (1.0f + 0.055f), 2.4f);
+            }
+        }
+
+    //! Convert a linear color channel to an 8-bit sRGB value
+    unsigned char convert(float c) const
+        {
+        unsigned int k = 0;
+        for (unsigned int step = 128; step > 0; step >>= 1)
+            {
+            if (c >= threshold[k + step])
+                k += step;
+            }
+        return (unsigned char)k;
+        }
+
+    private:
+    float threshold[256]; //!< Linear value at the lower boundary of each sRGB value
+    };
+
+//! The sRGB lookup table shared by all tracers
+static const SRGBTable srgb_table;
+
+//! Trace a 4-wide ray packet
+inline void
+rtc_intersect_packet(const int* valid, RTCScene scene, RTCIntersectContext* context, RTCRayHit4* rh)
+    {
+    rtcIntersect4(valid, scene, context, rh);
+    }
+
+//! Trace an 8-wide ray packet
+inline void
+rtc_intersect_packet(const int* valid, RTCScene scene, RTCIntersectContext* context, RTCRayHit8* rh)
+    {
+    rtcIntersect8(valid, scene, context, rh);
+    }
+
+//! Trace a 16-wide ray packet
+inline void rtc_intersect_packet(const int* valid,
+                                 RTCScene scene,
+                                 RTCIntersectContext* context,
+                                 RTCRayHit16* rh)
+    {
+    rtcIntersect16(valid, scene, context, rh);
+    }
+
+//! Intersect a batch of rays with the scene in packets of P rays
+/*! \param scene Embree scene to trace
+    \param ray_hits Rays to trace, overwritten with the hits
+    \param hit_data Output hit data for each ray
+    \param n Number of rays
+
+    The last packet is partially filled when n is not a multiple of P.
+*/
+template<unsigned int P, class RTCRayHitP>
+void intersect_packets(RTCScene scene,
+                       RTCRayHit* ray_hits,
+                       FresnelHitData* hit_data,
+                       unsigned int n)
+    {
+    for (unsigned int start = 0; start < n; start += P)
+        {
+        unsigned int count = std::min(P, n - start);
+
+        RTCRayHitP packet;
+        RTCRayN* ray_n = RTCRayHitN_RayN((RTCRayHitN*)&packet, P);
+        RTCHitN* hit_n = RTCRayHitN_HitN((RTCRayHitN*)&packet, P);
+        int valid[P];
+
+        for (unsigned int i = 0; i < P; i++)
+            {
+            valid[i] = 0;
+            if (i >= count)
+                continue;
+
+            const RTCRay& ray = ray_hits[start + i].ray;
+            valid[i] = -1;
+            RTCRayN_org_x(ray_n, P, i) = ray.org_x;
+            RTCRayN_org_y(ray_n, P, i) = ray.org_y;
+            RTCRayN_org_z(ray_n, P, i) = ray.org_z;
+            RTCRayN_tnear(ray_n, P, i) = ray.tnear;
+            RTCRayN_dir_x(ray_n, P, i) = ray.dir_x;
+            RTCRayN_dir_y(ray_n, P, i) = ray.dir_y;
+            RTCRayN_dir_z(ray_n, P, i) = ray.dir_z;
+            RTCRayN_time(ray_n, P, i) = ray.time;
+            RTCRayN_tfar(ray_n, P, i) = ray.tfar;
+            RTCRayN_mask(ray_n, P, i) = ray.mask;
+            RTCRayN_id(ray_n, P, i) = i;
+            RTCRayN_flags(ray_n, P, i) = 0;
+            RTCHitN_geomID(hit_n, P, i) = RTC_INVALID_GEOMETRY_ID;
+            RTCHitN_instID(hit_n, P, i, 0) = RTC_INVALID_GEOMETRY_ID;
+            }
+
+        FresnelRTCIntersectContext context;
+        rtcInitIntersectContext(&context.context);
+        context.context.flags = RTC_INTERSECT_CONTEXT_FLAG_COHERENT;
+        context.hit_data = hit_data + start;
+        rtc_intersect_packet(valid, scene, &context.context, &packet);
+
+        for (unsigned int i = 0; i < count; i++)
+            {
+            RTCRayHit& ray_hit = ray_hits[start + i];
+            ray_hit.ray.tfar = RTCRayN_tfar(ray_n, P, i);
+            ray_hit.hit.Ng_x = RTCHitN_Ng_x(hit_n, P, i);
+            ray_hit.hit.Ng_y = RTCHitN_Ng_y(hit_n, P, i);
+            ray_hit.hit.Ng_z = RTCHitN_Ng_z(hit_n, P, i);
+            ray_hit.hit.u = RTCHitN_u(hit_n, P, i);
+            ray_hit.hit.v = RTCHitN_v(hit_n, P, i);
+            ray_hit.hit.primID = RTCHitN_primID(hit_n, P, i);
+            ray_hit.hit.geomID = RTCHitN_geomID(hit_n, P, i);
+            ray_hit.hit.instID[0] = RTCHitN_instID(hit_n, P, i, 0);
+            }
+        }
+    }
+    } // namespace detail
+
 /*! \param device Device to attach the raytracer to
  */
 Tracer::Tracer(std::shared_ptr<Device> device, unsigned int w, unsigned int h) : m_device(device)
@@ -30,6 +172,167 @@ void Tracer::resize(unsigned int w, unsigned int h)
 
     m_linear_out = std::shared_ptr<Array<RGBA<float>>>(new Array<RGBA<float>>(w, h));
     m_srgb_out = std::shared_ptr<Array<RGBA<unsigned char>>>(new Array<RGBA<unsigned char>>(w, h));
+    m_srgb_dirty = false;
+    clearRegion();
+    clearFrame();
+
+    if (m_aovs_enabled)
+        allocateAOVs();
+    }
+
+/*! \param enabled Set to true to enable the auxiliary output buffers
+
+    When enabled, renders record the distance, normal, surface color, geometry id, and primitive id
+    of the primary ray hit in each pixel. Disabling the buffers frees them.
+*/
+void Tracer::setAOVsEnabled(bool enabled)
+    {
+    m_aovs_enabled = enabled;
+    if (enabled)
+        {
+        allocateAOVs();
+        }
+    else
+        {
+        m_depth_out.reset();
+        m_normal_out.reset();
+        m_albedo_out.reset();
+        m_geometry_id_out.reset();
+        m_primitive_id_out.reset();
+        }
+    }
+
+/*! Allocate auxiliary output buffers that match the output buffer size and fill them with the
+    values for pixels where the primary ray misses.
+*/
+void Tracer::allocateAOVs()
+    {
+    const unsigned int w = m_linear_out->getW();
+    const unsigned int h = m_linear_out->getH();
+
+    m_depth_out = std::make_shared<Array<float>>(w, h);
+    m_normal_out = std::make_shared<Array<vec3<float>>>(w, h);
+    m_albedo_out = std::make_shared<Array<RGB<float>>>(w, h);
+    m_geometry_id_out = std::make_shared<Array<unsigned int>>(w, h);
+    m_primitive_id_out = std::make_shared<Array<unsigned int>>(w, h);
+
+    float* depth = m_depth_out->map();
+    unsigned int* geometry_id = m_geometry_id_out->map();
+    unsigned int* primitive_id = m_primitive_id_out->map();
+    for (size_t pixel = 0; pixel < size_t(w) * size_t(h); pixel++)
+        {
+        depth[pixel] = std::numeric_limits<float>::infinity();
+        geometry_id[pixel] = RTC_INVALID_GEOMETRY_ID;
+        primitive_id[pixel] = RTC_INVALID_GEOMETRY_ID;
+        }
+    }
+
+/*! \param scene The Scene being rendered
+    \param pixel Index of the output pixel
+    \param ray_hit The primary ray and its hit
+    \param hit_data Fresnel specific hit data
+
+    The normal faces the camera. Pixels where the primary ray misses have an infinite depth, zero
+    normal and albedo, and invalid ids.
+*/
+void Tracer::writeAOVs(Scene& scene,
+                       size_t pixel,
+                       const RTCRayHit& ray_hit,
+                       const FresnelHitData& hit_data)
+    {
+    const RTCRay& ray = ray_hit.ray;
+    const unsigned int geom_id = ray_hit.hit.geomID;
+    float depth = std::numeric_limits<float>::infinity();
+    vec3<float> n(0, 0, 0);
+    RGB<float> albedo(0, 0, 0);
+    unsigned int prim_id = RTC_INVALID_GEOMETRY_ID;
+
+    if (geom_id != RTC_INVALID_GEOMETRY_ID)
+        {
+        vec3<float> dir(ray.dir_x, ray.dir_y, ray.dir_z);
+        depth = ray.tfar * std::sqrt(dot(dir, dir));
+
+        n = vec3<float>(ray_hit.hit.Ng_x, ray_hit.hit.Ng_y, ray_hit.hit.Ng_z);
+        n /= std::sqrt(dot(n, n));
+        if (dot(n, dir) > 0)
+            n = -n;
+
+        // report the material or outline color depending on the distance to the edge
+        if (hit_data.d >= scene.getOutlineWidth(geom_id))
+            albedo = scene.getMaterial(geom_id).getColor(hit_data.shading_color);
+        else
+            albedo = scene.getOutlineMaterial(geom_id).getColor(hit_data.shading_color);
+
+        prim_id = ray_hit.hit.primID;
+        }
+
+    m_depth_out->map()[pixel] = depth;
+    m_normal_out->map()[pixel] = n;
+    m_albedo_out->map()[pixel] = albedo;
+    m_geometry_id_out->map()[pixel] = geom_id;
+    m_primitive_id_out->map()[pixel] = prim_id;
+    }
+
+/*! \param x0 First pixel in the x direction
+    \param y0 First pixel in the y direction
+    \param x1 One past the last pixel in the x direction
+    \param y1 One past the last pixel in the y direction
+
+    Subsequent renders trace and accumulate only the pixels x0 <= i < x1, y0 <= j < y1 and leave the
+    rest of the output buffer untouched.
+*/
+void Tracer::setRegion(unsigned int x0, unsigned int y0, unsigned int x1, unsigned int y1)
+    {
+    if (x0 >= x1 || y0 >= y1 || x1 > m_linear_out->getW() || y1 > m_linear_out->getH())
+        throw std::runtime_error("Invalid region");
+
+    m_region.x0 = x0;
+    m_region.x1 = x1;
+    m_region.y0 = y0;
+    m_region.y1 = y1;
+    }
+
+/*! Subsequent renders trace the whole output buffer.
+ */
+void Tracer::clearRegion()
+    {
+    m_region.x0 = 0;
+    m_region.x1 = m_linear_out->getW();
+    m_region.y0 = 0;
+    m_region.y1 = m_linear_out->getH();
+    }
+
+/*! \param width Width of the frame
+    \param height Height of the frame
+    \param x Location of the first pixel of the output buffer in the frame (x direction)
+    \param y Location of the first pixel of the output buffer in the frame (y direction)
+
+    Subsequent renders trace the output buffer as the window at (x, y) of a width x height image,
+   so that a small output buffer renders a tile of a large image. Random numbers depend on the
+   location in the frame, so tiles match the same pixels of a render of the whole frame.
+*/
+void Tracer::setFrame(unsigned int width, unsigned int height, unsigned int x, unsigned int y)
+    {
+    if (x + m_linear_out->getW() > width || y + m_linear_out->getH() > height)
+        throw std::runtime_error("Invalid frame");
+
+    m_frame_width = width;
+    m_frame_height = height;
+    m_frame_x = x;
+    m_frame_y = y;
+    }
+
+/*! \param seconds Time limit
+
+    Renders stop taking samples (and tracing tiles on the CPU) once *seconds* have elapsed since
+   this call. The time limit remains in effect until clearTimeLimit() is called.
+*/
+void Tracer::setTimeLimit(double seconds)
+    {
+    m_deadline = std::chrono::steady_clock::now()
+                 + std::chrono::duration_cast<std::chrono::steady_clock::duration>(
+                     std::chrono::duration<double>(seconds));
+    m_has_deadline = true;
     }
 
 /*! \param scene The Scene to render
@@ -42,20 +345,180 @@ void Tracer::render(std::shared_ptr<Scene> scene)
         throw std::runtime_error("Scene and Tracer devices do not match");
     }
 
+/*! \param c Linear color to convert
+
+    \returns The color in sRGB space, or the highlight warning color when highlight warnings are
+   enabled and *c* is too bright to represent.
+*/
+RGBA<unsigned char> Tracer::toSRGB(const RGBA<float>& c) const
+    {
+    RGB<float> color(c.r, c.g, c.b);
+    if (m_highlight_warning && (c.r > 1.0f || c.g > 1.0f || c.b > 1.0f))
+        color = m_highlight_warning_color;
+
+    return RGBA<unsigned char>(detail::srgb_table.convert(color.r),
+                               detail::srgb_table.convert(color.g),
+                               detail::srgb_table.convert(color.b),
+                               (unsigned char)(c.a * 255.0f + 0.5f));
+    }
+
+/*! Convert every pixel in the linear output buffer to sRGB in parallel. getSRGBOutputBuffer()
+    calls this when the linear buffer has changed since the last conversion.
+*/
+void Tracer::updateSRGBOutput()
+    {
+    RGBA<float>* linear_output = m_linear_out->map();
+    RGBA<unsigned char>* srgb_output = m_srgb_out->map();
+    const size_t n_pixels = m_linear_out->getW() * m_linear_out->getH();
+
+    m_device->getTBBArena()->execute([&] {
+        tbb::parallel_for(tbb::blocked_range<size_t>(0, n_pixels),
+                          [=](const tbb::blocked_range<size_t>& r) {
+                              for (size_t pixel = r.begin(); pixel != r.end(); ++pixel)
+                                  srgb_output[pixel] = toSRGB(linear_output[pixel]);
+                          });
+    });
+
+    m_linear_out->unmap();
+    m_srgb_out->unmap();
+    m_srgb_dirty = false;
+    }
+
+/*! \param scene Embree scene to trace
+    \param ray_hit The ray to trace, overwritten with the hit
+    \param hit_data Output hit data
+*/
+void Tracer::intersectRay(RTCScene scene, RTCRayHit& ray_hit, FresnelHitData& hit_data) const
+    {
+    FresnelRTCIntersectContext context;
+    rtcInitIntersectContext(&context.context);
+    context.hit_data = &hit_data;
+    ray_hit.ray.id = 0;
+    rtcIntersect1(scene, &context.context, &ray_hit);
+    }
+
+/*! \param scene Embree scene to trace
+    \param origin Origin of the ray
+    \param direction Direction of the ray
+
+    \returns True when the ray hits any primitive in the scene.
+*/
+bool Tracer::isOccluded(RTCScene scene,
+                        const vec3<float>& origin,
+                        const vec3<float>& direction) const
+    {
+    RTCIntersectContext context;
+    rtcInitIntersectContext(&context);
+
+    RTCRay ray;
+    ray.org_x = origin.x;
+    ray.org_y = origin.y;
+    ray.org_z = origin.z;
+    ray.dir_x = direction.x;
+    ray.dir_y = direction.y;
+    ray.dir_z = direction.z;
+    ray.tnear = 1e-3f;
+    ray.tfar = std::numeric_limits<float>::infinity();
+    ray.time = 0.0f;
+    ray.mask = -1;
+    ray.id = 0;
+    ray.flags = 0;
+
+    // Embree sets tfar to -inf when the ray is occluded
+    rtcOccluded1(scene, &context, &ray);
+    return ray.tfar < 0.0f;
+    }
+
+/*! \param scene Embree scene to trace
+    \param ray_hits Rays to trace, overwritten with the hits
+    \param hit_data Output hit data for each ray
+    \param n Number of rays
+
+    Trace the rays in packets of the configured packet size. Packets are effective when the rays
+   are coherent, such as the primary rays from neighboring pixels in a tile. The results are the
+   same as intersecting each ray with intersectRay.
+*/
+void Tracer::intersectRays(RTCScene scene,
+                           RTCRayHit* ray_hits,
+                           FresnelHitData* hit_data,
+                           unsigned int n) const
+    {
+    switch (m_packet_size)
+        {
+        case 4:
+        detail::intersect_packets<4, RTCRayHit4>(scene, ray_hits, hit_data, n);
+        break;
+        case 8:
+        detail::intersect_packets<8, RTCRayHit8>(scene, ray_hits, hit_data, n);
+        break;
+        case 16:
+        detail::intersect_packets<16, RTCRayHit16>(scene, ray_hits, hit_data, n);
+        break;
+        default:
+        for (unsigned int i = 0; i < n; i++)
+            intersectRay(scene, ray_hits[i], hit_data[i]);
+        }
+    }
+
+/*! \param scene Embree scene to trace
+    \param ray_hits Rays to trace, overwritten with the hits
+    \param hit_data Output hit data for each ray
+    \param n Number of rays
+
+    Trace the rays with Embree's stream API. Embree gathers rays from the stream into packets
+   internally, which is effective for large numbers of incoherent rays.
+*/
+void Tracer::intersectStream(RTCScene scene,
+                             RTCRayHit* ray_hits,
+                             FresnelHitData* hit_data,
+                             unsigned int n) const
+    {
+    for (unsigned int i = 0; i < n; i++)
+        ray_hits[i].ray.id = i;
+
+    FresnelRTCIntersectContext context;
+    rtcInitIntersectContext(&context.context);
+    context.hit_data = hit_data;
+    rtcIntersect1M(scene, &context.context, ray_hits, n, sizeof(RTCRayHit));
+    }
+
 /*! \param m Python module to export in
  */
 void export_Tracer(pybind11::module& m)
     {
     pybind11::class_<Tracer, std::shared_ptr<Tracer>>(m, "Tracer")
         .def(pybind11::init<std::shared_ptr<Device>, unsigned int, unsigned int>())
-        .def("render", &Tracer::render)
+        .def("render", &Tracer::render, pybind11::call_guard<pybind11::gil_scoped_release>())
         .def("resize", &Tracer::resize)
         .def("getSRGBOutputBuffer", &Tracer::getSRGBOutputBuffer)
         .def("getLinearOutputBuffer", &Tracer::getLinearOutputBuffer)
+        .def("setAOVsEnabled", &Tracer::setAOVsEnabled)
+        .def("getAOVsEnabled", &Tracer::getAOVsEnabled)
+        .def("getDepthBuffer", &Tracer::getDepthBuffer)
+        .def("getNormalBuffer", &Tracer::getNormalBuffer)
+        .def("getAlbedoBuffer", &Tracer::getAlbedoBuffer)
+        .def("getGeometryIDBuffer", &Tracer::getGeometryIDBuffer)
+        .def("getPrimitiveIDBuffer", &Tracer::getPrimitiveIDBuffer)
         .def("enableHighlightWarning", &Tracer::enableHighlightWarning)
         .def("disableHighlightWarning", &Tracer::disableHighlightWarning)
         .def("getSeed", &Tracer::getSeed)
-        .def("setSeed", &Tracer::setSeed);
+        .def("setSeed", &Tracer::setSeed)
+        .def("getPacketSize", &Tracer::getPacketSize)
+        .def("setPacketSize", &Tracer::setPacketSize)
+        .def("getTileSize", &Tracer::getTileSize)
+        .def("setTileSize", &Tracer::setTileSize)
+        .def("getGrainSize", &Tracer::getGrainSize)
+        .def("setGrainSize", &Tracer::setGrainSize)
+        .def("getTileOrder", &Tracer::getTileOrder)
+        .def("setTileOrder", &Tracer::setTileOrder)
+        .def("setRegion", &Tracer::setRegion)
+        .def("clearRegion", &Tracer::clearRegion)
+        .def("setFrame", &Tracer::setFrame)
+        .def("clearFrame", &Tracer::clearFrame)
+        .def("setCancelToken", &Tracer::setCancelToken)
+        .def("setTimeLimit", &Tracer::setTimeLimit)
+        .def("clearTimeLimit", &Tracer::clearTimeLimit)
+        .def("isStopRequested", &Tracer::isStopRequested);
     }
 
     } // namespace cpu
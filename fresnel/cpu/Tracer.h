@@ -5,14 +5,18 @@
 #define TRACER_H_
 
 #include "embree_platform.h"
+#include <chrono>
 #include <embree3/rtcore.h>
 #include <embree3/rtcore_ray.h>
 #include <pybind11/pybind11.h>
+#include <stdexcept>
 
 #include "Array.h"
 #include "Scene.h"
 #include "common/Camera.h"
+#include "common/CancelToken.h"
 #include "common/ColorMath.h"
+#include "common/Tile.h"
 
 namespace fresnel
     {
@@ -25,7 +29,8 @@ namespace cpu
     The output buffer is stored in two formats. *m_linear_out* store the ray traced output in a
    linear RGB color space. This buffer is suitable for tone mapping and averaging with other render
    output. *m_srgb_out* stores the output in the sRGB color space and in a 4 bytes per pixel format
-   suitable for direct use in image display.
+   suitable for direct use in image display. Derived classes render into *m_linear_out* and set
+   *m_srgb_dirty*. The sRGB buffer is converted from the linear buffer when it is next requested.
 
     The rendering methods themselves do nothing. Derived classes must implement them.
 */
@@ -45,8 +50,12 @@ class Tracer
     virtual void render(std::shared_ptr<Scene> scene);
 
     //! Get the SRGB output pixel buffer
+    /*! The sRGB buffer is derived from the linear buffer only when it is requested.
+     */
     virtual std::shared_ptr<Array<RGBA<unsigned char>>> getSRGBOutputBuffer()
         {
+        if (m_srgb_dirty)
+            updateSRGBOutput();
         return m_srgb_out;
         }
 
@@ -56,16 +65,57 @@ class Tracer
         return m_linear_out;
         }
 
+    //! Enable or disable the auxiliary output buffers
+    void setAOVsEnabled(bool enabled);
+
+    //! Test if the auxiliary output buffers are enabled
+    bool getAOVsEnabled() const
+        {
+        return m_aovs_enabled;
+        }
+
+    //! Get the depth output buffer
+    std::shared_ptr<Array<float>> getDepthBuffer()
+        {
+        return m_depth_out;
+        }
+
+    //! Get the normal output buffer
+    std::shared_ptr<Array<vec3<float>>> getNormalBuffer()
+        {
+        return m_normal_out;
+        }
+
+    //! Get the albedo output buffer
+    std::shared_ptr<Array<RGB<float>>> getAlbedoBuffer()
+        {
+        return m_albedo_out;
+        }
+
+    //! Get the geometry id output buffer
+    std::shared_ptr<Array<unsigned int>> getGeometryIDBuffer()
+        {
+        return m_geometry_id_out;
+        }
+
+    //! Get the primitive id output buffer
+    std::shared_ptr<Array<unsigned int>> getPrimitiveIDBuffer()
+        {
+        return m_primitive_id_out;
+        }
+
     //! Enable highlight warnings
     void enableHighlightWarning(const RGB<float>& color)
         {
         m_highlight_warning = true;
         m_highlight_warning_color = color;
+        m_srgb_dirty = true;
         }
 
     void disableHighlightWarning()
         {
         m_highlight_warning = false;
+        m_srgb_dirty = true;
         }
 
     //! Set the random number seed
@@ -80,13 +130,161 @@ class Tracer
         return m_seed;
         }
 
+    //! Set the number of primary rays traced together in a packet
+    void setPacketSize(unsigned int packet_size)
+        {
+        if (packet_size != 1 && packet_size != 4 && packet_size != 8 && packet_size != 16)
+            throw std::runtime_error("Invalid packet size");
+        m_packet_size = packet_size;
+        }
+
+    //! Get the number of primary rays traced together in a packet
+    unsigned int getPacketSize() const
+        {
+        return m_packet_size;
+        }
+
+    //! Set the width and height of the tiles that threads render
+    void setTileSize(unsigned int tile_size)
+        {
+        if (tile_size == 0)
+            throw std::runtime_error("Invalid tile size");
+        m_tile_size = tile_size;
+        }
+
+    //! Get the width and height of the tiles that threads render
+    unsigned int getTileSize() const
+        {
+        return m_tile_size;
+        }
+
+    //! Set the minimum number of tiles in each parallel task
+    void setGrainSize(unsigned int grain_size)
+        {
+        if (grain_size == 0)
+            throw std::runtime_error("Invalid grain size");
+        m_grain_size = grain_size;
+        }
+
+    //! Get the minimum number of tiles in each parallel task
+    unsigned int getGrainSize() const
+        {
+        return m_grain_size;
+        }
+
+    //! Set the order in which threads take tiles
+    void setTileOrder(TileOrder tile_order)
+        {
+        m_tile_order = tile_order;
+        }
+
+    //! Get the order in which threads take tiles
+    TileOrder getTileOrder() const
+        {
+        return m_tile_order;
+        }
+
+    //! Set the region of the output buffer to render
+    void setRegion(unsigned int x0, unsigned int y0, unsigned int x1, unsigned int y1);
+
+    //! Render the whole output buffer
+    void clearRegion();
+
+    //! Place the output buffer in a larger frame
+    void setFrame(unsigned int width, unsigned int height, unsigned int x, unsigned int y);
+
+    //! Render the output buffer as the whole frame
+    void clearFrame()
+        {
+        m_frame_width = 0;
+        }
+
+    //! Set the token that cancels renders
+    void setCancelToken(std::shared_ptr<CancelToken> cancel_token)
+        {
+        m_cancel_token = cancel_token;
+        }
+
+    //! Stop rendering after the given number of seconds
+    void setTimeLimit(double seconds);
+
+    //! Remove the time limit
+    void clearTimeLimit()
+        {
+        m_has_deadline = false;
+        }
+
+    //! Test if the current render should stop
+    bool isStopRequested() const
+        {
+        return (m_cancel_token && m_cancel_token->isCancelled())
+               || (m_has_deadline && std::chrono::steady_clock::now() >= m_deadline);
+        }
+
     protected:
+    //! Intersect a single ray with the scene
+    void intersectRay(RTCScene scene, RTCRayHit& ray_hit, FresnelHitData& hit_data) const;
+
+    //! Test if anything in the scene occludes a ray
+    bool isOccluded(RTCScene scene, const vec3<float>& origin, const vec3<float>& direction) const;
+
+    //! Intersect a batch of coherent rays with the scene
+    void intersectRays(RTCScene scene,
+                       RTCRayHit* ray_hits,
+                       FresnelHitData* hit_data,
+                       unsigned int n) const;
+
+    //! Intersect a stream of incoherent rays with the scene
+    void intersectStream(RTCScene scene,
+                         RTCRayHit* ray_hits,
+                         FresnelHitData* hit_data,
+                         unsigned int n) const;
+
+    //! Place a camera's output buffer in the frame set by setFrame()
+    void applyFrame(Camera& cam) const
+        {
+        if (m_frame_width != 0)
+            cam.setFrame(m_frame_width, m_frame_height, m_frame_x, m_frame_y);
+        }
+
+    //! Convert the linear output buffer to sRGB
+    void updateSRGBOutput();
+
+    //! Allocate the auxiliary output buffers
+    void allocateAOVs();
+
+    //! Record the auxiliary outputs of a primary ray
+    void
+    writeAOVs(Scene& scene, size_t pixel, const RTCRayHit& ray_hit, const FresnelHitData& hit_data);
+
+    //! Convert a linear pixel to sRGB, flagging highlights
+    RGBA<unsigned char> toSRGB(const RGBA<float>& c) const;
+
     std::shared_ptr<Device> m_device;                       //!< The device the Scene is attached to
     std::shared_ptr<Array<RGBA<float>>> m_linear_out;       //!< The output buffer (linear space)
     std::shared_ptr<Array<RGBA<unsigned char>>> m_srgb_out; //!< The output buffer (srgb space)
+    bool m_aovs_enabled = false; //!< True when the auxiliary output buffers are enabled
+    std::shared_ptr<Array<float>> m_depth_out;        //!< Distance to the primary ray hit
+    std::shared_ptr<Array<vec3<float>>> m_normal_out; //!< Surface normal at the primary ray hit
+    std::shared_ptr<Array<RGB<float>>> m_albedo_out;  //!< Surface color at the primary ray hit
+    std::shared_ptr<Array<unsigned int>> m_geometry_id_out;  //!< Geometry hit by the primary ray
+    std::shared_ptr<Array<unsigned int>> m_primitive_id_out; //!< Primitive hit by the primary ray
     bool m_highlight_warning; //!< Set to true to enable highlight warnings in sRGB output
     RGB<float> m_highlight_warning_color; //!< The highlight warning color
     unsigned int m_seed = 0;              //!< Random number seed
+    bool m_srgb_dirty = false; //!< True when the sRGB buffer is out of date with the linear buffer
+    unsigned int m_packet_size = 1;              //!< Number of primary rays to trace in each packet
+    unsigned int m_tile_size = 4;                //!< Width and height of the tiles
+    unsigned int m_grain_size = 1;               //!< Minimum number of tiles in a parallel task
+    TileOrder m_tile_order = TileOrder::hilbert; //!< Order in which threads take tiles
+    std::shared_ptr<CancelToken> m_cancel_token; //!< Token that cancels renders
+    bool m_has_deadline = false;                 //!< True when renders have a time limit
+    std::chrono::steady_clock::time_point m_deadline; //!< Time at which renders stop
+    Tile m_region;                                    //!< Region of the output buffer to render
+    unsigned int m_frame_width = 0;  //!< Width of the frame (0: the output buffer is the frame)
+    unsigned int m_frame_height = 0; //!< Height of the frame
+    unsigned int m_frame_x = 0;      //!< Location of the output buffer in the frame (x direction)
+    unsigned int m_frame_y = 0;      //!< Location of the output buffer in the frame (y direction)
     };
 
 //! Export Tracer to python
@@ -3,7 +3,10 @@
 
 #include "TracerDirect.h"
 #include "common/RayGen.h"
+#include <algorithm>
 #include <cmath>
+#include <pybind11/numpy.h>
+#include <pybind11/stl.h>
 #include <stdexcept>
 
 #include "tbb/parallel_for.h"
@@ -27,196 +30,519 @@ void TracerDirect::render(std::shared_ptr<Scene> scene)
     {
     std::shared_ptr<tbb::task_arena> arena = scene->getDevice()->getTBBArena();
 
-    const RGB<float> background_color = scene->getBackgroundColor();
-    const float background_alpha = scene->getBackgroundAlpha();
+    const Camera cam = makeCamera(scene->getCamera());
+    const Lights lights(scene->getLights(), cam);
+    Tracer::render(scene);
+
+    // update Embree data structures
+    rtcCommitScene(scene->getRTCScene());
+    m_device->checkError();
+
+    RGBA<float>* linear_output = m_linear_out->map();
+
+    // each tile pixel traces a block of pixel_scale x pixel_scale output pixels in the region
+    const unsigned int pixel_scale = m_pixel_scale;
+    const Tile region = m_region;
+    Tile blocks;
+    blocks.x0 = 0;
+    blocks.x1 = (region.x1 - region.x0 + pixel_scale - 1) / pixel_scale;
+    blocks.y0 = 0;
+    blocks.y1 = (region.y1 - region.y0 + pixel_scale - 1) / pixel_scale;
+
+    const std::vector<Tile> tiles = make_tiles(blocks, m_tile_size, m_tile_order);
+    const Tile* tile_list = tiles.data();
+    const unsigned int max_tile_pixels = m_tile_size * m_tile_size;
+
+    // keep the hit records of every block and sample for relight()
+    const unsigned int n_samples = m_aa_n * m_aa_n;
+    DirectHitRecord* hit_cache = nullptr;
+    if (m_hit_cache_enabled)
+        {
+        m_hit_cache.resize(size_t(blocks.x1) * size_t(blocks.y1) * n_samples);
+        hit_cache = m_hit_cache.data();
+        m_hit_cache_camera = cam;
+        m_hit_cache_region = region;
+        m_hit_cache_blocks = blocks;
+        m_hit_cache_pixel_scale = pixel_scale;
+        m_hit_cache_samples = n_samples;
+        m_hit_cache_w = m_linear_out->getW();
+        m_hit_cache_h = m_linear_out->getH();
+        }
+
+    arena->execute([&] {
+        parallel_for(
+            blocked_range<size_t>(0, tiles.size(), m_grain_size),
+            [=](const blocked_range<size_t>& r) {
+                // per tile buffers, reused for every tile in the range
+                std::vector<RTCRayHit> ray_hits(max_tile_pixels);
+                std::vector<FresnelHitData> hit_data(max_tile_pixels);
+                std::vector<RGBA<float>> output_avg(max_tile_pixels);
+                for (size_t tile = r.begin(); tile != r.end(); ++tile)
+                    {
+                    // stop when cancelled or out of time
+                    if (isStopRequested())
+                        break;
+
+                    const Tile& t = tile_list[tile];
+                    traceTile(*scene,
+                              cam,
+                              lights,
+                              region,
+                              pixel_scale,
+                              t,
+                              blocks.x1,
+                              hit_cache,
+                              m_aovs_enabled,
+                              ray_hits.data(),
+                              hit_data.data(),
+                              output_avg.data());
+
+                    // write the output pixels, filling each block with its sample
+                    unsigned int k = 0;
+                    for (unsigned int j = t.y0; j < t.y1; j++)
+                        for (unsigned int i = t.x0; i < t.x1; i++, k++)
+                            fillBlock(linear_output, region, pixel_scale, i, j, output_avg[k]);
+                    } // loop over tiles in this region
+            });   // end parallel loop over tiles
+    });           // end parallel arena
+
+    m_linear_out->unmap();
+
+    // a render stopped early leaves tiles out of the cache
+    m_hit_cache_valid = m_hit_cache_enabled && !isStopRequested();
 
+    // the sRGB output is converted when it is next requested
+    m_srgb_dirty = true;
+    }
+
+/*! \param user_camera Camera view parameters
+
+    \returns The camera to trace primary rays with
+*/
+Camera TracerDirect::makeCamera(UserCamera user_camera) const
+    {
     // direct tracers do not support depth of field
-    UserCamera user_camera = scene->getCamera();
     user_camera.f_stop = std::numeric_limits<float>::infinity();
 
     // disable aa sampling with m_aa_n is 1
     bool sample_aa = (m_aa_n != 1);
 
-    const Camera cam(user_camera, m_linear_out->getW(), m_linear_out->getH(), m_seed, sample_aa);
-    const Lights lights(scene->getLights(), cam);
+    Camera cam(user_camera, m_linear_out->getW(), m_linear_out->getH(), m_seed, sample_aa);
+    applyFrame(cam);
+    return cam;
+    }
+
+/*! \param scene The Scene to render
+    \param cam Camera to trace primary rays with
+    \param lights Lights in the camera frame
+    \param region Region of the output buffer being rendered
+    \param pixel_scale Width and height of the pixel blocks
+    \param tile Tile of pixel blocks to trace
+    \param blocks_width Number of pixel blocks in each row of the region
+    \param hit_cache Hit records of every block and sample to fill out (may be nullptr)
+    \param write_aovs Set to true to write the auxiliary outputs
+    \param ray_hits Scratch space for the rays of each block in the tile
+    \param hit_data Scratch space for the hit data of each block in the tile
+    \param output_avg [output] Average color of each block in the tile
+
+    Trace and shade all AA samples of every pixel block in the tile.
+*/
+void TracerDirect::traceTile(Scene& scene,
+                             const Camera& cam,
+                             const Lights& lights,
+                             const Tile& region,
+                             unsigned int pixel_scale,
+                             const Tile& tile,
+                             unsigned int blocks_width,
+                             DirectHitRecord* hit_cache,
+                             bool write_aovs,
+                             RTCRayHit* ray_hits,
+                             FresnelHitData* hit_data,
+                             RGBA<float>* output_avg)
+    {
+    const unsigned int width = m_linear_out->getW();
+    const unsigned int n_samples = m_aa_n * m_aa_n;
+    const unsigned int x0 = tile.x0;
+    const unsigned int x1 = tile.x1;
+    const unsigned int y0 = tile.y0;
+    const unsigned int y1 = tile.y1;
+
+    const unsigned int n_tile_pixels = (x1 - x0) * (y1 - y0);
+    for (unsigned int k = 0; k < n_tile_pixels; k++)
+        output_avg[k] = RGBA<float>(0, 0, 0, 0);
+
+    // loop over AA samples
+    for (unsigned int sample = 0; sample < n_samples; sample++)
+        {
+        // generate the rays for all pixels in the tile
+        unsigned int k = 0;
+        for (unsigned int j = y0; j < y1; j++)
+            for (unsigned int i = x0; i < x1; i++, k++)
+                {
+                RTCRayHit& ray_hit = ray_hits[k];
+                RTCRay& ray = ray_hit.ray;
+                vec3<float> org, dir;
+                // sample the center of the block
+                const unsigned int sample_x
+                    = std::min(region.x0 + i * pixel_scale + pixel_scale / 2, region.x1 - 1);
+                const unsigned int sample_y
+                    = std::min(region.y0 + j * pixel_scale + pixel_scale / 2, region.y1 - 1);
+                cam.generateRay(org, dir, sample_x, sample_y, sample);
+                ray.org_x = org.x;
+                ray.org_y = org.y;
+                ray.org_z = org.z;
+
+                ray.dir_x = dir.x;
+                ray.dir_y = dir.y;
+                ray.dir_z = dir.z;
+
+                ray.tnear = 0.0f;
+                ray.tfar = std::numeric_limits<float>::infinity();
+                ray.time = 0.0f;
+                ray.flags = 0;
+                ray.mask = -1;
+                ray_hit.hit.geomID = RTC_INVALID_GEOMETRY_ID;
+                ray_hit.hit.instID[0] = RTC_INVALID_GEOMETRY_ID;
+                }
+
+        // trace the rays into the scene
+        intersectRays(scene.getRTCScene(), ray_hits, hit_data, n_tile_pixels);
+
+        // record the auxiliary outputs of the first sample
+        if (sample == 0 && write_aovs)
+            {
+            k = 0;
+            for (unsigned int j = y0; j < y1; j++)
+                for (unsigned int i = x0; i < x1; i++, k++)
+                    {
+                    const unsigned int block_x0 = region.x0 + i * pixel_scale;
+                    const unsigned int block_x1 = std::min(block_x0 + pixel_scale, region.x1);
+                    const unsigned int block_y0 = region.y0 + j * pixel_scale;
+                    const unsigned int block_y1 = std::min(block_y0 + pixel_scale, region.y1);
+                    for (unsigned int py = block_y0; py < block_y1; py++)
+                        for (unsigned int px = block_x0; px < block_x1; px++)
+                            writeAOVs(scene, py * width + px, ray_hits[k], hit_data[k]);
+                    }
+            }
+
+        // accumulate importance sampled average
+        k = 0;
+        for (unsigned int j = y0; j < y1; j++)
+            for (unsigned int i = x0; i < x1; i++, k++)
+                {
+                const DirectHitRecord hit = makeHitRecord(ray_hits[k], hit_data[k]);
+                if (hit_cache)
+                    hit_cache[(size_t(j) * blocks_width + i) * n_samples + sample] = hit;
+                const RTCRay& ray = ray_hits[k].ray;
+                const vec3<float> dir(ray.dir_x, ray.dir_y, ray.dir_z);
+                output_avg[k] += shade(scene, lights, hit, -dir / std::sqrt(dot(dir, dir)));
+                }
+        } // end loop over AA samples
+
+    for (unsigned int k = 0; k < n_tile_pixels; k++)
+        output_avg[k] /= float(n_samples);
+    }
+
+/*! \param scene The Scene to render
+    \param cameras Camera of each view
+    \param output [output] sRGB image of each view, one output buffer sized image after another
+
+    Render the scene from every camera in one parallel loop over the tiles of all views, sharing
+    one commit of the scene. Each view renders the whole image like render() does. renderViews()
+    leaves the output buffer, auxiliary outputs, and hit cache unchanged.
+*/
+void TracerDirect::renderViews(std::shared_ptr<Scene> scene,
+                               const std::vector<UserCamera>& cameras,
+                               RGBA<unsigned char>* output)
+    {
+    std::shared_ptr<tbb::task_arena> arena = scene->getDevice()->getTBBArena();
     Tracer::render(scene);
 
     // update Embree data structures
     rtcCommitScene(scene->getRTCScene());
     m_device->checkError();
 
-    RGBA<float>* linear_output = m_linear_out->map();
-    RGBA<unsigned char>* srgb_output = m_srgb_out->map();
-
-    // for each pixel
-    const unsigned int height = m_linear_out->getH();
     const unsigned int width = m_linear_out->getW();
+    const unsigned int height = m_linear_out->getH();
+    const size_t n_pixels = size_t(width) * size_t(height);
+
+    std::vector<Camera> cams;
+    std::vector<Lights> view_lights;
+    for (const UserCamera& user_camera : cameras)
+        {
+        cams.push_back(makeCamera(user_camera));
+        view_lights.push_back(Lights(scene->getLights(), cams.back()));
+        }
+    const Camera* cam_list = cams.data();
+    const Lights* lights_list = view_lights.data();
+
+    Tile region;
+    region.x0 = 0;
+    region.x1 = width;
+    region.y0 = 0;
+    region.y1 = height;
+
+    const std::vector<Tile> tiles = make_tiles(region, m_tile_size, m_tile_order);
+    const Tile* tile_list = tiles.data();
+    const size_t n_tiles = tiles.size();
+    const unsigned int max_tile_pixels = m_tile_size * m_tile_size;
+
+    arena->execute([&] {
+        parallel_for(blocked_range<size_t>(0, n_tiles * cameras.size(), m_grain_size),
+                     [=](const blocked_range<size_t>& r) {
+                         // per tile buffers, reused for every tile in the range
+                         std::vector<RTCRayHit> ray_hits(max_tile_pixels);
+                         std::vector<FresnelHitData> hit_data(max_tile_pixels);
+                         std::vector<RGBA<float>> output_avg(max_tile_pixels);
+                         for (size_t item = r.begin(); item != r.end(); ++item)
+                             {
+                             const size_t view = item / n_tiles;
+                             const Tile& t = tile_list[item % n_tiles];
+                             traceTile(*scene,
+                                       cam_list[view],
+                                       lights_list[view],
+                                       region,
+                                       1,
+                                       t,
+                                       width,
+                                       nullptr,
+                                       false,
+                                       ray_hits.data(),
+                                       hit_data.data(),
+                                       output_avg.data());
+
+                             RGBA<unsigned char>* view_output = output + view * n_pixels;
+                             unsigned int k = 0;
+                             for (unsigned int j = t.y0; j < t.y1; j++)
+                                 for (unsigned int i = t.x0; i < t.x1; i++, k++)
+                                     view_output[j * width + i] = toSRGB(output_avg[k]);
+                             } // loop over tiles in this range
+                     });   // end parallel loop over the tiles of all views
+    });                    // end parallel arena
+    }
+
+/*! \param scene The Scene to render
+    \param cameras Camera of each view
+
+    \returns The sRGB image of each view (views, height, width, 4)
+*/
+pybind11::array_t<unsigned char> TracerDirect::renderViewsPy(std::shared_ptr<Scene> scene,
+                                                             const std::vector<UserCamera>& cameras)
+    {
+    const pybind11::ssize_t width = m_linear_out->getW();
+    const pybind11::ssize_t height = m_linear_out->getH();
+    pybind11::array_t<unsigned char> result(
+        std::vector<pybind11::ssize_t> {pybind11::ssize_t(cameras.size()), height, width, 4});
+    RGBA<unsigned char>* output = (RGBA<unsigned char>*)result.mutable_data();
+
+        {
+        pybind11::gil_scoped_release release;
+        renderViews(scene, cameras, output);
+        }
+
+    return result;
+    }
+
+/*! \param scene The Scene to shade
 
-    const unsigned int TILE_SIZE_X = 4;
-    const unsigned int TILE_SIZE_Y = 4;
-    const unsigned int numTilesX = (width + TILE_SIZE_X - 1) / TILE_SIZE_X;
-    const unsigned int numTilesY = (height + TILE_SIZE_Y - 1) / TILE_SIZE_Y;
+    Shade the hit records that the last render() kept with the current lights, materials, outline
+    widths, and background of \a scene, skipping ray generation and intersection. relight() produces
+    the same image as render() when only those properties change. Changes to the camera or the
+    geometry require a new render().
+
+    The hit records keep the primitive color at each hit, so relight() does not see changes to the
+   geometry colors. Writes to the colors skip the geometry update and do not invalidate the cache,
+   so the caller must call render() after changing them.
+
+    relight() calls render() when the hit cache is disabled or does not match the output buffer.
+*/
+void TracerDirect::relight(std::shared_ptr<Scene> scene)
+    {
+    if (!m_hit_cache_valid || m_hit_cache_w != m_linear_out->getW()
+        || m_hit_cache_h != m_linear_out->getH())
+        {
+        render(scene);
+        return;
+        }
+
+    Tracer::render(scene);
+
+    std::shared_ptr<tbb::task_arena> arena = scene->getDevice()->getTBBArena();
+    const Camera cam = m_hit_cache_camera;
+    const Lights lights(scene->getLights(), cam);
+    RGBA<float>* linear_output = m_linear_out->map();
+
+    const Tile region = m_hit_cache_region;
+    const Tile blocks = m_hit_cache_blocks;
+    const unsigned int pixel_scale = m_hit_cache_pixel_scale;
+    const unsigned int n_samples = m_hit_cache_samples;
+    const DirectHitRecord* hit_cache = m_hit_cache.data();
 
     arena->execute([&] {
-        parallel_for(
-            blocked_range<size_t>(0, numTilesX * numTilesY),
-            [=](const blocked_range<size_t>& r) {
-                for (size_t tile = r.begin(); tile != r.end(); ++tile)
-                    {
-                    const unsigned int tileY = tile / numTilesX;
-                    const unsigned int tileX = tile - tileY * numTilesX;
-                    const unsigned int x0 = tileX * TILE_SIZE_X;
-                    const unsigned int x1 = std::min(x0 + TILE_SIZE_X, width);
-                    const unsigned int y0 = tileY * TILE_SIZE_Y;
-                    const unsigned int y1 = std::min(y0 + TILE_SIZE_Y, height);
-
-                    for (unsigned int j = y0; j < y1; j++)
-                        for (unsigned int i = x0; i < x1; i++)
-                            {
-                            // create the ray generator for this pixel
-                            RayGen ray_gen(i, j, width, height, m_seed);
-
-                            // loop over AA samples
-                            RGBA<float> output_avg(0, 0, 0, 0);
-
-                            for (unsigned int sample = 0; sample < m_aa_n * m_aa_n; sample++)
-                                {
-                                // trace a ray into the scene
-                                RTCRayHit ray_hit;
-                                RTCRay& ray = ray_hit.ray;
-                                vec3<float> org, dir;
-                                cam.generateRay(org, dir, i, j, sample);
-                                ray.org_x = org.x;
-                                ray.org_y = org.y;
-                                ray.org_z = org.z;
-
-                                ray.dir_x = dir.x;
-                                ray.dir_y = dir.y;
-                                ray.dir_z = dir.z;
-
-                                ray.tnear = 0.0f;
-                                ray.tfar = std::numeric_limits<float>::infinity();
-                                ray.time = 0.0f;
-                                ray.flags = 0;
-                                ray.mask = -1;
-                                ray_hit.hit.geomID = RTC_INVALID_GEOMETRY_ID;
-                                ray_hit.hit.instID[0] = RTC_INVALID_GEOMETRY_ID;
-
-                                FresnelRTCIntersectContext context;
-                                rtcInitIntersectContext(&context.context);
-
-                                rtcIntersect1(scene->getRTCScene(), &context.context, &ray_hit);
-
-                                // determine the output pixel color
-                                RGB<float> c = background_color;
-                                float a = background_alpha;
-
-                                if (ray_hit.hit.geomID != RTC_INVALID_GEOMETRY_ID)
-                                    {
-                                    vec3<float> n(ray_hit.hit.Ng_x,
-                                                  ray_hit.hit.Ng_y,
-                                                  ray_hit.hit.Ng_z);
-                                    n /= std::sqrt(dot(n, n));
-                                    vec3<float> v = -dir / std::sqrt(dot(dir, dir));
-                                    Material m;
-
-                                    // apply the material color or outline color depending on
-                                    // the distance to the edge
-                                    if (context.d >= scene->getOutlineWidth(ray_hit.hit.geomID))
-                                        m = scene->getMaterial(ray_hit.hit.geomID);
-                                    else
-                                        m = scene->getOutlineMaterial(ray_hit.hit.geomID);
-
-                                    if (m.isSolid())
-                                        {
-                                        c = m.getColor(context.shading_color);
-                                        }
-                                    else
-                                        {
-                                        c = RGB<float>(0, 0, 0);
-                                        for (unsigned int light_id = 0; light_id < lights.N;
-                                             light_id++)
-                                            {
-                                            vec3<float> l = lights.direction[light_id];
-
-                                            // find the representative point, a vector pointing
-                                            // to the a point on the area light with a smallest
-                                            // angle to the reflection vector
-                                            vec3<float> r = -v + (2.0f * n * dot(n, v));
-
-                                            // find the closest point on the area light
-                                            float half_angle = lights.theta[light_id];
-                                            float cos_half_angle = cosf(half_angle);
-                                            float ldotr = dot(l, r);
-                                            if (ldotr < cos_half_angle)
-                                                {
-                                                vec3<float> a = cross(l, r);
-                                                a = a / sqrtf(dot(a, a));
-
-                                                // miss the light, need to rotate r by the
-                                                // difference in the angles about l cross r
-                                                quat<float> q = quat<float>::fromAxisAngle(
-                                                    a,
-                                                    -acosf(ldotr) + half_angle);
-                                                r = rotate(q, r);
-                                                }
-                                            else
-                                                {
-                                                // hit the light, no modification necessary to r
-                                                }
-
-                                            // only apply brdf when the light faces the surface
-                                            RGB<float> f_d;
-                                            float ndotl = dot(n, l);
-                                            if (ndotl >= 0.0f)
-                                                f_d = m.brdf_diffuse(l, v, n, context.shading_color)
-                                                      * ndotl;
-                                            else
-                                                f_d = RGB<float>(0.0f, 0.0f, 0.0f);
-
-                                            RGB<float> f_s;
-                                            if (dot(n, r) >= 0.0f)
-                                                {
-                                                f_s = m.brdf_specular(r,
-                                                                      v,
-                                                                      n,
-                                                                      context.shading_color,
-                                                                      half_angle)
-                                                      * dot(n, r);
-                                                }
-                                            else
-                                                f_s = RGB<float>(0.0f, 0.0f, 0.0f);
-
-                                            c += (f_d + f_s) * float(M_PI) * lights.color[light_id];
-                                            }
-                                        }
-
-                                    a = 1.0;
-                                    }
-
-                                // accumulate importance sampled average
-                                output_avg += RGBA<float>(c, a);
-                                } // end loop over AA samples
-
-                            // write the output pixel
-                            unsigned int pixel = j * width + i;
-                            RGBA<float> output_pixel = output_avg / float(m_aa_n * m_aa_n);
-
-                            linear_output[pixel] = output_pixel;
-                            if (!m_highlight_warning
-                                || (output_pixel.r <= 1.0f && output_pixel.g <= 1.0f
-                                    && output_pixel.b <= 1.0f))
-                                srgb_output[pixel] = sRGB(output_pixel);
-                            else
-                                srgb_output[pixel]
-                                    = sRGB(RGBA<float>(m_highlight_warning_color, output_pixel.a));
-                            } // end loop over pixels in the tile
-                    }         // loop over tiles in this region
-            });           // end parallel loop over tiles
-    });                   // end parallel arena
+        parallel_for(blocked_range<unsigned int>(0, blocks.y1),
+                     [=](const blocked_range<unsigned int>& r) {
+                         for (unsigned int j = r.begin(); j != r.end(); ++j)
+                             for (unsigned int i = 0; i < blocks.x1; i++)
+                                 {
+                                 const DirectHitRecord* hits
+                                     = hit_cache + (size_t(j) * blocks.x1 + i) * n_samples;
+                                 // the block samples its center, as in traceTile()
+                                 const unsigned int sample_x = std::min(
+                                     region.x0 + i * pixel_scale + pixel_scale / 2,
+                                     region.x1 - 1);
+                                 const unsigned int sample_y = std::min(
+                                     region.y0 + j * pixel_scale + pixel_scale / 2,
+                                     region.y1 - 1);
+
+                                 RGBA<float> output_avg(0, 0, 0, 0);
+                                 for (unsigned int sample = 0; sample < n_samples; sample++)
+                                     {
+                                     // regenerate the camera ray to find the view direction
+                                     vec3<float> org, dir;
+                                     if (hits[sample].geom_id != RTC_INVALID_GEOMETRY_ID)
+                                         {
+                                         cam.generateRay(org, dir, sample_x, sample_y, sample);
+                                         dir = -dir / std::sqrt(dot(dir, dir));
+                                         }
+                                     output_avg += shade(*scene, lights, hits[sample], dir);
+                                     }
+
+                                 fillBlock(linear_output,
+                                           region,
+                                           pixel_scale,
+                                           i,
+                                           j,
+                                           output_avg / float(n_samples));
+                                 }
+                     });
+    });
 
     m_linear_out->unmap();
-    m_srgb_out->unmap();
+
+    // the sRGB output is converted when it is next requested
+    m_srgb_dirty = true;
+    }
+
+/*! \param linear_output Output buffer
+    \param region Region of the output buffer being rendered
+    \param pixel_scale Width and height of the pixel blocks
+    \param i Block index in the x direction
+    \param j Block index in the y direction
+    \param c Color to write
+
+    Blocks on the right and bottom edges of the region are clipped to the region.
+*/
+void TracerDirect::fillBlock(RGBA<float>* linear_output,
+                             const Tile& region,
+                             unsigned int pixel_scale,
+                             unsigned int i,
+                             unsigned int j,
+                             const RGBA<float>& c) const
+    {
+    const unsigned int width = m_linear_out->getW();
+    const unsigned int block_x0 = region.x0 + i * pixel_scale;
+    const unsigned int block_x1 = std::min(block_x0 + pixel_scale, region.x1);
+    const unsigned int block_y0 = region.y0 + j * pixel_scale;
+    const unsigned int block_y1 = std::min(block_y0 + pixel_scale, region.y1);
+    for (unsigned int py = block_y0; py < block_y1; py++)
+        for (unsigned int px = block_x0; px < block_x1; px++)
+            linear_output[py * width + px] = c;
+    }
+
+/*! \param ray_hit The traced primary ray
+    \param hit_data Shading data at the hit
+
+    \returns The inputs to shade()
+*/
+DirectHitRecord TracerDirect::makeHitRecord(const RTCRayHit& ray_hit,
+                                            const FresnelHitData& hit_data) const
+    {
+    DirectHitRecord hit;
+    hit.geom_id = ray_hit.hit.geomID;
+    if (hit.geom_id == RTC_INVALID_GEOMETRY_ID)
+        return hit;
+
+    hit.n = vec3<float>(ray_hit.hit.Ng_x, ray_hit.hit.Ng_y, ray_hit.hit.Ng_z);
+    hit.n /= std::sqrt(dot(hit.n, hit.n));
+    hit.shading_color = hit_data.shading_color;
+    hit.d = hit_data.d;
+    return hit;
+    }
+
+/*! \param scene Scene the ray was traced in
+    \param lights Lights in the camera frame
+    \param hit Shading inputs of the primary ray
+    \param v Unit vector from the hit toward the camera
+
+    \returns The color and alpha of the ray
+*/
+RGBA<float> TracerDirect::shade(Scene& scene,
+                                const Lights& lights,
+                                const DirectHitRecord& hit,
+                                const vec3<float>& v) const
+    {
+    if (hit.geom_id == RTC_INVALID_GEOMETRY_ID)
+        return RGBA<float>(scene.getBackgroundColor(), scene.getBackgroundAlpha());
+
+    const vec3<float>& n = hit.n;
+    Material m;
+
+    // apply the material color or outline color depending on the distance to the edge
+    if (hit.d >= scene.getOutlineWidth(hit.geom_id))
+        m = scene.getMaterial(hit.geom_id);
+    else
+        m = scene.getOutlineMaterial(hit.geom_id);
+
+    if (m.isSolid())
+        return RGBA<float>(m.getColor(hit.shading_color), 1.0f);
+
+    RGB<float> c(0, 0, 0);
+    for (unsigned int light_id = 0; light_id < lights.N; light_id++)
+        {
+        vec3<float> l = lights.direction[light_id];
+
+        // find the representative point, a vector pointing to the a point on the area light with
+        // a smallest angle to the reflection vector
+        vec3<float> r = -v + (2.0f * n * dot(n, v));
+
+        // find the closest point on the area light
+        float half_angle = lights.theta[light_id];
+        float cos_half_angle = cosf(half_angle);
+        float ldotr = dot(l, r);
+        if (ldotr < cos_half_angle)
+            {
+            vec3<float> a = cross(l, r);
+            a = a / sqrtf(dot(a, a));
+
+            // miss the light, need to rotate r by the difference in the angles about l cross r
+            quat<float> q = quat<float>::fromAxisAngle(a, -acosf(ldotr) + half_angle);
+            r = rotate(q, r);
+            }
+        else
+            {
+            // hit the light, no modification necessary to r
+            }
+
+        // only apply brdf when the light faces the surface
+        RGB<float> f_d;
+        float ndotl = dot(n, l);
+        if (ndotl >= 0.0f)
+            f_d = m.brdf_diffuse(l, v, n, hit.shading_color) * ndotl;
+        else
+            f_d = RGB<float>(0.0f, 0.0f, 0.0f);
+
+        RGB<float> f_s;
+        if (dot(n, r) >= 0.0f)
+            {
+            f_s = m.brdf_specular(r, v, n, hit.shading_color, half_angle) * dot(n, r);
+            }
+        else
+            f_s = RGB<float>(0.0f, 0.0f, 0.0f);
+
+        c += (f_d + f_s) * float(M_PI) * lights.color[light_id];
+        }
+
+    return RGBA<float>(c, 1.0f);
     }
 
 /*! \param m Python module to export in
@@ -226,7 +552,15 @@ void export_TracerDirect(pybind11::module& m)
     pybind11::class_<TracerDirect, Tracer, std::shared_ptr<TracerDirect>>(m, "TracerDirect")
         .def(pybind11::init<std::shared_ptr<Device>, unsigned int, unsigned int>())
         .def("setAntialiasingN", &TracerDirect::setAntialiasingN)
-        .def("getAntialiasingN", &TracerDirect::getAntialiasingN);
+        .def("getAntialiasingN", &TracerDirect::getAntialiasingN)
+        .def("setPixelScale", &TracerDirect::setPixelScale)
+        .def("getPixelScale", &TracerDirect::getPixelScale)
+        .def("relight",
+             &TracerDirect::relight,
+             pybind11::call_guard<pybind11::gil_scoped_release>())
+        .def("setHitCacheEnabled", &TracerDirect::setHitCacheEnabled)
+        .def("getHitCacheEnabled", &TracerDirect::getHitCacheEnabled)
+        .def("renderViews", &TracerDirect::renderViewsPy);
     }
 
     } // namespace cpu
@@ -7,7 +7,9 @@
 #include "embree_platform.h"
 #include <embree3/rtcore.h>
 #include <embree3/rtcore_ray.h>
+#include <pybind11/numpy.h>
 #include <pybind11/pybind11.h>
+#include <vector>
 
 #include "Tracer.h"
 
@@ -15,6 +17,19 @@ namespace fresnel
     {
 namespace cpu
     {
+//! Shading inputs of a traced primary ray
+/*! TracerDirect shades primary rays from these records. It keeps them for every sample when the hit
+    cache is enabled so that relight() can shade the same hits with new lights and materials. The
+    records omit the view direction, which relight() recomputes from the cached camera.
+*/
+struct DirectHitRecord
+    {
+    vec3<float> n;            //!< Unit surface normal
+    RGB<float> shading_color; //!< Primitive color at the hit
+    float d;                  //!< Distance from the hit to the primitive edge
+    unsigned int geom_id;     //!< Geometry hit, RTC_INVALID_GEOMETRY_ID when the ray misses
+    };
+
 //! Basic Direct raytracer
 /*!
  */
@@ -29,6 +44,35 @@ class TracerDirect : public Tracer
     //! Render a scene
     virtual void render(std::shared_ptr<Scene> scene);
 
+    //! Shade the hits cached by the last render with the scene's current lights and materials
+    void relight(std::shared_ptr<Scene> scene);
+
+    //! Render the scene from many cameras
+    void renderViews(std::shared_ptr<Scene> scene,
+                     const std::vector<UserCamera>& cameras,
+                     RGBA<unsigned char>* output);
+
+    //! Render the scene from many cameras into a new numpy array
+    pybind11::array_t<unsigned char> renderViewsPy(std::shared_ptr<Scene> scene,
+                                                   const std::vector<UserCamera>& cameras);
+
+    //! Enable or disable the hit cache
+    void setHitCacheEnabled(bool enabled)
+        {
+        m_hit_cache_enabled = enabled;
+        if (!enabled)
+            {
+            m_hit_cache_valid = false;
+            std::vector<DirectHitRecord>().swap(m_hit_cache);
+            }
+        }
+
+    //! Test if the hit cache is enabled
+    bool getHitCacheEnabled() const
+        {
+        return m_hit_cache_enabled;
+        }
+
     //! Set the number of AA samples in each direction
     void setAntialiasingN(unsigned int n)
         {
@@ -41,9 +85,71 @@ class TracerDirect : public Tracer
         return m_aa_n;
         }
 
+    //! Set the width and height of the pixel blocks that share one primary ray
+    void setPixelScale(unsigned int pixel_scale)
+        {
+        if (pixel_scale == 0)
+            throw std::runtime_error("Invalid pixel scale");
+        m_pixel_scale = pixel_scale;
+        }
+
+    //! Get the width and height of the pixel blocks that share one primary ray
+    unsigned int getPixelScale() const
+        {
+        return m_pixel_scale;
+        }
+
     protected:
+    //! Make the camera to trace primary rays with
+    Camera makeCamera(UserCamera user_camera) const;
+
+    //! Trace and shade the pixel blocks in one tile
+    void traceTile(Scene& scene,
+                   const Camera& cam,
+                   const Lights& lights,
+                   const Tile& region,
+                   unsigned int pixel_scale,
+                   const Tile& tile,
+                   unsigned int blocks_width,
+                   DirectHitRecord* hit_cache,
+                   bool write_aovs,
+                   RTCRayHit* ray_hits,
+                   FresnelHitData* hit_data,
+                   RGBA<float>* output_avg);
+
+    //! Collect the shading inputs of a traced primary ray
+    DirectHitRecord makeHitRecord(const RTCRayHit& ray_hit, const FresnelHitData& hit_data) const;
+
+    //! Determine the color of a primary ray
+    RGBA<float> shade(Scene& scene,
+                      const Lights& lights,
+                      const DirectHitRecord& hit,
+                      const vec3<float>& v) const;
+
+    //! Fill a block of output pixels with a color
+    void fillBlock(RGBA<float>* linear_output,
+                   const Tile& region,
+                   unsigned int pixel_scale,
+                   unsigned int i,
+                   unsigned int j,
+                   const RGBA<float>& c) const;
+
     //! Number of AA samples in each direction
     unsigned int m_aa_n = 8;
+
+    //! Width and height of the pixel blocks that share one primary ray
+    unsigned int m_pixel_scale = 1;
+
+    bool m_hit_cache_enabled = false;         //!< True when render() keeps the hit records
+    bool m_hit_cache_valid = false;           //!< True when m_hit_cache matches the output buffer
+    std::vector<DirectHitRecord> m_hit_cache; //!< Hit records of every block and sample
+    Camera m_hit_cache_camera;                //!< Camera the cached rays were traced with
+    Tile m_hit_cache_region;                  //!< Region of the output the cache covers
+    Tile m_hit_cache_blocks;                  //!< Pixel blocks in the cached region
+    unsigned int m_hit_cache_pixel_scale = 1; //!< Pixel scale of the cached render
+    unsigned int m_hit_cache_samples = 0;     //!< Number of samples per block in the cache
+    unsigned int m_hit_cache_w = 0;           //!< Output buffer width of the cached render
+    unsigned int m_hit_cache_h = 0;           //!< Output buffer height of the cached render
     };
 
 //! Export TracerDirect to python
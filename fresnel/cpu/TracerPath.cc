@@ -4,7 +4,10 @@
 #include "TracerPath.h"
 #include "common/RayGen.h"
 #include "common/TracerPathMethods.h"
+#include <algorithm>
+#include <atomic>
 #include <cmath>
+#include <cstring>
 #include <stdexcept>
 
 #include "tbb/parallel_for.h"
@@ -15,13 +18,65 @@ namespace fresnel
     {
 namespace cpu
     {
+namespace
+    {
+//! Spread the lower 10 bits of x so that two zero bits separate each bit
+inline uint32_t spread_bits_3(uint32_t x)
+    {
+    x &= 0x3ff;
+    x = (x | (x << 16)) & 0x030000ff;
+    x = (x | (x << 8)) & 0x0300f00f;
+    x = (x | (x << 4)) & 0x030c30c3;
+    x = (x | (x << 2)) & 0x09249249;
+    return x;
+    }
+
+//! Quantize a coordinate to 10 bits
+/*! \param x Coordinate
+    \param lo Smallest coordinate
+    \param scale 1023 divided by the range of the coordinates (0 when the range is empty)
+*/
+inline uint32_t quantize_10(float x, float lo, float scale)
+    {
+    return std::min((uint32_t)((x - lo) * scale), 1023u);
+    }
+
+//! Compute the key that wavefront mode sorts a ray by
+/*! \param origin Ray origin
+    \param direction Ray direction
+    \param lo Lower corner of the box that holds the ray origins
+    \param scale 1023 divided by the size of the box in each direction
+
+    \returns The direction octant and a coarse bin of the direction in the high bits, followed by
+    the Morton code of the origin quantized to 10 bits per axis within the box. Sorted rays with
+    the same direction bin start near each other.
+*/
+inline uint64_t wavefront_sort_key(const vec3<float>& origin,
+                                   const vec3<float>& direction,
+                                   const vec3<float>& lo,
+                                   const vec3<float>& scale)
+    {
+    const vec3<float>& d = direction;
+    uint64_t key = (d.x < 0.0f) | (d.y < 0.0f) << 1 | (d.z < 0.0f) << 2;
+    key = key << 6 | std::min((unsigned int)(fabsf(d.x) * 4.0f), 3u) << 4
+          | std::min((unsigned int)(fabsf(d.y) * 4.0f), 3u) << 2
+          | std::min((unsigned int)(fabsf(d.z) * 4.0f), 3u);
+
+    const uint32_t morton = spread_bits_3(quantize_10(origin.x, lo.x, scale.x))
+                            | spread_bits_3(quantize_10(origin.y, lo.y, scale.y)) << 1
+                            | spread_bits_3(quantize_10(origin.z, lo.z, scale.z)) << 2;
+    return key << 30 | morton;
+    }
+
+    } // end anonymous namespace
+
 /*! \param device Device to attach the raytracer to
  */
 TracerPath::TracerPath(std::shared_ptr<Device> device,
                        unsigned int w,
                        unsigned int h,
                        unsigned int light_samples)
-    : Tracer(device, w, h), m_light_samples(light_samples)
+    : Tracer(device, w, h), m_light_samples(light_samples), m_statistics()
     {
     reset();
     }
@@ -32,6 +87,17 @@ void TracerPath::reset()
     {
     m_n_samples = 0;
     m_seed++;
+    m_converged = false;
+    m_srgb_dirty = false;
+
+        {
+        std::lock_guard<std::mutex> lock(m_statistics_mutex);
+        m_statistics = PathStatistics();
+        }
+
+    const size_t n_pixels = m_linear_out->getW() * m_linear_out->getH();
+    m_pixel_samples.assign(n_pixels, 0);
+    m_m2.assign(n_pixels, RGB<float>(0, 0, 0));
 
     RGBA<float>* linear_output = m_linear_out->map();
     memset((void*)linear_output,
@@ -46,14 +112,629 @@ void TracerPath::reset()
     m_srgb_out->unmap();
     }
 
+/*! \param x0 First pixel in the tile (x direction)
+    \param x1 Last pixel + 1 in the tile (x direction)
+    \param y0 First pixel in the tile (y direction)
+    \param y1 Last pixel + 1 in the tile (y direction)
+    \param width Width of the output buffer
+
+    \returns True when every pixel in the tile has converged to the target noise level.
+*/
+bool TracerPath::isTileConverged(unsigned int x0,
+                                 unsigned int x1,
+                                 unsigned int y0,
+                                 unsigned int y1,
+                                 unsigned int width) const
+    {
+    for (unsigned int j = y0; j < y1; j++)
+        for (unsigned int i = x0; i < x1; i++)
+            {
+            unsigned int pixel = j * width + i;
+            if (!path_tracer_converged(m_m2[pixel], m_pixel_samples[pixel], m_target_noise))
+                return false;
+            }
+
+    return true;
+    }
+
+/*! \returns The path statistics counted since the last reset
+ */
+PathStatistics TracerPath::getStatistics() const
+    {
+    std::lock_guard<std::mutex> lock(m_statistics_mutex);
+    return m_statistics;
+    }
+
+/*! \returns A tuple of copies of the mean (height, width, 4), the running sum of squared
+   differences from the mean (height, width, 3), and the number of samples (height, width) of
+   every pixel.
+*/
+pybind11::tuple TracerPath::getAccumulator() const
+    {
+    const pybind11::ssize_t width = m_linear_out->getW();
+    const pybind11::ssize_t height = m_linear_out->getH();
+    const size_t n_pixels = width * height;
+
+    pybind11::array_t<float> mean(std::vector<pybind11::ssize_t> {height, width, 4});
+    pybind11::array_t<float> m2(std::vector<pybind11::ssize_t> {height, width, 3});
+    pybind11::array_t<unsigned int> pixel_samples(std::vector<pybind11::ssize_t> {height, width});
+
+    memcpy(mean.mutable_data(), m_linear_out->map(), sizeof(RGBA<float>) * n_pixels);
+    m_linear_out->unmap();
+    memcpy(m2.mutable_data(), m_m2.data(), sizeof(RGB<float>) * n_pixels);
+    memcpy(pixel_samples.mutable_data(), m_pixel_samples.data(), sizeof(unsigned int) * n_pixels);
+
+    return pybind11::make_tuple(mean, m2, pixel_samples);
+    }
+
+/*! \param mean Mean of every pixel (height, width, 4)
+    \param m2 Running sum of squared differences from the mean of every pixel (height, width, 3)
+    \param pixel_samples Number of samples of every pixel (height, width)
+    \param n_samples Number of samples taken by the tracer that produced the accumulator
+
+    Combine the samples in the accumulator with the samples taken so far. The output is the mean of
+   all samples, as if one tracer had taken them all. The accumulator must come from a tracer with
+   the same output buffer size and a different seed.
+*/
+void TracerPath::mergeAccumulator(
+    pybind11::array_t<float, pybind11::array::c_style> mean,
+    pybind11::array_t<float, pybind11::array::c_style> m2,
+    pybind11::array_t<unsigned int, pybind11::array::c_style> pixel_samples,
+    unsigned int n_samples)
+    {
+    const pybind11::ssize_t width = m_linear_out->getW();
+    const pybind11::ssize_t height = m_linear_out->getH();
+
+    if (mean.ndim() != 3 || mean.shape(0) != height || mean.shape(1) != width
+        || mean.shape(2) != 4)
+        throw std::runtime_error("mean must have the shape of the output buffer");
+    if (m2.ndim() != 3 || m2.shape(0) != height || m2.shape(1) != width || m2.shape(2) != 3)
+        throw std::runtime_error("m2 must have the shape of the output buffer");
+    if (pixel_samples.ndim() != 2 || pixel_samples.shape(0) != height
+        || pixel_samples.shape(1) != width)
+        throw std::runtime_error("pixel_samples must have the shape of the output buffer");
+
+    const RGBA<float>* other_mean = (const RGBA<float>*)mean.data();
+    const RGB<float>* other_m2 = (const RGB<float>*)m2.data();
+    const unsigned int* other_pixel_samples = pixel_samples.data();
+    const size_t n_pixels = width * height;
+
+    RGBA<float>* linear_output = m_linear_out->map();
+    for (size_t pixel = 0; pixel < n_pixels; pixel++)
+        {
+        path_tracer_merge(linear_output[pixel],
+                          m_m2[pixel],
+                          m_pixel_samples[pixel],
+                          other_mean[pixel],
+                          other_m2[pixel],
+                          other_pixel_samples[pixel]);
+        }
+    m_linear_out->unmap();
+
+    m_n_samples += n_samples;
+    m_converged = false;
+
+    // the sRGB output is converted from the merged mean when it is next requested
+    m_srgb_dirty = true;
+    }
+
+/*! \param stats Statistics counted by one thread
+ */
+void TracerPath::addStatistics(const PathStatistics& stats)
+    {
+    std::lock_guard<std::mutex> lock(m_statistics_mutex);
+    m_statistics.samples += stats.samples;
+    m_statistics.paths += stats.paths;
+    m_statistics.path_length += stats.path_length;
+    m_statistics.max_path_length = std::max(m_statistics.max_path_length, stats.max_path_length);
+    m_statistics.rays += stats.rays;
+    }
+
+/*! \param scene The Scene to render
+    \param prd [input/output] Per ray data of the path
+    \param shadow Shadow rays requested by path_tracer_hit
+*/
+void TracerPath::traceShadowRays(Scene& scene, PRDpath& prd, const PathShadowRays& shadow) const
+    {
+    for (unsigned int r = 0; r < shadow.N; r++)
+        {
+        if (!isOccluded(scene.getRTCScene(), shadow.origin, shadow.direction[r]))
+            prd.result += shadow.contribution[r];
+        }
+    }
+
+/*! \param scene The Scene to render
+    \param i Pixel index in the x direction
+    \param j Pixel index in the y direction
+    \param cam Camera that places the output buffer in the frame
+    \param lights The lights (in scene coordinates)
+    \param n_samples Number of samples taken in this pixel, including this one (the first is 1)
+    \param ray_hit_initial The traced camera ray for this sample
+    \param hit_data_initial Hit data for the camera ray
+    \param stats [output] Statistics to add the paths to (may be nullptr)
+
+    \returns The color of one camera sample (averaged over the light samples).
+*/
+RGBA<float> TracerPath::samplePixel(Scene& scene,
+                                    unsigned int i,
+                                    unsigned int j,
+                                    const Camera& cam,
+                                    const Lights& lights,
+                                    unsigned int n_samples,
+                                    const RTCRayHit& ray_hit_initial,
+                                    const FresnelHitData& hit_data_initial,
+                                    PathStatistics* stats) const
+    {
+    const RGB<float> background_color = scene.getBackgroundColor();
+    const float background_alpha = scene.getBackgroundAlpha();
+
+    // create the ray generator for this pixel
+    RayGen ray_gen(cam.getFrameX(i),
+                   cam.getFrameY(j),
+                   cam.getFrameWidth(),
+                   cam.getFrameHeight(),
+                   m_seed,
+                   m_sampler);
+
+    // per ray data
+    PRDpath prd;
+    prd.result = RGB<float>(0, 0, 0);
+    prd.a = 1.0f;
+    PathShadowRays shadow;
+
+    // trace a path from the hit point into the scene m_light_samples times
+    for (prd.light_sample = 0; prd.light_sample < m_light_samples; prd.light_sample++)
+        {
+        prd.attenuation = RGB<float>(1.0f, 1.0f, 1.0f);
+        prd.done = false;
+        prd.bsdf_pdf = 0.0f;
+        prd.n_shadow_rays = 0;
+
+        for (prd.depth = 0;; prd.depth++)
+            {
+            RTCRayHit ray_hit;
+            FresnelHitData hit_data;
+            if (prd.depth == 0)
+                {
+                // the camera ray is traced by the caller
+                ray_hit = ray_hit_initial;
+                hit_data = hit_data_initial;
+                }
+            else
+                {
+                RTCRay& ray = ray_hit.ray;
+                ray.org_x = prd.origin.x;
+                ray.org_y = prd.origin.y;
+                ray.org_z = prd.origin.z;
+
+                ray.dir_x = prd.direction.x;
+                ray.dir_y = prd.direction.y;
+                ray.dir_z = prd.direction.z;
+
+                ray.tnear = 1e-3f;
+                ray.tfar = std::numeric_limits<float>::infinity();
+                ray.time = 0.0f;
+                ray.mask = -1;
+                ray.flags = 0;
+                ray_hit.hit.geomID = RTC_INVALID_GEOMETRY_ID;
+                ray_hit.hit.instID[0] = RTC_INVALID_GEOMETRY_ID;
+
+                // subsequent depth steps need to trace
+                intersectRay(scene.getRTCScene(), ray_hit, hit_data);
+                }
+
+            if (ray_hit.hit.geomID != RTC_INVALID_GEOMETRY_ID)
+                {
+                // call hit program
+                path_tracer_hit(
+                    prd,
+                    scene.getMaterial(ray_hit.hit.geomID),
+                    scene.getOutlineMaterial(ray_hit.hit.geomID),
+                    hit_data.d,
+                    scene.getOutlineWidth(ray_hit.hit.geomID),
+                    hit_data.shading_color,
+                    vec3<float>(ray_hit.hit.Ng_x, ray_hit.hit.Ng_y, ray_hit.hit.Ng_z),
+                    vec3<float>(ray_hit.ray.org_x, ray_hit.ray.org_y, ray_hit.ray.org_z),
+                    vec3<float>(ray_hit.ray.dir_x, ray_hit.ray.dir_y, ray_hit.ray.dir_z),
+                    ray_hit.ray.tfar,
+                    ray_gen,
+                    n_samples,
+                    m_light_samples,
+                    lights,
+                    m_light_sampling,
+                    m_max_depth,
+                    m_roulette_depth,
+                    shadow);
+                traceShadowRays(scene, prd, shadow);
+                }
+            else
+                {
+                // call miss program
+                path_tracer_miss(
+                    prd,
+                    background_color,
+                    background_alpha,
+                    m_light_samples,
+                    lights,
+                    vec3<float>(ray_hit.ray.dir_x, ray_hit.ray.dir_y, ray_hit.ray.dir_z));
+                }
+
+            // break out of the loop when done
+            if (prd.done)
+                break;
+            } // end depth loop
+
+        if (stats)
+            path_tracer_count_path(*stats, prd);
+        } // end light samples loop
+
+    if (stats)
+        {
+        // the paths share one camera ray
+        stats->samples++;
+        stats->rays++;
+        }
+
+    return RGBA<float>(prd.result / float(m_light_samples), prd.a);
+    }
+
+/*! \param scene The Scene to render
+    \param cam Camera that places the output buffer in the frame
+    \param tile Tile of the output buffer
+    \param pixels [output] Index of each pixel of the tile in the output buffer
+    \param n_samples [output] Number of samples taken in each pixel, including this one
+    \param ray_hits [output] The traced camera ray for each pixel
+    \param hit_data [output] Hit data for the camera rays
+
+    \returns The number of pixels in the tile.
+
+    Count the new sample in every pixel of the tile, trace the camera rays in packets, and record
+   the auxiliary outputs of the first sample in each pixel.
+*/
+unsigned int TracerPath::traceCameraRays(Scene& scene,
+                                         const Camera& cam,
+                                         const Tile& tile,
+                                         unsigned int* pixels,
+                                         unsigned int* n_samples,
+                                         RTCRayHit* ray_hits,
+                                         FresnelHitData* hit_data)
+    {
+    const unsigned int width = m_linear_out->getW();
+
+    unsigned int k = 0;
+    for (unsigned int j = tile.y0; j < tile.y1; j++)
+        for (unsigned int i = tile.x0; i < tile.x1; i++, k++)
+            {
+            // update number of samples in this pixel (the first sample is 1)
+            const unsigned int pixel = j * width + i;
+            pixels[k] = pixel;
+            n_samples[k] = ++m_pixel_samples[pixel];
+
+            RTCRayHit& ray_hit = ray_hits[k];
+            RTCRay& ray = ray_hit.ray;
+            vec3<float> org, dir;
+            cam.generateRay(org, dir, i, j, camera_sample_index(m_sampler, n_samples[k]));
+            ray.org_x = org.x;
+            ray.org_y = org.y;
+            ray.org_z = org.z;
+
+            ray.dir_x = dir.x;
+            ray.dir_y = dir.y;
+            ray.dir_z = dir.z;
+
+            ray.tnear = 1e-3f;
+            ray.tfar = std::numeric_limits<float>::infinity();
+            ray.time = 0.0f;
+            ray.mask = -1;
+            ray.flags = 0;
+            ray_hit.hit.geomID = RTC_INVALID_GEOMETRY_ID;
+            ray_hit.hit.instID[0] = RTC_INVALID_GEOMETRY_ID;
+            }
+
+    intersectRays(scene.getRTCScene(), ray_hits, hit_data, k);
+
+    if (m_aovs_enabled)
+        {
+        for (unsigned int m = 0; m < k; m++)
+            if (n_samples[m] == 1)
+                writeAOVs(scene, pixels[m], ray_hits[m], hit_data[m]);
+        }
+
+    return k;
+    }
+
+/*! \param scene The Scene to render
+    \param cam Camera that places the output buffer in the frame
+    \param lights The lights (in scene coordinates)
+    \param n Number of camera samples
+    \param pixels Index of the pixel of each camera sample in the output buffer
+    \param n_samples Number of samples taken in the pixel of each camera sample, including this one
+    \param ray_hits The traced camera rays
+    \param hit_data Hit data for the camera rays
+    \param output [output] The color of each camera sample
+    \param stats [output] Statistics to add the paths to (may be nullptr)
+
+    Follow the same paths as samplePixel, breadth first. Each pass gathers the rays of every active
+   path, sorts them by direction and origin so that similar rays are traced together, and traces
+   them with one call to intersectStream. The camera samples may come from any pixels, so the
+   caller gathers them from many tiles to make long streams. The random numbers depend only on the
+   pixel, sample, light sample, and depth so the paths are the same as those that samplePixel
+   follows.
+*/
+void TracerPath::sampleWavefront(Scene& scene,
+                                 const Camera& cam,
+                                 const Lights& lights,
+                                 unsigned int n,
+                                 const unsigned int* pixels,
+                                 const unsigned int* n_samples,
+                                 const RTCRayHit* ray_hits,
+                                 const FresnelHitData* hit_data,
+                                 RGBA<float>* output,
+                                 PathStatistics* stats) const
+    {
+    const RGB<float> background_color = scene.getBackgroundColor();
+    const float background_alpha = scene.getBackgroundAlpha();
+    const unsigned int width = m_linear_out->getW();
+
+    // create the ray generator for the pixel of camera sample k
+    auto make_ray_gen = [&](unsigned int k) {
+        return RayGen(cam.getFrameX(pixels[k] % width),
+                      cam.getFrameY(pixels[k] / width),
+                      cam.getFrameWidth(),
+                      cam.getFrameHeight(),
+                      m_seed,
+                      m_sampler);
+    };
+
+    // the result of each path, summed in light sample order at the end so that the output does not
+    // depend on the order that the paths complete
+    std::vector<RGB<float>> path_result(size_t(n) * m_light_samples, RGB<float>(0, 0, 0));
+
+    // active paths and the camera sample each belongs to
+    std::vector<PRDpath> paths;
+    std::vector<unsigned int> path_sample;
+    PathShadowRays shadow;
+    paths.reserve(size_t(n) * m_light_samples);
+    path_sample.reserve(size_t(n) * m_light_samples);
+
+    // start the paths at the camera ray hits
+    for (unsigned int k = 0; k < n; k++)
+        {
+        const RTCRayHit& ray_hit = ray_hits[k];
+        if (stats)
+            {
+            stats->samples++;
+            stats->rays++;
+            }
+
+        if (ray_hit.hit.geomID == RTC_INVALID_GEOMETRY_ID)
+            {
+            // the camera ray hit the background, there are no paths to follow
+            output[k] = RGBA<float>(background_color, background_alpha);
+            if (stats)
+                {
+                // count the paths that end at the camera ray as samplePixel does
+                stats->paths += m_light_samples;
+                stats->path_length += m_light_samples;
+                stats->max_path_length = std::max(stats->max_path_length, 1ull);
+                }
+            continue;
+            }
+
+        const RayGen ray_gen = make_ray_gen(k);
+
+        for (unsigned int light_sample = 0; light_sample < m_light_samples; light_sample++)
+            {
+            PRDpath prd;
+            prd.result = RGB<float>(0, 0, 0);
+            prd.a = 1.0f;
+            prd.attenuation = RGB<float>(1.0f, 1.0f, 1.0f);
+            prd.light_sample = light_sample;
+            prd.depth = 0;
+            prd.done = false;
+            prd.bsdf_pdf = 0.0f;
+            prd.n_shadow_rays = 0;
+
+            path_tracer_hit(prd,
+                            scene.getMaterial(ray_hit.hit.geomID),
+                            scene.getOutlineMaterial(ray_hit.hit.geomID),
+                            hit_data[k].d,
+                            scene.getOutlineWidth(ray_hit.hit.geomID),
+                            hit_data[k].shading_color,
+                            vec3<float>(ray_hit.hit.Ng_x, ray_hit.hit.Ng_y, ray_hit.hit.Ng_z),
+                            vec3<float>(ray_hit.ray.org_x, ray_hit.ray.org_y, ray_hit.ray.org_z),
+                            vec3<float>(ray_hit.ray.dir_x, ray_hit.ray.dir_y, ray_hit.ray.dir_z),
+                            ray_hit.ray.tfar,
+                            ray_gen,
+                            n_samples[k],
+                            m_light_samples,
+                            lights,
+                            m_light_sampling,
+                            m_max_depth,
+                            m_roulette_depth,
+                            shadow);
+            traceShadowRays(scene, prd, shadow);
+
+            if (prd.done)
+                {
+                path_result[size_t(k) * m_light_samples + light_sample] = prd.result;
+                if (stats)
+                    path_tracer_count_path(*stats, prd);
+                }
+            else
+                {
+                paths.push_back(prd);
+                path_sample.push_back(k);
+                }
+            }
+        }
+
+    // follow the active paths one bounce at a time
+    std::vector<unsigned int> order;
+    std::vector<uint64_t> sort_key;
+    std::vector<RTCRayHit> stream;
+    std::vector<FresnelHitData> stream_hit_data;
+    std::vector<PRDpath> next_paths;
+    std::vector<unsigned int> next_path_sample;
+
+    while (paths.size() > 0)
+        {
+        const unsigned int n_paths = paths.size();
+
+        // find the box that holds the ray origins
+        const float inf = std::numeric_limits<float>::infinity();
+        vec3<float> lo(inf, inf, inf);
+        vec3<float> hi(-inf, -inf, -inf);
+        for (unsigned int p = 0; p < n_paths; p++)
+            {
+            const vec3<float>& o = paths[p].origin;
+            lo = vec3<float>(std::min(lo.x, o.x), std::min(lo.y, o.y), std::min(lo.z, o.z));
+            hi = vec3<float>(std::max(hi.x, o.x), std::max(hi.y, o.y), std::max(hi.z, o.z));
+            }
+        const vec3<float> size = hi - lo;
+        const vec3<float> scale(size.x > 0.0f ? 1023.0f / size.x : 0.0f,
+                                size.y > 0.0f ? 1023.0f / size.y : 0.0f,
+                                size.z > 0.0f ? 1023.0f / size.z : 0.0f);
+
+        // sort the rays by direction, then by origin
+        sort_key.resize(n_paths);
+        order.resize(n_paths);
+        for (unsigned int p = 0; p < n_paths; p++)
+            {
+            sort_key[p] = wavefront_sort_key(paths[p].origin, paths[p].direction, lo, scale);
+            order[p] = p;
+            }
+        std::sort(order.begin(), order.end(), [&sort_key](unsigned int a, unsigned int b) {
+            return sort_key[a] < sort_key[b];
+        });
+
+        // gather the rays into a stream
+        stream.resize(n_paths);
+        stream_hit_data.resize(n_paths);
+        for (unsigned int m = 0; m < n_paths; m++)
+            {
+            PRDpath& prd = paths[order[m]];
+            prd.depth++;
+
+            RTCRay& ray = stream[m].ray;
+            ray.org_x = prd.origin.x;
+            ray.org_y = prd.origin.y;
+            ray.org_z = prd.origin.z;
+
+            ray.dir_x = prd.direction.x;
+            ray.dir_y = prd.direction.y;
+            ray.dir_z = prd.direction.z;
+
+            ray.tnear = 1e-3f;
+            ray.tfar = std::numeric_limits<float>::infinity();
+            ray.time = 0.0f;
+            ray.mask = -1;
+            ray.flags = 0;
+            stream[m].hit.geomID = RTC_INVALID_GEOMETRY_ID;
+            stream[m].hit.instID[0] = RTC_INVALID_GEOMETRY_ID;
+            }
+
+        intersectStream(scene.getRTCScene(), stream.data(), stream_hit_data.data(), n_paths);
+
+        // shade the hits and keep the paths that continue
+        next_paths.clear();
+        next_path_sample.clear();
+        for (unsigned int m = 0; m < n_paths; m++)
+            {
+            PRDpath& prd = paths[order[m]];
+            const unsigned int k = path_sample[order[m]];
+            const RTCRayHit& ray_hit = stream[m];
+
+            if (ray_hit.hit.geomID != RTC_INVALID_GEOMETRY_ID)
+                {
+                path_tracer_hit(
+                    prd,
+                    scene.getMaterial(ray_hit.hit.geomID),
+                    scene.getOutlineMaterial(ray_hit.hit.geomID),
+                    stream_hit_data[m].d,
+                    scene.getOutlineWidth(ray_hit.hit.geomID),
+                    stream_hit_data[m].shading_color,
+                    vec3<float>(ray_hit.hit.Ng_x, ray_hit.hit.Ng_y, ray_hit.hit.Ng_z),
+                    vec3<float>(ray_hit.ray.org_x, ray_hit.ray.org_y, ray_hit.ray.org_z),
+                    vec3<float>(ray_hit.ray.dir_x, ray_hit.ray.dir_y, ray_hit.ray.dir_z),
+                    ray_hit.ray.tfar,
+                    make_ray_gen(k),
+                    n_samples[k],
+                    m_light_samples,
+                    lights,
+                    m_light_sampling,
+                    m_max_depth,
+                    m_roulette_depth,
+                    shadow);
+                traceShadowRays(scene, prd, shadow);
+                }
+            else
+                {
+                path_tracer_miss(
+                    prd,
+                    background_color,
+                    background_alpha,
+                    m_light_samples,
+                    lights,
+                    vec3<float>(ray_hit.ray.dir_x, ray_hit.ray.dir_y, ray_hit.ray.dir_z));
+                }
+
+            if (prd.done)
+                {
+                path_result[size_t(k) * m_light_samples + prd.light_sample] = prd.result;
+                if (stats)
+                    path_tracer_count_path(*stats, prd);
+                }
+            else
+                {
+                next_paths.push_back(prd);
+                next_path_sample.push_back(k);
+                }
+            }
+
+        paths.swap(next_paths);
+        path_sample.swap(next_path_sample);
+        }
+
+    // average the light samples
+    for (unsigned int k = 0; k < n; k++)
+        {
+        if (ray_hits[k].hit.geomID == RTC_INVALID_GEOMETRY_ID)
+            continue;
+
+        RGB<float> result(0, 0, 0);
+        for (unsigned int light_sample = 0; light_sample < m_light_samples; light_sample++)
+            result += path_result[size_t(k) * m_light_samples + light_sample];
+        output[k] = RGBA<float>(result / float(m_light_samples), 1.0f);
+        }
+    }
+
 void TracerPath::render(std::shared_ptr<Scene> scene)
     {
-    std::shared_ptr<tbb::task_arena> arena = scene->getDevice()->getTBBArena();
+    renderSamples(scene, 1);
+    }
 
-    const RGB<float> background_color = scene->getBackgroundColor();
-    const float background_alpha = scene->getBackgroundAlpha();
+/*! \param scene The Scene to render
+    \param n Number of samples to take
+
+    Take *n* samples in every pixel with a single pass over the image. Each tile takes all of its
+   samples before moving on to the next. In wavefront mode, each thread instead takes one sample
+   in every tile of its range per pass and follows the paths of up to getWavefrontSize() camera
+   samples from many tiles together. Tiles stop sampling when isStopRequested(), so a cancelled
+   render may leave some tiles with fewer samples than others. getNumSamples() counts the samples
+   that the tiles actually take.
+*/
+void TracerPath::renderSamples(std::shared_ptr<Scene> scene, unsigned int n)
+    {
+    std::shared_ptr<tbb::task_arena> arena = scene->getDevice()->getTBBArena();
 
-    const Camera cam(scene->getCamera(), m_linear_out->getW(), m_linear_out->getH(), m_seed);
+    Camera cam(scene->getCamera(),
+               m_linear_out->getW(),
+               m_linear_out->getH(),
+               m_seed,
+               true,
+               m_sampler);
+    applyFrame(cam);
     const Lights lights(scene->getLights(), cam);
     Tracer::render(scene);
 
@@ -62,188 +743,178 @@ void TracerPath::render(std::shared_ptr<Scene> scene)
     m_device->checkError();
 
     RGBA<float>* linear_output = m_linear_out->map();
-    RGBA<unsigned char>* srgb_output = m_srgb_out->map();
-
-    // update number of samples (the first sample is 1)
-    m_n_samples++;
 
     // for each pixel
-    const unsigned int height = m_linear_out->getH();
     const unsigned int width = m_linear_out->getW();
 
-    const unsigned int TILE_SIZE_X = 4;
-    const unsigned int TILE_SIZE_Y = 4;
-    const unsigned int numTilesX = (width + TILE_SIZE_X - 1) / TILE_SIZE_X;
-    const unsigned int numTilesY = (height + TILE_SIZE_Y - 1) / TILE_SIZE_Y;
+    const std::vector<Tile> tiles = make_tiles(m_region, m_tile_size, m_tile_order);
+    const Tile* tile_list = tiles.data();
+    const unsigned int max_tile_pixels = m_tile_size * m_tile_size;
+
+    // a wavefront batch holds up to m_wavefront_size camera samples plus the last tile added
+    const unsigned int max_batch
+        = m_wavefront ? m_wavefront_size + max_tile_pixels : max_tile_pixels;
+
+    // count the tiles that have not converged
+    std::atomic<unsigned int> n_unconverged_tiles(0);
+
+    // count the samples actually taken, tiles stop early when they converge or are cancelled
+    std::atomic<unsigned int> max_pixel_samples(m_n_samples);
+
+    RGB<float>* m2 = m_m2.data();
+    const bool adaptive = m_target_noise > 0.0f;
 
     arena->execute([&] {
         parallel_for(
-            blocked_range<size_t>(0, numTilesX * numTilesY),
-            [=](const blocked_range<size_t>& r) {
-                for (size_t tile = r.begin(); tile != r.end(); ++tile)
+            blocked_range<size_t>(0, tiles.size(), m_grain_size),
+            [=, &n_unconverged_tiles, &max_pixel_samples](const blocked_range<size_t>& r) {
+                // per range buffers, reused for every tile in the range
+                std::vector<unsigned int> pixels(max_batch);
+                std::vector<RTCRayHit> ray_hits(max_batch);
+                std::vector<FresnelHitData> hit_data(max_batch);
+                std::vector<RGBA<float>> output_samples(max_batch);
+                std::vector<unsigned int> n_samples(max_batch);
+                PathStatistics stats = PathStatistics();
+                PathStatistics* stats_ptr = m_statistics_enabled ? &stats : nullptr;
+                unsigned int range_max_samples = 0;
+
+                // running average and variance using Welford's method. The variance
+                // determines when a pixel has converged in adaptive sampling.
+                auto accumulate = [&](unsigned int n_batch) {
+                    for (unsigned int k = 0; k < n_batch; k++)
+                        {
+                        const unsigned int pixel = pixels[k];
+                        path_tracer_accumulate(linear_output[pixel],
+                                               m2[pixel],
+                                               output_samples[k],
+                                               n_samples[k]);
+                        range_max_samples = std::max(range_max_samples, n_samples[k]);
+                        }
+                };
+
+                // follow the paths of the camera samples in the batch
+                auto sample_batch = [&](unsigned int n_batch) {
+                    sampleWavefront(*scene,
+                                    cam,
+                                    lights,
+                                    n_batch,
+                                    pixels.data(),
+                                    n_samples.data(),
+                                    ray_hits.data(),
+                                    hit_data.data(),
+                                    output_samples.data(),
+                                    stats_ptr);
+                    accumulate(n_batch);
+                };
+
+                if (m_wavefront)
+                    {
+                    // take one sample in every tile of the range per pass, so that each batch
+                    // gathers the camera samples of many tiles
+                    for (unsigned int sample = 0; sample < n && !isStopRequested(); sample++)
+                        {
+                        unsigned int n_batch = 0;
+                        for (size_t tile = r.begin(); tile != r.end(); ++tile)
+                            {
+                            const Tile& t = tile_list[tile];
+
+                            // adaptive sampling: stop sampling tiles that have converged
+                            if (adaptive && isTileConverged(t.x0, t.x1, t.y0, t.y1, width))
+                                continue;
+
+                            // stop when cancelled or out of time
+                            if (isStopRequested())
+                                break;
+
+                            n_batch += traceCameraRays(*scene,
+                                                       cam,
+                                                       t,
+                                                       &pixels[n_batch],
+                                                       &n_samples[n_batch],
+                                                       &ray_hits[n_batch],
+                                                       &hit_data[n_batch]);
+
+                            if (n_batch >= m_wavefront_size)
+                                {
+                                sample_batch(n_batch);
+                                n_batch = 0;
+                                }
+                            }
+
+                        if (n_batch > 0)
+                            sample_batch(n_batch);
+                        }
+                    }
+                else
                     {
-                    const unsigned int tileY = tile / numTilesX;
-                    const unsigned int tileX = tile - tileY * numTilesX;
-                    const unsigned int x0 = tileX * TILE_SIZE_X;
-                    const unsigned int x1 = std::min(x0 + TILE_SIZE_X, width);
-                    const unsigned int y0 = tileY * TILE_SIZE_Y;
-                    const unsigned int y1 = std::min(y0 + TILE_SIZE_Y, height);
-
-                    for (unsigned int j = y0; j < y1; j++)
-                        for (unsigned int i = x0; i < x1; i++)
+                    for (size_t tile = r.begin(); tile != r.end(); ++tile)
+                        {
+                        const Tile& t = tile_list[tile];
+
+                        // take all samples in this tile while the scene data it touches is in
+                        // cache
+                        for (unsigned int sample = 0; sample < n; sample++)
                             {
-                            // create the ray generator for this pixel
-                            RayGen ray_gen(i, j, width, height, m_seed);
-
-                            // per ray data
-                            PRDpath prd;
-                            prd.result = RGB<float>(0, 0, 0);
-                            prd.a = 1.0f;
-
-                            // trace the first ray into the scene
-                            RTCRayHit ray_hit_initial;
-                            RTCRay& ray_initial = ray_hit_initial.ray;
-
-                            vec3<float> org, dir;
-                            cam.generateRay(org, dir, i, j, m_n_samples);
-                            ray_initial.org_x = org.x;
-                            ray_initial.org_y = org.y;
-                            ray_initial.org_z = org.z;
-
-                            ray_initial.dir_x = dir.x;
-                            ray_initial.dir_y = dir.y;
-                            ray_initial.dir_z = dir.z;
-
-                            ray_initial.tnear = 1e-3f;
-                            ray_initial.tfar = std::numeric_limits<float>::infinity();
-                            ray_initial.time = 0.0f;
-                            ray_initial.mask = -1;
-                            ray_initial.flags = 0;
-                            ray_hit_initial.hit.geomID = RTC_INVALID_GEOMETRY_ID;
-                            ray_hit_initial.hit.instID[0] = RTC_INVALID_GEOMETRY_ID;
-
-                            FresnelRTCIntersectContext context;
-                            rtcInitIntersectContext(&context.context);
-
-                            rtcIntersect1(scene->getRTCScene(), &context.context, &ray_hit_initial);
-
-                            FresnelRTCIntersectContext context_initial = context;
-
-                            // trace a path from the hit point into the scene m_light_samples times
-                            for (prd.light_sample = 0; prd.light_sample < m_light_samples;
-                                 prd.light_sample++)
+                            // adaptive sampling: stop sampling tiles that have converged
+                            if (adaptive && isTileConverged(t.x0, t.x1, t.y0, t.y1, width))
+                                break;
+
+                            // stop when cancelled or out of time
+                            if (isStopRequested())
+                                break;
+
+                            const unsigned int n_tile_pixels = traceCameraRays(*scene,
+                                                                               cam,
+                                                                               t,
+                                                                               pixels.data(),
+                                                                               n_samples.data(),
+                                                                               ray_hits.data(),
+                                                                               hit_data.data());
+
+                            // follow the paths from each camera ray
+                            for (unsigned int k = 0; k < n_tile_pixels; k++)
                                 {
-                                prd.attenuation = RGB<float>(1.0f, 1.0f, 1.0f);
-                                prd.done = false;
-
-                                for (prd.depth = 0;; prd.depth++)
-                                    {
-                                    RTCRayHit ray_hit;
-                                    if (prd.depth == 0)
-                                        {
-                                        // the first hit is cached above
-                                        ray_hit = ray_hit_initial;
-                                        context = context_initial;
-                                        }
-                                    else
-                                        {
-                                        RTCRay& ray = ray_hit.ray;
-                                        ray.org_x = prd.origin.x;
-                                        ray.org_y = prd.origin.y;
-                                        ray.org_z = prd.origin.z;
-
-                                        ray.dir_x = prd.direction.x;
-                                        ray.dir_y = prd.direction.y;
-                                        ray.dir_z = prd.direction.z;
-
-                                        ray.tnear = 1e-3f;
-                                        ray.tfar = std::numeric_limits<float>::infinity();
-                                        ray.time = 0.0f;
-                                        ray.mask = -1;
-                                        ray.flags = 0;
-                                        ray_hit.hit.geomID = RTC_INVALID_GEOMETRY_ID;
-                                        ray_hit.hit.instID[0] = RTC_INVALID_GEOMETRY_ID;
-
-                                        // subsequent depth steps need to trace
-                                        context = FresnelRTCIntersectContext();
-                                        rtcInitIntersectContext(&context.context);
-
-                                        rtcIntersect1(scene->getRTCScene(),
-                                                      &context.context,
-                                                      &ray_hit);
-                                        }
-
-                                    if (ray_hit.hit.geomID != RTC_INVALID_GEOMETRY_ID)
-                                        {
-                                        // call hit program
-                                        path_tracer_hit(
-                                            prd,
-                                            scene->getMaterial(ray_hit.hit.geomID),
-                                            scene->getOutlineMaterial(ray_hit.hit.geomID),
-                                            context.d,
-                                            scene->getOutlineWidth(ray_hit.hit.geomID),
-                                            context.shading_color,
-                                            vec3<float>(ray_hit.hit.Ng_x,
-                                                        ray_hit.hit.Ng_y,
-                                                        ray_hit.hit.Ng_z),
-                                            vec3<float>(ray_hit.ray.org_x,
-                                                        ray_hit.ray.org_y,
-                                                        ray_hit.ray.org_z),
-                                            vec3<float>(ray_hit.ray.dir_x,
-                                                        ray_hit.ray.dir_y,
-                                                        ray_hit.ray.dir_z),
-                                            ray_hit.ray.tfar,
-                                            ray_gen,
-                                            m_n_samples,
-                                            m_light_samples);
-                                        }
-                                    else
-                                        {
-                                        // call miss program
-                                        path_tracer_miss(prd,
-                                                         background_color,
-                                                         background_alpha,
-                                                         m_light_samples,
-                                                         lights,
-                                                         vec3<float>(ray_hit.ray.dir_x,
-                                                                     ray_hit.ray.dir_y,
-                                                                     ray_hit.ray.dir_z));
-                                        }
-
-                                    // break out of the loop when done
-                                    if (prd.done)
-                                        break;
-                                    } // end depth loop
-                                }     // end light samples loop
-
-                            // take the current sample and compute the average with the previous
-                            // samples
-                            RGBA<float> output_sample(prd.result / float(m_light_samples), prd.a);
-
-                            // running average using Welford's method. Variance is not particularly
-                            // useful to users, so don't compute that.
-                            // (http://jonisalonen.com/2013/deriving-welfords-method-for-computing-variance/)
-                            unsigned int pixel = j * width + i;
-                            RGBA<float> old_mean = linear_output[pixel];
-                            linear_output[pixel]
-                                = old_mean + (output_sample - old_mean) / float(m_n_samples);
-
-                            // convert the current average output to sRGB
-                            RGBA<float> output_pixel = linear_output[pixel];
-                            if (!m_highlight_warning
-                                || (output_pixel.r <= 1.0f && output_pixel.g <= 1.0f
-                                    && output_pixel.b <= 1.0f))
-                                srgb_output[pixel] = sRGB(output_pixel);
-                            else
-                                srgb_output[pixel]
-                                    = sRGB(RGBA<float>(m_highlight_warning_color, output_pixel.a));
-                            } // end loop over pixels in a tile
-                    }         // end loop over tiles in this work unit
-            });           // end parallel loop over all tiles
-    });                   // end arena limited execution
+                                output_samples[k] = samplePixel(*scene,
+                                                                pixels[k] % width,
+                                                                pixels[k] / width,
+                                                                cam,
+                                                                lights,
+                                                                n_samples[k],
+                                                                ray_hits[k],
+                                                                hit_data[k],
+                                                                stats_ptr);
+                                }
+
+                            accumulate(n_tile_pixels);
+                            } // end loop over samples
+                        }     // end loop over tiles in this work unit
+                    }
+
+                for (size_t tile = r.begin(); tile != r.end(); ++tile)
+                    {
+                    const Tile& t = tile_list[tile];
+                    if (!(adaptive && isTileConverged(t.x0, t.x1, t.y0, t.y1, width)))
+                        n_unconverged_tiles++;
+                    }
+
+                if (stats_ptr)
+                    addStatistics(stats);
+
+                unsigned int current = max_pixel_samples;
+                while (current < range_max_samples
+                       && !max_pixel_samples.compare_exchange_weak(current, range_max_samples))
+                    {
+                    }
+            }); // end parallel loop over all tiles
+    });         // end arena limited execution
 
     m_linear_out->unmap();
-    m_srgb_out->unmap();
+
+    m_converged = (n_unconverged_tiles == 0);
+    m_n_samples = max_pixel_samples;
+
+    // the sRGB output is converted from the average when it is next requested
+    m_srgb_dirty = true;
     }
 
 /*! \param m Python module to export in
@@ -254,7 +925,30 @@ void export_TracerPath(pybind11::module& m)
         .def(pybind11::init<std::shared_ptr<Device>, unsigned int, unsigned int, unsigned int>())
         .def("getNumSamples", &TracerPath::getNumSamples)
         .def("reset", &TracerPath::reset)
-        .def("setLightSamples", &TracerPath::setLightSamples);
+        .def("setLightSamples", &TracerPath::setLightSamples)
+        .def("setTargetNoise", &TracerPath::setTargetNoise)
+        .def("getTargetNoise", &TracerPath::getTargetNoise)
+        .def("isConverged", &TracerPath::isConverged)
+        .def("setWavefront", &TracerPath::setWavefront)
+        .def("getWavefront", &TracerPath::getWavefront)
+        .def("setWavefrontSize", &TracerPath::setWavefrontSize)
+        .def("getWavefrontSize", &TracerPath::getWavefrontSize)
+        .def("setSampler", &TracerPath::setSampler)
+        .def("getSampler", &TracerPath::getSampler)
+        .def("setLightSampling", &TracerPath::setLightSampling)
+        .def("getLightSampling", &TracerPath::getLightSampling)
+        .def("setMaxDepth", &TracerPath::setMaxDepth)
+        .def("getMaxDepth", &TracerPath::getMaxDepth)
+        .def("setRouletteDepth", &TracerPath::setRouletteDepth)
+        .def("getRouletteDepth", &TracerPath::getRouletteDepth)
+        .def("setStatisticsEnabled", &TracerPath::setStatisticsEnabled)
+        .def("getStatisticsEnabled", &TracerPath::getStatisticsEnabled)
+        .def("getStatistics", &TracerPath::getStatistics)
+        .def("getAccumulator", &TracerPath::getAccumulator)
+        .def("mergeAccumulator", &TracerPath::mergeAccumulator)
+        .def("renderSamples",
+             &TracerPath::renderSamples,
+             pybind11::call_guard<pybind11::gil_scoped_release>());
     }
 
     } // namespace cpu
@@ -7,12 +7,19 @@
 #include "embree_platform.h"
 #include <embree3/rtcore.h>
 #include <embree3/rtcore_ray.h>
+#include <mutex>
+#include <pybind11/numpy.h>
 #include <pybind11/pybind11.h>
+#include <vector>
 
 #include "Tracer.h"
+#include "common/PathStatistics.h"
 
 namespace fresnel
     {
+struct PRDpath;
+struct PathShadowRays;
+
 namespace cpu
     {
 //! Path tracer
@@ -21,11 +28,19 @@ namespace cpu
    etc...).
 
     Every time render() is called, a sample is taken and the output updated to match the current
-   average. Many samples may be needed to obtain a converged image. Call reset() to clear the
-   current image and start a new sampling run. The Tracer does not know when the camera angle,
-   materials, or other properties of the scene have changed, so the caller must call reset()
-   whenever needed to start sampling a new view or changed scene (unless motion blur or other
-   multiple exposure techniques are the desired output).
+   average. renderSamples() takes many samples in a single call. Many samples may be needed to
+   obtain a converged image. Call reset() to clear the current image and start a new sampling run.
+   The Tracer does not know when the camera angle, materials, or other properties of the scene have
+   changed, so the caller must call reset() whenever needed to start sampling a new view or changed
+   scene (unless motion blur or other multiple exposure techniques are the desired output).
+
+    By default, TracerPath follows each path depth first. In wavefront mode, it follows the paths
+   of many camera samples from the tiles in a thread's range together: at each depth, it sorts the
+   active rays by direction and origin and traces them with Embree's stream API.
+
+    TracerPath tracks the number of samples and the running variance of every pixel. When a target
+   noise level is set, render() skips tiles where every pixel has converged to the target so that
+   the remaining samples are spent on the noisy regions of the image.
 */
 class TracerPath : public Tracer
     {
@@ -41,6 +56,9 @@ class TracerPath : public Tracer
     //! Render a scene
     virtual void render(std::shared_ptr<Scene> scene);
 
+    //! Render many samples of a scene
+    void renderSamples(std::shared_ptr<Scene> scene, unsigned int n);
+
     //! Reset the sampling
     virtual void reset();
 
@@ -48,8 +66,7 @@ class TracerPath : public Tracer
     virtual void resize(unsigned int w, unsigned int h)
         {
         Tracer::resize(w, h);
-        m_n_samples = 0;
-        m_seed++;
+        reset();
         }
 
     //! Get the number of samples taken
@@ -64,9 +81,188 @@ class TracerPath : public Tracer
         m_light_samples = light_samples;
         }
 
+    //! Set the target noise level for adaptive sampling
+    /*! \param target_noise Target standard error of the mean. Set to 0 to sample every pixel.
+     */
+    void setTargetNoise(float target_noise)
+        {
+        if (target_noise < 0.0f)
+            throw std::runtime_error("Invalid target noise");
+        m_target_noise = target_noise;
+        }
+
+    //! Get the target noise level
+    float getTargetNoise() const
+        {
+        return m_target_noise;
+        }
+
+    //! Test if every tile has converged
+    bool isConverged() const
+        {
+        return m_converged;
+        }
+
+    //! Set whether to trace secondary bounces in wavefront order
+    void setWavefront(bool wavefront)
+        {
+        m_wavefront = wavefront;
+        }
+
+    //! Get whether secondary bounces are traced in wavefront order
+    bool getWavefront() const
+        {
+        return m_wavefront;
+        }
+
+    //! Set the number of camera samples that wavefront mode follows together
+    void setWavefrontSize(unsigned int wavefront_size)
+        {
+        if (wavefront_size == 0)
+            throw std::runtime_error("Invalid wavefront size");
+        m_wavefront_size = wavefront_size;
+        }
+
+    //! Get the number of camera samples that wavefront mode follows together
+    unsigned int getWavefrontSize() const
+        {
+        return m_wavefront_size;
+        }
+
+    //! Set the sequence to draw camera, aperture, and bounce samples from
+    void setSampler(Sampler sampler)
+        {
+        m_sampler = sampler;
+        }
+
+    //! Get the sequence to draw camera, aperture, and bounce samples from
+    Sampler getSampler() const
+        {
+        return m_sampler;
+        }
+
+    //! Set whether to sample the lights directly at each hit
+    void setLightSampling(bool light_sampling)
+        {
+        m_light_sampling = light_sampling;
+        }
+
+    //! Get whether the lights are sampled directly at each hit
+    bool getLightSampling() const
+        {
+        return m_light_sampling;
+        }
+
+    //! Set the maximum number of surfaces a path may hit (0 is unlimited)
+    void setMaxDepth(unsigned int max_depth)
+        {
+        m_max_depth = max_depth;
+        }
+
+    //! Get the maximum number of surfaces a path may hit
+    unsigned int getMaxDepth() const
+        {
+        return m_max_depth;
+        }
+
+    //! Set the depth at which Russian roulette termination starts
+    void setRouletteDepth(unsigned int roulette_depth)
+        {
+        m_roulette_depth = roulette_depth;
+        }
+
+    //! Get the depth at which Russian roulette termination starts
+    unsigned int getRouletteDepth() const
+        {
+        return m_roulette_depth;
+        }
+
+    //! Set whether to count the paths traced
+    void setStatisticsEnabled(bool enabled)
+        {
+        m_statistics_enabled = enabled;
+        }
+
+    //! Get whether the paths traced are counted
+    bool getStatisticsEnabled() const
+        {
+        return m_statistics_enabled;
+        }
+
+    //! Get the path statistics counted since the last reset
+    PathStatistics getStatistics() const;
+
+    //! Get a copy of the accumulated samples
+    pybind11::tuple getAccumulator() const;
+
+    //! Merge accumulated samples into the output
+    void mergeAccumulator(pybind11::array_t<float, pybind11::array::c_style> mean,
+                          pybind11::array_t<float, pybind11::array::c_style> m2,
+                          pybind11::array_t<unsigned int, pybind11::array::c_style> pixel_samples,
+                          unsigned int n_samples);
+
     protected:
-    unsigned int m_n_samples;     //!< Number of samples taken since the last reset
+    unsigned int m_n_samples;     //!< Most samples taken in any pixel since the last reset
     unsigned int m_light_samples; //!< Number of light samples to take each render()
+    float m_target_noise = 0.0f;  //!< Target noise level for adaptive sampling (0 disables)
+
+    std::vector<unsigned int> m_pixel_samples; //!< Number of samples taken in each pixel
+    std::vector<RGB<float>> m_m2;              //!< Running sum of squared differences from the mean
+    bool m_converged = false;              //!< True when every tile converged in the last render()
+    bool m_wavefront = false;              //!< True to trace secondary bounces in wavefront order
+    unsigned int m_wavefront_size = 4096;  //!< Camera samples that wavefront mode follows together
+    Sampler m_sampler = Sampler::random;   //!< Sequence to draw samples from
+    bool m_light_sampling = false;         //!< True to sample the lights directly at each hit
+    unsigned int m_max_depth = 0;          //!< Maximum number of surfaces a path may hit (0: any)
+    unsigned int m_roulette_depth = 0;     //!< Depth at which Russian roulette starts
+    bool m_statistics_enabled = false;     //!< True to count the paths traced
+    PathStatistics m_statistics;           //!< Path statistics since the last reset
+    mutable std::mutex m_statistics_mutex; //!< Protects m_statistics
+
+    //! Add statistics counted by one thread to the totals
+    void addStatistics(const PathStatistics& stats);
+
+    //! Add the contribution of the unoccluded shadow rays to a path
+    void traceShadowRays(Scene& scene, PRDpath& prd, const PathShadowRays& shadow) const;
+
+    //! Follow the path of one camera ray in a pixel
+    RGBA<float> samplePixel(Scene& scene,
+                            unsigned int i,
+                            unsigned int j,
+                            const Camera& cam,
+                            const Lights& lights,
+                            unsigned int n_samples,
+                            const RTCRayHit& ray_hit_initial,
+                            const FresnelHitData& hit_data_initial,
+                            PathStatistics* stats) const;
+
+    //! Trace the camera rays of one sample in every pixel of a tile
+    unsigned int traceCameraRays(Scene& scene,
+                                 const Camera& cam,
+                                 const Tile& tile,
+                                 unsigned int* pixels,
+                                 unsigned int* n_samples,
+                                 RTCRayHit* ray_hits,
+                                 FresnelHitData* hit_data);
+
+    //! Follow the paths of many camera samples one bounce at a time
+    void sampleWavefront(Scene& scene,
+                         const Camera& cam,
+                         const Lights& lights,
+                         unsigned int n,
+                         const unsigned int* pixels,
+                         const unsigned int* n_samples,
+                         const RTCRayHit* ray_hits,
+                         const FresnelHitData* hit_data,
+                         RGBA<float>* output,
+                         PathStatistics* stats) const;
+
+    //! Test if all pixels in a tile have converged
+    bool isTileConverged(unsigned int x0,
+                         unsigned int x1,
+                         unsigned int y0,
+                         unsigned int y1,
+                         unsigned int width) const;
     };
 
 //! Export TracerDirect to python
@@ -7,25 +7,149 @@
 
 #include <embree3/rtcore.h>
 
-/*! Per the Embree documentation, this intersection context structure has the same data layout as
-   the one in Embree's header, with extra custom bits at the end.
-
-    The fresnel extensions are:
-
-    - *d*: The distance to the nearest edge, provided by intersection routines
+//! Fresnel specific data determined when a ray hits a primitive
+/*! - *d*: The distance to the nearest edge, provided by intersection routines
     - *shading_color*: The color of the primitive (or primitive subunit), provided by intersection
    routines
 */
+struct FresnelHitData
+    {
+    FresnelHitData() : d(std::numeric_limits<float>::max()) { }
 
+    float d;                           //!< Distance to the nearest edge
+    fresnel::RGB<float> shading_color; //!< shading color determined by which primitive the ray hits
+                                       //!< (or where on the primitive)
+    };
+
+/*! Per the Embree documentation, this intersection context structure has the same data layout as
+   the one in Embree's header, with extra custom bits at the end.
+
+    The fresnel extension is a pointer to one FresnelHitData slot per ray traced with the context.
+   Tracers set the ray *id* to the index of the slot the ray writes to: 0 for single rays, the lane
+   index for packets, and the position in the stream for ray streams.
+*/
 struct FresnelRTCIntersectContext
     {
-    FresnelRTCIntersectContext() : d(std::numeric_limits<float>::max()) { }
-
     RTCIntersectContext context;
 
     // ray extensions go here
-    float d;                           //!< Distance to the nearest edge
-    fresnel::RGB<float> shading_color; //!< shading color determined by which primitive the ray hits
-                                       //!< (or where on the primitive)
+    FresnelHitData* hit_data; //!< Hit data for each ray, indexed by ray id
     };
+
+//! Intersect every active ray passed to a user geometry callback
+/*! Embree calls user geometry intersection functions with N rays at a time, where N may be 1, 4, 8,
+   or 16 depending on how the rays are traced. fresnel_intersect_n loads each active ray into a
+   RTCRayHit, calls *intersect_ray* to test it against the primitive, and stores the result back
+   into the packet.
+
+    \param args Arguments to the intersect check
+    \param intersect_ray Function that intersects a single ray with primitive args->primID. It
+   updates the ray hit and sets the hit data when the ray hits the primitive closer than tfar.
+*/
+inline void fresnel_intersect_n(const struct RTCIntersectFunctionNArguments* args,
+                                void (*intersect_ray)(const struct RTCIntersectFunctionNArguments*,
+                                                      RTCRayHit&,
+                                                      FresnelHitData&))
+    {
+    FresnelRTCIntersectContext& context = *(FresnelRTCIntersectContext*)args->context;
+
+    if (args->N == 1)
+        {
+        RTCRayHit& rayhit = *(RTCRayHit*)args->rayhit;
+        float tfar = rayhit.ray.tfar;
+        intersect_ray(args, rayhit, context.hit_data[rayhit.ray.id]);
+        if (rayhit.ray.tfar < tfar)
+            rayhit.hit.instID[0] = context.context.instID[0];
+        return;
+        }
+
+    const unsigned int N = args->N;
+    RTCRayN* ray_n = RTCRayHitN_RayN(args->rayhit, N);
+    RTCHitN* hit_n = RTCRayHitN_HitN(args->rayhit, N);
+
+    for (unsigned int i = 0; i < N; i++)
+        {
+        if (args->valid[i] == 0)
+            continue;
+
+        RTCRayHit rayhit;
+        rayhit.ray.org_x = RTCRayN_org_x(ray_n, N, i);
+        rayhit.ray.org_y = RTCRayN_org_y(ray_n, N, i);
+        rayhit.ray.org_z = RTCRayN_org_z(ray_n, N, i);
+        rayhit.ray.tnear = RTCRayN_tnear(ray_n, N, i);
+        rayhit.ray.dir_x = RTCRayN_dir_x(ray_n, N, i);
+        rayhit.ray.dir_y = RTCRayN_dir_y(ray_n, N, i);
+        rayhit.ray.dir_z = RTCRayN_dir_z(ray_n, N, i);
+        rayhit.ray.tfar = RTCRayN_tfar(ray_n, N, i);
+        rayhit.ray.id = RTCRayN_id(ray_n, N, i);
+        rayhit.hit.Ng_x = RTCHitN_Ng_x(hit_n, N, i);
+        rayhit.hit.Ng_y = RTCHitN_Ng_y(hit_n, N, i);
+        rayhit.hit.Ng_z = RTCHitN_Ng_z(hit_n, N, i);
+        rayhit.hit.u = RTCHitN_u(hit_n, N, i);
+        rayhit.hit.v = RTCHitN_v(hit_n, N, i);
+
+        float tfar = rayhit.ray.tfar;
+        intersect_ray(args, rayhit, context.hit_data[rayhit.ray.id]);
+        if (rayhit.ray.tfar < tfar)
+            {
+            RTCRayN_tfar(ray_n, N, i) = rayhit.ray.tfar;
+            RTCHitN_Ng_x(hit_n, N, i) = rayhit.hit.Ng_x;
+            RTCHitN_Ng_y(hit_n, N, i) = rayhit.hit.Ng_y;
+            RTCHitN_Ng_z(hit_n, N, i) = rayhit.hit.Ng_z;
+            RTCHitN_u(hit_n, N, i) = rayhit.hit.u;
+            RTCHitN_v(hit_n, N, i) = rayhit.hit.v;
+            RTCHitN_primID(hit_n, N, i) = rayhit.hit.primID;
+            RTCHitN_geomID(hit_n, N, i) = rayhit.hit.geomID;
+            RTCHitN_instID(hit_n, N, i, 0) = context.context.instID[0];
+            }
+        }
+    }
+
+//! Test every active ray passed to a user geometry occlusion callback
+/*! Embree calls user geometry occlusion functions to trace shadow rays, which only need to know
+   if the ray hits any primitive between tnear and tfar. fresnel_occluded_n tests each active ray
+   with *intersect_ray* and sets tfar to -inf for the rays that hit the primitive, as Embree
+   requires. Occlusion tests discard the hit data.
+
+    \param args Arguments to the occlusion check
+    \param intersect_ray Function that intersects a single ray with primitive args->primID.
+*/
+inline void fresnel_occluded_n(const struct RTCOccludedFunctionNArguments* args,
+                               void (*intersect_ray)(const struct RTCIntersectFunctionNArguments*,
+                                                     RTCRayHit&,
+                                                     FresnelHitData&))
+    {
+    // the intersection routines only read the primitive and user data from the arguments
+    RTCIntersectFunctionNArguments intersect_args;
+    intersect_args.valid = args->valid;
+    intersect_args.geometryUserPtr = args->geometryUserPtr;
+    intersect_args.primID = args->primID;
+    intersect_args.context = args->context;
+    intersect_args.rayhit = nullptr;
+    intersect_args.N = args->N;
+    intersect_args.geomID = args->geomID;
+
+    const unsigned int N = args->N;
+    for (unsigned int i = 0; i < N; i++)
+        {
+        if (args->valid[i] == 0)
+            continue;
+
+        RTCRayHit rayhit;
+        rayhit.ray.org_x = RTCRayN_org_x(args->ray, N, i);
+        rayhit.ray.org_y = RTCRayN_org_y(args->ray, N, i);
+        rayhit.ray.org_z = RTCRayN_org_z(args->ray, N, i);
+        rayhit.ray.tnear = RTCRayN_tnear(args->ray, N, i);
+        rayhit.ray.dir_x = RTCRayN_dir_x(args->ray, N, i);
+        rayhit.ray.dir_y = RTCRayN_dir_y(args->ray, N, i);
+        rayhit.ray.dir_z = RTCRayN_dir_z(args->ray, N, i);
+        rayhit.ray.tfar = RTCRayN_tfar(args->ray, N, i);
+
+        FresnelHitData hit_data;
+        float tfar = rayhit.ray.tfar;
+        intersect_ray(&intersect_args, rayhit, hit_data);
+        if (rayhit.ray.tfar < tfar)
+            RTCRayN_tfar(args->ray, N, i) = -std::numeric_limits<float>::infinity();
+        }
+    }
 #endif
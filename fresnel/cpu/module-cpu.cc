@@ -1,6 +1,7 @@
 // Copyright (c) 2016-2020 The Regents of the University of Michigan
 // This file is part of the Fresnel project, released under the BSD 3-Clause License.
 
+#include "Denoise.h"
 #include "Device.h"
 #include "Geometry.h"
 #include "GeometryConvexPolyhedron.h"
@@ -34,4 +35,5 @@ PYBIND11_MODULE(_cpu, m)
     export_TracerDirect(m);
     export_TracerPath(m);
     export_Array(m);
+    export_Denoise(m);
     }
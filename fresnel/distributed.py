@@ -0,0 +1,477 @@
+# Copyright (c) 2016-2020 The Regents of the University of Michigan
+# This file is part of the Fresnel project, released under the BSD 3-Clause
+# License.
+
+"""Render one image on many workers.
+
+A `Coordinator` splits an image into tiles, hands the tiles to worker
+processes over sockets, and writes the finished tiles into one output buffer as
+they arrive. Workers may run on the same node or on other nodes of a cluster.
+Provide a function that builds the scene:
+
+.. code-block:: python
+
+    def make_scene(device):
+        scene = fresnel.Scene(device)
+        fresnel.geometry.Sphere(scene, position=position, radius=0.5)
+        scene.camera = fresnel.camera.Orthographic.fit(scene)
+        return scene
+
+    image = fresnel.distributed.render(make_scene,
+                                       w=16384,
+                                       h=16384,
+                                       samples=256,
+                                       processes=4)
+
+To render with workers on other nodes, start a `Coordinator` with an address
+the nodes can reach, and call `work` on each node with that address and the
+coordinator's `authkey <Coordinator.authkey>`:
+
+.. code-block:: python
+
+    # on the coordinating node
+    coordinator = fresnel.distributed.Coordinator(
+        make_scene, w=16384, h=16384, address=('0.0.0.0', 6000),
+        authkey=b'secret')
+    image = coordinator.run()
+
+    # on each worker node
+    fresnel.distributed.work(('head-node', 6000), authkey=b'secret')
+
+Workers take the next task from the coordinator as soon as they finish the
+previous one, so fast workers take more tiles than slow ones and the load
+balances itself. When a worker disconnects, the coordinator gives its tile to
+another worker.
+
+Every worker builds the scene with ``make_scene`` and traces each tile with a
+tracer the size of the tile that renders the tile's window of the full image, so
+the time and memory of each task scale with the tile, not the image. Tiles use
+the same random numbers as the same pixels of a single render of the image.
+Run one worker per node and let its `Device <fresnel.Device>` use all of the
+node's cores.
+"""
+
+import multiprocessing
+import multiprocessing.connection
+import os
+import pickle
+import threading
+import traceback
+
+import numpy
+
+from . import tracer
+from . import util
+from .animate import _worker_threads
+
+
+class _TileRenderer(object):
+    """Render tiles of an image with one scene.
+
+    Each tile renders in a tracer the size of the tile, placed in the frame of
+    the full image. The renderer keeps one tracer for each tile size.
+    """
+
+    def __init__(self, device, make_scene, w, h, method, light_samples):
+        self.device = device
+        self.scene = make_scene(device)
+        self.w = w
+        self.h = h
+        self.method = method
+        self.light_samples = light_samples
+        self.tracers = {}
+
+    def _get_tracer(self, w, h):
+        """Get the tracer for tiles of size w x h."""
+        key = (w, h)
+        if key not in self.tracers:
+            if self.method == 'preview':
+                self.tracers[key] = tracer.Preview(self.device, w=w, h=h)
+            else:
+                self.tracers[key] = tracer.Path(self.device, w=w, h=h)
+        return self.tracers[key]
+
+    def __call__(self, region, seed, samples):
+        """Render one tile and return a copy of its linear output."""
+        x0, y0, x1, y1 = region
+        tile_tracer = self._get_tracer(x1 - x0, y1 - y0)
+        tile_tracer._tracer.setFrame(self.w, self.h, x0, y0)
+
+        if self.method == 'preview':
+            tile_tracer.seed = seed
+            tile_tracer.render(self.scene)
+        else:
+            tile_tracer.reset()
+            tile_tracer.seed = seed
+            tile_tracer.sample(self.scene,
+                               samples=samples,
+                               reset=False,
+                               light_samples=self.light_samples)
+        return tile_tracer.linear_output[:]
+
+
+def work(address, authkey, device=None, mode='auto', n=None):
+    """Render tiles for a `Coordinator`.
+
+    Args:
+        address (tuple[str, int]): Address of the coordinator.
+        authkey (bytes): Authentication key of the coordinator.
+        device (`Device <fresnel.Device>`): Device to render on. ``None``
+            creates a new device with *mode* and *n*.
+        mode (str): Mode of the device that `work` creates.
+        n (int): Number of threads of the device that `work` creates.
+
+    Returns:
+        int: The number of tasks rendered.
+
+    `work` connects to the coordinator, builds the scene, and renders the
+    tasks that the coordinator assigns until the image is complete.
+    """
+    if device is None:
+        from . import Device
+        device = Device(mode=mode, n=n)
+
+    n_tasks = 0
+    with multiprocessing.connection.Client(address,
+                                           authkey=authkey) as connection:
+        job = connection.recv_bytes()
+        renderer = None
+
+        while True:
+            task = connection.recv()
+            if task is None:
+                break
+
+            try:
+                if renderer is None:
+                    renderer = _TileRenderer(device, *pickle.loads(job))
+                result = (True, renderer(*task))
+            except Exception:
+                result = (False, traceback.format_exc())
+
+            connection.send(result)
+            if not result[0]:
+                break
+            n_tasks += 1
+
+    return n_tasks
+
+
+class Coordinator(object):
+    """Coordinate workers that render tiles of one image.
+
+    Args:
+        make_scene (callable): Function that builds the scene as
+            ``make_scene(device)`` and returns the `Scene <fresnel.Scene>`.
+        w (int): Output image width (in pixels).
+        h (int): Output image height (in pixels).
+        method (str): ``'preview'`` to render with `tracer.Preview
+            <fresnel.tracer.Preview>` or ``'path'`` to render with `tracer.Path
+            <fresnel.tracer.Path>`.
+        samples (int): Number of samples per pixel with ``method='path'``.
+        light_samples (int): Number of light samples with ``method='path'``.
+        tile_size (int): Width and height of the tiles (in pixels).
+        sample_split (int): Number of tasks to split the samples of each tile
+            into with ``method='path'``.
+        seed (int): Random number seed.
+        address (tuple[str, int]): Address to listen for workers on. The
+            default listens on a free port of the local host.
+        authkey (bytes): Key that workers must present to connect. ``None``
+            generates a random key.
+
+    *make_scene* must be picklable (for example, a module level function), as
+    the coordinator sends it to every worker.
+
+    With *sample_split*, each task takes ``samples // sample_split`` of the
+    samples of a tile with a different seed, and the coordinator averages the
+    tasks of each tile. Split the samples to keep more workers busy than there
+    are tiles.
+    """
+
+    def __init__(self,
+                 make_scene,
+                 w,
+                 h,
+                 method='path',
+                 samples=64,
+                 light_samples=1,
+                 tile_size=256,
+                 sample_split=1,
+                 seed=0,
+                 address=('localhost', 0),
+                 authkey=None):
+        if method not in ('preview', 'path'):
+            raise ValueError("Invalid method: " + str(method))
+        if tile_size < 1:
+            raise ValueError("tile_size must be at least 1")
+        if method == 'preview':
+            sample_split = 1
+        if sample_split < 1 or sample_split > max(samples, 1):
+            raise ValueError("sample_split must be between 1 and samples")
+
+        if authkey is None:
+            authkey = os.urandom(32)
+
+        self._job = pickle.dumps((make_scene, w, h, method, light_samples))
+        self._listener = multiprocessing.connection.Listener(address,
+                                                             authkey=authkey)
+        self._authkey = authkey
+
+        # tasks are (region, seed, samples); the tasks of each tile are
+        # consecutive so that tiles complete in order
+        self._tasks = []
+        for y0 in range(0, h, tile_size):
+            for x0 in range(0, w, tile_size):
+                region = (x0, y0, min(x0 + tile_size, w),
+                          min(y0 + tile_size, h))
+                for i in range(sample_split):
+                    n = samples // sample_split
+                    if i < samples % sample_split:
+                        n += 1
+                    self._tasks.append((region, seed + i, n))
+
+        self._pending = list(reversed(range(len(self._tasks))))
+        self._tile_samples = {}
+        self._n_done = 0
+        self._error = None
+        self._condition = threading.Condition()
+        self._accept_thread = None
+        self._linear_output = numpy.zeros((h, w, 4), dtype=numpy.float32)
+
+    @property
+    def address(self):
+        """tuple[str, int]: Address that workers connect to."""
+        return self._listener.address
+
+    @property
+    def authkey(self):
+        """bytes: Key that workers present to connect."""
+        return self._authkey
+
+    @property
+    def linear_output(self):
+        """``(H, W, 4)`` `numpy.ndarray` of ``numpy.float32``: The image in\
+            linear color space.
+
+        Tiles appear in `linear_output` as workers finish them.
+        """
+        return self._linear_output
+
+    def _accept(self):
+        """Accept worker connections until the image is complete."""
+        while True:
+            try:
+                connection = self._listener.accept()
+            except (OSError, EOFError, multiprocessing.AuthenticationError):
+                connection = None
+
+            with self._condition:
+                if self._done():
+                    if connection is not None:
+                        connection.close()
+                    return
+
+            if connection is not None:
+                threading.Thread(target=self._serve,
+                                 args=(connection,),
+                                 daemon=True).start()
+
+    def _done(self):
+        """Test if the image is complete (call with the lock held)."""
+        return self._n_done == len(self._tasks) or self._error is not None
+
+    def _next_task(self):
+        """Wait for a task to assign, or return None when done."""
+        with self._condition:
+            while not self._pending and not self._done():
+                self._condition.wait()
+
+            if self._done():
+                return None
+            return self._pending.pop()
+
+    def _serve(self, connection):
+        """Assign tasks to one worker until the image is complete."""
+        index = None
+        try:
+            connection.send_bytes(self._job)
+            while True:
+                index = self._next_task()
+                if index is None:
+                    connection.send(None)
+                    return
+
+                connection.send(self._tasks[index])
+                ok, result = connection.recv()
+                if not ok:
+                    with self._condition:
+                        self._error = result
+                        self._condition.notify_all()
+                    index = None
+                    return
+
+                self._finish(index, result)
+                index = None
+        except (OSError, EOFError):
+            pass
+        finally:
+            # give the task of a lost worker to another worker
+            if index is not None:
+                with self._condition:
+                    self._pending.append(index)
+                    self._condition.notify_all()
+            connection.close()
+
+    def _finish(self, index, image):
+        """Average a finished task into the output."""
+        (x0, y0, x1, y1), _, samples = self._tasks[index]
+        with self._condition:
+            n = self._tile_samples.get((x0, y0), 0)
+            self._tile_samples[(x0, y0)] = n + samples
+            tile = self._linear_output[y0:y1, x0:x1]
+            if n == 0:
+                tile[:] = image
+            else:
+                tile += (image - tile) * (samples / (n + samples))
+
+            self._n_done += 1
+            self._condition.notify_all()
+
+    def run(self, progress=None):
+        """Render the image.
+
+        Args:
+            progress (callable): Function to call as ``progress(done, total)``
+                when workers finish tasks, where *done* is the number of
+                finished tasks and *total* is the number of tasks.
+
+        Returns:
+            ``(H, W, 4)`` `numpy.ndarray` of ``numpy.uint8``: The image in sRGB
+            color space.
+
+        `run` blocks until workers connect and finish every task.
+
+        Raises:
+            RuntimeError: When a worker fails to build the scene or render a
+                task.
+        """
+        self._accept_thread = threading.Thread(target=self._accept,
+                                               daemon=True)
+        self._accept_thread.start()
+
+        try:
+            reported = -1
+            while True:
+                with self._condition:
+                    while not self._done() and self._n_done == reported:
+                        self._condition.wait()
+                    done = self._done()
+                    reported = self._n_done
+                    error = self._error
+
+                if error is not None:
+                    raise RuntimeError("Distributed render failed:\n" + error)
+                if progress is not None:
+                    progress(reported, len(self._tasks))
+                if done:
+                    break
+        finally:
+            self.close()
+
+        return util.linear_to_srgb(self._linear_output)
+
+    def close(self):
+        """Stop listening for workers.
+
+        Workers that are still rendering stop after their current task.
+        """
+        with self._condition:
+            if not self._done():
+                self._error = "The coordinator closed."
+            self._condition.notify_all()
+
+        # wake the thread waiting for connections so that it sees the image is
+        # complete
+        if self._accept_thread is not None and self._accept_thread.is_alive():
+            try:
+                multiprocessing.connection.Client(
+                    self.address, authkey=self._authkey).close()
+            except (OSError, EOFError, multiprocessing.AuthenticationError):
+                pass
+            self._accept_thread.join()
+
+        self._listener.close()
+
+
+def render(make_scene,
+           w=600,
+           h=370,
+           method='path',
+           samples=64,
+           light_samples=1,
+           tile_size=256,
+           sample_split=1,
+           seed=0,
+           processes=1,
+           mode='auto',
+           progress=None):
+    """Render an image on worker processes.
+
+    Args:
+        make_scene (callable): Function that builds the scene as
+            ``make_scene(device)`` and returns the `Scene <fresnel.Scene>`.
+        w (int): Output image width (in pixels).
+        h (int): Output image height (in pixels).
+        method (str): ``'preview'`` or ``'path'``.
+        samples (int): Number of samples per pixel with ``method='path'``.
+        light_samples (int): Number of light samples with ``method='path'``.
+        tile_size (int): Width and height of the tiles (in pixels).
+        sample_split (int): Number of tasks to split the samples of each tile
+            into.
+        seed (int): Random number seed.
+        processes (int): Number of local worker processes.
+        mode (str): Mode of the workers' devices (see `Device
+            <fresnel.Device>`).
+        progress (callable): See `Coordinator.run`.
+
+    Returns:
+        ``(H, W, 4)`` `numpy.ndarray` of ``numpy.uint8``: The image in sRGB
+        color space.
+
+    `render` starts a `Coordinator` on the local host and *processes* local
+    workers with the ``spawn`` method. On the CPU, each worker uses an equal
+    share of the CPU cores.
+    """
+    processes = int(processes)
+    if processes < 1:
+        raise ValueError("processes must be at least 1")
+
+    coordinator = Coordinator(make_scene,
+                              w,
+                              h,
+                              method=method,
+                              samples=samples,
+                              light_samples=light_samples,
+                              tile_size=tile_size,
+                              sample_split=sample_split,
+                              seed=seed)
+
+    n = _worker_threads(mode, processes)
+
+    context = multiprocessing.get_context('spawn')
+    workers = [
+        context.Process(target=work,
+                        args=(coordinator.address, coordinator.authkey, None,
+                              mode, n),
+                        daemon=True) for i in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+
+    try:
+        return coordinator.run(progress)
+    finally:
+        for worker in workers:
+            worker.join(timeout=10)
+            if worker.is_alive():
+                worker.terminate()
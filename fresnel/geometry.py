@@ -19,6 +19,7 @@ See Also:
 
 from . import material
 from . import util
+import contextlib
 import numpy
 
 
@@ -28,10 +29,50 @@ class Geometry(object):
     `Geometry` provides operations and properties common to all geometry
     classes.
 
+    .. rubric:: Zero copy buffers
+
+    By default, geometry classes allocate their own buffers and copy the
+    arguments into them. Pass ``copy=False`` to the constructor to use the
+    memory of `numpy.ndarray` arguments directly instead, including
+    `numpy.memmap` arrays. The geometry keeps a reference to each adopted
+    array, and changes to the array are visible in the geometry. Array
+    arguments must be C-contiguous and have the exact shape and ``float32``
+    data type of the buffer, otherwise the constructor raises `ValueError`.
+    Arguments that are not arrays (such as a scalar radius) are copied as
+    usual. Only the CPU adopts arrays, the GPU copies them.
+
+    The geometry may adopt read-only arrays, such as a `numpy.memmap` opened
+    with ``mode='r'``. Writes to the corresponding `Array
+    <fresnel.util.Array>` attributes then raise `ValueError`.
+
+    Note:
+        Write to adopted arrays through the geometry's `Array
+        <fresnel.util.Array>` attributes (``geometry.position[:] = ...``) so
+        that the tracer rebuilds its acceleration structures.
+
+    .. rubric:: Batched updates
+
+    Every write to a buffer that changes the shape or placement of the
+    primitives updates the tracer's acceleration structures for the geometry.
+    Use `set` to assign several buffers at once, or write inside a
+    `batch_update` block, to update the acceleration structures only once.
+    Writes to ``color`` do not change the bounds of the primitives and never
+    update the acceleration structures.
+
     Note:
         You cannot instantiate a Geometry directly. Use one of the subclasses.
     """
 
+    # names of the per-primitive buffers
+    _buffers = ()
+
+    # geometry is enabled when created
+    _enabled = True
+
+    # depth of nested batch_update blocks and whether a write was deferred
+    _batch_depth = 0
+    _batch_pending = False
+
     def __init__(self):
         raise RuntimeError("Use a specific geometry class")
 
@@ -44,6 +85,7 @@ class Geometry(object):
             `disable`
         """
         self._geometry.enable()
+        self._enabled = True
 
     def disable(self):
         """Disable the geometry.
@@ -54,6 +96,7 @@ class Geometry(object):
             `enable`
         """
         self._geometry.disable()
+        self._enabled = False
 
     def remove(self):
         """Remove the geometry from the scene.
@@ -65,6 +108,97 @@ class Geometry(object):
         self._geometry.remove()
         self.scene.geometry.remove(self)
 
+    @contextlib.contextmanager
+    def batch_update(self):
+        """Defer acceleration structure updates until the block exits.
+
+        Writes to the geometry's buffers inside the ``with`` block mark the
+        geometry as changed, and the geometry updates once when the outermost
+        block exits::
+
+            with geometry.batch_update():
+                for i in range(len(p)):
+                    geometry.position[i] = p[i]
+
+        Render after the block exits, the tracer may use stale acceleration
+        structures inside it.
+
+        See Also:
+            `set`, `Scene.batch_update <fresnel.Scene.batch_update>`
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0 and self._batch_pending:
+                self._batch_pending = False
+                self._geometry.update()
+
+    def set(self, **buffers):
+        """Assign several buffers with one acceleration structure update.
+
+        Args:
+            buffers: Values to assign to each buffer by name, for example
+                ``geometry.set(position=p, radius=r, color=c)``.
+
+        Raises:
+            ValueError: When a name is not a buffer of this geometry.
+        """
+        for name in buffers:
+            if name not in self._buffers:
+                raise ValueError(f"{type(self).__name__} has no buffer {name}, "
+                                 f"valid buffers are {self._buffers}")
+
+        with self.batch_update():
+            for name, value in buffers.items():
+                getattr(self, name)[:] = value
+
+    def _update(self):
+        """Update the acceleration structures, unless in a batch."""
+        if self._batch_depth > 0:
+            self._batch_pending = True
+        else:
+            self._geometry.update()
+
+    def _set_buffers(self, copy, **values):
+        """Fill the buffers, adopting arrays when *copy* is False."""
+        with self.batch_update():
+            for name, value in values.items():
+                array = getattr(self, name)
+                if (not copy and isinstance(value, numpy.ndarray)
+                        and array._adopt(value)):
+                    continue
+                array[:] = value
+
+    def _get_state(self):
+        """Get the state that `Scene.save <fresnel.Scene.save>` stores.
+
+        Returns:
+            tuple[dict, dict]: JSON serializable constructor arguments and the
+            arrays (`numpy.ndarray` or `util.Array <fresnel.util.Array>`) that
+            `_from_state` needs to rebuild the geometry.
+        """
+        arrays = {name: getattr(self, name) for name in self._buffers}
+        return {}, arrays
+
+    @classmethod
+    def _from_state(cls, scene, params, arrays):
+        """Rebuild a geometry from the state given by `_get_state`."""
+        return cls(scene,
+                   N=len(arrays[cls._buffers[0]]),
+                   copy=False,
+                   **params,
+                   **arrays)
+
+    @property
+    def id(self):
+        """int: Identify this geometry in the tracer's geometry id output.
+
+        See `fresnel.tracer.Tracer.geometry_id`.
+        """
+        return self._geometry.getGeometryID()
+
     @property
     def material(self):
         """Material: Define how light interacts with the geometry."""
@@ -113,6 +247,9 @@ class Cylinder(Geometry):
         N (int): Number of cylinders in the geometry. If ``None``, determine
             *N* from *points*.
 
+        copy (bool): When ``False``, use the memory of `numpy.ndarray`
+            arguments as the geometry's buffers (see `Geometry`).
+
     See Also:
         Tutorials:
 
@@ -127,6 +264,8 @@ class Cylinder(Geometry):
         and NumPy will broadcast it to all elements of the array.
     """
 
+    _buffers = ('points', 'radius', 'color')
+
     def __init__(self,
                  scene,
                  points=((0, 0, 0), (0, 0, 0)),
@@ -135,7 +274,8 @@ class Cylinder(Geometry):
                  N=None,
                  material=material.Material(solid=1.0, color=(1, 0, 1)),
                  outline_material=material.Material(solid=1.0, color=(0, 0, 0)),
-                 outline_width=0.0):
+                 outline_width=0.0,
+                 copy=True):
         if N is None:
             N = len(points)
 
@@ -144,9 +284,7 @@ class Cylinder(Geometry):
         self.outline_material = outline_material
         self.outline_width = outline_width
 
-        self.points[:] = points
-        self.radius[:] = radius
-        self.color[:] = color
+        self._set_buffers(copy, points=points, radius=radius, color=color)
 
         self.scene = scene
         self.scene.geometry.append(self)
@@ -185,7 +323,9 @@ class Cylinder(Geometry):
     @property
     def color(self):
         """(N, 2, 3) `Array`: Color of each start and end point."""
-        return util.Array(self._geometry.getColorBuffer(), geom=self)
+        return util.Array(self._geometry.getColorBuffer(),
+                          geom=self,
+                          bounds=False)
 
 
 class Box(Cylinder):
@@ -229,11 +369,21 @@ class Box(Cylinder):
                          N=12,
                          material=material.Material(solid=1.0))
         self._box = self._from_box(box)
-        self.points[:] = self._generate_points(self._box)
-
-        self.box_radius = box_radius
-
-        self.box_color = box_color
+        with self.batch_update():
+            self.points[:] = self._generate_points(self._box)
+            self.box_radius = box_radius
+            self.box_color = box_color
+
+    def _get_state(self):
+        params, arrays = super()._get_state()
+        params['box'] = [float(v) for v in self._box]
+        return params, arrays
+
+    @classmethod
+    def _from_state(cls, scene, params, arrays):
+        geom = cls(scene, params['box'])
+        geom.set(**{name: arrays[name] for name in cls._buffers})
+        return geom
 
     def _from_box(self, box):
         """Duck type the box from a valid input.
@@ -392,6 +542,9 @@ class Polygon(Geometry):
         N (int): Number of polygons in the geometry. If ``None``, determine
             *N* from *position*.
 
+        copy (bool): When ``False``, use the memory of `numpy.ndarray`
+            arguments as the geometry's buffers (see `Geometry`).
+
     See Also:
         Tutorials:
 
@@ -402,6 +555,8 @@ class Polygon(Geometry):
         primitive properties in the appropriate array type.
     """
 
+    _buffers = ('position', 'angle', 'color')
+
     def __init__(self,
                  scene,
                  vertices,
@@ -412,19 +567,20 @@ class Polygon(Geometry):
                  N=None,
                  material=material.Material(solid=1.0, color=(1, 0, 1)),
                  outline_material=material.Material(solid=1.0, color=(0, 0, 0)),
-                 outline_width=0.0):
+                 outline_width=0.0,
+                 copy=True):
         if N is None:
             N = len(position)
 
+        self._vertices = numpy.asarray(vertices, dtype=numpy.float32)
+        self._rounding_radius = float(rounding_radius)
         self._geometry = scene.device.module.GeometryPolygon(
-            scene._scene, vertices, rounding_radius, N)
+            scene._scene, self._vertices, rounding_radius, N)
         self.material = material
         self.outline_material = outline_material
         self.outline_width = outline_width
 
-        self.position[:] = position
-        self.angle[:] = angle
-        self.color[:] = color
+        self._set_buffers(copy, position=position, angle=angle, color=color)
 
         self.scene = scene
         self.scene.geometry.append(self)
@@ -442,7 +598,15 @@ class Polygon(Geometry):
     @property
     def color(self):
         """(N, 2, 3) `Array`: The color of each polygon."""
-        return util.Array(self._geometry.getColorBuffer(), geom=self)
+        return util.Array(self._geometry.getColorBuffer(),
+                          geom=self,
+                          bounds=False)
+
+    def _get_state(self):
+        params, arrays = super()._get_state()
+        params['rounding_radius'] = self._rounding_radius
+        arrays['vertices'] = self._vertices
+        return params, arrays
 
     def get_extents(self):
         """Get the extents of the geometry.
@@ -482,6 +646,9 @@ class Sphere(Geometry):
         N (int): Number of spheres in the geometry. If ``None``, determine *N*
             from *position*.
 
+        copy (bool): When ``False``, use the memory of `numpy.ndarray`
+            arguments as the geometry's buffers (see `Geometry`).
+
     See Also:
         Tutorials:
 
@@ -496,6 +663,8 @@ class Sphere(Geometry):
         numpy will broadcast it to all elements of the array.
     """
 
+    _buffers = ('position', 'radius', 'color')
+
     def __init__(self,
                  scene,
                  position=(0, 0, 0),
@@ -504,7 +673,8 @@ class Sphere(Geometry):
                  N=None,
                  material=material.Material(solid=1.0, color=(1, 0, 1)),
                  outline_material=material.Material(solid=1.0, color=(0, 0, 0)),
-                 outline_width=0.0):
+                 outline_width=0.0,
+                 copy=True):
         if N is None:
             N = len(position)
 
@@ -513,9 +683,7 @@ class Sphere(Geometry):
         self.outline_material = outline_material
         self.outline_width = outline_width
 
-        self.position[:] = position
-        self.radius[:] = radius
-        self.color[:] = color
+        self._set_buffers(copy, position=position, radius=radius, color=color)
 
         self.scene = scene
         self.scene.geometry.append(self)
@@ -548,7 +716,9 @@ class Sphere(Geometry):
     @property
     def color(self):
         """(N, 3) `Array`: The color of each sphere."""
-        return util.Array(self._geometry.getColorBuffer(), geom=self)
+        return util.Array(self._geometry.getColorBuffer(),
+                          geom=self,
+                          bounds=False)
 
 
 class Mesh(Geometry):
@@ -576,6 +746,9 @@ class Mesh(Geometry):
         N (int): Number of mesh instances in the geometry. If ``None``,
             determine *N* from *position*.
 
+        copy (bool): When ``False``, use the memory of `numpy.ndarray`
+            arguments as the geometry's buffers (see `Geometry`).
+
     See Also:
         Tutorials:
 
@@ -586,6 +759,8 @@ class Mesh(Geometry):
         primitive properties in the appropriate array type.
     """
 
+    _buffers = ('position', 'orientation', 'color')
+
     def __init__(self,
                  scene,
                  vertices,
@@ -595,7 +770,8 @@ class Mesh(Geometry):
                  N=None,
                  material=material.Material(solid=1.0, color=(1, 0, 1)),
                  outline_material=material.Material(solid=1.0, color=(0, 0, 0)),
-                 outline_width=0.0):
+                 outline_width=0.0,
+                 copy=True):
         if N is None:
             N = len(position)
 
@@ -606,9 +782,10 @@ class Mesh(Geometry):
         self.outline_material = outline_material
         self.outline_width = outline_width
 
-        self.position[:] = position
-        self.orientation[:] = orientation
-        self.color[:] = color
+        self._set_buffers(copy,
+                          position=position,
+                          orientation=orientation,
+                          color=color)
 
         self.scene = scene
         self.scene.geometry.append(self)
@@ -626,7 +803,14 @@ class Mesh(Geometry):
     @property
     def color(self):
         """(N, 3) `Array`: The color of each sphere."""
-        return util.Array(self._geometry.getColorBuffer(), geom=self)
+        return util.Array(self._geometry.getColorBuffer(),
+                          geom=self,
+                          bounds=False)
+
+    def _get_state(self):
+        params, arrays = super()._get_state()
+        arrays['vertices'] = self.vertices
+        return params, arrays
 
     def get_extents(self):
         """Get the extents of the geometry.
@@ -690,6 +874,9 @@ class ConvexPolyhedron(Geometry):
         N (int): Number of spheres in the geometry. If ``None``, determine *N*
             from *position*.
 
+        copy (bool): When ``False``, use the memory of `numpy.ndarray`
+            arguments as the geometry's buffers (see `Geometry`).
+
     See Also:
         Tutorials:
 
@@ -700,6 +887,8 @@ class ConvexPolyhedron(Geometry):
         primitive properties in the appropriate array type.
     """
 
+    _buffers = ('position', 'orientation', 'color')
+
     def __init__(self,
                  scene,
                  polyhedron_info,
@@ -709,28 +898,59 @@ class ConvexPolyhedron(Geometry):
                  N=None,
                  material=material.Material(solid=1.0, color=(1, 0, 1)),
                  outline_material=material.Material(solid=1.0, color=(0, 0, 0)),
-                 outline_width=0.0):
+                 outline_width=0.0,
+                 copy=True):
         if N is None:
             N = len(position)
 
-        origins = polyhedron_info['face_origin']
-        normals = polyhedron_info['face_normal']
-        face_colors = polyhedron_info['face_color']
-        r = polyhedron_info['radius']
+        origins = numpy.asarray(polyhedron_info['face_origin'],
+                                dtype=numpy.float32)
+        normals = numpy.asarray(polyhedron_info['face_normal'],
+                                dtype=numpy.float32)
+        face_colors = numpy.asarray(polyhedron_info['face_color'],
+                                    dtype=numpy.float32)
+        r = float(polyhedron_info['radius'])
         self._geometry = scene.device.module.GeometryConvexPolyhedron(
             scene._scene, origins, normals, face_colors, N, r)
         self.material = material
         self.outline_material = outline_material
         self.outline_width = outline_width
         self._radius = r
+        self._polyhedron_info = dict(face_origin=origins,
+                                     face_normal=normals,
+                                     face_color=face_colors)
 
-        self.position[:] = position
-        self.orientation[:] = orientation
-        self.color[:] = color
+        self._set_buffers(copy,
+                          position=position,
+                          orientation=orientation,
+                          color=color)
 
         self.scene = scene
         self.scene.geometry.append(self)
 
+    def _get_state(self):
+        params, arrays = super()._get_state()
+        params['radius'] = self._radius
+        params['color_by_face'] = self.color_by_face
+        arrays.update(self._polyhedron_info)
+        return params, arrays
+
+    @classmethod
+    def _from_state(cls, scene, params, arrays):
+        polyhedron_info = dict(face_origin=arrays['face_origin'],
+                               face_normal=arrays['face_normal'],
+                               face_color=arrays['face_color'],
+                               radius=params['radius'])
+        geom = cls(scene,
+                   polyhedron_info,
+                   position=arrays['position'],
+                   orientation=arrays['orientation'],
+                   color=arrays['color'],
+                   N=len(arrays['position']),
+                   copy=False)
+        geom.color_by_face = params['color_by_face']
+        return geom
+
     def get_extents(self):
         """Get the extents of the geometry.
 
@@ -758,7 +978,9 @@ class ConvexPolyhedron(Geometry):
     @property
     def color(self):
         """(N, 3) `Array`: The color of each polyhedron."""
-        return util.Array(self._geometry.getColorBuffer(), geom=self)
+        return util.Array(self._geometry.getColorBuffer(),
+                          geom=self,
+                          bounds=False)
 
     @property
     def color_by_face(self):
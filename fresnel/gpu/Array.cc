@@ -73,6 +73,14 @@ void export_Array(pybind11::module& m)
         .def_buffer([](Array<float>& t) -> pybind11::buffer_info { return t.getBuffer(); })
         .def("map", &Array<float>::map_py)
         .def("unmap", &Array<float>::unmap);
+
+    pybind11::class_<Array<unsigned int>, std::shared_ptr<Array<unsigned int>>>(
+        m,
+        "Array_ui",
+        pybind11::buffer_protocol())
+        .def_buffer([](Array<unsigned int>& t) -> pybind11::buffer_info { return t.getBuffer(); })
+        .def("map", &Array<unsigned int>::map_py)
+        .def("unmap", &Array<unsigned int>::unmap);
     }
 
     } // namespace gpu
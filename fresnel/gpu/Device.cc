@@ -41,7 +41,7 @@ Device::Device(const std::string& ptx_root, int n) : m_ptx_root(ptx_root)
     m_context = optix::Context::create();
     m_context->setDevices(devices.begin(), devices.end());
 
-    m_context->setRayTypeCount(2);
+    m_context->setRayTypeCount(3);
 
     // miss programs
     optix::Program p2 = getProgram("path.ptx", "path_miss");
@@ -80,6 +80,9 @@ void Geometry::setupInstance()
     m_instance->setMaterialCount(1);
     m_instance->setMaterial(0, m_device->getMaterial());
 
+    m_geom_id = m_scene->allocateGeometryID();
+    m_instance["geometry_id"]->setUint(m_geom_id);
+
     setMaterial(Material(RGB<float>(1, 0, 1)));
     setOutlineMaterial(Material(RGB<float>(0, 0, 0), 1.0f));
 
@@ -135,6 +138,7 @@ void export_Geometry(pybind11::module& m)
         .def("disable", &Geometry::disable)
         .def("enable", &Geometry::enable)
         .def("remove", &Geometry::remove)
+        .def("getGeometryID", &Geometry::getGeometryID)
         .def("update", &Geometry::update);
     }
 
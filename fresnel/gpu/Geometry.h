@@ -54,6 +54,12 @@ class Geometry
     //! Remove the Geometry from the Scene
     void remove();
 
+    //! Get the id reported for this geometry in the geometry id output buffer
+    unsigned int getGeometryID() const
+        {
+        return m_geom_id;
+        }
+
     //! Get the material
     const Material& getMaterial()
         {
@@ -97,6 +103,8 @@ class Geometry
     std::shared_ptr<Scene> m_scene;   //!< The scene the geometry is attached to
     std::shared_ptr<Device> m_device; //!< The device the Scene is attached to
 
+    unsigned int m_geom_id = 0; //!< Id of this geometry in the Scene
+
     Material m_mat;         //!< material assigned to this geometry
     Material m_outline_mat; //!< outline material assigned to this geometry
     float m_outline_width;  //!< outline width
@@ -130,15 +130,25 @@ class Scene
         m_lights = lights;
         }
 
+    //! Assign an id to a new geometry instance
+    /*! Ids are unique within the scene and match the ids reported in the geometry id output
+        buffer.
+    */
+    unsigned int allocateGeometryID()
+        {
+        return m_next_geometry_id++;
+        }
+
     private:
     optix::GeometryGroup m_root;      //!< Store the scene root object
     optix::Acceleration m_accel;      //!< Store the acceleration structure
     std::shared_ptr<Device> m_device; //!< The device the scene is attached to
 
-    RGB<float> m_background_color; //!< The background color
-    float m_background_alpha;      //!< Background alpha
-    UserCamera m_camera;           //!< The camera
-    Lights m_lights;               //!< The lights
+    RGB<float> m_background_color;       //!< The background color
+    float m_background_alpha;            //!< Background alpha
+    UserCamera m_camera;                 //!< The camera
+    Lights m_lights;                     //!< The lights
+    unsigned int m_next_geometry_id = 0; //!< Id to assign to the next geometry instance
     };
 
 //! Export Scene to python
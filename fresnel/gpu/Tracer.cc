@@ -3,6 +3,8 @@
 
 #include "Tracer.h"
 
+#include <limits>
+
 namespace fresnel
     {
 namespace gpu
@@ -48,6 +50,140 @@ void Tracer::resize(unsigned int w, unsigned int h)
 
     m_linear_out_py = std::make_shared<Array<RGBA<float>>>(2, m_linear_out_gpu);
     m_srgb_out_py = std::make_shared<Array<RGBA<unsigned char>>>(2, m_srgb_out_gpu);
+    clearRegion();
+    clearFrame();
+    allocateAOVs();
+    }
+
+/*! \param enabled Set to true to enable the auxiliary output buffers
+
+    When enabled, renders record the distance, normal, surface color, geometry id, and primitive id
+    of the primary ray hit in each pixel.
+*/
+void Tracer::setAOVsEnabled(bool enabled)
+    {
+    m_aovs_enabled = enabled;
+    allocateAOVs();
+    }
+
+/*! Allocate auxiliary output buffers that match the output buffer size and fill them with the
+    values for pixels where the primary ray misses. The ray generation programs reference the
+    buffers even when the outputs are disabled, so allocate 1x1 placeholders in that case.
+*/
+void Tracer::allocateAOVs()
+    {
+    const unsigned int w = m_aovs_enabled ? m_w : 1;
+    const unsigned int h = m_aovs_enabled ? m_h : 1;
+    optix::Context context = m_device->getContext();
+
+    m_depth_out_gpu = context->createBuffer(RT_BUFFER_OUTPUT, RT_FORMAT_FLOAT, w, h);
+    m_normal_out_gpu = context->createBuffer(RT_BUFFER_OUTPUT, RT_FORMAT_FLOAT3, w, h);
+    m_albedo_out_gpu = context->createBuffer(RT_BUFFER_OUTPUT, RT_FORMAT_FLOAT3, w, h);
+    m_geometry_id_out_gpu = context->createBuffer(RT_BUFFER_OUTPUT, RT_FORMAT_UNSIGNED_INT, w, h);
+    m_primitive_id_out_gpu = context->createBuffer(RT_BUFFER_OUTPUT, RT_FORMAT_UNSIGNED_INT, w, h);
+
+    float* depth_data = (float*)m_depth_out_gpu->map();
+    unsigned int* geometry_id_data = (unsigned int*)m_geometry_id_out_gpu->map();
+    unsigned int* primitive_id_data = (unsigned int*)m_primitive_id_out_gpu->map();
+    for (size_t pixel = 0; pixel < size_t(w) * size_t(h); pixel++)
+        {
+        depth_data[pixel] = std::numeric_limits<float>::infinity();
+        geometry_id_data[pixel] = 0xffffffff;
+        primitive_id_data[pixel] = 0xffffffff;
+        }
+    m_depth_out_gpu->unmap();
+    m_geometry_id_out_gpu->unmap();
+    m_primitive_id_out_gpu->unmap();
+
+    void* tmp = m_normal_out_gpu->map();
+    memset(tmp, 0, size_t(w) * size_t(h) * 12);
+    m_normal_out_gpu->unmap();
+
+    tmp = m_albedo_out_gpu->map();
+    memset(tmp, 0, size_t(w) * size_t(h) * 12);
+    m_albedo_out_gpu->unmap();
+
+    // the Array objects own the buffers and destroy the previous ones
+    m_depth_out_py = std::make_shared<Array<float>>(2, m_depth_out_gpu);
+    m_normal_out_py = std::make_shared<Array<vec3<float>>>(2, m_normal_out_gpu);
+    m_albedo_out_py = std::make_shared<Array<RGB<float>>>(2, m_albedo_out_gpu);
+    m_geometry_id_out_py = std::make_shared<Array<unsigned int>>(2, m_geometry_id_out_gpu);
+    m_primitive_id_out_py = std::make_shared<Array<unsigned int>>(2, m_primitive_id_out_gpu);
+    }
+
+/*! Call before launching a ray generation program that writes auxiliary outputs.
+ */
+void Tracer::setAOVVariables()
+    {
+    optix::Context context = m_device->getContext();
+    context["aovs_enabled"]->setUint(m_aovs_enabled);
+    context["depth_buffer"]->set(m_depth_out_gpu);
+    context["normal_buffer"]->set(m_normal_out_gpu);
+    context["albedo_buffer"]->set(m_albedo_out_gpu);
+    context["geometry_id_buffer"]->set(m_geometry_id_out_gpu);
+    context["primitive_id_buffer"]->set(m_primitive_id_out_gpu);
+    }
+
+/*! \param x0 First pixel in the x direction
+    \param y0 First pixel in the y direction
+    \param x1 One past the last pixel in the x direction
+    \param y1 One past the last pixel in the y direction
+
+    Subsequent renders trace and accumulate only the pixels x0 <= i < x1, y0 <= j < y1 and leave the
+    rest of the output buffer untouched.
+*/
+void Tracer::setRegion(unsigned int x0, unsigned int y0, unsigned int x1, unsigned int y1)
+    {
+    if (x0 >= x1 || y0 >= y1 || x1 > m_w || y1 > m_h)
+        throw std::runtime_error("Invalid region");
+
+    m_region.x0 = x0;
+    m_region.x1 = x1;
+    m_region.y0 = y0;
+    m_region.y1 = y1;
+    }
+
+/*! Subsequent renders trace the whole output buffer.
+ */
+void Tracer::clearRegion()
+    {
+    m_region.x0 = 0;
+    m_region.x1 = m_w;
+    m_region.y0 = 0;
+    m_region.y1 = m_h;
+    }
+
+/*! \param width Width of the frame
+    \param height Height of the frame
+    \param x Location of the first pixel of the output buffer in the frame (x direction)
+    \param y Location of the first pixel of the output buffer in the frame (y direction)
+
+    Subsequent renders trace the output buffer as the window at (x, y) of a width x height image,
+   so that a small output buffer renders a tile of a large image. Random numbers depend on the
+   location in the frame, so tiles match the same pixels of a render of the whole frame.
+*/
+void Tracer::setFrame(unsigned int width, unsigned int height, unsigned int x, unsigned int y)
+    {
+    if (x + m_w > width || y + m_h > height)
+        throw std::runtime_error("Invalid frame");
+
+    m_frame_width = width;
+    m_frame_height = height;
+    m_frame_x = x;
+    m_frame_y = y;
+    }
+
+/*! \param seconds Time limit
+
+    TracerPath::renderSamples() stops launching samples once *seconds* have elapsed since this call.
+    The time limit remains in effect until clearTimeLimit() is called.
+*/
+void Tracer::setTimeLimit(double seconds)
+    {
+    m_deadline = std::chrono::steady_clock::now()
+                 + std::chrono::duration_cast<std::chrono::steady_clock::duration>(
+                     std::chrono::duration<double>(seconds));
+    m_has_deadline = true;
     }
 
 /*! \param scene The Scene to render
@@ -64,14 +200,37 @@ void export_Tracer(pybind11::module& m)
     {
     pybind11::class_<Tracer, std::shared_ptr<Tracer>>(m, "Tracer")
         .def(pybind11::init<std::shared_ptr<Device>, unsigned int, unsigned int>())
-        .def("render", &Tracer::render)
+        .def("render", &Tracer::render, pybind11::call_guard<pybind11::gil_scoped_release>())
         .def("resize", &Tracer::resize)
         .def("getSRGBOutputBuffer", &Tracer::getSRGBOutputBuffer)
         .def("getLinearOutputBuffer", &Tracer::getLinearOutputBuffer)
+        .def("setAOVsEnabled", &Tracer::setAOVsEnabled)
+        .def("getAOVsEnabled", &Tracer::getAOVsEnabled)
+        .def("getDepthBuffer", &Tracer::getDepthBuffer)
+        .def("getNormalBuffer", &Tracer::getNormalBuffer)
+        .def("getAlbedoBuffer", &Tracer::getAlbedoBuffer)
+        .def("getGeometryIDBuffer", &Tracer::getGeometryIDBuffer)
+        .def("getPrimitiveIDBuffer", &Tracer::getPrimitiveIDBuffer)
         .def("enableHighlightWarning", &Tracer::enableHighlightWarning)
         .def("disableHighlightWarning", &Tracer::disableHighlightWarning)
         .def("getSeed", &Tracer::getSeed)
-        .def("setSeed", &Tracer::setSeed);
+        .def("setSeed", &Tracer::setSeed)
+        .def("getPacketSize", &Tracer::getPacketSize)
+        .def("setPacketSize", &Tracer::setPacketSize)
+        .def("getTileSize", &Tracer::getTileSize)
+        .def("setTileSize", &Tracer::setTileSize)
+        .def("getGrainSize", &Tracer::getGrainSize)
+        .def("setGrainSize", &Tracer::setGrainSize)
+        .def("getTileOrder", &Tracer::getTileOrder)
+        .def("setTileOrder", &Tracer::setTileOrder)
+        .def("setRegion", &Tracer::setRegion)
+        .def("clearRegion", &Tracer::clearRegion)
+        .def("setFrame", &Tracer::setFrame)
+        .def("clearFrame", &Tracer::clearFrame)
+        .def("setCancelToken", &Tracer::setCancelToken)
+        .def("setTimeLimit", &Tracer::setTimeLimit)
+        .def("clearTimeLimit", &Tracer::clearTimeLimit)
+        .def("isStopRequested", &Tracer::isStopRequested);
     }
 
     } // namespace gpu
@@ -4,13 +4,17 @@
 #ifndef TRACER_H_
 #define TRACER_H_
 
+#include <chrono>
 #include <optixu/optixpp_namespace.h>
 #include <pybind11/pybind11.h>
+#include <stdexcept>
 
 #include "Array.h"
 #include "Scene.h"
 #include "common/Camera.h"
+#include "common/CancelToken.h"
 #include "common/ColorMath.h"
+#include "common/Tile.h"
 
 namespace fresnel
     {
@@ -54,6 +58,45 @@ class Tracer
         return m_srgb_out_py;
         }
 
+    //! Enable or disable the auxiliary output buffers
+    void setAOVsEnabled(bool enabled);
+
+    //! Test if the auxiliary output buffers are enabled
+    bool getAOVsEnabled() const
+        {
+        return m_aovs_enabled;
+        }
+
+    //! Get the depth output buffer
+    std::shared_ptr<Array<float>> getDepthBuffer()
+        {
+        return m_aovs_enabled ? m_depth_out_py : nullptr;
+        }
+
+    //! Get the normal output buffer
+    std::shared_ptr<Array<vec3<float>>> getNormalBuffer()
+        {
+        return m_aovs_enabled ? m_normal_out_py : nullptr;
+        }
+
+    //! Get the albedo output buffer
+    std::shared_ptr<Array<RGB<float>>> getAlbedoBuffer()
+        {
+        return m_aovs_enabled ? m_albedo_out_py : nullptr;
+        }
+
+    //! Get the geometry id output buffer
+    std::shared_ptr<Array<unsigned int>> getGeometryIDBuffer()
+        {
+        return m_aovs_enabled ? m_geometry_id_out_py : nullptr;
+        }
+
+    //! Get the primitive id output buffer
+    std::shared_ptr<Array<unsigned int>> getPrimitiveIDBuffer()
+        {
+        return m_aovs_enabled ? m_primitive_id_out_py : nullptr;
+        }
+
     //! Enable highlight warnings
     void enableHighlightWarning(const RGB<float>& color)
         {
@@ -78,7 +121,117 @@ class Tracer
         return m_seed;
         }
 
+    //! Set the number of primary rays traced together in a packet
+    /*! OptiX schedules rays on the GPU itself. The packet size is validated for API compatibility
+       with the CPU tracers and has no effect.
+    */
+    void setPacketSize(unsigned int packet_size)
+        {
+        if (packet_size != 1 && packet_size != 4 && packet_size != 8 && packet_size != 16)
+            throw std::runtime_error("Invalid packet size");
+        m_packet_size = packet_size;
+        }
+
+    //! Get the number of primary rays traced together in a packet
+    unsigned int getPacketSize() const
+        {
+        return m_packet_size;
+        }
+
+    //! Set the width and height of the tiles that threads render
+    /*! OptiX launches one thread per pixel. The tile settings are validated for API compatibility
+       with the CPU tracers and have no effect.
+    */
+    void setTileSize(unsigned int tile_size)
+        {
+        if (tile_size == 0)
+            throw std::runtime_error("Invalid tile size");
+        m_tile_size = tile_size;
+        }
+
+    //! Get the width and height of the tiles that threads render
+    unsigned int getTileSize() const
+        {
+        return m_tile_size;
+        }
+
+    //! Set the minimum number of tiles in each parallel task
+    void setGrainSize(unsigned int grain_size)
+        {
+        if (grain_size == 0)
+            throw std::runtime_error("Invalid grain size");
+        m_grain_size = grain_size;
+        }
+
+    //! Get the minimum number of tiles in each parallel task
+    unsigned int getGrainSize() const
+        {
+        return m_grain_size;
+        }
+
+    //! Set the order in which threads take tiles
+    void setTileOrder(TileOrder tile_order)
+        {
+        m_tile_order = tile_order;
+        }
+
+    //! Get the order in which threads take tiles
+    TileOrder getTileOrder() const
+        {
+        return m_tile_order;
+        }
+
+    //! Set the region of the output buffer to render
+    void setRegion(unsigned int x0, unsigned int y0, unsigned int x1, unsigned int y1);
+
+    //! Render the whole output buffer
+    void clearRegion();
+
+    //! Place the output buffer in a larger frame
+    void setFrame(unsigned int width, unsigned int height, unsigned int x, unsigned int y);
+
+    //! Render the output buffer as the whole frame
+    void clearFrame()
+        {
+        m_frame_width = 0;
+        }
+
+    //! Set the token that cancels renders
+    void setCancelToken(std::shared_ptr<CancelToken> cancel_token)
+        {
+        m_cancel_token = cancel_token;
+        }
+
+    //! Stop rendering after the given number of seconds
+    void setTimeLimit(double seconds);
+
+    //! Remove the time limit
+    void clearTimeLimit()
+        {
+        m_has_deadline = false;
+        }
+
+    //! Test if the current render should stop
+    bool isStopRequested() const
+        {
+        return (m_cancel_token && m_cancel_token->isCancelled())
+               || (m_has_deadline && std::chrono::steady_clock::now() >= m_deadline);
+        }
+
     protected:
+    //! Allocate the auxiliary output buffers
+    void allocateAOVs();
+
+    //! Set the auxiliary output variables in the OptiX context
+    void setAOVVariables();
+
+    //! Place a camera's output buffer in the frame set by setFrame()
+    void applyFrame(Camera& cam) const
+        {
+        if (m_frame_width != 0)
+            cam.setFrame(m_frame_width, m_frame_height, m_frame_x, m_frame_y);
+        }
+
     std::shared_ptr<Device> m_device; //!< The device the Scene is attached to
     unsigned int m_w;                 //!< Width of the output buffer
     unsigned int m_h;                 //!< Height of the output buffer
@@ -89,13 +242,38 @@ class Tracer
     std::shared_ptr<Array<RGBA<unsigned char>>>
         m_srgb_out_py; //!< The sRGB output buffer for python
 
+    bool m_aovs_enabled = false;          //!< True when the auxiliary output buffers are enabled
+    optix::Buffer m_depth_out_gpu;        //!< The GPU depth output buffer
+    optix::Buffer m_normal_out_gpu;       //!< The GPU normal output buffer
+    optix::Buffer m_albedo_out_gpu;       //!< The GPU albedo output buffer
+    optix::Buffer m_geometry_id_out_gpu;  //!< The GPU geometry id output buffer
+    optix::Buffer m_primitive_id_out_gpu; //!< The GPU primitive id output buffer
+    std::shared_ptr<Array<float>> m_depth_out_py;        //!< Distance to the primary ray hit
+    std::shared_ptr<Array<vec3<float>>> m_normal_out_py; //!< Surface normal at the primary ray hit
+    std::shared_ptr<Array<RGB<float>>> m_albedo_out_py;  //!< Surface color at the primary ray hit
+    std::shared_ptr<Array<unsigned int>> m_geometry_id_out_py; //!< Geometry hit by the primary ray
+    std::shared_ptr<Array<unsigned int>>
+        m_primitive_id_out_py; //!< Primitive hit by the primary ray
+
     optix::Program m_ray_gen;           //!< Ray generation program
     optix::Program m_exception_program; //!< Exception program
     unsigned int m_ray_gen_entry;       //!< Entry point of the ray generation program
 
     bool m_highlight_warning; //!< Set to true to enable highlight warnings in sRGB output
-    RGB<float> m_highlight_warning_color; //!< The highlight warning color
-    unsigned int m_seed = 0;              //!< Random number seed
+    RGB<float> m_highlight_warning_color;        //!< The highlight warning color
+    unsigned int m_seed = 0;                     //!< Random number seed
+    unsigned int m_packet_size = 1;              //!< Number of primary rays to trace in each packet
+    unsigned int m_tile_size = 4;                //!< Width and height of the tiles
+    unsigned int m_grain_size = 1;               //!< Minimum number of tiles in a parallel task
+    TileOrder m_tile_order = TileOrder::hilbert; //!< Order in which threads take tiles
+    std::shared_ptr<CancelToken> m_cancel_token; //!< Token that cancels renders
+    bool m_has_deadline = false;                 //!< True when renders have a time limit
+    std::chrono::steady_clock::time_point m_deadline; //!< Time at which renders stop
+    Tile m_region;                                    //!< Region of the output buffer to render
+    unsigned int m_frame_width = 0;  //!< Width of the frame (0: the output buffer is the frame)
+    unsigned int m_frame_height = 0; //!< Height of the frame
+    unsigned int m_frame_x = 0;      //!< Location of the output buffer in the frame (x direction)
+    unsigned int m_frame_y = 0;      //!< Location of the output buffer in the frame (y direction)
     };
 
 //! Export Tracer to python
@@ -50,7 +50,8 @@ void TracerDirect::render(std::shared_ptr<Scene> scene)
     // disable aa sampling with m_aa_n is 1
     bool sample_aa = (m_aa_n != 1);
 
-    const Camera camera(user_camera, m_w, m_h, m_seed, sample_aa);
+    Camera camera(user_camera, m_w, m_h, m_seed, sample_aa);
+    applyFrame(camera);
     const Lights lights(scene->getLights(), camera);
 
     Tracer::render(scene);
@@ -63,6 +64,7 @@ void TracerDirect::render(std::shared_ptr<Scene> scene)
     context["bad_color"]->setFloat(1.0f, 0.0f, 1.0f);
     context["srgb_output_buffer"]->set(m_srgb_out_gpu);
     context["linear_output_buffer"]->set(m_linear_out_gpu);
+    setAOVVariables();
 
     // set camera variables
     context["cam"]->setUserData(sizeof(camera), &camera);
@@ -81,7 +83,13 @@ void TracerDirect::render(std::shared_ptr<Scene> scene)
     context["aa_n"]->setUint(m_aa_n);
     context["seed"]->setUint(m_seed);
 
-    context->launch(m_ray_gen_entry, m_w, m_h);
+    // launch only over the render region, one thread per pixel block
+    context["region_offset"]->setUint(m_region.x0, m_region.y0);
+    context["region_end"]->setUint(m_region.x1, m_region.y1);
+    context["pixel_scale"]->setUint(m_pixel_scale);
+    context->launch(m_ray_gen_entry,
+                    (m_region.x1 - m_region.x0 + m_pixel_scale - 1) / m_pixel_scale,
+                    (m_region.y1 - m_region.y0 + m_pixel_scale - 1) / m_pixel_scale);
     }
 
 /*! \param m Python module to export in
@@ -91,7 +99,14 @@ void export_TracerDirect(pybind11::module& m)
     pybind11::class_<TracerDirect, Tracer, std::shared_ptr<TracerDirect>>(m, "TracerDirect")
         .def(pybind11::init<std::shared_ptr<Device>, unsigned int, unsigned int>())
         .def("setAntialiasingN", &TracerDirect::setAntialiasingN)
-        .def("getAntialiasingN", &TracerDirect::getAntialiasingN);
+        .def("getAntialiasingN", &TracerDirect::getAntialiasingN)
+        .def("setPixelScale", &TracerDirect::setPixelScale)
+        .def("getPixelScale", &TracerDirect::getPixelScale)
+        .def("relight",
+             &TracerDirect::relight,
+             pybind11::call_guard<pybind11::gil_scoped_release>())
+        .def("setHitCacheEnabled", &TracerDirect::setHitCacheEnabled)
+        .def("getHitCacheEnabled", &TracerDirect::getHitCacheEnabled);
     }
 
     } // namespace gpu
@@ -32,6 +32,28 @@ class TracerDirect : public Tracer
     //! Render a scene
     void render(std::shared_ptr<Scene> scene);
 
+    //! Shade the scene with its current lights and materials
+    /*! The GPU traces primary rays quickly and does not cache hits. relight() renders the scene.
+     */
+    void relight(std::shared_ptr<Scene> scene)
+        {
+        render(scene);
+        }
+
+    //! Enable or disable the hit cache
+    /*! The hit cache setting is stored for API compatibility with the CPU tracer and has no effect.
+     */
+    void setHitCacheEnabled(bool enabled)
+        {
+        m_hit_cache_enabled = enabled;
+        }
+
+    //! Test if the hit cache is enabled
+    bool getHitCacheEnabled() const
+        {
+        return m_hit_cache_enabled;
+        }
+
     //! Set the number of AA samples in each direction
     void setAntialiasingN(unsigned int n)
         {
@@ -44,9 +66,29 @@ class TracerDirect : public Tracer
         return m_aa_n;
         }
 
+    //! Set the width and height of the pixel blocks that share one primary ray
+    void setPixelScale(unsigned int pixel_scale)
+        {
+        if (pixel_scale == 0)
+            throw std::runtime_error("Invalid pixel scale");
+        m_pixel_scale = pixel_scale;
+        }
+
+    //! Get the width and height of the pixel blocks that share one primary ray
+    unsigned int getPixelScale() const
+        {
+        return m_pixel_scale;
+        }
+
     protected:
     //! Number of AA samples in each direction
     unsigned int m_aa_n = 8;
+
+    //! Width and height of the pixel blocks that share one primary ray
+    unsigned int m_pixel_scale = 1;
+
+    //! Hit cache setting (unused on the GPU)
+    bool m_hit_cache_enabled = false;
     };
 
 //! Export TracerDirect to python
@@ -3,5 +3,6 @@
 
 const unsigned int TRACER_PREVIEW_RAY_ID = 0;
 const unsigned int TRACER_PATH_RAY_ID = 1;
+const unsigned int TRACER_SHADOW_RAY_ID = 2;
 
 #endif
@@ -1,11 +1,14 @@
 // Copyright (c) 2016-2020 The Regents of the University of Michigan
 // This file is part of the Fresnel project, released under the BSD 3-Clause License.
 
+#include <cstring>
 #include <iostream>
 #include <string>
 
 #include "TracerIDs.h"
 #include "TracerPath.h"
+#include "common/RayGen.h"
+#include "common/TracerPathMethods.h"
 
 using namespace std;
 
@@ -29,6 +32,11 @@ TracerPath::TracerPath(std::shared_ptr<Device> device,
     // load the exception program
     m_exception_program = m_device->getProgram("path.ptx", "path_exception");
     context->setExceptionProgram(m_ray_gen_entry, m_exception_program);
+
+    m_variance_gpu = context->createBuffer(RT_BUFFER_INPUT_OUTPUT, RT_FORMAT_FLOAT4, m_w, m_h);
+    m_statistics_gpu = context->createBuffer(RT_BUFFER_INPUT_OUTPUT,
+                                             RT_FORMAT_UNSIGNED_LONG_LONG,
+                                             sizeof(PathStatistics) / sizeof(unsigned long long));
     reset();
     }
 
@@ -46,6 +54,150 @@ void TracerPath::reset()
     tmp = m_srgb_out_gpu->map();
     memset(tmp, 0, m_w * m_h * 4);
     m_srgb_out_gpu->unmap();
+
+    tmp = m_variance_gpu->map();
+    memset(tmp, 0, m_w * m_h * 16);
+    m_variance_gpu->unmap();
+
+    tmp = m_statistics_gpu->map();
+    memset(tmp, 0, sizeof(PathStatistics));
+    m_statistics_gpu->unmap();
+    }
+
+/*! \returns The path statistics counted since the last reset
+ */
+PathStatistics TracerPath::getStatistics()
+    {
+    PathStatistics stats;
+    void* tmp = m_statistics_gpu->map();
+    memcpy(&stats, tmp, sizeof(PathStatistics));
+    m_statistics_gpu->unmap();
+    return stats;
+    }
+
+/*! \returns A tuple of copies of the mean (height, width, 4), the running sum of squared
+   differences from the mean (height, width, 3), and the number of samples (height, width) of
+   every pixel.
+*/
+pybind11::tuple TracerPath::getAccumulator()
+    {
+    const pybind11::ssize_t width = m_w;
+    const pybind11::ssize_t height = m_h;
+    const size_t n_pixels = width * height;
+
+    pybind11::array_t<float> mean(std::vector<pybind11::ssize_t> {height, width, 4});
+    pybind11::array_t<float> m2(std::vector<pybind11::ssize_t> {height, width, 3});
+    pybind11::array_t<unsigned int> pixel_samples(std::vector<pybind11::ssize_t> {height, width});
+
+    memcpy(mean.mutable_data(), m_linear_out_gpu->map(), sizeof(float4) * n_pixels);
+    m_linear_out_gpu->unmap();
+
+    // the variance buffer stores m2 and the number of samples together
+    float* m2_out = m2.mutable_data();
+    unsigned int* pixel_samples_out = pixel_samples.mutable_data();
+    const float4* variance = (const float4*)m_variance_gpu->map();
+    for (size_t pixel = 0; pixel < n_pixels; pixel++)
+        {
+        m2_out[pixel * 3 + 0] = variance[pixel].x;
+        m2_out[pixel * 3 + 1] = variance[pixel].y;
+        m2_out[pixel * 3 + 2] = variance[pixel].z;
+        pixel_samples_out[pixel] = (unsigned int)variance[pixel].w;
+        }
+    m_variance_gpu->unmap();
+
+    return pybind11::make_tuple(mean, m2, pixel_samples);
+    }
+
+/*! \param mean Mean of every pixel (height, width, 4)
+    \param m2 Running sum of squared differences from the mean of every pixel (height, width, 3)
+    \param pixel_samples Number of samples of every pixel (height, width)
+    \param n_samples Number of samples taken by the tracer that produced the accumulator
+
+    Combine the samples in the accumulator with the samples taken so far and update the sRGB
+    output to match.
+*/
+void TracerPath::mergeAccumulator(
+    pybind11::array_t<float, pybind11::array::c_style> mean,
+    pybind11::array_t<float, pybind11::array::c_style> m2,
+    pybind11::array_t<unsigned int, pybind11::array::c_style> pixel_samples,
+    unsigned int n_samples)
+    {
+    const pybind11::ssize_t width = m_w;
+    const pybind11::ssize_t height = m_h;
+
+    if (mean.ndim() != 3 || mean.shape(0) != height || mean.shape(1) != width
+        || mean.shape(2) != 4)
+        throw std::runtime_error("mean must have the shape of the output buffer");
+    if (m2.ndim() != 3 || m2.shape(0) != height || m2.shape(1) != width || m2.shape(2) != 3)
+        throw std::runtime_error("m2 must have the shape of the output buffer");
+    if (pixel_samples.ndim() != 2 || pixel_samples.shape(0) != height
+        || pixel_samples.shape(1) != width)
+        throw std::runtime_error("pixel_samples must have the shape of the output buffer");
+
+    const RGBA<float>* other_mean = (const RGBA<float>*)mean.data();
+    const RGB<float>* other_m2 = (const RGB<float>*)m2.data();
+    const unsigned int* other_pixel_samples = pixel_samples.data();
+    const size_t n_pixels = width * height;
+
+    RGBA<float>* linear_output = (RGBA<float>*)m_linear_out_gpu->map();
+    RGBA<unsigned char>* srgb_output = (RGBA<unsigned char>*)m_srgb_out_gpu->map();
+    float4* variance = (float4*)m_variance_gpu->map();
+    for (size_t pixel = 0; pixel < n_pixels; pixel++)
+        {
+        RGB<float> pixel_m2(variance[pixel].x, variance[pixel].y, variance[pixel].z);
+        unsigned int n = (unsigned int)variance[pixel].w;
+        path_tracer_merge(linear_output[pixel],
+                          pixel_m2,
+                          n,
+                          other_mean[pixel],
+                          other_m2[pixel],
+                          other_pixel_samples[pixel]);
+        variance[pixel] = make_float4(pixel_m2.r, pixel_m2.g, pixel_m2.b, float(n));
+
+        const RGBA<float>& c = linear_output[pixel];
+        if (m_highlight_warning && (c.r > 1.0f || c.g > 1.0f || c.b > 1.0f))
+            srgb_output[pixel] = sRGB(RGBA<float>(m_highlight_warning_color, c.a));
+        else
+            srgb_output[pixel] = sRGB(c);
+        }
+    m_variance_gpu->unmap();
+    m_srgb_out_gpu->unmap();
+    m_linear_out_gpu->unmap();
+
+    m_n_samples += n_samples;
+    }
+
+/*! \param w New output buffer width
+    \param h New output buffer height
+*/
+void TracerPath::resize(unsigned int w, unsigned int h)
+    {
+    Tracer::resize(w, h);
+    m_variance_gpu->setSize(w, h);
+    reset();
+    }
+
+/*! \returns True when every pixel in the render region has converged to the target noise level
+ */
+bool TracerPath::isConverged()
+    {
+    if (m_target_noise == 0.0f)
+        return false;
+
+    // only pixels in the render region are sampled
+    bool converged = true;
+    float4* variance = (float4*)m_variance_gpu->map();
+    for (unsigned int j = m_region.y0; j < m_region.y1 && converged; j++)
+        for (unsigned int i = m_region.x0; i < m_region.x1 && converged; i++)
+            {
+            float4 v = variance[j * m_w + i];
+            converged = path_tracer_converged(RGB<float>(v.x, v.y, v.z),
+                                              (unsigned int)v.w,
+                                              m_target_noise);
+            }
+    m_variance_gpu->unmap();
+
+    return converged;
     }
 
 //! Initialize the Material for use in tracing
@@ -53,6 +205,9 @@ void TracerPath::setupMaterial(optix::Material mat, Device* dev)
     {
     optix::Program p = dev->getProgram("path.ptx", "path_closest_hit");
     mat->setClosestHitProgram(TRACER_PATH_RAY_ID, p);
+
+    optix::Program shadow = dev->getProgram("path.ptx", "path_shadow_any_hit");
+    mat->setAnyHitProgram(TRACER_SHADOW_RAY_ID, shadow);
     }
 
 /*! \param scene The Scene to render
@@ -62,7 +217,8 @@ void TracerPath::render(std::shared_ptr<Scene> scene)
     const RGB<float> background_color = scene->getBackgroundColor();
     const float background_alpha = scene->getBackgroundAlpha();
 
-    const Camera camera(scene->getCamera(), m_w, m_h, m_seed);
+    Camera camera(scene->getCamera(), m_w, m_h, m_seed, true, m_sampler);
+    applyFrame(camera);
     const Lights lights(scene->getLights(), camera);
 
     Tracer::render(scene);
@@ -78,6 +234,8 @@ void TracerPath::render(std::shared_ptr<Scene> scene)
     context["bad_color"]->setFloat(1.0f, 0.0f, 1.0f);
     context["srgb_output_buffer"]->set(m_srgb_out_gpu);
     context["linear_output_buffer"]->set(m_linear_out_gpu);
+    setAOVVariables();
+    context["variance_buffer"]->set(m_variance_gpu);
 
     // set camera variables
     context["cam"]->setUserData(sizeof(camera), &camera);
@@ -94,11 +252,39 @@ void TracerPath::render(std::shared_ptr<Scene> scene)
 
     // path tracer settings
     context["seed"]->setUint(m_seed);
-    context["n_samples"]->setUint(m_n_samples);
     context["light_samples"]->setUint(m_light_samples);
+    context["target_noise"]->setFloat(m_target_noise);
+    context["sampler"]->setUint((unsigned int)m_sampler);
+    context["light_sampling"]->setUint(m_light_sampling);
+    context["max_depth"]->setUint(m_max_depth);
+    context["roulette_depth"]->setUint(m_roulette_depth);
+    context["statistics_enabled"]->setUint(m_statistics_enabled);
+    context["statistics_buffer"]->set(m_statistics_gpu);
 
     // TODO: Consider using progressive launches to better utilize multi-gpu systems
-    context->launch(m_ray_gen_entry, m_w, m_h);
+    // launch only over the render region
+    context["region_offset"]->setUint(m_region.x0, m_region.y0);
+    context->launch(m_ray_gen_entry, m_region.x1 - m_region.x0, m_region.y1 - m_region.y0);
+    }
+
+/*! \param scene The Scene to render
+    \param n Number of samples to take
+
+    Launch the path tracer *n* times, stopping early when adaptive sampling converges or when
+    isStopRequested().
+*/
+void TracerPath::renderSamples(std::shared_ptr<Scene> scene, unsigned int n)
+    {
+    for (unsigned int sample = 0; sample < n; sample++)
+        {
+        if (isStopRequested())
+            break;
+
+        render(scene);
+
+        if (m_target_noise > 0.0f && isConverged())
+            break;
+        }
     }
 
 /*! \param m Python module to export in
@@ -109,7 +295,30 @@ void export_TracerPath(pybind11::module& m)
         .def(pybind11::init<std::shared_ptr<Device>, unsigned int, unsigned int, unsigned int>())
         .def("getNumSamples", &TracerPath::getNumSamples)
         .def("reset", &TracerPath::reset)
-        .def("setLightSamples", &TracerPath::setLightSamples);
+        .def("setLightSamples", &TracerPath::setLightSamples)
+        .def("setTargetNoise", &TracerPath::setTargetNoise)
+        .def("getTargetNoise", &TracerPath::getTargetNoise)
+        .def("isConverged", &TracerPath::isConverged)
+        .def("setWavefront", &TracerPath::setWavefront)
+        .def("getWavefront", &TracerPath::getWavefront)
+        .def("setWavefrontSize", &TracerPath::setWavefrontSize)
+        .def("getWavefrontSize", &TracerPath::getWavefrontSize)
+        .def("setSampler", &TracerPath::setSampler)
+        .def("getSampler", &TracerPath::getSampler)
+        .def("setLightSampling", &TracerPath::setLightSampling)
+        .def("getLightSampling", &TracerPath::getLightSampling)
+        .def("setMaxDepth", &TracerPath::setMaxDepth)
+        .def("getMaxDepth", &TracerPath::getMaxDepth)
+        .def("setRouletteDepth", &TracerPath::setRouletteDepth)
+        .def("getRouletteDepth", &TracerPath::getRouletteDepth)
+        .def("setStatisticsEnabled", &TracerPath::setStatisticsEnabled)
+        .def("getStatisticsEnabled", &TracerPath::getStatisticsEnabled)
+        .def("getStatistics", &TracerPath::getStatistics)
+        .def("getAccumulator", &TracerPath::getAccumulator)
+        .def("mergeAccumulator", &TracerPath::mergeAccumulator)
+        .def("renderSamples",
+             &TracerPath::renderSamples,
+             pybind11::call_guard<pybind11::gil_scoped_release>());
     }
 
     } // namespace gpu
@@ -5,9 +5,11 @@
 #define TRACER_PATH_H_
 
 #include <optixu/optixpp_namespace.h>
+#include <pybind11/numpy.h>
 #include <pybind11/pybind11.h>
 
 #include "Tracer.h"
+#include "common/PathStatistics.h"
 
 namespace fresnel
     {
@@ -16,7 +18,9 @@ namespace gpu
 //! Path tracer
 /*! GPU code for the tracer is in path.cu
 
-    See cpu::TracerPath for API documentation
+    See cpu::TracerPath for API documentation. The GPU implementation tests for convergence per
+   pixel instead of per tile. m_variance_gpu stores the running sum of squared differences from the
+   mean in the rgb components and the number of samples taken in the w component.
 */
 class TracerPath : public Tracer
     {
@@ -35,16 +39,14 @@ class TracerPath : public Tracer
     //! Render a scene
     void render(std::shared_ptr<Scene> scene);
 
+    //! Render many samples of a scene
+    void renderSamples(std::shared_ptr<Scene> scene, unsigned int n);
+
     //! Reset the sampling
     virtual void reset();
 
     //! Resize the output buffer
-    virtual void resize(unsigned int w, unsigned int h)
-        {
-        Tracer::resize(w, h);
-        m_n_samples = 0;
-        m_seed++;
-        }
+    virtual void resize(unsigned int w, unsigned int h);
 
     //! Get the number of samples taken
     unsigned int getNumSamples() const
@@ -58,9 +60,139 @@ class TracerPath : public Tracer
         m_light_samples = light_samples;
         }
 
+    //! Set the target noise level for adaptive sampling
+    void setTargetNoise(float target_noise)
+        {
+        if (target_noise < 0.0f)
+            throw std::runtime_error("Invalid target noise");
+        m_target_noise = target_noise;
+        }
+
+    //! Get the target noise level
+    float getTargetNoise() const
+        {
+        return m_target_noise;
+        }
+
+    //! Test if every pixel has converged
+    bool isConverged();
+
+    //! Set whether to trace secondary bounces in wavefront order
+    /*! OptiX schedules rays on the GPU itself. The setting is stored for API compatibility with the
+       CPU tracer and has no effect.
+    */
+    void setWavefront(bool wavefront)
+        {
+        m_wavefront = wavefront;
+        }
+
+    //! Get whether secondary bounces are traced in wavefront order
+    bool getWavefront() const
+        {
+        return m_wavefront;
+        }
+
+    //! Set the number of camera samples that wavefront mode follows together
+    /*! The setting is stored for API compatibility with the CPU tracer and has no effect.
+     */
+    void setWavefrontSize(unsigned int wavefront_size)
+        {
+        if (wavefront_size == 0)
+            throw std::runtime_error("Invalid wavefront size");
+        m_wavefront_size = wavefront_size;
+        }
+
+    //! Get the number of camera samples that wavefront mode follows together
+    unsigned int getWavefrontSize() const
+        {
+        return m_wavefront_size;
+        }
+
+    //! Set the sequence to draw camera, aperture, and bounce samples from
+    void setSampler(Sampler sampler)
+        {
+        m_sampler = sampler;
+        }
+
+    //! Get the sequence to draw camera, aperture, and bounce samples from
+    Sampler getSampler() const
+        {
+        return m_sampler;
+        }
+
+    //! Set whether to sample the lights directly at each hit
+    void setLightSampling(bool light_sampling)
+        {
+        m_light_sampling = light_sampling;
+        }
+
+    //! Get whether the lights are sampled directly at each hit
+    bool getLightSampling() const
+        {
+        return m_light_sampling;
+        }
+
+    //! Set the maximum number of surfaces a path may hit (0 is unlimited)
+    void setMaxDepth(unsigned int max_depth)
+        {
+        m_max_depth = max_depth;
+        }
+
+    //! Get the maximum number of surfaces a path may hit
+    unsigned int getMaxDepth() const
+        {
+        return m_max_depth;
+        }
+
+    //! Set the depth at which Russian roulette termination starts
+    void setRouletteDepth(unsigned int roulette_depth)
+        {
+        m_roulette_depth = roulette_depth;
+        }
+
+    //! Get the depth at which Russian roulette termination starts
+    unsigned int getRouletteDepth() const
+        {
+        return m_roulette_depth;
+        }
+
+    //! Set whether to count the paths traced
+    void setStatisticsEnabled(bool enabled)
+        {
+        m_statistics_enabled = enabled;
+        }
+
+    //! Get whether the paths traced are counted
+    bool getStatisticsEnabled() const
+        {
+        return m_statistics_enabled;
+        }
+
+    //! Get the path statistics counted since the last reset
+    PathStatistics getStatistics();
+
+    //! Get a copy of the accumulated samples
+    pybind11::tuple getAccumulator();
+
+    //! Merge accumulated samples into the output
+    void mergeAccumulator(pybind11::array_t<float, pybind11::array::c_style> mean,
+                          pybind11::array_t<float, pybind11::array::c_style> m2,
+                          pybind11::array_t<unsigned int, pybind11::array::c_style> pixel_samples,
+                          unsigned int n_samples);
+
     protected:
-    unsigned int m_n_samples;     //!< Number of samples taken since the last reset
-    unsigned int m_light_samples; //!< Number of light samples to take each render()
+    unsigned int m_n_samples;            //!< Number of samples taken since the last reset
+    unsigned int m_light_samples;        //!< Number of light samples to take each render()
+    float m_target_noise = 0.0f;         //!< Target noise level for adaptive sampling (0 disables)
+    optix::Buffer m_variance_gpu;        //!< Per pixel running variance and sample count
+    bool m_wavefront = false;            //!< Wavefront mode flag (unused on the GPU)
+    unsigned int m_wavefront_size = 4096; //!< Wavefront size (unused on the GPU)
+    Sampler m_sampler = Sampler::random; //!< Sequence to draw samples from
+    bool m_light_sampling = false;       //!< True to sample the lights directly at each hit
+    unsigned int m_max_depth = 0;        //!< Maximum number of surfaces a path may hit (0: any)
+    unsigned int m_roulette_depth = 0;   //!< Depth at which Russian roulette starts
+    bool m_statistics_enabled = false;   //!< True to count the paths traced
+    optix::Buffer m_statistics_gpu;      //!< Path statistics counters (see PathStatistics)
     };
 
 //! Export TracerPath to python
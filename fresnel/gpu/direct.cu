@@ -18,9 +18,19 @@ struct alignas(16) PRDradiance
     {
     float3 result;
     unsigned int hit;
+
+    // auxiliary outputs
+    float depth;
+    float3 normal;
+    float3 albedo;
+    unsigned int geometry_id;
+    unsigned int primitive_id;
     };
 
 rtDeclareVariable(uint2, launch_index, rtLaunchIndex, );
+rtDeclareVariable(uint2, region_offset, , );
+rtDeclareVariable(uint2, region_end, , );
+rtDeclareVariable(unsigned int, pixel_scale, , );
 rtDeclareVariable(rtObject, top_object, , );
 rtDeclareVariable(float, scene_epsilon, , );
 rtDeclareVariable(float3, bad_color, , );
@@ -30,6 +40,13 @@ rtDeclareVariable(optix::Ray, ray, rtCurrentRay, );
 rtBuffer<float4, 2> linear_output_buffer;
 rtBuffer<uchar4, 2> srgb_output_buffer;
 
+rtDeclareVariable(unsigned int, aovs_enabled, , );
+rtBuffer<float, 2> depth_buffer;
+rtBuffer<float3, 2> normal_buffer;
+rtBuffer<float3, 2> albedo_buffer;
+rtBuffer<unsigned int, 2> geometry_id_buffer;
+rtBuffer<unsigned int, 2> primitive_id_buffer;
+
 ///////////////////////////////////////////////////////////////////////////////////////////
 // variables output from intersection program
 
@@ -44,13 +61,17 @@ rtDeclareVariable(RGB<float>, shading_color, attribute shading_color, );
  */
 RT_PROGRAM void direct_exception()
     {
+    // launches cover only the render region, offset the index to find the output pixel
+    const uint2 pixel_index = make_uint2(launch_index.x * pixel_scale + region_offset.x,
+                                         launch_index.y * pixel_scale + region_offset.y);
+
     const unsigned int code = rtGetExceptionCode();
 
     if (code == RT_EXCEPTION_STACK_OVERFLOW)
         {
-        linear_output_buffer[launch_index]
+        linear_output_buffer[pixel_index]
             = make_float4(bad_color.x, bad_color.y, bad_color.z, 1.0f);
-        srgb_output_buffer[launch_index]
+        srgb_output_buffer[pixel_index]
             = make_uchar4(255.0f * bad_color.x, 255.0f * bad_color.y, 255.0f * bad_color.z, 255);
         }
     else
@@ -74,11 +95,23 @@ rtDeclareVariable(unsigned int, seed, , );
  */
 RT_PROGRAM void direct_ray_gen()
     {
-    // determine the viewing plane relative coordinates
-    optix::size_t2 screen = linear_output_buffer.size();
+    // launches cover only the render region in blocks of pixel_scale x pixel_scale pixels, find the
+    // first output pixel of the block
+    const uint2 block_index = make_uint2(launch_index.x * pixel_scale + region_offset.x,
+                                         launch_index.y * pixel_scale + region_offset.y);
+    const uint2 block_end = make_uint2(min(block_index.x + pixel_scale, region_end.x),
+                                       min(block_index.y + pixel_scale, region_end.y));
+
+    // sample the center of the block
+    const uint2 pixel_index = make_uint2(min(block_index.x + pixel_scale / 2, region_end.x - 1),
+                                         min(block_index.y + pixel_scale / 2, region_end.y - 1));
 
     // create the ray generator for this pixel
-    RayGen ray_gen(launch_index.x, launch_index.y, screen.x, screen.y, seed);
+    RayGen ray_gen(cam.getFrameX(pixel_index.x),
+                   cam.getFrameY(pixel_index.y),
+                   cam.getFrameWidth(),
+                   cam.getFrameHeight(),
+                   seed);
 
     // loop over AA samples
     RGBA<float> output_avg(0, 0, 0, 0);
@@ -87,15 +120,35 @@ RT_PROGRAM void direct_ray_gen()
         {
         // trace a ray into the scene
         vec3<float> org, dir;
-        cam.generateRay(org, dir, launch_index.x, launch_index.y, sample);
+        cam.generateRay(org, dir, pixel_index.x, pixel_index.y, sample);
 
         optix::Ray ray(org, dir, TRACER_PREVIEW_RAY_ID, scene_epsilon);
 
         PRDradiance prd;
         prd.hit = 0;
+        prd.depth = __int_as_float(0x7f800000);
+        prd.normal = make_float3(0.0f, 0.0f, 0.0f);
+        prd.albedo = make_float3(0.0f, 0.0f, 0.0f);
+        prd.geometry_id = 0xffffffff;
+        prd.primitive_id = 0xffffffff;
 
         rtTrace(top_object, ray, prd);
 
+        // record the auxiliary outputs of the first sample
+        if (sample == 0 && aovs_enabled)
+            {
+            for (unsigned int j = block_index.y; j < block_end.y; j++)
+                for (unsigned int i = block_index.x; i < block_end.x; i++)
+                    {
+                    const uint2 index = make_uint2(i, j);
+                    depth_buffer[index] = prd.depth;
+                    normal_buffer[index] = prd.normal;
+                    albedo_buffer[index] = prd.albedo;
+                    geometry_id_buffer[index] = prd.geometry_id;
+                    primitive_id_buffer[index] = prd.primitive_id;
+                    }
+            }
+
         // determine the output pixel color
         RGB<float> c(background_color);
         float a = background_alpha;
@@ -112,7 +165,7 @@ RT_PROGRAM void direct_ray_gen()
     // correct aa sample average
     RGBA<float> output_pixel = output_avg / float(aa_n * aa_n);
 
-    // write the output pixel
+    // convert the output pixel to sRGB
     RGBA<unsigned char> srgb_output_pixel(0, 0, 0, 0);
     if (!highlight_warning
         || (output_pixel.r <= 1.0f && output_pixel.g <= 1.0f && output_pixel.b <= 1.0f))
@@ -120,12 +173,17 @@ RT_PROGRAM void direct_ray_gen()
     else
         srgb_output_pixel = sRGB(RGBA<float>(highlight_warning_color, output_pixel.a));
 
-    linear_output_buffer[launch_index]
-        = make_float4(output_pixel.r, output_pixel.g, output_pixel.b, output_pixel.a);
-    srgb_output_buffer[launch_index] = make_uchar4(srgb_output_pixel.r,
-                                                   srgb_output_pixel.g,
-                                                   srgb_output_pixel.b,
-                                                   srgb_output_pixel.a);
+    // fill the block
+    for (unsigned int j = block_index.y; j < block_end.y; j++)
+        for (unsigned int i = block_index.x; i < block_end.x; i++)
+            {
+            linear_output_buffer[make_uint2(i, j)]
+                = make_float4(output_pixel.r, output_pixel.g, output_pixel.b, output_pixel.a);
+            srgb_output_buffer[make_uint2(i, j)] = make_uchar4(srgb_output_pixel.r,
+                                                               srgb_output_pixel.g,
+                                                               srgb_output_pixel.b,
+                                                               srgb_output_pixel.a);
+            }
     }
 
 ///////////////////////////////////////////////////////////////////////////////////////////
@@ -134,6 +192,8 @@ RT_PROGRAM void direct_ray_gen()
 rtDeclareVariable(Material, material, , );
 rtDeclareVariable(Material, outline_material, , );
 rtDeclareVariable(float, outline_width, , );
+rtDeclareVariable(unsigned int, geometry_id, , );
+rtDeclareVariable(float, t_hit, rtIntersectionDistance, );
 
 //! Determine result color
 /*! Implement Whitted ray material
@@ -213,4 +273,11 @@ RT_PROGRAM void direct_closest_hit()
 
     prd_radiance.result = float3(c);
     prd_radiance.hit = 1;
+
+    // auxiliary outputs, with the normal facing the camera
+    prd_radiance.depth = t_hit * sqrtf(dot(dir, dir));
+    prd_radiance.normal = float3(dot(n, v) < 0.0f ? -n : n);
+    prd_radiance.albedo = float3(m.getColor(shading_color));
+    prd_radiance.geometry_id = geometry_id;
+    prd_radiance.primitive_id = rtGetPrimitiveIndex();
     }
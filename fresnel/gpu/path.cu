@@ -11,18 +11,34 @@
 
 using namespace fresnel;
 
+//! Per ray data for shadow rays
+struct PRDshadow
+    {
+    unsigned int visible; //!< Set to 0 when the shadow ray hits any primitive
+    };
+
 ///////////////////////////////////////////////////////////////////////////////////////////
 // scene wide variables
 
 rtDeclareVariable(uint2, launch_index, rtLaunchIndex, );
+rtDeclareVariable(uint2, region_offset, , );
 rtDeclareVariable(rtObject, top_object, , );
 rtDeclareVariable(float, scene_epsilon, , );
 rtDeclareVariable(float3, bad_color, , );
 rtDeclareVariable(PRDpath, prd_path, rtPayload, );
+rtDeclareVariable(PRDshadow, prd_shadow, rtPayload, );
 rtDeclareVariable(optix::Ray, ray, rtCurrentRay, );
 
 rtBuffer<float4, 2> linear_output_buffer;
 rtBuffer<uchar4, 2> srgb_output_buffer;
+rtBuffer<float4, 2> variance_buffer;
+
+rtDeclareVariable(unsigned int, aovs_enabled, , );
+rtBuffer<float, 2> depth_buffer;
+rtBuffer<float3, 2> normal_buffer;
+rtBuffer<float3, 2> albedo_buffer;
+rtBuffer<unsigned int, 2> geometry_id_buffer;
+rtBuffer<unsigned int, 2> primitive_id_buffer;
 
 ///////////////////////////////////////////////////////////////////////////////////////////
 // variables output from intersection program
@@ -38,13 +54,17 @@ rtDeclareVariable(RGB<float>, shading_color, attribute shading_color, );
  */
 RT_PROGRAM void path_exception()
     {
+    // launches cover only the render region, offset the index to find the output pixel
+    const uint2 pixel_index
+        = make_uint2(launch_index.x + region_offset.x, launch_index.y + region_offset.y);
+
     const unsigned int code = rtGetExceptionCode();
 
     if (code == RT_EXCEPTION_STACK_OVERFLOW)
         {
-        linear_output_buffer[launch_index]
+        linear_output_buffer[pixel_index]
             = make_float4(bad_color.x, bad_color.y, bad_color.z, 1.0f);
-        srgb_output_buffer[launch_index]
+        srgb_output_buffer[pixel_index]
             = make_uchar4(255.0f * bad_color.x, 255.0f * bad_color.y, 255.0f * bad_color.z, 255);
         }
     else
@@ -61,31 +81,70 @@ rtDeclareVariable(unsigned int, highlight_warning, , );
 rtDeclareVariable(float, background_alpha, , );
 rtDeclareVariable(Lights, lights, , );
 rtDeclareVariable(unsigned int, seed, , );
-rtDeclareVariable(unsigned int, n_samples, , );
 rtDeclareVariable(unsigned int, light_samples, , );
+rtDeclareVariable(float, target_noise, , );
+rtDeclareVariable(unsigned int, sampler, , );
+rtDeclareVariable(unsigned int, light_sampling, , );
+rtDeclareVariable(unsigned int, max_depth, , );
+rtDeclareVariable(unsigned int, roulette_depth, , );
+rtDeclareVariable(unsigned int, statistics_enabled, , );
+rtBuffer<unsigned long long, 1> statistics_buffer;
 
 //! Trace rays for Path tracer
 /*! Implement Path tracer ray generation
  */
 RT_PROGRAM void path_ray_gen()
     {
-    // determine the viewing plane relative coordinates
-    optix::size_t2 screen = linear_output_buffer.size();
+    // launches cover only the render region, offset the index to find the output pixel
+    const uint2 pixel_index
+        = make_uint2(launch_index.x + region_offset.x, launch_index.y + region_offset.y);
+
+    // adaptive sampling: skip pixels that have already converged
+    float4 variance_f = variance_buffer[pixel_index];
+    RGB<float> m2(variance_f.x, variance_f.y, variance_f.z);
+    unsigned int pixel_samples = (unsigned int)variance_f.w;
+    if (target_noise > 0.0f && path_tracer_converged(m2, pixel_samples, target_noise))
+        return;
+
+    // update number of samples in this pixel (the first sample is 1)
+    pixel_samples++;
 
     // create the ray generator for this pixel
-    RayGen ray_gen(launch_index.x, launch_index.y, screen.x, screen.y, seed);
+    RayGen ray_gen(cam.getFrameX(pixel_index.x),
+                   cam.getFrameY(pixel_index.y),
+                   cam.getFrameWidth(),
+                   cam.getFrameHeight(),
+                   seed,
+                   Sampler(sampler));
+
+    // reset the auxiliary outputs, the closest hit program records the first sample's primary hit
+    if (aovs_enabled && pixel_samples == 1)
+        {
+        depth_buffer[pixel_index] = __int_as_float(0x7f800000);
+        normal_buffer[pixel_index] = make_float3(0.0f, 0.0f, 0.0f);
+        albedo_buffer[pixel_index] = make_float3(0.0f, 0.0f, 0.0f);
+        geometry_id_buffer[pixel_index] = 0xffffffff;
+        primitive_id_buffer[pixel_index] = 0xffffffff;
+        }
 
     // per ray data
     PRDpath prd;
     prd.result = RGB<float>(0, 0, 0);
     prd.a = 1.0f;
+    PathStatistics stats = {1, 0, 0, 0, 0};
 
     // trace a path from the camera into the scene light_samples times
     for (prd.light_sample = 0; prd.light_sample < light_samples; prd.light_sample++)
         {
         prd.attenuation = RGB<float>(1.0f, 1.0f, 1.0f);
         prd.done = false;
-        cam.generateRay(prd.origin, prd.direction, launch_index.x, launch_index.y, n_samples);
+        prd.bsdf_pdf = 0.0f;
+        prd.n_shadow_rays = 0;
+        cam.generateRay(prd.origin,
+                        prd.direction,
+                        pixel_index.x,
+                        pixel_index.y,
+                        camera_sample_index(Sampler(sampler), pixel_samples));
 
         for (prd.depth = 0;; prd.depth++)
             {
@@ -97,18 +156,31 @@ RT_PROGRAM void path_ray_gen()
             if (prd.done)
                 break;
             } // end depth loop
-        }     // end light samples loop
+
+        // each light sample traces its own camera ray
+        path_tracer_count_path(stats, prd);
+        stats.rays++;
+        } // end light samples loop
+
+    if (statistics_enabled)
+        {
+        atomicAdd(&statistics_buffer[0], stats.samples);
+        atomicAdd(&statistics_buffer[1], stats.paths);
+        atomicAdd(&statistics_buffer[2], stats.path_length);
+        atomicMax(&statistics_buffer[3], stats.max_path_length);
+        atomicAdd(&statistics_buffer[4], stats.rays);
+        }
 
     RGBA<float> output_sample(prd.result / float(light_samples), prd.a);
 
-    // running average using Welford's method. Variance is not particularly useful to users,
-    // so don't compute that.
-    // (http://jonisalonen.com/2013/deriving-welfords-method-for-computing-variance/)
-    float4 old_mean_f = linear_output_buffer[launch_index];
-    RGBA<float> old_mean = RGBA<float>(old_mean_f.x, old_mean_f.y, old_mean_f.z, old_mean_f.w);
-    RGBA<float> output_pixel = old_mean + (output_sample - old_mean) / float(n_samples);
-    linear_output_buffer[launch_index]
+    // running average and variance using Welford's method. The variance determines when a pixel
+    // has converged in adaptive sampling.
+    float4 old_mean_f = linear_output_buffer[pixel_index];
+    RGBA<float> output_pixel = RGBA<float>(old_mean_f.x, old_mean_f.y, old_mean_f.z, old_mean_f.w);
+    path_tracer_accumulate(output_pixel, m2, output_sample, pixel_samples);
+    linear_output_buffer[pixel_index]
         = make_float4(output_pixel.r, output_pixel.g, output_pixel.b, output_pixel.a);
+    variance_buffer[pixel_index] = make_float4(m2.r, m2.g, m2.b, float(pixel_samples));
 
     // convert the current average output to sRGB
     RGBA<unsigned char> srgb_output_pixel(0, 0, 0, 0);
@@ -118,10 +190,10 @@ RT_PROGRAM void path_ray_gen()
     else
         srgb_output_pixel = sRGB(RGBA<float>(highlight_warning_color, output_pixel.a));
 
-    srgb_output_buffer[launch_index] = make_uchar4(srgb_output_pixel.r,
-                                                   srgb_output_pixel.g,
-                                                   srgb_output_pixel.b,
-                                                   srgb_output_pixel.a);
+    srgb_output_buffer[pixel_index] = make_uchar4(srgb_output_pixel.r,
+                                                  srgb_output_pixel.g,
+                                                  srgb_output_pixel.b,
+                                                  srgb_output_pixel.a);
     }
 
 ///////////////////////////////////////////////////////////////////////////////////////////
@@ -131,18 +203,48 @@ rtDeclareVariable(Material, material, , );
 rtDeclareVariable(Material, outline_material, , );
 rtDeclareVariable(float, outline_width, , );
 rtDeclareVariable(float, t_hit, rtIntersectionDistance, );
+rtDeclareVariable(unsigned int, geometry_id, , );
 
 //! Determine result color
 /*! Implement Whitted ray material
  */
 RT_PROGRAM void path_closest_hit()
     {
-    optix::size_t2 screen = linear_output_buffer.size();
-    RayGen ray_gen(launch_index.x, launch_index.y, screen.x, screen.y, seed);
+    // launches cover only the render region, offset the index to find the output pixel
+    const uint2 pixel_index
+        = make_uint2(launch_index.x + region_offset.x, launch_index.y + region_offset.y);
+
+    RayGen ray_gen(cam.getFrameX(pixel_index.x),
+                   cam.getFrameY(pixel_index.y),
+                   cam.getFrameWidth(),
+                   cam.getFrameHeight(),
+                   seed,
+                   Sampler(sampler));
+
+    // the ray generation program updates the pixel sample count after tracing all paths
+    unsigned int pixel_samples = (unsigned int)variance_buffer[pixel_index].w + 1;
 
     vec3<float> ray_origin(ray.origin);
     vec3<float> ray_direction(ray.direction);
 
+    // record the auxiliary outputs of the first sample's primary hit, with the normal facing the
+    // camera
+    if (aovs_enabled && pixel_samples == 1 && prd_path.depth == 0 && prd_path.light_sample == 0)
+        {
+        vec3<float> n = shading_normal * rsqrtf(dot(shading_normal, shading_normal));
+        if (dot(n, ray_direction) > 0.0f)
+            n = -n;
+
+        const Material& m = (shading_distance >= outline_width) ? material : outline_material;
+
+        depth_buffer[pixel_index] = t_hit * sqrtf(dot(ray_direction, ray_direction));
+        normal_buffer[pixel_index] = float3(n);
+        albedo_buffer[pixel_index] = float3(m.getColor(shading_color));
+        geometry_id_buffer[pixel_index] = geometry_id;
+        primitive_id_buffer[pixel_index] = rtGetPrimitiveIndex();
+        }
+
+    PathShadowRays shadow;
     path_tracer_hit(prd_path,
                     material,
                     outline_material,
@@ -154,8 +256,35 @@ RT_PROGRAM void path_closest_hit()
                     ray_direction,
                     t_hit,
                     ray_gen,
-                    n_samples,
-                    light_samples);
+                    pixel_samples,
+                    light_samples,
+                    lights,
+                    light_sampling,
+                    max_depth,
+                    roulette_depth,
+                    shadow);
+
+    // trace the shadow rays and add the light from the visible ones
+    for (unsigned int r = 0; r < shadow.N; r++)
+        {
+        PRDshadow prd;
+        prd.visible = 1;
+        optix::Ray shadow_ray(shadow.origin,
+                              shadow.direction[r],
+                              TRACER_SHADOW_RAY_ID,
+                              scene_epsilon);
+        rtTrace(top_object, shadow_ray, prd);
+
+        if (prd.visible)
+            prd_path.result += shadow.contribution[r];
+        }
+    }
+
+//! Terminate shadow rays at the first hit
+RT_PROGRAM void path_shadow_any_hit()
+    {
+    prd_shadow.visible = 0;
+    rtTerminateRay();
     }
 
 RT_PROGRAM void path_miss()
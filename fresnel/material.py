@@ -331,3 +331,14 @@ class _OutlineMaterialProxy(object):
 
     def _get_cpp_material(self):
         return self._geometry.getOutlineMaterial()
+
+
+def _to_dict(mat):
+    """Get the properties of a material as a JSON serializable dict."""
+    return dict(solid=mat.solid,
+                color=[float(c) for c in mat.color],
+                primitive_color_mix=mat.primitive_color_mix,
+                roughness=mat.roughness,
+                specular=mat.specular,
+                spec_trans=mat.spec_trans,
+                metal=mat.metal)
@@ -14,10 +14,16 @@ See Also:
     - :doc:`examples/02-Advanced-topics/02-Tracer-methods`
 """
 
+import time
 import numpy
 from . import util
+from . import tuning
 from . import _common
 
+INVALID_ID = 2**32 - 1
+"""int: Value of `Tracer.geometry_id` and `Tracer.primitive_id` in pixels where
+the camera ray misses all geometry."""
+
 
 class Tracer(object):
     """Base class for all ray tracers.
@@ -27,6 +33,32 @@ class Tracer(object):
     Each `Tracer` instance stores a pixel output buffer. When you `render` a
     `Scene`, the `output` is updated.
 
+    New tracers load the performance settings `tile_size`, `grain_size`,
+    `tile_order`, and `packet_size` (and `Path.wavefront`) from the machine's
+    profile when there is one. See `fresnel.tune` and `fresnel.tuning`.
+
+    .. _async-rendering:
+
+    .. rubric:: Asynchronous rendering
+
+    Tracers release the GIL while rendering. `render_async` and
+    `Path.sample_async` render in a background thread owned by the `Device
+    <fresnel.Device>` and return a `concurrent.futures.Future` so that Python
+    code can load the next frame or encode the previous image in the
+    meantime. The device runs one render at a time: renders started from
+    different threads or tracers that share a `Device <fresnel.Device>` wait
+    for each other and execute in the order they are submitted.
+
+    Until the future completes:
+
+    * Do not modify the `Scene <fresnel.Scene>` or its geometry, camera, or
+      lights.
+    * Do not read the tracer's `output` or `linear_output`, change its
+      settings, or `resize` it.
+
+    Use a separate `Scene <fresnel.Scene>` and tracer for each frame in flight
+    to prepare the next frame while the current one renders.
+
     Note:
         You cannot instantiate `Tracer` directly. Use one of the subclasses.
     """
@@ -46,22 +78,100 @@ class Tracer(object):
         """
         self._tracer.resize(w, h)
 
-    def render(self, scene):
+    def render(self, scene, region=None):
         """Render a scene.
 
         Args:
             scene (`Scene <fresnel.Scene>`): The scene to render.
+            region (tuple[int, int, int, int]): Render only the pixels in the
+                rectangle ``(x0, y0, x1, y1)``. ``None`` renders the whole
+                output buffer.
 
         Returns:
             A reference to the current output buffer as a
             `fresnel.util.ImageArray`.
 
         Render the given scene and write the resulting pixels into the output
-        buffer.
+        buffer. When *region* is set, the tracer only traces the pixels in
+        ``output[y0:y1, x0:x1]`` and leaves the rest of the output buffer
+        untouched. Use this to re-render part of an image after a local change
+        to the scene.
         """
-        self._tracer.render(scene._scene)
+        with self.device._render_lock:
+            self._set_region(region)
+            try:
+                self._tracer.render(scene._scene)
+            finally:
+                self._tracer.clearRegion()
+
         return self.output
 
+    def render_async(self, scene, region=None):
+        """Render a scene in the background.
+
+        Args:
+            scene (`Scene <fresnel.Scene>`): The scene to render.
+            region (tuple[int, int, int, int]): Render only the pixels in the
+                rectangle ``(x0, y0, x1, y1)``. ``None`` renders the whole
+                output buffer.
+
+        Returns:
+            concurrent.futures.Future: The future result of `render`.
+
+        `render_async` returns immediately and renders the scene in a
+        background thread. The render releases the GIL, so other Python threads
+        can run while it executes. See :ref:`async-rendering` for the rules
+        that apply while the render is in progress.
+        """
+        return self.device._submit(self.render, scene, region)
+
+    def render_views(self, scene, cameras):
+        """Render a scene from many cameras.
+
+        Args:
+            scene (`Scene <fresnel.Scene>`): The scene to render.
+            cameras (list[`camera.Camera <fresnel.camera.Camera>`]): The camera
+                of each view.
+
+        Returns:
+            ``(M, H, W, 4)`` `numpy.ndarray` of ``numpy.uint8``: The sRGB image
+            of each of the *M* views.
+
+        `render_views` renders each view as `render` does with
+        ``scene.camera`` set to that view's camera, and leaves ``scene.camera``
+        unchanged. Use it to render turntables and multi-panel figures. The CPU
+        `Preview` tracer updates the scene once and traces the tiles of every
+        view in one parallel loop, which keeps all cores busy even when the
+        views are small, and leaves `output` unchanged. Other tracers render
+        the views one at a time in `output`.
+        """
+        return self._render_each_view(scene, cameras,
+                                      lambda: self.render(scene))
+
+    def _render_each_view(self, scene, cameras, render):
+        """Call *render* for each camera and collect the outputs."""
+        cameras = list(cameras)
+        h, w, _ = self.output.shape
+        views = numpy.empty(shape=(len(cameras), h, w, 4), dtype=numpy.uint8)
+
+        old_camera = scene.camera
+        try:
+            for i, camera in enumerate(cameras):
+                scene.camera = camera
+                render()
+                views[i] = self.output[:]
+        finally:
+            scene.camera = old_camera
+
+        return views
+
+    def _set_region(self, region):
+        """Set the region of the output buffer to render."""
+        if region is not None:
+            if len(region) != 4:
+                raise ValueError("region must be (x0, y0, x1, y1)")
+            self._tracer.setRegion(*region)
+
     def enable_highlight_warning(self, color=(1, 0, 1)):
         """Enable highlight clipping warnings.
 
@@ -114,8 +224,15 @@ class Tracer(object):
 
         Note:
             The output buffer is modified by `render` and `resize`.
+
+        Note:
+            On the CPU, the sRGB `output` is converted from `linear_output`
+            when its pixels are read, not on every `render`. The `ImageArray`
+            that `output`, `render`, and `Path.sample` return reads the latest
+            image each time it is accessed, and rendering without reading it
+            never converts the image.
         """
-        return util.ImageArray(self._tracer.getSRGBOutputBuffer(), geom=None)
+        return util._TracerImageArray(self._tracer.getSRGBOutputBuffer)
 
     @property
     def linear_output(self):
@@ -126,6 +243,78 @@ class Tracer(object):
         """
         return util.Array(self._tracer.getLinearOutputBuffer(), geom=None)
 
+    @property
+    def aovs(self):
+        """bool: Record auxiliary outputs of the camera rays.
+
+        When `True`, `render` (and `Path.sample`) record the `depth`,
+        `normal`, `albedo`, `geometry_id`, and `primitive_id` of the surface
+        each camera ray hits. The tracers record the auxiliary outputs for the
+        first camera ray in each pixel only, at a small cost in speed and
+        memory. Pass them to `fresnel.denoise` as guides or use them to
+        composite and select objects in the rendered image.
+
+        `Path` records the auxiliary outputs in the first sample after
+        `Path.reset`.
+        """
+        return self._tracer.getAOVsEnabled()
+
+    @aovs.setter
+    def aovs(self, value):
+        self._tracer.setAOVsEnabled(bool(value))
+
+    def _aov(self, buffer):
+        if not self.aovs:
+            raise RuntimeError("Set aovs to True to record auxiliary outputs")
+        return util.Array(buffer, geom=None)
+
+    @property
+    def depth(self):
+        """Array: Distance from the camera to the surface in each pixel.
+
+        The depth is ``inf`` in pixels where the camera ray misses all
+        geometry. Requires `aovs`.
+        """
+        return self._aov(self._tracer.getDepthBuffer())
+
+    @property
+    def normal(self):
+        """Array: Unit surface normal in each pixel.
+
+        The normal faces the camera. It is ``(0, 0, 0)`` in pixels where the
+        camera ray misses all geometry. Requires `aovs`.
+        """
+        return self._aov(self._tracer.getNormalBuffer())
+
+    @property
+    def albedo(self):
+        """Array: Linear material color of the surface in each pixel.
+
+        The albedo is ``(0, 0, 0)`` in pixels where the camera ray misses all
+        geometry. Requires `aovs`.
+        """
+        return self._aov(self._tracer.getAlbedoBuffer())
+
+    @property
+    def geometry_id(self):
+        """Array: Geometry in each pixel.
+
+        Compare to `Geometry.id <fresnel.geometry.Geometry.id>`. The id is
+        `INVALID_ID` in pixels where the camera ray misses all geometry.
+        Requires `aovs`.
+        """
+        return self._aov(self._tracer.getGeometryIDBuffer())
+
+    @property
+    def primitive_id(self):
+        """Array: Index of the primitive in each pixel.
+
+        The primitive is the sphere, cylinder, polygon, polyhedron, or mesh
+        instance within the geometry. The id is `INVALID_ID` in pixels where
+        the camera ray misses all geometry. Requires `aovs`.
+        """
+        return self._aov(self._tracer.getPrimitiveIDBuffer())
+
     @property
     def seed(self):
         """int: Random number seed."""
@@ -135,6 +324,81 @@ class Tracer(object):
     def seed(self, value):
         self._tracer.setSeed(value)
 
+    @property
+    def packet_size(self):
+        """int: Number of camera rays traced together.
+
+        The CPU tracers trace the camera rays of neighboring pixels together in
+        packets of 4, 8, or 16 rays, which Embree intersects with the scene
+        using SIMD instructions. A packet size of 1 traces every ray on its
+        own. Packets change the speed of rendering, not the output image.
+
+        The GPU ignores `packet_size`.
+        """
+        return self._tracer.getPacketSize()
+
+    @packet_size.setter
+    def packet_size(self, value):
+        self._tracer.setPacketSize(value)
+
+    @property
+    def tile_size(self):
+        """int: Width and height of the tiles that CPU threads render.
+
+        The CPU tracers split the image into square tiles and render the tiles
+        in parallel. Larger tiles reduce the scheduling overhead on machines
+        with many cores. Smaller tiles balance the load better when the render
+        time varies across the image.
+
+        The GPU ignores `tile_size`.
+        """
+        return self._tracer.getTileSize()
+
+    @tile_size.setter
+    def tile_size(self, value):
+        self._tracer.setTileSize(value)
+
+    @property
+    def grain_size(self):
+        """int: Minimum number of tiles in each parallel task on the CPU.
+
+        The GPU ignores `grain_size`.
+        """
+        return self._tracer.getGrainSize()
+
+    @grain_size.setter
+    def grain_size(self, value):
+        self._tracer.setGrainSize(value)
+
+    @property
+    def tile_order(self):
+        """str: Order in which CPU threads take tiles from the image.
+
+        * ``'row_major'``: Left to right, then top to bottom.
+        * ``'morton'``: Along a Morton (Z-order) curve.
+        * ``'hilbert'``: Along a Hilbert curve.
+
+        Each thread renders a contiguous range of tiles. Morton and Hilbert
+        order give each thread a compact region of the image, which touches a
+        smaller part of the scene and uses the CPU caches more effectively.
+        The tile order does not change the output image.
+
+        The default is ``'hilbert'``. Before v0.13.0, the CPU tracers always
+        rendered tiles in row major order. Renders that stop early (see
+        `render_async`) now leave their unrendered pixels in compact blocks
+        instead of strips of rows. Set `tile_order` to ``'row_major'`` to
+        restore the previous behavior.
+
+        The GPU ignores `tile_order`.
+        """
+        return self._tracer.getTileOrder().name
+
+    @tile_order.setter
+    def tile_order(self, value):
+        if value not in _common.TileOrder.__members__:
+            raise ValueError("Invalid tile order: " + str(value))
+        self._tracer.setTileOrder(_common.TileOrder.__members__[value])
+
 
 class Preview(Tracer):
     """Preview ray tracer.
@@ -162,12 +426,33 @@ class Preview(Tracer):
     the image. The anti-aliasing level corresponds to ``aa_level=3`` in fresnel
     versions up to 0.11.0. Different `seed` values will result in different
     output images.
+
+    .. rubric:: Relighting
+
+    Set `cache_hits` to True to keep the surface hit by every camera ray when
+    rendering. After changing the scene's lights, background, or geometry
+    materials and outline widths, call `relight` to shade the cached hits
+    without tracing any rays. `relight` produces the same image as `render`
+    in a fraction of the time, which makes interactive tuning of the lighting
+    fast in large scenes:
+
+    .. code-block:: python
+
+        tracer.cache_hits = True
+        tracer.render(scene)
+        scene.lights[0].color = (1, 0.5, 0.5)
+        tracer.relight(scene)
+
+    The cache stores 32 bytes for every anti-aliasing sample, or about 2 GB
+    for a 1000x1000 image with `anti_alias`. Call `render` after moving the
+    camera or modifying the geometry.
     """
 
     def __init__(self, device, w, h, anti_alias=True):
         self.device = device
         self._tracer = device.module.TracerDirect(device._device, w, h)
         self.anti_alias = anti_alias
+        tuning.apply(self)
 
     @property
     def anti_alias(self):
@@ -181,6 +466,99 @@ class Preview(Tracer):
         else:
             self._tracer.setAntialiasingN(1)
 
+    @property
+    def cache_hits(self):
+        """bool: Keep the camera ray hits for `relight`.
+
+        The GPU does not cache hits. With the GPU, `relight` renders the scene.
+        """
+        return self._tracer.getHitCacheEnabled()
+
+    @cache_hits.setter
+    def cache_hits(self, value):
+        self._tracer.setHitCacheEnabled(bool(value))
+
+    def render_views(self, scene, cameras):  # noqa
+        if not hasattr(self._tracer, 'renderViews'):
+            return super().render_views(scene, cameras)
+
+        cameras = [camera._camera for camera in cameras]
+        with self.device._render_lock:
+            return self._tracer.renderViews(scene._scene, cameras)
+
+    def relight(self, scene):
+        """Shade the last render with the scene's current lights and materials.
+
+        Args:
+            scene (`Scene <fresnel.Scene>`): The scene to shade.
+
+        Returns:
+            A reference to the current output buffer as a
+            `fresnel.util.ImageArray`.
+
+        `relight` shades the camera ray hits cached by the last `render` with
+        the current lights, background, materials, and outline widths in
+        *scene*. It updates the pixels that the last `render` traced, including
+        its region. When there is no cache (`cache_hits` is False or the
+        tracer has been resized since the last `render`), `relight` renders the
+        whole scene instead.
+
+        Warning:
+            `relight` does not detect changes to the camera or geometry,
+            including the geometry colors: the cache keeps the color of each
+            hit, so `relight` ignores writes to ``color`` arrays. Call
+            `render` after making any of these changes.
+        """
+        with self.device._render_lock:
+            self._tracer.relight(scene._scene)
+
+        return self.output
+
+    def render_progressive(self, scene, scales=(8, 2, 1), region=None):
+        """Render a scene in progressively refined passes.
+
+        Args:
+            scene (`Scene <fresnel.Scene>`): The scene to render.
+            scales (list[int]): Width and height of the pixel blocks that
+                share a single primary ray in each pass.
+            region (tuple[int, int, int, int]): Render only the pixels in the
+                rectangle ``(x0, y0, x1, y1)``. ``None`` renders the whole
+                output buffer.
+
+        Yields:
+            ImageArray: A reference to the current `output` buffer after each
+            pass.
+
+        `render_progressive` is a generator. The first pass traces one ray per
+        ``scales[0]`` by ``scales[0]`` block of pixels, which gives a coarse
+        image of a large scene almost immediately. Each following pass traces
+        the next (finer) scale. These passes do not anti-alias. When
+        `anti_alias` is True, a final pass renders the full resolution image
+        with anti-aliasing. The final image is the same as `render` produces.
+
+        .. code-block:: python
+
+            for image in tracer.render_progressive(scene):
+                display(image)
+
+        Stop iterating to skip the remaining passes.
+        """
+        aa_n = self._tracer.getAntialiasingN()
+        passes = [(scale, 1) for scale in scales]
+        if aa_n > 1:
+            passes.append((1, aa_n))
+
+        for scale, pass_aa_n in passes:
+            self._tracer.setPixelScale(scale)
+            self._tracer.setAntialiasingN(pass_aa_n)
+            try:
+                output = self.render(scene, region=region)
+            finally:
+                self._tracer.setPixelScale(1)
+                self._tracer.setAntialiasingN(aa_n)
+
+            yield output
+
 
 class Path(Tracer):
     """Path tracer.
@@ -195,12 +573,17 @@ class Path(Tracer):
     call to `render` performs one sample per pixel. The `output` image is the
     mean of all the samples. Many samples are required to produce a smooth
     image. `sample` provides a convenience API to make many samples with a
-    single call.
+    single call. `sample` takes all of the samples in native code without
+    holding the Python global interpreter lock.
     """
 
     def __init__(self, device, w, h):
         self.device = device
         self._tracer = device.module.TracerPath(device._device, w, h, 1)
+        tuning.apply(self)
+
+        # seeds of the samples in the accumulator, see merge
+        self._seeds = set()
 
     def reset(self):
         """Clear the output buffer.
@@ -209,20 +592,54 @@ class Path(Tracer):
         new image is statistically independent from the previous.
         """
         self._tracer.reset()
-
-    def sample(self, scene, samples, reset=True, light_samples=1):
+        self._seeds = set()
+
+    def render(self, scene, region=None):  # noqa
+        output = super().render(scene, region)
+        self._seeds.add(self.seed)
+        return output
+
+    def sample(self,
+               scene,
+               samples=None,
+               reset=True,
+               light_samples=1,
+               target_noise=None,
+               region=None,
+               time_budget=None,
+               progress=None,
+               cancel=None):
         r"""Sample the image.
 
         Args:
             scene (`Scene`): The scene to render.
 
-            samples (int): The number of samples to take per pixel.
+            samples (int): The number of samples to take per pixel. ``None``
+                samples until *time_budget* runs out.
 
             reset (bool): When True, call `reset` before sampling
 
             light_samples (int): The number of light samples per primary camera
                 ray.
 
+            target_noise (float): Stop sampling pixels when the standard error
+                of their mean falls below this value (in linear color units).
+                ``None`` samples every pixel *samples* times.
+
+            region (tuple[int, int, int, int]): Sample only the pixels in the
+                rectangle ``(x0, y0, x1, y1)``. ``None`` samples the whole
+                output buffer.
+
+            time_budget (float): Stop sampling after this many seconds.
+
+            progress (callable): Function to call after each pass of samples
+                as ``progress(samples, elapsed)``, where *samples* is the
+                number of samples per pixel taken so far and *elapsed* is the
+                time since `sample` started in seconds.
+
+            cancel (`CancelToken`): Stop sampling when this token is
+                cancelled.
+
         As an unbiased renderer, the sampling noise will scale as
         :math:`\frac{1}{\sqrt{\text{total_samples}}}`, where ``total_samples``
         is ``samples*light_samples``.
@@ -239,6 +656,45 @@ class Path(Tracer):
         > 1`` can boost performance moderately. On the CPU, it can boost
         performance slightly due to improved cache coherency.
 
+        .. rubric:: Adaptive sampling
+
+        When *target_noise* is set, the tracer estimates the variance of each
+        pixel and stops sampling regions of the image (tiles on the CPU, pixels
+        on the GPU) after every pixel in the region converges to the target
+        noise level. Flat backgrounds and solid materials converge quickly,
+        leaving more of the render time for the noisy regions of the image. In
+        this mode, *samples* is the maximum number of samples per pixel and
+        `sample` returns early when the entire image converges. Pixels are
+        only tested for convergence after taking at least 16 samples.
+
+        .. rubric:: Time budgets and cancellation
+
+        When *time_budget* or *progress* is set, `sample` takes samples in
+        passes over the image, doubling the number of samples in each pass. It
+        measures the time each pass takes and sizes the next pass to fit in the
+        remaining *time_budget*. It calls *progress* after every pass. The
+        tracer also stops sampling in native code when the budget runs out, so
+        `sample` returns promptly even when a pass takes longer than expected.
+        Set *samples* to the maximum number of samples to take, or ``None`` to
+        sample until the budget runs out.
+
+        Call `CancelToken.cancel` from another thread (or from *progress*) to
+        stop a `sample` call in progress. The tracer checks the token between
+        samples and, on the CPU, between tiles. Pixels keep the samples they
+        have taken so far, so the output remains a valid (noisier) image.
+
+        `sample` does not hold the device's render lock while it calls
+        *progress*, so *progress* may render with other tracers on the same
+        `Device` (for example, to preview the image). *progress* must not call
+        `sample` or `render` on this tracer.
+
+        .. rubric:: Region of interest
+
+        When *region* is set, `sample` traces and accumulates samples only for
+        the pixels in ``output[y0:y1, x0:x1]`` and leaves the rest of the output
+        buffer untouched. Pass ``reset=False`` to refine part of an existing
+        image, as `reset` clears the whole buffer.
+
         Returns:
             ImageArray: A reference to the current `output` buffer.
 
@@ -247,16 +703,396 @@ class Path(Tracer):
             continue to add samples to the current output image. Use the same
             number of light samples when sampling an image in this way.
         """
-        if reset:
-            self.reset()
+        if samples is None and time_budget is None:
+            raise ValueError("Set samples, time_budget, or both")
+
+        with self.device._render_lock:
+            if reset:
+                self.reset()
+
+            self._tracer.setLightSamples(light_samples)
+            if target_noise is not None:
+                self._tracer.setTargetNoise(target_noise)
+
+            if cancel is not None:
+                self._tracer.setCancelToken(cancel._token)
+            if time_budget is not None:
+                self._tracer.setTimeLimit(time_budget)
+
+            try:
+                self._set_region(region)
+                if time_budget is None and progress is None:
+                    self._tracer.renderSamples(scene._scene, samples)
+                else:
+                    self._sample_passes(scene, samples, time_budget, progress)
+            finally:
+                # reset the number of light samples to 1, disable adaptive
+                # sampling, render the whole buffer, and remove the limits to
+                # avoid side effects with future calls to render() by the user
+                self._tracer.setLightSamples(1)
+                self._tracer.setTargetNoise(0)
+                self._tracer.clearRegion()
+                self._tracer.setCancelToken(None)
+                self._tracer.clearTimeLimit()
+
+            self._seeds.add(self.seed)
+
+        return self.output
+
+    def _sample_passes(self, scene, samples, time_budget, progress):
+        """Sample the image in passes of increasing size."""
+        start = time.monotonic()
+        total = 0
+        n = 1
+
+        while samples is None or total < samples:
+            if samples is not None:
+                n = min(n, samples - total)
+
+            pass_start = time.monotonic()
+            self._tracer.renderSamples(scene._scene, n)
+            now = time.monotonic()
+            total += n
+
+            if progress is not None:
+                # let progress render with other tracers on the device
+                self.device._render_lock.release()
+                try:
+                    progress(total, now - start)
+                finally:
+                    self.device._render_lock.acquire()
+
+            if self._tracer.isStopRequested() or self._tracer.isConverged():
+                break
+
+            # double the pass size, but only take as many samples as fit in the
+            # remaining time
+            n *= 2
+            if time_budget is not None:
+                time_per_sample = (now - pass_start) / (n // 2)
+                remaining = time_budget - (time.monotonic() - start)
+                if time_per_sample > 0:
+                    n = min(n, int(remaining / time_per_sample))
+                if n < 1:
+                    break
+
+    def sample_async(self, scene, samples=None, **kwargs):
+        """Sample the image in the background.
+
+        Args:
+            scene (`Scene`): The scene to render.
+            samples (int): The number of samples to take per pixel.
+            kwargs: Additional arguments to `sample`.
+
+        Returns:
+            concurrent.futures.Future: The future result of `sample`.
+
+        `sample_async` returns immediately and samples the image in a
+        background thread. See :ref:`async-rendering` for the rules that apply
+        while sampling is in progress.
+        """
+        return self.device._submit(self.sample, scene, samples, **kwargs)
+
+    def render_views(self, scene, cameras, samples=64, **kwargs):
+        """Sample a scene from many cameras.
+
+        Args:
+            scene (`Scene`): The scene to render.
+            cameras (list[`camera.Camera <fresnel.camera.Camera>`]): The camera
+                of each view.
+            samples (int): The number of samples to take per pixel in each
+                view.
+            kwargs: Additional arguments to `sample`.
+
+        Returns:
+            ``(M, H, W, 4)`` `numpy.ndarray` of ``numpy.uint8``: The sRGB image
+            of each of the *M* views.
+
+        `render_views` calls `sample` once for each view with ``scene.camera``
+        set to that view's camera, and leaves ``scene.camera`` unchanged. The
+        `output` holds the last view when it completes.
+        """
+        return self._render_each_view(
+            scene, cameras,
+            lambda: self.sample(scene, samples, reset=True, **kwargs))
+
+    def get_state(self):
+        """Get the accumulated samples.
+
+        Returns:
+            dict: Copies of the sampler state with the keys:
+
+            * ``mean``: ``(H, W, 4)`` mean of the samples in each pixel (linear
+              color).
+            * ``m2``: ``(H, W, 3)`` sum of squared differences from the mean in
+              each pixel.
+            * ``pixel_samples``: ``(H, W)`` number of samples in each pixel.
+            * ``samples``: Number of samples per pixel taken since the last
+              `reset`. Adaptive sampling, time budgets, and cancellation may
+              stop sampling before the requested number of samples.
+            * ``seed``: The current random number `seed`.
+            * ``seeds``: The seeds of all the samples, including those added
+              by `merge`.
+
+        The state holds only `numpy.ndarray` and `int` values, so it may be
+        pickled and sent to another process. Pass it to `merge` to combine
+        samples taken by different tracers.
+        """
+        mean, m2, pixel_samples = self._tracer.getAccumulator()
+        return dict(mean=mean,
+                    m2=m2,
+                    pixel_samples=pixel_samples,
+                    samples=self._tracer.getNumSamples(),
+                    seed=self.seed,
+                    seeds=sorted(self._seeds))
+
+    def merge(self, state):
+        """Combine samples taken by another tracer with this one.
+
+        Args:
+            state (dict): Sampler state from `get_state`.
+
+        `merge` adds the samples in *state* to the samples this tracer has
+        taken since the last `reset`. The `output` becomes the mean of all the
+        samples and the per pixel variance used by adaptive sampling is
+        combined exactly, as if this tracer had taken every sample itself.
+        Merge into a freshly `reset` tracer to restore a saved state.
+
+        Split a long render among processes by giving each a different `seed`
+        and a share of the samples::
+
+            # in each worker
+            tracer.seed = worker_index
+            tracer.sample(scene, samples=samples // n_workers)
+            state = tracer.get_state()
+
+            # in the coordinator
+            tracer.reset()
+            for state in states:
+                tracer.merge(state)
+
+        `merge` keeps track of the seeds of the samples it holds, and refuses
+        a state with samples taken with any of the same seeds, which would be
+        identical, not independent.
+
+        Raises:
+            ValueError: When the state has a different image size than the
+                `output`, or holds samples taken with the same seed as samples
+                this tracer already holds.
+        """
+        mean = numpy.ascontiguousarray(state['mean'], dtype=numpy.float32)
+        m2 = numpy.ascontiguousarray(state['m2'], dtype=numpy.float32)
+        pixel_samples = numpy.ascontiguousarray(state['pixel_samples'],
+                                                dtype=numpy.uint32)
+
+        h, w, _ = self.linear_output.shape
+        if (mean.shape != (h, w, 4) or m2.shape != (h, w, 3)
+                or pixel_samples.shape != (h, w)):
+            raise ValueError("state must have the same image size as output")
+
+        seeds = set()
+        if state['samples'] > 0:
+            seeds = set(state.get('seeds', [state['seed']]))
+        if seeds & self._seeds:
+            raise ValueError("state has samples with the same seed: "
+                             f"{sorted(seeds & self._seeds)}")
+
+        with self.device._render_lock:
+            self._tracer.mergeAccumulator(mean, m2, pixel_samples,
+                                          state['samples'])
+        self._seeds |= seeds
+
+    @property
+    def wavefront(self):
+        """bool: Follow many paths together one bounce at a time.
+
+        By default, the CPU path tracer follows each path from the camera to
+        the end before starting the next. Rays after the first bounce point in
+        random directions, so consecutive rays touch unrelated parts of the
+        scene. When `wavefront` is True, each thread takes one sample in every
+        tile of its share of the image per pass and gathers the camera
+        samples of many tiles into batches of `wavefront_size`. At each
+        bounce, it sorts the active rays of a batch by direction and origin,
+        and traces them together with Embree's stream API. This may be faster
+        for scenes with many reflective materials and ``light_samples > 1``.
+        Use `fresnel.tune` to measure it on your machine and scene. The output
+        image is the same to within floating point round off.
+
+        The GPU ignores `wavefront`.
+        """
+        return self._tracer.getWavefront()
+
+    @wavefront.setter
+    def wavefront(self, value):
+        self._tracer.setWavefront(value)
+
+    @property
+    def wavefront_size(self):
+        """int: Number of camera samples that `wavefront` mode follows together.
+
+        Larger batches make longer ray streams with more coherent rays after
+        sorting at the cost of more memory per thread.
+
+        The GPU ignores `wavefront_size`.
+        """
+        return self._tracer.getWavefrontSize()
+
+    @wavefront_size.setter
+    def wavefront_size(self, value):
+        self._tracer.setWavefrontSize(value)
+
+    @property
+    def sampler(self):
+        """str: Sequence that the path tracer draws samples from.
+
+        * ``'random'``: Independent random numbers.
+        * ``'sobol'``: Owen scrambled Sobol points.
+
+        The path tracer draws the location of each camera ray in the pixel, its
+        point on the lens, and the direction of each bounce from the sampler.
+        Independent random samples converge at the plain Monte Carlo rate.
+        Sobol points stratify the samples in each pixel, so the image reaches
+        a given noise level in fewer samples, especially when taking a power of
+        2 samples. Both samplers are deterministic functions of the `seed`,
+        pixel, and sample index.
+        """
+        return self._tracer.getSampler().name
+
+    @sampler.setter
+    def sampler(self, value):
+        if value not in _common.Sampler.__members__:
+            raise ValueError("Invalid sampler: " + str(value))
+        self._tracer.setSampler(_common.Sampler.__members__[value])
+
+    @property
+    def light_sampling(self):
+        """bool: Set to True to sample the lights directly at each hit.
+
+        With light sampling, the path tracer traces a shadow ray toward each
+        light at every bounce and combines the result with the light that the
+        bounce ray finds using multiple importance sampling. Both settings
+        converge to the same image. Light sampling greatly reduces the noise
+        from small lights, which bounce rays rarely hit, at the cost of one
+        extra ray per light per bounce. Light sampling is disabled by default,
+        so that images match those of previous releases.
+        """
+        return self._tracer.getLightSampling()
+
+    @light_sampling.setter
+    def light_sampling(self, value):
+        self._tracer.setLightSampling(bool(value))
+
+    @property
+    def max_depth(self):
+        """int: Maximum number of surfaces a path may hit.
+
+        Paths end after hitting *max_depth* surfaces. ``None`` allows paths of
+        any length, which end only when they escape the scene or by Russian
+        roulette. Limiting the depth speeds up scenes with deep
+        interreflections, such as dense packings, at the cost of a darker,
+        biased image. With `light_sampling`, ``max_depth=1`` renders direct
+        lighting only.
+        """
+        max_depth = self._tracer.getMaxDepth()
+        if max_depth == 0:
+            return None
+        return max_depth
+
+    @max_depth.setter
+    def max_depth(self, value):
+        if value is None:
+            self._tracer.setMaxDepth(0)
+            return
+
+        value = int(value)
+        if value < 1:
+            raise ValueError("max_depth must be at least 1")
+        self._tracer.setMaxDepth(value)
 
-        self._tracer.setLightSamples(light_samples)
+    @property
+    def roulette_depth(self):
+        """int: Depth at which Russian roulette termination starts.
+
+        From this depth on, the path tracer randomly ends paths that carry
+        little light and scales up the paths that continue, which keeps the
+        image unbiased. 0 applies Russian roulette from the first hit. Larger
+        values follow every path for more bounces, which reduces noise in
+        dimly lit regions but takes longer per sample.
+        """
+        return self._tracer.getRouletteDepth()
 
-        for i in range(samples):
-            out = self.render(scene)
+    @roulette_depth.setter
+    def roulette_depth(self, value):
+        value = int(value)
+        if value < 0:
+            raise ValueError("roulette_depth must be non-negative")
+        self._tracer.setRouletteDepth(value)
 
-        # reset the number of light samples to 1 to avoid side effects with
-        # future calls to render() by the user
-        self._tracer.setLightSamples(1)
+    @property
+    def collect_statistics(self):
+        """bool: Set to True to count the paths traced.
 
-        return out
+        See `statistics`.
+        """
+        return self._tracer.getStatisticsEnabled()
+
+    @collect_statistics.setter
+    def collect_statistics(self, value):
+        self._tracer.setStatisticsEnabled(bool(value))
+
+    @property
+    def statistics(self):
+        """dict: Path statistics counted since the last `reset`.
+
+        * ``samples``: Number of camera samples taken.
+        * ``paths``: Number of paths followed.
+        * ``mean_path_length``: Average number of rays in a path, from the
+          camera ray to the ray that ends the path.
+        * ``max_path_length``: Number of rays in the longest path.
+        * ``rays``: Number of rays traced, including camera and shadow rays.
+        * ``rays_per_sample``: Average number of rays traced per camera
+          sample.
+
+        Requires `collect_statistics`.
+        """
+        if not self.collect_statistics:
+            raise RuntimeError(
+                "Set collect_statistics to True to count the paths traced")
+
+        stats = self._tracer.getStatistics()
+        return dict(
+            samples=stats.samples,
+            paths=stats.paths,
+            mean_path_length=stats.path_length / max(stats.paths, 1),
+            max_path_length=stats.max_path_length,
+            rays=stats.rays,
+            rays_per_sample=stats.rays / max(stats.samples, 1))
+
+
+class CancelToken(object):
+    """Cancel a `Path.sample` call in progress.
+
+    Pass a `CancelToken` to `Path.sample` (or `Path.sample_async`) and call
+    `cancel` from any thread to stop sampling early::
+
+        token = fresnel.tracer.CancelToken()
+        future = tracer.sample_async(scene, samples=1000, cancel=token)
+        ...
+        token.cancel()
+        future.result()
+
+    Once cancelled, a token stays cancelled. Use a new token for each
+    `Path.sample` call.
+    """
+
+    def __init__(self):
+        self._token = _common.CancelToken()
+
+    def cancel(self):
+        """Request that sampling stop."""
+        self._token.cancel()
+
+    @property
+    def cancelled(self):
+        """bool: True after `cancel` is called."""
+        return self._token.isCancelled()
@@ -0,0 +1,161 @@
+# Copyright (c) 2016-2020 The Regents of the University of Michigan
+# This file is part of the Fresnel project, released under the BSD 3-Clause
+# License.
+
+"""Per-machine performance profiles.
+
+`fresnel.tune` measures the rendering speed of a scene with several tracer
+configurations and saves the fastest to a profile. `Preview` and `Path` load
+the profile for their `Device` when they are created.
+
+The profile is a JSON file at ``~/.fresnel/profile.json``. Set the environment
+variable ``FRESNEL_PROFILE`` to the path of a different file, or to an empty
+string to disable profiles. Tracers ignore a profile that cannot be read (with
+a warning).
+
+Each machine has its own section of the profile, identified by the host name
+and the `Device` description. Within a machine, settings are stored by scene
+class (see `scene_class`). Tracers load the settings from the most recent call
+to `fresnel.tune` on the machine because they are created before they see a
+scene.
+"""
+
+import json
+import math
+import os
+import platform
+import warnings
+
+tracer_settings = ('tile_size', 'grain_size', 'tile_order', 'packet_size',
+                   'wavefront')
+"""tuple[str]: Tracer properties that tracers load from the profile."""
+
+_latest = '*'
+
+
+def path():
+    """Get the path to the profile.
+
+    Returns:
+        str: The profile file name, or ``None`` when profiles are disabled.
+    """
+    profile = os.environ.get('FRESNEL_PROFILE')
+    if profile is None:
+        return os.path.join(os.path.expanduser('~'), '.fresnel',
+                            'profile.json')
+    if profile == '':
+        return None
+    return profile
+
+
+def machine(device):
+    """Identify the machine and device in the profile.
+
+    Args:
+        device (`Device`): The device.
+
+    Returns:
+        str: The host name, mode, and description of *device*.
+    """
+    return '{} {}: {}'.format(platform.node(), device.mode,
+                              device._device.describe())
+
+
+def scene_class(scene):
+    """Classify a scene by its content.
+
+    Args:
+        scene (`Scene`): The scene.
+
+    Returns:
+        str: The geometry types in *scene* and the order of magnitude of
+        the number of primitives.
+
+    Scenes in the same class tend to perform best with the same settings.
+    """
+    types = sorted(set(type(g).__name__ for g in scene.geometry))
+    n = 0
+    for g in scene.geometry:
+        if hasattr(g, 'position'):
+            n += g.position.shape[0]
+        elif hasattr(g, 'points'):
+            n += g.points.shape[0]
+    magnitude = int(math.log10(n)) if n > 0 else 0
+    return '{}/1e{}'.format('+'.join(types), magnitude)
+
+
+def _read():
+    filename = path()
+    if filename is None or not os.path.exists(filename):
+        return {}
+
+    try:
+        with open(filename, 'r') as f:
+            profile = json.load(f)
+    except (OSError, ValueError) as e:
+        warnings.warn(f"Ignoring unreadable profile {filename}: {e}")
+        return {}
+
+    if not isinstance(profile, dict):
+        warnings.warn(f"Ignoring invalid profile {filename}")
+        return {}
+    return profile
+
+
+def load(device, scene=None):
+    """Load settings from the profile.
+
+    Args:
+        device (`Device`): Load the settings for this device.
+        scene (`Scene`): Load the settings for the class of this scene. When
+            ``None``, load the settings from the most recent call to
+            `fresnel.tune` on this machine.
+
+    Returns:
+        dict: The settings, or an empty dict when there are none.
+    """
+    section = _read().get(machine(device), {})
+    key = _latest if scene is None else scene_class(scene)
+    return section.get(key, {})
+
+
+def save(device, scene, settings):
+    """Save settings to the profile.
+
+    Args:
+        device (`Device`): Save the settings for this device.
+        scene (`Scene`): Save the settings for the class of this scene.
+        settings (dict): The settings.
+
+    The settings also become the most recent settings for the machine, which
+    tracers load by default.
+    """
+    filename = path()
+    if filename is None:
+        return
+
+    profile = _read()
+    section = profile.setdefault(machine(device), {})
+    section[scene_class(scene)] = settings
+    section[_latest] = settings
+
+    directory = os.path.dirname(filename)
+    if directory != '':
+        os.makedirs(directory, exist_ok=True)
+    with open(filename, 'w') as f:
+        json.dump(profile, f, indent=4, sort_keys=True)
+
+
+def apply(tracer, scene=None):
+    """Apply profile settings to a tracer.
+
+    Args:
+        tracer (`tracer.Tracer`): The tracer to configure.
+        scene (`Scene`): Apply the settings for the class of this scene. When
+            ``None``, apply the most recent settings for the machine.
+    """
+    settings = load(tracer.device, scene)
+    for name in tracer_settings:
+        # some settings apply only to some tracers, such as `tracer.Path`
+        if name in settings and hasattr(tracer, name):
+            setattr(tracer, name, settings[name])
@@ -30,6 +30,9 @@ class Array(object):
     data is copied directly from *v* into the internal buffer. Otherwise, it is
     converted to a `numpy.ndarray` before copying.
 
+    Writing to an array that a geometry adopted from a read-only
+    `numpy.ndarray` raises `ValueError`.
+
     .. rubric:: Reading
 
     Read from an array with ``v = array[slice]``. This returns a **copy** of the
@@ -40,12 +43,17 @@ class Array(object):
         dtype: Numpy data type
     """
 
-    def __init__(self, buf, geom):
+    def __init__(self, buf, geom, bounds=True):
         self.buf = buf
         # geom stores a pointer to the owning geometry, so array writes trigger
         # acceleration structure updates set to None if this buffer is not
         # associated with a geometry
         self.geom = geom
+        # bounds is False for attribute buffers (such as color) that do not
+        # change the primitive bounds, writes to them skip the update
+        self.bounds = bounds
+        # _read_only is True after adopting a read-only array, writes raise
+        self._read_only = False
 
         self.buf.map()
         a = numpy.array(self.buf, copy=False)
@@ -55,22 +63,56 @@ class Array(object):
 
     def __setitem__(self, slice, data):
         """Assign a data array to a slice."""
-        self.buf.map()
-        a = numpy.array(self.buf, copy=False)
+        if self._read_only:
+            raise ValueError("Cannot write to an array that adopted read-only "
+                             "memory")
+
+        buf = self.buf
+        buf.map()
+        a = numpy.array(buf, copy=False)
         a[slice] = data
-        self.buf.unmap()
+        buf.unmap()
 
-        if self.geom is not None:
-            self.geom._geometry.update()
+        if self.geom is not None and self.bounds:
+            self.geom._update()
 
     def __getitem__(self, slice):
         """Make a copy of the data in the buffer."""
-        self.buf.map()
-        a = numpy.array(self.buf, copy=False)
+        buf = self.buf
+        buf.map()
+        a = numpy.array(buf, copy=False)
         data = numpy.array(a[slice], copy=True)
-        self.buf.unmap()
+        buf.unmap()
         return data
 
+    def _adopt(self, data):
+        """Use the memory of *data* as the buffer instead of copying it.
+
+        Returns:
+            bool: True when the buffer adopted *data*. False when the device
+            cannot adopt memory and the caller should copy *data* instead.
+
+        Raises:
+            ValueError: When *data* does not match the shape and data type of
+                the buffer or is not C-contiguous.
+        """
+        if not hasattr(self.buf, 'adopt'):
+            return False
+
+        if (data.dtype != self.dtype or data.shape != self.shape
+                or not data.flags.c_contiguous):
+            raise ValueError(
+                f"Cannot adopt a {data.shape} {data.dtype} array: arrays must "
+                f"be C-contiguous and {self.shape} {self.dtype}")
+
+        self.buf.adopt(data)
+        self._read_only = not data.flags.writeable
+
+        if self.geom is not None and self.bounds:
+            self.geom._update()
+
+        return True
+
 
 class ImageArray(Array):
     """Access fresnel images.
@@ -87,16 +129,75 @@ class ImageArray(Array):
         if PIL_Image is None:
             raise RuntimeError("No PIL.Image module to format png")
 
-        self.buf.map()
+        buf = self.buf
+        buf.map()
 
         f = io.BytesIO()
-        a = numpy.array(self.buf, copy=False)
+        a = numpy.array(buf, copy=False)
         PIL_Image.fromarray(a, mode='RGBA').save(f, 'png')
-        self.buf.unmap()
+        buf.unmap()
 
         return f.getvalue()
 
 
+class _TracerImageArray(ImageArray):
+    """Access a tracer's sRGB output when it is read.
+
+    The CPU tracers convert the linear output to sRGB when the sRGB buffer is
+    requested. `_TracerImageArray` requests the buffer on every access, so it
+    always reads the latest image and holding one does not convert the image.
+
+    Args:
+        get_buffer (callable): Function that returns the sRGB buffer.
+    """
+
+    def __init__(self, get_buffer):
+        self._get_buffer = get_buffer
+        self.geom = None
+        self.bounds = True
+        self._read_only = False
+        self.dtype = numpy.dtype(numpy.uint8)
+
+    @property
+    def buf(self):
+        """The sRGB buffer of the tracer."""
+        return self._get_buffer()
+
+    @property
+    def shape(self):
+        """Tuple[int, int, int]: Dimensions of the array."""
+        buf = self.buf
+        buf.map()
+        shape = numpy.array(buf, copy=False).shape
+        buf.unmap()
+        return shape
+
+
+def linear_to_srgb(image):
+    """Convert a linear color image to sRGB.
+
+    Args:
+        image ((H, W, 4) `numpy.ndarray` of ``float32``): Image in linear
+            color space, such as `Tracer.linear_output
+            <fresnel.tracer.Tracer.linear_output>` or the result of
+            `fresnel.denoise`.
+
+    Returns:
+        (H, W, 4) `numpy.ndarray` of ``uint8``: The image in the sRGB color
+        space, in the same format as `Tracer.output
+        <fresnel.tracer.Tracer.output>`.
+    """
+    image = numpy.asarray(image, dtype=numpy.float32)
+    rgb = numpy.maximum(image[..., 0:3], 0)
+    rgb = numpy.where(rgb < 0.0031308, 12.92 * rgb,
+                      1.055 * numpy.power(rgb, 1.0 / 2.4) - 0.055)
+
+    srgb = numpy.empty(image.shape, dtype=numpy.float32)
+    srgb[..., 0:3] = numpy.minimum(rgb, 1.0)
+    srgb[..., 3] = numpy.clip(image[..., 3], 0, 1)
+    return (srgb * 255.0 + 0.5).astype(numpy.uint8)
+
+
 def convex_polyhedron_from_vertices(vertices):
     """Make a convex polyhedron from vertices.
 
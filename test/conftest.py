@@ -61,6 +61,12 @@ def device_name(device):
     return name
 
 
+@pytest.fixture(autouse=True)
+def disable_profile(monkeypatch):
+    """Keep tracers from loading the user's performance profile."""
+    monkeypatch.setenv('FRESNEL_PROFILE', '')
+
+
 @pytest.fixture(scope='session', params=devices, ids=device_name)
 def device_(request):
     """Pytest fixture parameterized over several devices."""
@@ -0,0 +1,156 @@
+"""Test fresnel.animate."""
+
+import fresnel
+import numpy
+import os
+import PIL.Image
+import pytest
+
+import conftest
+
+
+def _frames():
+    """Generate sphere positions for a short animation."""
+    angle = numpy.arange(6) * 2 * numpy.pi / 6
+    for i in range(4):
+        position = numpy.zeros(shape=(6, 3), dtype=numpy.float32)
+        position[:, 0] = (2 + 0.25 * i) * numpy.cos(angle)
+        position[:, 1] = (2 + 0.25 * i) * numpy.sin(angle)
+        yield position
+
+
+def _update(scene, frame):
+    """Move the spheres to the frame's positions."""
+    scene.geometry[0].position[:] = frame
+
+
+def test_render(device_):
+    """Test that render matches rendering each frame."""
+    images = []
+    n = fresnel.animate.render(_frames(),
+                               conftest.scene_hex_sphere,
+                               _update,
+                               images.append,
+                               w=50,
+                               h=40,
+                               device=device_)
+    assert n == 4
+    assert len(images) == 4
+
+    scene = conftest.scene_hex_sphere(device_)
+    tracer = fresnel.tracer.Preview(device=device_, w=50, h=40)
+    for image, frame in zip(images, _frames()):
+        assert image.shape == (40, 50, 4)
+        _update(scene, frame)
+        tracer.render(scene)
+        numpy.testing.assert_array_equal(image, tracer.output[:])
+
+    assert numpy.any(images[0] != images[-1])
+
+
+def test_render_path(device_):
+    """Test that render samples frames with the path tracer."""
+    images = []
+    n = fresnel.animate.render(_frames(),
+                               conftest.scene_hex_sphere,
+                               _update,
+                               images.append,
+                               w=50,
+                               h=40,
+                               method='path',
+                               samples=4,
+                               device=device_)
+    assert n == 4
+
+    scene = conftest.scene_hex_sphere(device_)
+    tracer = fresnel.tracer.Path(device=device_, w=50, h=40)
+    _update(scene, list(_frames())[2])
+    tracer.sample(scene, samples=4)
+    numpy.testing.assert_array_equal(images[2], tracer.output[:])
+
+    with pytest.raises(ValueError):
+        fresnel.animate.render(_frames(),
+                               conftest.scene_hex_sphere,
+                               _update,
+                               images.append,
+                               method='direct',
+                               device=device_)
+
+
+def test_frame_error(device_):
+    """Test that errors raised by the frame iterator propagate."""
+
+    def frames():
+        yield from _frames()
+        raise IOError("bad frame")
+
+    images = []
+    with pytest.raises(IOError):
+        fresnel.animate.render(frames(),
+                               conftest.scene_hex_sphere,
+                               _update,
+                               images.append,
+                               w=50,
+                               h=40,
+                               device=device_)
+
+
+def test_image_files(device_, tmp_path):
+    """Test that ImageFiles saves numbered png files."""
+    images = []
+    sink = fresnel.animate.ImageFiles(str(tmp_path / 'frame{:03d}.png'),
+                                      start=1)
+
+    def save(image):
+        images.append(image)
+        sink(image)
+
+    fresnel.animate.render(_frames(),
+                           conftest.scene_hex_sphere,
+                           _update,
+                           save,
+                           w=50,
+                           h=40,
+                           device=device_)
+
+    for i, image in enumerate(images):
+        saved = numpy.array(PIL.Image.open(tmp_path / f'frame{i + 1:03d}.png'))
+        numpy.testing.assert_array_equal(saved, image)
+
+
+def test_render_processes(device_):
+    """Test that render with processes sinks the frames in order."""
+    images = []
+    n = fresnel.animate.render(_frames(),
+                               conftest.scene_hex_sphere,
+                               _update,
+                               images.append,
+                               w=50,
+                               h=40,
+                               processes=2,
+                               mode=device_.mode)
+    assert n == 4
+    assert len(images) == 4
+
+    serial = []
+    fresnel.animate.render(_frames(),
+                           conftest.scene_hex_sphere,
+                           _update,
+                           serial.append,
+                           w=50,
+                           h=40,
+                           device=device_)
+    for image, expected in zip(images, serial):
+        numpy.testing.assert_array_equal(image, expected)
+
+
+def test_worker_threads():
+    """Test that workers share the CPU cores unless they render on a GPU."""
+    share = max(1, (os.cpu_count() or 1) // 2)
+    if 'cpu' in fresnel.Device.available_modes:
+        assert fresnel.animate._worker_threads('cpu', 2) == share
+    if 'gpu' in fresnel.Device.available_modes:
+        assert fresnel.animate._worker_threads('auto', 2) is None
+        assert fresnel.animate._worker_threads('gpu', 2) is None
+    else:
+        assert fresnel.animate._worker_threads('auto', 2) == share
@@ -0,0 +1,81 @@
+"""Test the denoiser."""
+
+import fresnel
+import numpy
+import pytest
+
+pytestmark = pytest.mark.skipif(not fresnel._common.cpu_built(),
+                                reason="denoise requires the CPU build")
+
+
+def test_constant():
+    """Test that denoising preserves a constant image."""
+    image = numpy.zeros(shape=(30, 40, 4), dtype=numpy.float32)
+    image[:, :] = (0.25, 0.5, 0.75, 1.0)
+
+    result = fresnel.denoise(image)
+    assert result.shape == (30, 40, 4)
+    assert result.dtype == numpy.float32
+    numpy.testing.assert_allclose(result, image, rtol=1e-6)
+
+
+def test_reduce_noise(scene_hex_sphere_):
+    """Test that denoising moves a noisy image closer to a converged one."""
+    tracer = fresnel.tracer.Path(device=scene_hex_sphere_.device, w=50, h=40)
+    tracer.sample(scene_hex_sphere_, samples=128)
+    reference = numpy.copy(tracer.linear_output[:])
+
+    tracer.sample(scene_hex_sphere_, samples=4)
+    noisy = numpy.copy(tracer.linear_output[:])
+    result = fresnel.denoise(tracer.linear_output)
+
+    numpy.testing.assert_array_equal(tracer.linear_output[:], noisy)
+    assert (numpy.mean((result - reference)**2)
+            < numpy.mean((noisy - reference)**2))
+
+    # the filter gives the same result on the device's threads
+    numpy.testing.assert_array_equal(
+        fresnel.denoise(noisy, device=scene_hex_sphere_.device), result)
+
+
+def test_guides():
+    """Test that the guide images stop the filter at edges."""
+    image = numpy.zeros(shape=(20, 20, 4), dtype=numpy.float32)
+    image[:, :10] = (1, 1, 1, 1)
+    image[:, 10:] = (0, 0, 0, 1)
+
+    normal = numpy.zeros(shape=(20, 20, 3), dtype=numpy.float32)
+    normal[:, :10] = (0, 0, 1)
+    normal[:, 10:] = (1, 0, 0)
+
+    depth = numpy.full(shape=(20, 20), fill_value=numpy.inf,
+                       dtype=numpy.float32)
+    depth[:, :10] = 5
+
+    albedo = numpy.ones(shape=(20, 20, 3), dtype=numpy.float32)
+
+    result = fresnel.denoise(image,
+                             albedo=albedo,
+                             normal=normal,
+                             depth=depth,
+                             sigma_color=100)
+    numpy.testing.assert_allclose(result, image, atol=1e-6)
+
+    with pytest.raises(RuntimeError):
+        fresnel.denoise(image, normal=normal[:10])
+
+    with pytest.raises(RuntimeError):
+        fresnel.denoise(image[:, :, 0:3])
+
+
+def test_linear_to_srgb(scene_hex_sphere_):
+    """Test that linear_to_srgb matches the tracer's sRGB output."""
+    tracer = fresnel.tracer.Preview(device=scene_hex_sphere_.device,
+                                    w=50,
+                                    h=40)
+    tracer.render(scene_hex_sphere_)
+
+    srgb = fresnel.util.linear_to_srgb(tracer.linear_output[:])
+    assert srgb.dtype == numpy.uint8
+    difference = numpy.abs(srgb.astype(int) - tracer.output[:].astype(int))
+    assert numpy.max(difference) <= 1
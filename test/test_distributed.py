@@ -0,0 +1,126 @@
+"""Test fresnel.distributed."""
+
+import fresnel
+import numpy
+import pytest
+import threading
+
+import conftest
+
+
+def _bad_scene(device):
+    """Fail to build a scene."""
+    raise ValueError("bad scene")
+
+
+def _start_workers(coordinator, device, n=2):
+    """Start workers in threads of this process."""
+    workers = [
+        threading.Thread(target=fresnel.distributed.work,
+                         args=(coordinator.address, coordinator.authkey,
+                               device)) for i in range(n)
+    ]
+    for worker in workers:
+        worker.start()
+    return workers
+
+
+def test_render_preview(device_):
+    """Test that the tiles form the same image as one render."""
+    coordinator = fresnel.distributed.Coordinator(conftest.scene_hex_sphere,
+                                                  w=50,
+                                                  h=40,
+                                                  method='preview',
+                                                  tile_size=16,
+                                                  seed=3)
+    workers = _start_workers(coordinator, device_)
+
+    progress = []
+    image = coordinator.run(progress=lambda done, total: progress.append(
+        (done, total)))
+    for worker in workers:
+        worker.join()
+
+    assert image.shape == (40, 50, 4)
+    assert progress[-1] == (12, 12)
+
+    scene = conftest.scene_hex_sphere(device_)
+    tracer = fresnel.tracer.Preview(device=device_, w=50, h=40)
+    tracer.seed = 3
+    tracer.render(scene)
+    numpy.testing.assert_allclose(coordinator.linear_output,
+                                  tracer.linear_output[:],
+                                  atol=1e-5)
+    numpy.testing.assert_allclose(image, tracer.output[:], atol=1)
+
+
+def test_render_path(device_):
+    """Test that split samples average to the full image."""
+    coordinator = fresnel.distributed.Coordinator(conftest.scene_hex_sphere,
+                                                  w=50,
+                                                  h=40,
+                                                  samples=8,
+                                                  tile_size=32,
+                                                  sample_split=2)
+    workers = _start_workers(coordinator, device_)
+    image = coordinator.run()
+    for worker in workers:
+        worker.join()
+
+    assert image.shape == (40, 50, 4)
+
+    scene = conftest.scene_hex_sphere(device_)
+    tracer = fresnel.tracer.Path(device=device_, w=50, h=40)
+    tracer.sample(scene, samples=8)
+    assert numpy.mean(coordinator.linear_output[:, :, 0:3]) == pytest.approx(
+        numpy.mean(tracer.linear_output[:, :, 0:3]), rel=0.05)
+
+    with pytest.raises(ValueError):
+        fresnel.distributed.Coordinator(conftest.scene_hex_sphere,
+                                        w=50,
+                                        h=40,
+                                        samples=8,
+                                        sample_split=9)
+
+
+def test_tile_work(device_):
+    """Test that the work of a task scales with the tile, not the image."""
+    renderer = fresnel.distributed._TileRenderer(device_,
+                                                 conftest.scene_hex_sphere,
+                                                 w=500,
+                                                 h=400,
+                                                 method='path',
+                                                 light_samples=1)
+    tile = renderer((32, 16, 48, 28), seed=5, samples=4)
+    assert tile.shape == (12, 16, 4)
+
+    # the tracer holds only the tile and samples only its pixels
+    tile_tracer = renderer.tracers[(16, 12)]
+    assert tile_tracer.linear_output.shape == (12, 16, 4)
+    assert tile_tracer.get_state()['samples'] == 4
+    numpy.testing.assert_array_equal(
+        tile_tracer.get_state()['pixel_samples'], 4)
+
+    tile_tracer.collect_statistics = True
+    renderer((32, 16, 48, 28), seed=5, samples=4)
+    assert tile_tracer.statistics['samples'] == 12 * 16 * 4
+
+    # the tile matches the same pixels of a render of the full image
+    scene = conftest.scene_hex_sphere(device_)
+    tracer = fresnel.tracer.Path(device=device_, w=500, h=400)
+    tracer.reset()
+    tracer.seed = 5
+    tracer.sample(scene, samples=4, reset=False)
+    numpy.testing.assert_allclose(tile,
+                                  tracer.linear_output[16:28, 32:48],
+                                  atol=1e-5)
+
+
+def test_worker_error(device_):
+    """Test that worker errors propagate to the coordinator."""
+    coordinator = fresnel.distributed.Coordinator(_bad_scene, w=50, h=40)
+    workers = _start_workers(coordinator, device_, n=1)
+    with pytest.raises(RuntimeError, match='bad scene'):
+        coordinator.run()
+    for worker in workers:
+        worker.join()
@@ -125,6 +125,39 @@ def test_color(scene_four_spheres_, generate=False):
             dir_path / 'reference' / 'test_geometry_sphere.test_color.png')
 
 
+def test_color_no_update(scene_four_spheres_, monkeypatch):
+    """Test that color writes render without updating the geometry."""
+    geometry = scene_four_spheres_.geometry[0]
+    geometry.material.primitive_color_mix = 1.0
+    fresnel.preview(scene_four_spheres_, w=150, h=100, anti_alias=False)
+
+    updates = []
+    update = geometry._update
+
+    def count_update():
+        updates.append(True)
+        update()
+
+    monkeypatch.setattr(geometry, '_update', count_update)
+
+    c = fresnel.color.linear(
+        numpy.array([[1, 1, 1], [0, 0, 1], [0, 1, 0], [1, 0, 0]],
+                    dtype=numpy.float32))
+    geometry.color[:] = c
+    assert len(updates) == 0
+
+    buf_proxy = fresnel.preview(scene_four_spheres_,
+                                w=150,
+                                h=100,
+                                anti_alias=False)
+    conftest.assert_image_approx_equal(
+        buf_proxy[:],
+        dir_path / 'reference' / 'test_geometry_sphere.test_color.png')
+
+    geometry.position[:] = geometry.position[:]
+    assert len(updates) == 1
+
+
 def test_outline(scene_four_spheres_, generate=False):
     """Test that outlines render properly."""
     geometry = scene_four_spheres_.geometry[0]
@@ -144,6 +177,90 @@ def test_outline(scene_four_spheres_, generate=False):
             dir_path / 'reference' / 'test_geometry_sphere.test_outline.png')
 
 
+def test_set(scene_four_spheres_):
+    """Test that set and batch_update assign buffers."""
+    geometry = scene_four_spheres_.geometry[0]
+
+    p = numpy.array([[1.5, 0, 1], [1.5, 0, -1], [-1.5, 0, 1], [-1.5, 0, -1]],
+                    dtype=numpy.float32)
+    r = numpy.array([0.5, 0.6, 0.8, 1.0], dtype=numpy.float32)
+    geometry.set(position=p, radius=r)
+    numpy.testing.assert_array_equal(p, geometry.position[:])
+    numpy.testing.assert_array_equal(r, geometry.radius[:])
+
+    with pytest.raises(ValueError):
+        geometry.set(orientation=[1, 0, 0, 0])
+
+    with scene_four_spheres_.batch_update():
+        for i in range(len(p)):
+            geometry.position[i] = p[i] * 2
+    numpy.testing.assert_array_equal(p * 2, geometry.position[:])
+
+    with geometry.batch_update():
+        geometry.position[:] = [[1, 0, 1], [1, 0, -1], [-1, 0, 1], [-1, 0, -1]]
+
+    buf_proxy = fresnel.preview(scene_four_spheres_,
+                                w=150,
+                                h=100,
+                                anti_alias=False)
+    conftest.assert_image_approx_equal(
+        buf_proxy[:],
+        dir_path / 'reference' / 'test_geometry_sphere.test_radius.png')
+
+
+def test_adopt(device_):
+    """Test that spheres render from adopted arrays."""
+    position = numpy.array([[1, 0, 1], [1, 0, -1], [-1, 0, 1], [-1, 0, -1]],
+                           dtype=numpy.float32)
+    color = numpy.array([[1, 0, 0], [0, 1, 0], [0, 0, 1], [1, 0, 1]],
+                        dtype=numpy.float32)
+
+    scene = fresnel.Scene(device_, lights=conftest.test_lights())
+    scene.camera = fresnel.camera.Orthographic(position=(10, 10, 10),
+                                               look_at=(0, 0, 0),
+                                               up=(0, 1, 0),
+                                               height=4)
+    mat = fresnel.material.Material(
+        color=fresnel.color.linear([0.42, 0.267, 1]))
+    geometry = fresnel.geometry.Sphere(scene,
+                                       position=position,
+                                       radius=1.0,
+                                       material=mat,
+                                       color=color,
+                                       copy=False)
+    numpy.testing.assert_array_equal(position, geometry.position[:])
+
+    buf_proxy = fresnel.preview(scene, w=150, h=100, anti_alias=False)
+    conftest.assert_image_approx_equal(
+        buf_proxy[:],
+        dir_path / 'reference' / 'test_geometry_sphere.test_render.png')
+
+    if device_.mode == 'cpu':
+        # the geometry shares memory with the adopted array
+        geometry.position[:] = position * 2
+        numpy.testing.assert_array_equal(position, geometry.position[:])
+
+        with pytest.raises(ValueError):
+            fresnel.geometry.Sphere(scene,
+                                    position=position.astype(numpy.float64),
+                                    copy=False)
+        with pytest.raises(ValueError):
+            fresnel.geometry.Sphere(scene,
+                                    position=numpy.asfortranarray(position),
+                                    copy=False)
+
+        # read-only arrays are adopted, but cannot be written
+        read_only = position.copy()
+        read_only.flags.writeable = False
+        geometry = fresnel.geometry.Sphere(scene,
+                                           position=read_only,
+                                           copy=False)
+        numpy.testing.assert_array_equal(read_only, geometry.position[:])
+        with pytest.raises(ValueError):
+            geometry.position[:] = position * 2
+        numpy.testing.assert_array_equal(read_only, geometry.position[:])
+
+
 if __name__ == '__main__':
     struct = namedtuple("struct", "param")
     device = conftest.device(struct(('cpu', None)))
@@ -2,6 +2,7 @@
 
 import fresnel
 import numpy
+import pytest
 from collections import namedtuple
 import PIL
 import conftest
@@ -163,6 +164,80 @@ def test_multiple_geometries(device_, generate=False):
             dir_path / 'reference' / 'test_scene.test_multiple_geometries4.png')
 
 
+def test_save_load(device_, tmp_path):
+    """Test that a loaded scene renders the same as the saved scene."""
+    scene = fresnel.Scene(device=device_, lights=conftest.test_lights())
+    fresnel.geometry.Sphere(scene,
+                            position=[[1, 0, 0], [-1, 0, 0]],
+                            radius=[0.5, 0.75],
+                            color=[[1, 0, 0], [0, 1, 0]],
+                            material=fresnel.material.Material(
+                                color=(0.5, 0.25, 0.125),
+                                primitive_color_mix=0.5,
+                                roughness=0.6),
+                            outline_width=0.1)
+    cylinder = fresnel.geometry.Cylinder(scene,
+                                         points=[[[0, 0, 0], [0, 1, 0]]],
+                                         radius=0.1)
+    cylinder.disable()
+    fresnel.geometry.Box(scene, [4, 5, 6], box_radius=0.05)
+    fresnel.geometry.Polygon(scene,
+                             vertices=[[-1, -1], [1, -1], [1, 1], [-1, 1]],
+                             position=[[0, 2]],
+                             rounding_radius=0.1)
+    fresnel.geometry.Mesh(scene,
+                          vertices=[[0, 0, 0], [1, 0, 0], [0, 1, 0]],
+                          position=[[0, -2, 0]])
+    polyhedron_info = fresnel.util.convex_polyhedron_from_vertices(
+        [[1, 1, 1], [-1, -1, 1], [1, -1, -1], [-1, 1, -1]])
+    polyhedron = fresnel.geometry.ConvexPolyhedron(scene,
+                                                   polyhedron_info,
+                                                   position=[[2, 2, 0]])
+    polyhedron.color_by_face = 0.5
+    scene.background_color = (0.25, 0.5, 0.75)
+    scene.background_alpha = 0.5
+    scene.camera = fresnel.camera.Perspective(position=(0, 0, 20),
+                                              look_at=(0, 0, 0),
+                                              up=(0, 1, 0),
+                                              focal_length=0.5)
+
+    path = str(tmp_path / 'scene.fresnel')
+    scene.save(path)
+    loaded = fresnel.Scene.load(path, device=device_)
+
+    assert [type(g) for g in loaded.geometry] == [
+        type(g) for g in scene.geometry
+    ]
+    for geom, loaded_geom in zip(scene.geometry, loaded.geometry):
+        for name in geom._buffers:
+            numpy.testing.assert_array_equal(
+                getattr(loaded_geom, name)[:],
+                getattr(geom, name)[:])
+        assert loaded_geom._enabled == geom._enabled
+        assert loaded_geom.outline_width == geom.outline_width
+        assert loaded_geom.material.color == geom.material.color
+        assert loaded_geom.material.roughness == geom.material.roughness
+
+    assert loaded.geometry[2].box == scene.geometry[2].box
+    assert loaded.geometry[5].color_by_face == 0.5
+    assert isinstance(loaded.camera, fresnel.camera.Perspective)
+    assert repr(loaded.camera) == repr(scene.camera)
+    assert len(loaded.lights) == len(scene.lights)
+    numpy.testing.assert_array_equal(loaded.background_color,
+                                     scene.background_color)
+    assert loaded.background_alpha == 0.5
+
+    tracer = fresnel.tracer.Preview(device=device_, w=100, h=100)
+    numpy.testing.assert_array_equal(
+        numpy.array(tracer.render(loaded)[:]),
+        numpy.array(tracer.render(scene)[:]))
+
+    with open(path, 'r+b') as f:
+        f.write(b'NOTASCNE')
+    with pytest.raises(ValueError):
+        fresnel.Scene.load(path, device=device_)
+
+
 if __name__ == '__main__':
     struct = namedtuple("struct", "param")
     device = conftest.device(struct(('cpu', None)))
@@ -2,6 +2,8 @@
 
 import fresnel
 from collections import namedtuple
+import numpy
+import pytest
 import PIL
 import conftest
 import os
@@ -64,6 +66,286 @@ def test_resize(scene_hex_sphere_, generate=False):
     assert buf.shape == (300, 200, 4)
 
 
+def test_output_srgb(scene_hex_sphere_):
+    """Test that output is the sRGB conversion of linear_output."""
+    tracer = fresnel.tracer.Preview(device=scene_hex_sphere_.device,
+                                    w=100,
+                                    h=100,
+                                    anti_alias=True)
+    tracer.render(scene_hex_sphere_)
+
+    linear = tracer.linear_output[:]
+    rgb = linear[:, :, 0:3]
+    srgb = numpy.where(rgb < 0.0031308, 12.92 * rgb,
+                       1.055 * numpy.power(rgb, 1 / 2.4) - 0.055)
+    expected = numpy.empty(linear.shape)
+    expected[:, :, 0:3] = numpy.clip(srgb, 0, 1) * 255
+    expected[:, :, 3] = linear[:, :, 3] * 255
+
+    diff = numpy.abs(tracer.output[:] - numpy.round(expected))
+    assert numpy.max(diff) <= 1
+
+
+def test_output_lazy(scene_hex_sphere_):
+    """Test that the image returned by render reads the latest output."""
+    tracer = fresnel.tracer.Preview(device=scene_hex_sphere_.device,
+                                    w=100,
+                                    h=100,
+                                    anti_alias=False)
+    image = tracer.render(scene_hex_sphere_)
+    first = image[:]
+
+    # render a different image without reading the output
+    scene_hex_sphere_.background_color = (1, 0, 0)
+    scene_hex_sphere_.background_alpha = 1.0
+    tracer.render(scene_hex_sphere_)
+
+    # the image returned by the first render reads the second image
+    numpy.testing.assert_array_equal(image[:], tracer.output[:])
+    assert numpy.any(image[:] != first)
+    assert image.shape == (100, 100, 4)
+
+
+def test_packet_size(scene_hex_sphere_):
+    """Test that packet tracing produces the same image as single rays."""
+    tracer = fresnel.tracer.Preview(device=scene_hex_sphere_.device,
+                                    w=50,
+                                    h=42,
+                                    anti_alias=True)
+    assert tracer.packet_size == 1
+    tracer.render(scene_hex_sphere_)
+    reference = numpy.copy(tracer.linear_output[:])
+
+    for packet_size in (4, 8, 16):
+        tracer.packet_size = packet_size
+        assert tracer.packet_size == packet_size
+        tracer.render(scene_hex_sphere_)
+        numpy.testing.assert_array_equal(tracer.linear_output[:], reference)
+
+    with pytest.raises(RuntimeError):
+        tracer.packet_size = 3
+
+
+def test_tiles(scene_hex_sphere_):
+    """Test that the tile settings do not change the output."""
+    tracer = fresnel.tracer.Preview(device=scene_hex_sphere_.device,
+                                    w=50,
+                                    h=42,
+                                    anti_alias=True)
+    assert tracer.tile_order == 'hilbert'
+    tracer.render(scene_hex_sphere_)
+    reference = numpy.copy(tracer.linear_output[:])
+
+    for tile_size, grain_size, tile_order in [(4, 1, 'row_major'),
+                                              (7, 3, 'morton'),
+                                              (16, 2, 'hilbert')]:
+        tracer.tile_size = tile_size
+        tracer.grain_size = grain_size
+        tracer.tile_order = tile_order
+        assert tracer.tile_size == tile_size
+        assert tracer.grain_size == grain_size
+        assert tracer.tile_order == tile_order
+        tracer.render(scene_hex_sphere_)
+        numpy.testing.assert_array_equal(tracer.linear_output[:], reference)
+
+    with pytest.raises(ValueError):
+        tracer.tile_order = 'spiral'
+
+
+def test_region(scene_hex_sphere_):
+    """Test that region rendering leaves the rest of the buffer untouched."""
+    tracer = fresnel.tracer.Preview(device=scene_hex_sphere_.device,
+                                    w=50,
+                                    h=42,
+                                    anti_alias=True)
+    tracer.render(scene_hex_sphere_)
+    reference = numpy.copy(tracer.linear_output[:])
+
+    tracer.resize(w=50, h=42)
+    tracer.render(scene_hex_sphere_, region=(10, 5, 33, 30))
+    output = numpy.copy(tracer.linear_output[:])
+    numpy.testing.assert_array_equal(output[5:30, 10:33],
+                                     reference[5:30, 10:33])
+    output[5:30, 10:33] = 0
+    numpy.testing.assert_array_equal(output, 0)
+
+    # the region applies only to a single render
+    tracer.render(scene_hex_sphere_)
+    numpy.testing.assert_array_equal(tracer.linear_output[:], reference)
+
+    with pytest.raises(RuntimeError):
+        tracer.render(scene_hex_sphere_, region=(10, 5, 51, 30))
+
+    with pytest.raises(RuntimeError):
+        tracer.render(scene_hex_sphere_, region=(10, 5, 10, 30))
+
+
+def test_render_async(scene_hex_sphere_):
+    """Test that render_async produces the same image as render."""
+    tracer = fresnel.tracer.Preview(device=scene_hex_sphere_.device,
+                                    w=50,
+                                    h=42,
+                                    anti_alias=True)
+    tracer.render(scene_hex_sphere_)
+    reference = numpy.copy(tracer.linear_output[:])
+
+    tracer.resize(w=50, h=42)
+    future = tracer.render_async(scene_hex_sphere_)
+    output = future.result()
+    numpy.testing.assert_array_equal(output[:], tracer.output[:])
+    numpy.testing.assert_array_equal(tracer.linear_output[:], reference)
+
+
+def test_render_progressive(scene_hex_sphere_):
+    """Test that progressive passes refine to the full render."""
+    tracer = fresnel.tracer.Preview(device=scene_hex_sphere_.device,
+                                    w=50,
+                                    h=42,
+                                    anti_alias=True)
+    tracer.render(scene_hex_sphere_)
+    reference = numpy.copy(tracer.linear_output[:])
+
+    passes = []
+    for image in tracer.render_progressive(scene_hex_sphere_, scales=(8, 1)):
+        numpy.testing.assert_array_equal(image[:], tracer.output[:])
+        passes.append(numpy.copy(tracer.linear_output[:]))
+    assert len(passes) == 3
+    assert tracer.anti_alias
+
+    # the first pass fills 8x8 blocks with a single sample
+    coarse = passes[0]
+    numpy.testing.assert_array_equal(coarse[0:8, 0:8],
+                                     numpy.broadcast_to(coarse[0, 0],
+                                                        (8, 8, 4)))
+    numpy.testing.assert_array_equal(coarse[40:42, 48:50],
+                                     numpy.broadcast_to(coarse[40, 48],
+                                                        (2, 2, 4)))
+
+    numpy.testing.assert_array_equal(passes[-1], reference)
+
+
+def test_aovs(scene_hex_sphere_):
+    """Test the auxiliary outputs."""
+    tracer = fresnel.tracer.Preview(device=scene_hex_sphere_.device,
+                                    w=100,
+                                    h=100,
+                                    anti_alias=False)
+    assert not tracer.aovs
+    with pytest.raises(RuntimeError):
+        tracer.depth
+
+    tracer.aovs = True
+    tracer.render(scene_hex_sphere_)
+    geometry = scene_hex_sphere_.geometry[0]
+
+    assert tracer.depth[:].shape == (100, 100)
+    assert tracer.normal[:].shape == (100, 100, 3)
+    assert tracer.albedo[:].shape == (100, 100, 3)
+    assert tracer.geometry_id[:].shape == (100, 100)
+    assert tracer.primitive_id[:].shape == (100, 100)
+
+    # the camera ray misses all spheres in the center of the image
+    assert tracer.depth[50, 50] == numpy.inf
+    assert tracer.geometry_id[50, 50] == fresnel.tracer.INVALID_ID
+    assert tracer.primitive_id[50, 50] == fresnel.tracer.INVALID_ID
+    numpy.testing.assert_array_equal(tracer.normal[50, 50], (0, 0, 0))
+
+    # and hits the top of the first sphere at (2, 0, 0)
+    assert tracer.depth[50, 83] == pytest.approx(9, abs=0.05)
+    assert tracer.geometry_id[50, 83] == geometry.id
+    assert tracer.primitive_id[50, 83] == 0
+    numpy.testing.assert_allclose(tracer.normal[50, 83], (0, 0, 1), atol=0.05)
+    numpy.testing.assert_allclose(tracer.albedo[50, 83],
+                                  geometry.material.color,
+                                  rtol=1e-5)
+
+    hit = tracer.geometry_id[:] != fresnel.tracer.INVALID_ID
+    assert numpy.all(numpy.isfinite(tracer.depth[:][hit]))
+    numpy.testing.assert_allclose(numpy.linalg.norm(tracer.normal[:][hit],
+                                                    axis=1),
+                                  1,
+                                  rtol=1e-5)
+
+    tracer.aovs = False
+    with pytest.raises(RuntimeError):
+        tracer.depth
+
+
+def test_relight(scene_hex_sphere_):
+    """Test that relight matches render after changing lights and materials."""
+    tracer = fresnel.tracer.Preview(device=scene_hex_sphere_.device,
+                                    w=60,
+                                    h=50)
+    tracer.cache_hits = True
+    assert tracer.cache_hits
+    tracer.render(scene_hex_sphere_)
+
+    geometry = scene_hex_sphere_.geometry[0]
+    scene_hex_sphere_.lights[0].color = (0.5, 1, 0.25)
+    scene_hex_sphere_.background_color = (0, 0, 1)
+    scene_hex_sphere_.background_alpha = 1
+    geometry.material.color = (0.25, 0.5, 1)
+    geometry.material.roughness = 0.1
+    geometry.outline_width = 0.3
+
+    relit = numpy.copy(tracer.relight(scene_hex_sphere_)[:])
+    relit_linear = numpy.copy(tracer.linear_output[:])
+
+    reference = fresnel.tracer.Preview(device=scene_hex_sphere_.device,
+                                       w=60,
+                                       h=50)
+    reference.render(scene_hex_sphere_)
+
+    numpy.testing.assert_allclose(relit_linear,
+                                  reference.linear_output[:],
+                                  rtol=1e-5,
+                                  atol=1e-6)
+    assert numpy.max(
+        numpy.abs(relit.astype(int) - reference.output[:].astype(int))) <= 1
+
+    # relight renders when there is no cache
+    tracer.cache_hits = False
+    tracer.resize(60, 50)
+    tracer.relight(scene_hex_sphere_)
+    numpy.testing.assert_array_equal(tracer.linear_output[:],
+                                     reference.linear_output[:])
+
+
+def test_render_views(scene_hex_sphere_):
+    """Test that render_views matches rendering each view."""
+    tracer = fresnel.tracer.Preview(device=scene_hex_sphere_.device,
+                                    w=50,
+                                    h=40)
+    camera = scene_hex_sphere_.camera
+    cameras = [
+        fresnel.camera.Orthographic(position=(0, 0, 10),
+                                    look_at=(0, 0, 0),
+                                    up=(0, 1, 0),
+                                    height=4),
+        fresnel.camera.Orthographic(position=(10, 0, 0),
+                                    look_at=(0, 0, 0),
+                                    up=(0, 0, 1),
+                                    height=4),
+        fresnel.camera.Perspective(position=(0, 10, 10),
+                                   look_at=(0, 0, 0),
+                                   up=(0, 0, 1),
+                                   height=0.5),
+    ]
+
+    views = tracer.render_views(scene_hex_sphere_, cameras)
+    assert views.shape == (3, 40, 50, 4)
+    assert views.dtype == numpy.uint8
+    numpy.testing.assert_array_equal(scene_hex_sphere_.camera.position,
+                                     camera.position)
+
+    for view, c in zip(views, cameras):
+        scene_hex_sphere_.camera = c
+        tracer.render(scene_hex_sphere_)
+        numpy.testing.assert_array_equal(view, tracer.output[:])
+
+    assert tracer.render_views(scene_hex_sphere_, []).shape == (0, 40, 50, 4)
+
+
 if __name__ == '__main__':
     struct = namedtuple("struct", "param")
     device = conftest.device(struct(('cpu', None)))
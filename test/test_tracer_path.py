@@ -2,10 +2,13 @@
 
 import fresnel
 from collections import namedtuple
+import numpy
+import pytest
 import PIL
 import conftest
 import os
 import pathlib
+import time
 
 dir_path = pathlib.Path(os.path.realpath(__file__)).parent
 
@@ -29,6 +32,435 @@ def test_render(scene_hex_sphere_, generate=False):
                                            tolerance=16)
 
 
+def test_render_adaptive(scene_hex_sphere_):
+    """Test that the path tracer renders properly with adaptive sampling."""
+    tracer = fresnel.tracer.Path(device=scene_hex_sphere_.device, w=100, h=100)
+    tracer.seed = 11
+
+    buf_proxy = tracer.sample(scene_hex_sphere_,
+                              samples=64,
+                              light_samples=40,
+                              target_noise=0.002)
+
+    conftest.assert_image_approx_equal(buf_proxy[:],
+                                       dir_path / 'reference'
+                                       / 'test_tracer_path.test_render.png',
+                                       tolerance=16)
+
+    # converged regions stop sampling before the cap
+    pixel_samples = tracer.get_state()['pixel_samples']
+    assert pixel_samples.max() <= 64
+    assert pixel_samples.min() >= 16
+    assert pixel_samples.min() < 64
+    assert pixel_samples.sum() < 64 * 100 * 100
+    assert tracer.get_state()['samples'] == pixel_samples.max()
+
+    # samples counts the samples taken when the whole image converges early
+    tracer.sample(scene_hex_sphere_, samples=64, target_noise=1.0)
+    state = tracer.get_state()
+    assert state['pixel_samples'].max() < 64
+    assert state['samples'] == state['pixel_samples'].max()
+
+
+def test_sample_matches_render(scene_hex_sphere_):
+    """Test that sample produces the same image as repeated calls to render."""
+    tracer_sample = fresnel.tracer.Path(device=scene_hex_sphere_.device,
+                                        w=50,
+                                        h=40)
+    tracer_sample.seed = 11
+    tracer_sample.sample(scene_hex_sphere_, samples=8)
+
+    tracer_render = fresnel.tracer.Path(device=scene_hex_sphere_.device,
+                                        w=50,
+                                        h=40)
+    tracer_render.seed = 11
+    tracer_render.reset()
+    for i in range(8):
+        tracer_render.render(scene_hex_sphere_)
+
+    numpy.testing.assert_allclose(tracer_sample.linear_output[:],
+                                  tracer_render.linear_output[:],
+                                  rtol=1e-5,
+                                  atol=1e-6)
+    numpy.testing.assert_array_equal(tracer_sample.output[:],
+                                     tracer_render.output[:])
+
+
+def test_wavefront(scene_hex_sphere_):
+    """Test that wavefront mode follows the same paths as depth first mode."""
+    tracer = fresnel.tracer.Path(device=scene_hex_sphere_.device, w=50, h=40)
+    assert not tracer.wavefront
+    tracer.sample(scene_hex_sphere_, samples=4, light_samples=8)
+    reference = numpy.copy(tracer.linear_output[:])
+
+    tracer.seed = 0
+    tracer.wavefront = True
+    assert tracer.wavefront
+    tracer.sample(scene_hex_sphere_, samples=4, light_samples=8)
+
+    numpy.testing.assert_allclose(tracer.linear_output[:],
+                                  reference,
+                                  rtol=1e-5,
+                                  atol=1e-6)
+
+    # batches that end in the middle of a tile and span many tiles
+    assert tracer.wavefront_size == 4096
+    for wavefront_size in (7, 100000):
+        tracer.seed = 0
+        tracer.wavefront_size = wavefront_size
+        assert tracer.wavefront_size == wavefront_size
+        tracer.sample(scene_hex_sphere_, samples=4, light_samples=8)
+
+        numpy.testing.assert_allclose(tracer.linear_output[:],
+                                      reference,
+                                      rtol=1e-5,
+                                      atol=1e-6)
+
+    with pytest.raises(RuntimeError):
+        tracer.wavefront_size = 0
+
+
+def test_sample_region(scene_hex_sphere_):
+    """Test that sampling a region leaves the rest of the buffer untouched."""
+    tracer = fresnel.tracer.Path(device=scene_hex_sphere_.device, w=50, h=40)
+    tracer.sample(scene_hex_sphere_, samples=4)
+    reference = numpy.copy(tracer.linear_output[:])
+
+    tracer.seed = 0
+    tracer.sample(scene_hex_sphere_, samples=4, region=(0, 12, 25, 40))
+    output = numpy.copy(tracer.linear_output[:])
+    numpy.testing.assert_allclose(output[12:40, 0:25],
+                                  reference[12:40, 0:25],
+                                  rtol=1e-5,
+                                  atol=1e-6)
+    output[12:40, 0:25] = 0
+    numpy.testing.assert_array_equal(output, 0)
+
+    # continue sampling the rest of the image
+    tracer.sample(scene_hex_sphere_,
+                  samples=4,
+                  reset=False,
+                  region=(25, 12, 50, 40))
+    tracer.sample(scene_hex_sphere_,
+                  samples=4,
+                  reset=False,
+                  region=(0, 0, 50, 12))
+    numpy.testing.assert_allclose(tracer.linear_output[:],
+                                  reference,
+                                  rtol=1e-5,
+                                  atol=1e-6)
+
+
+def test_sample_async(scene_hex_sphere_):
+    """Test concurrent sample_async calls on tracers sharing a device."""
+    tracer = fresnel.tracer.Path(device=scene_hex_sphere_.device, w=50, h=40)
+    tracer.sample(scene_hex_sphere_, samples=4, light_samples=2)
+    reference = numpy.copy(tracer.linear_output[:])
+
+    tracers = [
+        fresnel.tracer.Path(device=scene_hex_sphere_.device, w=50, h=40)
+        for i in range(3)
+    ]
+    futures = [
+        t.sample_async(scene_hex_sphere_, samples=4, light_samples=2)
+        for t in tracers
+    ]
+
+    for t, future in zip(tracers, futures):
+        future.result()
+        numpy.testing.assert_allclose(t.linear_output[:],
+                                      reference,
+                                      rtol=1e-5,
+                                      atol=1e-6)
+
+
+def test_sample_time_budget(scene_hex_sphere_):
+    """Test that sample stops when the time budget runs out."""
+    tracer = fresnel.tracer.Path(device=scene_hex_sphere_.device, w=50, h=40)
+
+    calls = []
+    start = time.monotonic()
+    tracer.sample(scene_hex_sphere_,
+                  time_budget=0.5,
+                  progress=lambda samples, elapsed: calls.append(samples))
+    elapsed = time.monotonic() - start
+
+    assert elapsed < 2.0
+    assert len(calls) > 0
+    assert calls == sorted(calls)
+    assert numpy.any(tracer.linear_output[:] != 0)
+
+    # samples limits the number of samples taken within the budget
+    calls = []
+    tracer.sample(scene_hex_sphere_,
+                  samples=5,
+                  time_budget=60,
+                  progress=lambda samples, elapsed: calls.append(samples))
+    assert calls[-1] == 5
+
+    with pytest.raises(ValueError):
+        tracer.sample(scene_hex_sphere_)
+
+
+def test_sample_progress_render(scene_hex_sphere_):
+    """Test that progress may render with another tracer on the device."""
+    tracer = fresnel.tracer.Path(device=scene_hex_sphere_.device, w=50, h=40)
+    preview = fresnel.tracer.Preview(device=scene_hex_sphere_.device,
+                                     w=50,
+                                     h=40)
+
+    def progress(samples, elapsed):
+        preview.render(scene_hex_sphere_)
+
+    tracer.sample(scene_hex_sphere_, samples=4, progress=progress)
+    assert numpy.any(preview.linear_output[:] != 0)
+
+    reference = fresnel.tracer.Path(device=scene_hex_sphere_.device,
+                                    w=50,
+                                    h=40)
+    reference.sample(scene_hex_sphere_, samples=4)
+    numpy.testing.assert_allclose(tracer.linear_output[:],
+                                  reference.linear_output[:],
+                                  rtol=1e-5,
+                                  atol=1e-6)
+
+
+def test_sample_cancel(scene_hex_sphere_):
+    """Test that a cancelled token stops sampling."""
+    tracer = fresnel.tracer.Path(device=scene_hex_sphere_.device, w=50, h=40)
+    token = fresnel.tracer.CancelToken()
+    assert not token.cancelled
+    token.cancel()
+    assert token.cancelled
+
+    tracer.sample(scene_hex_sphere_, samples=100, cancel=token)
+    numpy.testing.assert_array_equal(tracer.linear_output[:], 0)
+
+    # a cancelled sample takes no samples, so merging it records no seeds
+    state = tracer.get_state()
+    assert state['samples'] == 0
+    merged = fresnel.tracer.Path(device=scene_hex_sphere_.device, w=50, h=40)
+    merged.merge(state)
+    merged.merge(state)
+    assert merged.get_state()['seeds'] == []
+
+    # the token applies only to the call it is passed to
+    tracer.sample(scene_hex_sphere_, samples=1)
+    assert numpy.any(tracer.linear_output[:] != 0)
+
+
+def test_aovs(scene_hex_sphere_):
+    """Test that Path records the auxiliary outputs of the first sample."""
+    tracer = fresnel.tracer.Path(device=scene_hex_sphere_.device, w=100, h=100)
+    tracer.aovs = True
+    tracer.sample(scene_hex_sphere_, samples=4)
+    geometry = scene_hex_sphere_.geometry[0]
+
+    assert tracer.depth[50, 50] == numpy.inf
+    assert tracer.geometry_id[50, 50] == fresnel.tracer.INVALID_ID
+    assert tracer.depth[50, 83] == pytest.approx(9, abs=0.05)
+    assert tracer.geometry_id[50, 83] == geometry.id
+    assert tracer.primitive_id[50, 83] == 0
+
+    hit = tracer.geometry_id[:] != fresnel.tracer.INVALID_ID
+    assert numpy.count_nonzero(hit) > 0
+    numpy.testing.assert_array_equal(hit, numpy.isfinite(tracer.depth[:]))
+
+
+def test_sampler(scene_hex_sphere_):
+    """Test that the Sobol sampler is deterministic and reduces noise."""
+    tracer = fresnel.tracer.Path(device=scene_hex_sphere_.device, w=50, h=40)
+    assert tracer.sampler == 'random'
+    with pytest.raises(ValueError):
+        tracer.sampler = 'halton'
+
+    tracer.sampler = 'random'
+    tracer.seed = 0
+    tracer.sample(scene_hex_sphere_, samples=1024)
+    reference = numpy.copy(tracer.linear_output[:])
+
+    def error(sampler):
+        tracer.sampler = sampler
+        tracer.seed = 10
+        tracer.sample(scene_hex_sphere_, samples=16)
+        return numpy.mean((tracer.linear_output[:] - reference)**2)
+
+    sobol_error = error('sobol')
+    sobol = numpy.copy(tracer.linear_output[:])
+    random_error = error('random')
+
+    assert tracer.sampler == 'random'
+    assert sobol_error < random_error
+
+    tracer.sampler = 'sobol'
+    tracer.seed = 10
+    tracer.sample(scene_hex_sphere_, samples=16)
+    numpy.testing.assert_array_equal(tracer.linear_output[:], sobol)
+
+
+def test_sobol_stratified():
+    """Test that a pixel's first 2^k anti-aliasing samples are stratified."""
+    for k in range(8):
+        n = 2**k
+        points = fresnel._common.sobol_aa_points(10, 123, n)
+        assert points.shape == (n, 2)
+
+        # every elementary interval of area 1/n holds exactly one point
+        for a in range(k + 1):
+            b = k - a
+            x = numpy.floor(points[:, 0] * 2**a).astype(int)
+            y = numpy.floor(points[:, 1] * 2**b).astype(int)
+            assert len(numpy.unique(x * 2**b + y)) == n
+
+
+def test_light_sampling(scene_hex_sphere_):
+    """Test that light sampling reduces noise from small lights."""
+    scene_hex_sphere_.lights = [
+        fresnel.light.Light(direction=(1, 1, 1), color=(1, 1, 1), theta=0.1)
+    ]
+
+    tracer = fresnel.tracer.Path(device=scene_hex_sphere_.device, w=50, h=40)
+    assert not tracer.light_sampling
+
+    tracer.light_sampling = True
+    tracer.seed = 0
+    tracer.sample(scene_hex_sphere_, samples=1024)
+    reference = numpy.copy(tracer.linear_output[:])
+
+    def error(light_sampling):
+        tracer.light_sampling = light_sampling
+        tracer.seed = 10
+        tracer.sample(scene_hex_sphere_, samples=16)
+        return numpy.mean((tracer.linear_output[:] - reference)**2)
+
+    assert error(True) < error(False)
+    assert not tracer.light_sampling
+
+    # both estimators converge to the same image
+    tracer.seed = 0
+    tracer.sample(scene_hex_sphere_, samples=1024)
+    assert numpy.mean(tracer.linear_output[:, :, 0:3]) == pytest.approx(
+        numpy.mean(reference[:, :, 0:3]), rel=0.05)
+
+
+def test_depth(scene_hex_sphere_):
+    """Test the path depth limits and statistics."""
+    tracer = fresnel.tracer.Path(device=scene_hex_sphere_.device, w=50, h=40)
+    assert tracer.max_depth is None
+    assert tracer.roulette_depth == 0
+    assert not tracer.collect_statistics
+    with pytest.raises(RuntimeError):
+        tracer.statistics
+    with pytest.raises(ValueError):
+        tracer.max_depth = 0
+    with pytest.raises(ValueError):
+        tracer.roulette_depth = -1
+
+    tracer.collect_statistics = True
+    tracer.roulette_depth = 4
+    tracer.sample(scene_hex_sphere_, samples=4, light_samples=2)
+    statistics = tracer.statistics
+    assert statistics['samples'] == 50 * 40 * 4
+    assert statistics['paths'] == 50 * 40 * 4 * 2
+    assert statistics['mean_path_length'] >= 1
+    assert statistics['max_path_length'] >= 2
+    assert statistics['rays_per_sample'] >= 1
+
+    tracer.max_depth = 2
+    tracer.sample(scene_hex_sphere_, samples=4, light_samples=2)
+    assert tracer.max_depth == 2
+    assert tracer.statistics['max_path_length'] <= 2
+
+    # direct lighting only
+    tracer.max_depth = 1
+    tracer.sample(scene_hex_sphere_, samples=4)
+    assert tracer.statistics['max_path_length'] == 1
+    assert numpy.max(tracer.linear_output[:, :, 0:3]) > 0
+
+    tracer.max_depth = None
+    assert tracer.max_depth is None
+
+
+def test_merge(scene_hex_sphere_):
+    """Test that merged accumulators match the combined samples."""
+    states = []
+    for seed in (1, 2):
+        tracer = fresnel.tracer.Path(device=scene_hex_sphere_.device,
+                                     w=50,
+                                     h=40)
+        tracer.seed = seed
+        tracer.sample(scene_hex_sphere_, samples=4)
+        states.append(tracer.get_state())
+
+    state = states[0]
+    assert state['mean'].shape == (40, 50, 4)
+    assert state['m2'].shape == (40, 50, 3)
+    numpy.testing.assert_array_equal(state['pixel_samples'], 4)
+    assert state['samples'] == 4
+
+    merged = fresnel.tracer.Path(device=scene_hex_sphere_.device, w=50, h=40)
+    merged.merge(states[0])
+    numpy.testing.assert_allclose(merged.linear_output[:], states[0]['mean'])
+    merged.merge(states[1])
+
+    merged_state = merged.get_state()
+    assert merged_state['samples'] == 8
+    numpy.testing.assert_array_equal(merged_state['pixel_samples'], 8)
+    numpy.testing.assert_allclose(
+        merged.linear_output[:],
+        (states[0]['mean'] + states[1]['mean']) / 2,
+        atol=1e-5)
+    assert merged.output[:].shape == (40, 50, 4)
+
+    # the merged variance is the variance of the two sets of samples together
+    delta = states[1]['mean'][:, :, 0:3] - states[0]['mean'][:, :, 0:3]
+    numpy.testing.assert_allclose(merged_state['m2'],
+                                  states[0]['m2'] + states[1]['m2']
+                                  + delta**2 * 2,
+                                  rtol=1e-4,
+                                  atol=1e-5)
+
+    with pytest.raises(ValueError):
+        merged.merge(states[0])
+
+    small = fresnel.tracer.Path(device=scene_hex_sphere_.device, w=10, h=10)
+    with pytest.raises(ValueError):
+        small.merge(states[0])
+
+
+def test_merge_workers(scene_hex_sphere_):
+    """Test the worker recipe in the merge documentation."""
+    n_workers = 3
+    samples = 6
+    states = []
+    for worker_index in range(n_workers):
+        tracer = fresnel.tracer.Path(device=scene_hex_sphere_.device,
+                                     w=50,
+                                     h=40)
+        tracer.seed = worker_index
+        tracer.sample(scene_hex_sphere_, samples=samples // n_workers)
+        states.append(tracer.get_state())
+
+    tracer = fresnel.tracer.Path(device=scene_hex_sphere_.device, w=50, h=40)
+    tracer.reset()
+    for state in states:
+        tracer.merge(state)
+
+    state = tracer.get_state()
+    assert state['samples'] == samples
+    assert len(state['seeds']) == n_workers
+
+    # merging the same samples twice is an error
+    with pytest.raises(ValueError):
+        tracer.merge(states[1])
+
+    # so is merging samples that share a seed with samples from another state
+    other = fresnel.tracer.Path(device=scene_hex_sphere_.device, w=50, h=40)
+    other.merge(states[0])
+    with pytest.raises(ValueError):
+        other.merge(dict(states[1], seeds=states[0]['seeds']))
+
+
 if __name__ == '__main__':
     struct = namedtuple("struct", "param")
     device = conftest.device(struct(('gpu', 1)))
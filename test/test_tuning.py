@@ -0,0 +1,70 @@
+"""Test the performance tuning profile."""
+
+import fresnel
+import json
+import pytest
+
+
+def test_tune(scene_hex_sphere_, tmp_path, monkeypatch):
+    """Test that tune saves settings that new tracers load."""
+    profile = tmp_path / 'profile.json'
+    monkeypatch.setenv('FRESNEL_PROFILE', str(profile))
+
+    settings = fresnel.tune(scene_hex_sphere_,
+                            w=20,
+                            h=20,
+                            samples=4,
+                            tile_sizes=(4, 8),
+                            grain_sizes=(1, 2),
+                            tile_orders=('row_major', 'hilbert'),
+                            packet_sizes=(1, 4),
+                            wavefronts=(False, True))
+
+    if scene_hex_sphere_.device.mode != 'cpu':
+        assert settings == {}
+        assert not profile.exists()
+        return
+
+    assert settings['tile_size'] in (4, 8)
+    assert settings['grain_size'] in (1, 2)
+    assert settings['tile_order'] in ('row_major', 'hilbert')
+    assert settings['packet_size'] in (1, 4)
+    assert settings['wavefront'] in (False, True)
+    assert set(settings) == set(fresnel.tuning.tracer_settings)
+
+    data = json.loads(profile.read_text())
+    section = data[fresnel.tuning.machine(scene_hex_sphere_.device)]
+    assert section[fresnel.tuning.scene_class(scene_hex_sphere_)] == settings
+    assert fresnel.tuning.load(scene_hex_sphere_.device) == settings
+
+    tracer = fresnel.tracer.Path(device=scene_hex_sphere_.device, w=10, h=10)
+    for name in fresnel.tuning.tracer_settings:
+        if name in settings:
+            assert getattr(tracer, name) == settings[name]
+
+
+def test_disabled(scene_hex_sphere_, monkeypatch):
+    """Test that an empty FRESNEL_PROFILE disables the profile."""
+    monkeypatch.setenv('FRESNEL_PROFILE', '')
+    assert fresnel.tuning.path() is None
+    assert fresnel.tuning.load(scene_hex_sphere_.device) == {}
+
+
+def test_unreadable(scene_hex_sphere_, tmp_path, monkeypatch):
+    """Test that tracers ignore a corrupt profile."""
+    profile = tmp_path / 'profile.json'
+    profile.write_text('{"truncated": ')
+    monkeypatch.setenv('FRESNEL_PROFILE', str(profile))
+
+    with pytest.warns(UserWarning):
+        assert fresnel.tuning.load(scene_hex_sphere_.device) == {}
+    with pytest.warns(UserWarning):
+        tracer = fresnel.tracer.Preview(device=scene_hex_sphere_.device,
+                                        w=10,
+                                        h=10)
+    assert tracer.packet_size == 1
+
+
+def test_scene_class(scene_hex_sphere_):
+    """Test the scene classification."""
+    assert fresnel.tuning.scene_class(scene_hex_sphere_) == 'Sphere/1e0'